@@ -0,0 +1,119 @@
+"""partition metrics by day & add rollups
+
+Revision ID: 4f1c2a9d7b3e
+Revises: 92d5ea581eda
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from datetime import date, datetime, timedelta, timezone
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "4f1c2a9d7b3e"
+down_revision: Union[str, Sequence[str], None] = "92d5ea581eda"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PREMAKE_DAYS = 3
+
+
+def _create_partition(day: date) -> None:
+    op.execute(
+        f"CREATE TABLE IF NOT EXISTS metrics_p{day:%Y%m%d} PARTITION OF metrics "
+        f"FOR VALUES FROM ('{day.isoformat()}+00') TO ('{(day + timedelta(days=1)).isoformat()}+00')"
+    )
+
+
+def _create_rollup(name: str) -> None:
+    op.create_table(
+        name,
+        sa.Column("type", sa.String(length=64), nullable=False),
+        sa.Column("bucket", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.Column("sum", sa.Float(), nullable=False),
+        sa.Column("min", sa.Float(), nullable=False),
+        sa.Column("max", sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint("type", "bucket"),
+    )
+
+
+def _backfill_rollup(name: str, resolution: int) -> None:
+    op.execute(
+        f"INSERT INTO {name} (type, bucket, count, sum, min, max) "
+        f"SELECT type, to_timestamp(floor(extract(epoch FROM ts) / {resolution}) * {resolution}), "
+        "count(*), sum(value), min(value), max(value) "
+        "FROM metrics GROUP BY 1, 2"
+    )
+
+
+def upgrade() -> None:
+    op.rename_table("metrics", "metrics_legacy")
+    op.execute("ALTER TABLE metrics_legacy RENAME CONSTRAINT metrics_pkey TO metrics_legacy_pkey")
+    op.drop_index("ix_metrics_ts", table_name="metrics_legacy")
+    op.drop_index("ix_metrics_type", table_name="metrics_legacy")
+
+    op.create_table(
+        "metrics",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("ts", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("type", sa.String(length=64), nullable=False),
+        sa.Column("value", sa.Float(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("CURRENT_TIMESTAMP"), nullable=False),
+        sa.PrimaryKeyConstraint("id", "ts"),
+        postgresql_partition_by="RANGE (ts)",
+    )
+    op.create_index("ix_metrics_type_ts", "metrics", ["type", "ts"], unique=False)
+    op.create_index("ix_metrics_ts_brin", "metrics", ["ts"], unique=False, postgresql_using="brin")
+    op.execute("CREATE TABLE metrics_default PARTITION OF metrics DEFAULT")
+
+    bounds = op.get_bind().execute(
+        sa.text("SELECT (min(ts) AT TIME ZONE 'UTC')::date, (max(ts) AT TIME ZONE 'UTC')::date FROM metrics_legacy")
+    ).one()
+    today = datetime.now(tz=timezone.utc).date()
+    first = min(bounds[0] or today, today)
+    last = max(bounds[1] or today, today + timedelta(days=PREMAKE_DAYS))
+    day = first
+    while day <= last:
+        _create_partition(day)
+        day += timedelta(days=1)
+
+    op.execute(
+        "INSERT INTO metrics (id, ts, type, value, created_at) "
+        "SELECT id, ts, type, value, coalesce(created_at, CURRENT_TIMESTAMP) FROM metrics_legacy"
+    )
+    op.drop_table("metrics_legacy")
+
+    _create_rollup("metrics_1m")
+    _create_rollup("metrics_1h")
+    _backfill_rollup("metrics_1m", 60)
+    _backfill_rollup("metrics_1h", 3600)
+
+
+def downgrade() -> None:
+    op.drop_table("metrics_1h")
+    op.drop_table("metrics_1m")
+
+    op.create_table(
+        "metrics_flat",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("type", sa.String(length=64), nullable=False),
+        sa.Column("value", sa.Float(), nullable=False),
+        sa.Column("ts", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("CURRENT_TIMESTAMP")),
+        sa.PrimaryKeyConstraint("id", name="metrics_flat_pkey"),
+    )
+    op.execute(
+        "INSERT INTO metrics_flat (id, type, value, ts, created_at) "
+        "SELECT id, type, value, ts, created_at FROM metrics"
+    )
+    # Dropping the parent drops every partition with it.
+    op.drop_table("metrics")
+    op.rename_table("metrics_flat", "metrics")
+    op.execute("ALTER TABLE metrics RENAME CONSTRAINT metrics_flat_pkey TO metrics_pkey")
+    op.create_index("ix_metrics_type", "metrics", ["type"], unique=False)
+    op.create_index("ix_metrics_ts", "metrics", ["ts"], unique=False)
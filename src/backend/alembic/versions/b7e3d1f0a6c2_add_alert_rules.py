@@ -0,0 +1,46 @@
+"""add alert rules
+
+Revision ID: b7e3d1f0a6c2
+Revises: 4f1c2a9d7b3e
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b7e3d1f0a6c2"
+down_revision: Union[str, Sequence[str], None] = "4f1c2a9d7b3e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    alert_kind_enum = sa.Enum("threshold", "zscore", "ewma", name="alertkind")
+
+    op.create_table(
+        "alert_rules",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True, nullable=False),
+        sa.Column("name", sa.String(length=255), nullable=False),
+        sa.Column("metric_type", sa.String(length=64), nullable=False),
+        sa.Column("kind", alert_kind_enum, nullable=False),
+        sa.Column("lower", sa.Float(), nullable=True),
+        sa.Column("upper", sa.Float(), nullable=True),
+        sa.Column("threshold", sa.Float(), nullable=True),
+        sa.Column("window", sa.Integer(), nullable=True),
+        sa.Column("alpha", sa.Float(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("CURRENT_TIMESTAMP")),
+    )
+    op.create_index("ix_alert_rules_metric_type", "alert_rules", ["metric_type"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_alert_rules_metric_type", table_name="alert_rules")
+    op.drop_table("alert_rules")
+
+    alert_kind_enum = sa.Enum("threshold", "zscore", "ewma", name="alertkind")
+    alert_kind_enum.drop(op.get_bind(), checkfirst=True)
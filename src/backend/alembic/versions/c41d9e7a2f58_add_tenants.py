@@ -0,0 +1,62 @@
+"""add tenants
+
+Revision ID: c41d9e7a2f58
+Revises: b7e3d1f0a6c2
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c41d9e7a2f58"
+down_revision: Union[str, Sequence[str], None] = "b7e3d1f0a6c2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Series keys gain a `{tenant}/` prefix of up to 33 characters.
+TYPE_COLUMNS = (
+    ("metrics", "type"),
+    ("metrics_1m", "type"),
+    ("metrics_1h", "type"),
+    ("alert_rules", "metric_type"),
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "tenants",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True, nullable=False),
+        sa.Column("slug", sa.String(length=32), nullable=False),
+        sa.Column("name", sa.String(length=255), nullable=False),
+        sa.Column("ingest_rate", sa.Float(), nullable=True),
+        sa.Column("ingest_burst", sa.Integer(), nullable=True),
+        sa.Column("connection_rate", sa.Float(), nullable=True),
+        sa.Column("max_connections", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("CURRENT_TIMESTAMP")),
+    )
+    op.create_index("ix_tenants_slug", "tenants", ["slug"], unique=True)
+
+    op.add_column("users", sa.Column("tenant_id", postgresql.UUID(as_uuid=True), nullable=True))
+    op.create_foreign_key("fk_users_tenant_id_tenants", "users", "tenants", ["tenant_id"], ["id"])
+    op.create_index("ix_users_tenant_id", "users", ["tenant_id"], unique=False)
+
+    # Widening a varchar is a catalog-only change, also on the partitioned table.
+    for table, column in TYPE_COLUMNS:
+        op.alter_column(table, column, type_=sa.String(length=128), existing_type=sa.String(length=64), existing_nullable=False)
+
+
+def downgrade() -> None:
+    for table, column in TYPE_COLUMNS:
+        op.alter_column(table, column, type_=sa.String(length=64), existing_type=sa.String(length=128), existing_nullable=False)
+
+    op.drop_index("ix_users_tenant_id", table_name="users")
+    op.drop_constraint("fk_users_tenant_id_tenants", "users", type_="foreignkey")
+    op.drop_column("users", "tenant_id")
+
+    op.drop_index("ix_tenants_slug", table_name="tenants")
+    op.drop_table("tenants")
@@ -0,0 +1,42 @@
+"""add series and metrics.series_id
+
+Revision ID: d8a3f5c1e047
+Revises: c41d9e7a2f58
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d8a3f5c1e047"
+down_revision: Union[str, Sequence[str], None] = "c41d9e7a2f58"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "series",
+        sa.Column("id", sa.BigInteger(), autoincrement=False, primary_key=True, nullable=False),
+        sa.Column("type", sa.String(length=128), nullable=False),
+        sa.Column("labels", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("CURRENT_TIMESTAMP")),
+    )
+    op.create_index("ix_series_type", "series", ["type"], unique=False)
+
+    # Nullable, so existing partitions are not rewritten; the index is created on
+    # the partitioned parent and cascades to every partition.
+    op.add_column("metrics", sa.Column("series_id", sa.BigInteger(), nullable=True))
+    op.create_index("ix_metrics_series_id_ts", "metrics", ["series_id", "ts"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_metrics_series_id_ts", table_name="metrics")
+    op.drop_column("metrics", "series_id")
+
+    op.drop_index("ix_series_type", table_name="series")
+    op.drop_table("series")
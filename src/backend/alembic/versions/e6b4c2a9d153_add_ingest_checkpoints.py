@@ -0,0 +1,32 @@
+"""add ingest_checkpoints
+
+Revision ID: e6b4c2a9d153
+Revises: d8a3f5c1e047
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e6b4c2a9d153"
+down_revision: Union[str, Sequence[str], None] = "d8a3f5c1e047"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ingest_checkpoints",
+        sa.Column("log_id", sa.String(length=32), primary_key=True, nullable=False),
+        sa.Column("segment", sa.BigInteger(), nullable=False),
+        sa.Column("byte_offset", sa.BigInteger(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("CURRENT_TIMESTAMP")),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("ingest_checkpoints")
@@ -1,9 +1,17 @@
 from fastapi import APIRouter
 
-from app.api import auth, metrics
+from app.api import alerts, auth, internal, metrics
+from app.ws import aggregates as ws_aggregates
+from app.ws import alerts as ws_alerts
 from app.ws import metrics as ws_metrics
+from app.ws import stream as ws_stream
 
 api_router = APIRouter()
 api_router.include_router(auth.router, prefix="/auth", tags=["auth"])
+api_router.include_router(internal.router, prefix="/internal")
 api_router.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
+api_router.include_router(alerts.router, prefix="/alerts", tags=["alerts"])
 api_router.include_router(ws_metrics.router, tags=["ws"])
+api_router.include_router(ws_stream.router, tags=["ws"])
+api_router.include_router(ws_alerts.router, tags=["ws"])
+api_router.include_router(ws_aggregates.router, tags=["ws"])
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import logging
+import uuid
+from typing import Annotated, Any
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.session import get_async_db
+from app.dependencies.auth import get_current_admin, get_current_user
+from app.dependencies.metrics import series_key
+from app.models.alert import AlertRule
+from app.schemas.alerts import AlertEventRead, AlertRuleCreate, AlertRuleRead
+from app.services.alerts import alert_engine
+from app.services.auth_cache import Principal
+from app.services.tenants import SEPARATOR, namespace, qualify
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.get("", response_model=list[AlertEventRead])
+async def list_alerts(
+    user: Annotated[Principal, Depends(get_current_user)],
+    limit: Annotated[int, Query(ge=1, le=settings.alerts_recent_max)] = 100,
+) -> list[dict[str, Any]]:
+    """The latest alert state changes of the caller's tenant, newest first."""
+    try:
+        return await alert_engine.recent(limit, user.tenant)
+    except Exception as exc:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="alert store unavailable",
+        ) from exc
+
+
+@router.get("/rules", response_model=list[AlertRuleRead])
+async def list_rules(
+    user: Annotated[Principal, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    metric_type: str | None = None,
+) -> list[AlertRule]:
+    stmt = select(AlertRule).order_by(AlertRule.metric_type, AlertRule.name)
+    if metric_type is not None:
+        stmt = stmt.where(AlertRule.metric_type == series_key(user, metric_type))
+    elif user.tenant:
+        prefix = qualify(user.tenant, "")
+        stmt = stmt.where(AlertRule.metric_type.startswith(prefix, autoescape=True))
+    else:
+        stmt = stmt.where(AlertRule.metric_type.not_like(f"%{SEPARATOR}%"))
+    return list((await db.scalars(stmt)).all())
+
+
+@router.post(
+    "/rules", response_model=AlertRuleRead, status_code=status.HTTP_201_CREATED
+)
+async def create_rule(
+    payload: AlertRuleCreate,
+    user: Annotated[Principal, Depends(get_current_admin)],
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+) -> AlertRule:
+    rule = AlertRule(**payload.model_dump())
+    rule.metric_type = series_key(user, payload.metric_type)
+    db.add(rule)
+    await db.commit()
+    await db.refresh(rule)
+    await _announce()
+    return rule
+
+
+@router.delete("/rules/{rule_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_rule(
+    rule_id: uuid.UUID,
+    user: Annotated[Principal, Depends(get_current_admin)],
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+) -> Response:
+    rule = await db.get(AlertRule, rule_id)
+    if rule is None or namespace(rule.metric_type) != user.tenant:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="rule not found"
+        )
+    await db.delete(rule)
+    await db.commit()
+    await _announce()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+async def _announce() -> None:
+    try:
+        await alert_engine.rules_changed()
+    except Exception as exc:  # the engine also reloads whenever it (re)starts
+        logger.warning("Could not announce alert rule change: %s", exc)
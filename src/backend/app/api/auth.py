@@ -1,21 +1,51 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from __future__ import annotations
+
+import logging
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.security import create_access_token, verify_password
-from app.db.session import get_db
+from app.core.security import create_access_token, password_needs_rehash
+from app.db.session import get_async_db
 from app.models.user import User
 from app.schemas.auth import LoginRequest, TokenResponse
+from app.services.password_hasher import HasherBusyError, password_hasher
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
 @router.post("/login", response_model=TokenResponse)
-def login(payload: LoginRequest, db: Session = Depends(get_db)) -> TokenResponse:
-    user = db.execute(
-        select(User).where(User.email == payload.email)
+async def login(
+    payload: LoginRequest,
+    request: Request,
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+) -> TokenResponse:
+    user = (
+        await db.execute(select(User).where(User.email == payload.email))
     ).scalar_one_or_none()
-    if user is None or not verify_password(payload.password, user.password_hash):
+    client_ip = request.client.host if request.client else ""
+    keys = (f"ip:{client_ip}", f"email:{payload.email.lower()}")
+    try:
+        verified = await password_hasher.verify(
+            payload.password, user.password_hash if user else None, keys
+        )
+        if verified and password_needs_rehash(user.password_hash):
+            user.password_hash = await password_hasher.hash(payload.password, keys)
+            await db.commit()
+            logger.info(
+                "Rehashed password for %s at the current work factor", user.email
+            )
+    except HasherBusyError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts",
+            headers={"Retry-After": str(exc.retry_after)},
+        ) from exc
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials"
         )
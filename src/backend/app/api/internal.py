@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import hmac
+import ipaddress
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import PlainTextResponse
+
+from app.core.config import settings
+from app.services.worker_metrics import worker_metrics
+
+router = APIRouter()
+
+EXPOSITION_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _allowed_source(host: str | None) -> bool:
+    try:
+        address = ipaddress.ip_address(host or "")
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network, strict=False)
+        for network in settings.internal_metrics_allow
+    )
+
+
+def require_scraper(request: Request) -> None:
+    """Let in `INTERNAL_METRICS_ALLOW` sources, or anyone with the scrape token.
+
+    The exposition names tenants and channels, so it is not for the public.
+    """
+    token = settings.internal_metrics_token
+    scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+    if token and scheme.lower() == "bearer":
+        if hmac.compare_digest(credentials.encode(), token.encode()):
+            return
+    elif _allowed_source(request.client.host if request.client else None):
+        return
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+
+
+@router.get("/metrics", include_in_schema=False)
+async def exposition(
+    _: Annotated[None, Depends(require_scraper)],
+) -> PlainTextResponse:
+    """Prometheus text exposition of every worker, each sample labelled `worker`."""
+    return PlainTextResponse(
+        await worker_metrics.render(), media_type=EXPOSITION_CONTENT_TYPE
+    )
@@ -1,49 +1,293 @@
 from __future__ import annotations
 
+import heapq
 from datetime import UTC, datetime, timedelta
-from typing import Annotated
+from typing import Annotated, Any
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from app.core.config import settings
+from app.db.session import get_async_db, get_async_sessionmaker
 from app.dependencies.auth import get_current_user
-from app.models.user import User
-from app.schemas.metrics import MetricSeriesResponse
+from app.dependencies.metrics import parse_matchers, series_key
+from app.schemas.metrics import (
+    HotTierStats,
+    IngestResponse,
+    MetricAggregate,
+    MetricSeriesResponse,
+    Quantile,
+    SeriesRead,
+)
+from app.services.auth_cache import Principal
+from app.services.export import (
+    ExportFormat,
+    available_export_formats,
+    export_filename,
+    export_points,
+)
+from app.services.hot_tier import hot_tier
+from app.services.ingest import (
+    BufferFullError,
+    InvalidPayloadError,
+    ingest_buffer,
+    parse_body,
+)
+from app.services.query_cache import align_down, query_cache
+from app.services.reducers import Downsample, reduce_series
+from app.services.rolling import DEFAULT_QUANTILES, rolling_aggregates
+from app.services.series import CardinalityLimitError, series_index
+from app.services.tenants import (
+    QuotaExceededError,
+    display_name,
+    namespace,
+    tenant_limiter,
+)
+from app.services.timeseries import Aggregation, as_utc, query_series, resolve_step
+from app.services.wire import (
+    WireFormat,
+    available_formats,
+    encode_series,
+    entity_tag,
+    etag_matches,
+    negotiate,
+)
 
 router = APIRouter()
 
+LabelMatchers = Annotated[
+    list[str] | None,
+    Query(
+        alias="match",
+        description='Label matchers: `host=web-3`, `region!=us`, `host=~"web-.*"`',
+    ),
+]
 
-def _mock_metrics(
-    metric_type: str, start_at: datetime, end_at: datetime
-) -> MetricSeriesResponse:
-    duration = (end_at - start_at).total_seconds() or 1
-    steps = max(int(duration), 1)
-    interval = max(duration / steps, 1)
-    series = []
-    current = start_at
-    for idx in range(steps + 1):
-        series.append(
-            {
-                "timestamp": current.isoformat().replace("+00:00", "Z"),
-                "value": 50 + (idx % 10),
-                "type": metric_type,
-            }
-        )
-        current = current + timedelta(seconds=interval)
-        if current > end_at:
-            break
-    return MetricSeriesResponse(series=series)
 
-
-@router.get("", response_model=MetricSeriesResponse)
+@router.get(
+    "",
+    response_model=MetricSeriesResponse,
+    responses={
+        200: {
+            "content": {
+                fmt.value: {} for fmt in WireFormat if fmt is not WireFormat.JSON
+            }
+        },
+        304: {"description": "The series still matches `If-None-Match`"},
+        406: {"description": "None of the accepted media types can be produced"},
+    },
+)
 async def list_metrics(
+    request: Request,
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    user: Annotated[Principal, Depends(get_current_user)],
     metric_type: Annotated[str, Query(alias="type")] = "cpu",
     from_ts: Annotated[datetime | None, Query(alias="from")] = None,
     to_ts: Annotated[datetime | None, Query(alias="to")] = None,
-    _: Annotated[User, Depends(get_current_user)] = None,
-) -> MetricSeriesResponse:
+    step: Annotated[
+        int | None, Query(ge=1, description="Bucket width in seconds")
+    ] = None,
+    agg: Aggregation = Aggregation.AVG,
+    max_points: Annotated[
+        int | None, Query(ge=2, description="Thin the series to this many points")
+    ] = None,
+    downsample: Downsample = Downsample.LTTB,
+    match: LabelMatchers = None,
+) -> Response:
+    """Bucketed series, as point objects or, per `Accept`, columnar arrays.
+
+    With `max_points` the bucketed series is thinned for charting: `lttb` keeps
+    the points that preserve its shape, `minmax` the low and high of each bucket.
+
+    Each `match` narrows the type to the series whose labels satisfy it; the
+    buckets then aggregate the points of every matching series.
+
+    Columnar formats carry parallel `ts` (epoch ms) and `values` arrays, in JSON
+    (`application/vnd.rad.columnar+json`), MessagePack (`application/msgpack`) or
+    Arrow IPC (`application/vnd.apache.arrow.stream`, with the `arrow` extra).
+    """
+    fmt = negotiate(request.headers.get("accept"))
+    if fmt is None:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail="Supported media types: "
+            + ", ".join(option.value for option in available_formats()),
+        )
+    key = series_key(user, metric_type)
+    matchers = parse_matchers(match)
     now = datetime.now(tz=UTC)
-    start_at = from_ts or now - timedelta(minutes=5)
-    end_at = to_ts or now
+    end_at = as_utc(to_ts) if to_ts else now
+    start_at = as_utc(from_ts) if from_ts else end_at - timedelta(minutes=5)
     if start_at > end_at:
         start_at = end_at - timedelta(minutes=5)
-    return _mock_metrics(metric_type, start_at=start_at, end_at=end_at)
+    step = resolve_step(start_at, end_at, step, settings.metrics_max_points)
+    start_at = align_down(start_at, step)
+    end_at = align_down(end_at, step) + timedelta(seconds=step, microseconds=-1)
+    if matchers:
+        columns = await query_series(
+            db,
+            key,
+            start_at,
+            end_at,
+            step=step,
+            agg=agg,
+            series=series_index.select(key, matchers),
+        )
+    else:
+        columns = hot_tier.query(key, start_at, end_at, step=step, agg=agg)
+    if columns is None:
+        columns = await query_cache.series(
+            db, key, start_at, end_at, step=step, agg=agg
+        )
+    if max_points is not None:
+        columns = reduce_series(columns, max_points, downsample)
+    body = encode_series(columns, agg.value, fmt)
+    headers = {"Vary": "Accept", "ETag": entity_tag(body)}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    # A plain Response skips re-validating every point against response_model.
+    return Response(content=body, media_type=fmt.value, headers=headers)
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {fmt.media_type: {} for fmt in ExportFormat}},
+        406: {"description": "The format is not available on this server"},
+    },
+)
+async def export_metrics(
+    session_factory: Annotated[
+        async_sessionmaker[AsyncSession], Depends(get_async_sessionmaker)
+    ],
+    from_ts: Annotated[datetime, Query(alias="from")],
+    user: Annotated[Principal, Depends(get_current_user)],
+    metric_type: Annotated[str, Query(alias="type")] = "cpu",
+    to_ts: Annotated[datetime | None, Query(alias="to")] = None,
+    format: ExportFormat = ExportFormat.CSV,
+) -> StreamingResponse:
+    """Every raw point in the range as CSV, NDJSON or Parquet, streamed in chunks.
+
+    Memory use does not grow with the range, and the database query stops as soon
+    as the client disconnects. Parquet needs the `arrow` extra.
+    """
+    if format not in available_export_formats():
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail="Supported export formats: "
+            + ", ".join(option.value for option in available_export_formats()),
+        )
+    key = series_key(user, metric_type)
+    start_at = as_utc(from_ts)
+    end_at = as_utc(to_ts) if to_ts else datetime.now(tz=UTC)
+    filename = export_filename(metric_type, format)
+    return StreamingResponse(
+        export_points(session_factory, key, start_at, end_at, format),
+        media_type=format.media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/aggregate", response_model=MetricAggregate)
+async def aggregate_metrics(
+    user: Annotated[Principal, Depends(get_current_user)],
+    metric_type: Annotated[str, Query(alias="type")] = "cpu",
+    window: Annotated[int, Query(ge=1, description="Window in seconds")] = 60,
+    q: Annotated[list[Quantile] | None, Query()] = None,
+) -> dict[str, Any]:
+    """Sliding-window aggregates of `metric_type` maintained as points arrive.
+
+    `window` is one of `ROLLING_WINDOWS`; `q` asks for quantiles (default p50,
+    p95, p99) from a sketch accurate to `ROLLING_SKETCH_ACCURACY` relative error.
+    `rate` is the per-second change of the value between the oldest and newest
+    point of the window. The cost does not depend on how many points it holds.
+    """
+    key = series_key(user, metric_type)
+    try:
+        return rolling_aggregates.query(key, window, q or DEFAULT_QUANTILES)
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc)
+        ) from exc
+
+
+@router.get("/series", response_model=list[SeriesRead])
+async def list_series(
+    user: Annotated[Principal, Depends(get_current_user)],
+    metric_type: Annotated[str, Query(alias="type")] = "cpu",
+    match: LabelMatchers = None,
+    limit: Annotated[int, Query(ge=1, le=10_000)] = 1000,
+) -> list[dict[str, Any]]:
+    """Label sets of the series of `metric_type` satisfying every `match`.
+
+    Answered from this worker's in-memory label index, sorted by labels.
+    """
+    key = series_key(user, metric_type)
+    ids = series_index.select(key, parse_matchers(match))
+    label_sets = heapq.nsmallest(limit, map(series_index.labels, ids))
+    return [{"type": metric_type, "labels": dict(labels)} for labels in label_sets]
+
+
+@router.get("/hot-tier", response_model=dict[str, HotTierStats])
+async def hot_tier_stats(
+    user: Annotated[Principal, Depends(get_current_user)],
+) -> dict[str, HotTierStats]:
+    """Points held and memory used by the in-process ring buffer of each type."""
+    return {
+        display_name(key): stats
+        for key, stats in hot_tier.stats().items()
+        if namespace(key) == user.tenant
+    }
+
+
+@router.post(
+    "/ingest", response_model=IngestResponse, status_code=status.HTTP_202_ACCEPTED
+)
+async def ingest_metrics(
+    request: Request,
+    user: Annotated[Principal, Depends(get_current_user)],
+) -> IngestResponse:
+    """Accept NDJSON points or a compact `[type, ts, value]` array batch.
+
+    Points count against the tenant's ingest rate; past it the whole batch is
+    refused with 429 and a `Retry-After` for when it would fit. A batch that would
+    take a type past `SERIES_MAX_PER_TYPE` label sets is refused with 422, and one
+    the buffer cannot hold with 429; neither counts against the rate.
+    """
+    body = await request.body()
+    try:
+        points = parse_body(body, request.headers.get("content-type", ""))
+    except InvalidPayloadError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc)
+        ) from exc
+    keys = {name: series_key(user, name) for name in {point.type for point in points}}
+    if user.tenant is not None:
+        points = [point._replace(type=keys[point.type]) for point in points]
+    try:
+        tenant_limiter.admit_points(user, len(points))
+    except QuotaExceededError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(exc),
+            headers={"Retry-After": str(exc.retry_after)},
+        ) from exc
+    try:
+        series_index.admit({(point.type, point.labels) for point in points})
+    except CardinalityLimitError as exc:
+        tenant_limiter.refund_points(user, len(points))
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc)
+        ) from exc
+    try:
+        accepted = ingest_buffer.add(points)
+    except BufferFullError as exc:
+        tenant_limiter.refund_points(user, len(points))
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Ingest buffer is full",
+            headers={"Retry-After": str(exc.retry_after)},
+        ) from exc
+    return IngestResponse(accepted=accepted)
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from functools import lru_cache
-from typing import List
+from typing import List, Literal
 
 from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -15,7 +15,18 @@ class Settings(BaseSettings):
     secret_key: str = Field(default="change-this", alias="SECRET_KEY")
     algorithm: str = "HS256"
     access_token_expire_minutes: int = Field(default=60, alias="ACCESS_TOKEN_EXPIRE_MINUTES")
+    bcrypt_rounds: int = Field(default=12, alias="BCRYPT_ROUNDS")
+    password_hash_workers: int = Field(default=2, alias="PASSWORD_HASH_WORKERS")
+    password_hash_max_queue: int = Field(default=32, alias="PASSWORD_HASH_MAX_QUEUE")
+    login_max_concurrency_per_key: int = Field(default=2, alias="LOGIN_MAX_CONCURRENCY_PER_KEY")
+    auth_cache_ttl_seconds: float = Field(default=60.0, alias="AUTH_CACHE_TTL_SECONDS")
+    auth_cache_max_entries: int = Field(default=10_000, alias="AUTH_CACHE_MAX_ENTRIES")
+    auth_cache_redis_enabled: bool = Field(default=False, alias="AUTH_CACHE_REDIS_ENABLED")
+    auth_token_cache_max_entries: int = Field(default=10_000, alias="AUTH_TOKEN_CACHE_MAX_ENTRIES")
     cors_origins: List[str] | str = Field(default="http://localhost:5173", alias="CORS_ORIGINS")
+    internal_metrics_token: str | None = Field(default=None, alias="INTERNAL_METRICS_TOKEN")
+    internal_metrics_allow: List[str] | str = Field(default="127.0.0.1/32,::1/128", alias="INTERNAL_METRICS_ALLOW")
+    internal_metrics_publish_seconds: float = Field(default=10.0, alias="INTERNAL_METRICS_PUBLISH_SECONDS")
 
     database_url_override: str | None = Field(default=None, alias="DATABASE_URL")
     postgres_host: str = Field(default="db", alias="POSTGRES_HOST")
@@ -23,9 +34,69 @@ class Settings(BaseSettings):
     postgres_db: str = Field(default="radb", alias="POSTGRES_DB")
     postgres_user: str = Field(default="radb", alias="POSTGRES_USER")
     postgres_password: str = Field(default="radb", alias="POSTGRES_PASSWORD")
+    db_pool_size: int = Field(default=20, alias="DB_POOL_SIZE")
+    db_max_overflow: int = Field(default=20, alias="DB_MAX_OVERFLOW")
+    db_pool_recycle_seconds: int = Field(default=1800, alias="DB_POOL_RECYCLE_SECONDS")
+    db_pool_timeout_seconds: float = Field(default=10.0, alias="DB_POOL_TIMEOUT_SECONDS")
+    # psycopg prepares a statement server-side after this many executions; None disables.
+    db_prepare_threshold: int | None = Field(default=5, alias="DB_PREPARE_THRESHOLD")
 
     redis_host: str = Field(default="redis", alias="REDIS_HOST")
     redis_port: int = Field(default=6379, alias="REDIS_PORT")
+    leader_election_enabled: bool = Field(default=True, alias="LEADER_ELECTION_ENABLED")
+    leader_lease_seconds: float = Field(default=15.0, alias="LEADER_LEASE_SECONDS")
+
+    metrics_max_points: int = Field(default=2000, alias="METRICS_MAX_POINTS")
+    hot_tier_capacity: int = Field(default=16_384, alias="HOT_TIER_CAPACITY")
+    hot_tier_window_seconds: float = Field(default=900.0, alias="HOT_TIER_WINDOW_SECONDS")
+    hot_tier_queue_size: int = Field(default=65_536, alias="HOT_TIER_QUEUE_SIZE")
+    metrics_cache_max_bytes: int = Field(default=64 * 1024 * 1024, alias="METRICS_CACHE_MAX_BYTES")
+    metrics_cache_chunk_buckets: int = Field(default=256, alias="METRICS_CACHE_CHUNK_BUCKETS")
+    metrics_cache_settle_seconds: float = Field(default=60.0, alias="METRICS_CACHE_SETTLE_SECONDS")
+    metrics_cache_redis_enabled: bool = Field(default=False, alias="METRICS_CACHE_REDIS_ENABLED")
+    metrics_cache_redis_ttl_seconds: int = Field(default=86_400, alias="METRICS_CACHE_REDIS_TTL_SECONDS")
+    export_chunk_rows: int = Field(default=10_000, alias="EXPORT_CHUNK_ROWS")
+    rolling_windows: List[int] | str = Field(default="60,300", alias="ROLLING_WINDOWS")
+    rolling_sketch_accuracy: float = Field(default=0.01, alias="ROLLING_SKETCH_ACCURACY")
+    rolling_queue_size: int = Field(default=65_536, alias="ROLLING_QUEUE_SIZE")
+    alerts_recent_max: int = Field(default=1000, alias="ALERTS_RECENT_MAX")
+    alerts_queue_size: int = Field(default=65_536, alias="ALERTS_QUEUE_SIZE")
+    metrics_retention_days: int = Field(default=30, alias="METRICS_RETENTION_DAYS")
+    metrics_rollup_1m_retention_days: int = Field(default=90, alias="METRICS_ROLLUP_1M_RETENTION_DAYS")
+    metrics_rollup_1h_retention_days: int = Field(default=730, alias="METRICS_ROLLUP_1H_RETENTION_DAYS")
+    metrics_partition_premake_days: int = Field(default=3, alias="METRICS_PARTITION_PREMAKE_DAYS")
+    metrics_maintenance_interval_seconds: float = Field(default=3600.0, alias="METRICS_MAINTENANCE_INTERVAL_SECONDS")
+    ingest_buffer_max_points: int = Field(default=200_000, alias="INGEST_BUFFER_MAX_POINTS")
+    ingest_flush_points: int = Field(default=10_000, alias="INGEST_FLUSH_POINTS")
+    ingest_flush_interval_seconds: float = Field(default=0.5, alias="INGEST_FLUSH_INTERVAL_SECONDS")
+    wal_dir: str | None = Field(default=None, alias="WAL_DIR")
+    wal_segment_bytes: int = Field(default=64 * 1024 * 1024, alias="WAL_SEGMENT_BYTES")
+    wal_max_bytes: int = Field(default=1024 * 1024 * 1024, alias="WAL_MAX_BYTES")
+    series_max_per_type: int = Field(default=10_000, alias="SERIES_MAX_PER_TYPE")
+    series_max_labels: int = Field(default=16, alias="SERIES_MAX_LABELS")
+    series_queue_size: int = Field(default=65_536, alias="SERIES_QUEUE_SIZE")
+
+    generator_types: int = Field(default=1, alias="GENERATOR_TYPES")
+    generator_hosts: int = Field(default=1, alias="GENERATOR_HOSTS")
+    generator_rate: float = Field(default=1.0, alias="GENERATOR_RATE")
+    generator_batch_size: int = Field(default=1000, alias="GENERATOR_BATCH_SIZE")
+    generator_report_interval_seconds: float = Field(default=60.0, alias="GENERATOR_REPORT_INTERVAL_SECONDS")
+
+    ws_queue_size: int = Field(default=256, alias="WS_QUEUE_SIZE")
+    ws_overflow_policy: Literal["conflate", "drop_oldest"] = Field(default="conflate", alias="WS_OVERFLOW_POLICY")
+    ws_max_lag_seconds: float = Field(default=10.0, alias="WS_MAX_LAG_SECONDS")
+    ws_snapshot_seconds: float = Field(default=300.0, alias="WS_SNAPSHOT_SECONDS")
+    ws_replay_max_entries: int = Field(default=10_000, alias="WS_REPLAY_MAX_ENTRIES")
+    ws_replay_queue_size: int = Field(default=65_536, alias="WS_REPLAY_QUEUE_SIZE")
+    ws_replay_linger_seconds: float = Field(default=30.0, alias="WS_REPLAY_LINGER_SECONDS")
+    ws_stream_tick_seconds: float = Field(default=0.25, alias="WS_STREAM_TICK_SECONDS")
+    ws_stream_max_subscriptions: int = Field(default=64, alias="WS_STREAM_MAX_SUBSCRIPTIONS")
+    ws_fair_concurrency: int = Field(default=64, alias="WS_FAIR_CONCURRENCY")
+    ws_send_timeout_seconds: float = Field(default=5.0, alias="WS_SEND_TIMEOUT_SECONDS")
+    tenant_ingest_rate: float = Field(default=50_000.0, alias="TENANT_INGEST_RATE")
+    tenant_ingest_burst: int = Field(default=100_000, alias="TENANT_INGEST_BURST")
+    tenant_connection_rate: float = Field(default=10.0, alias="TENANT_CONNECTION_RATE")
+    tenant_max_connections: int = Field(default=1000, alias="TENANT_MAX_CONNECTIONS")
 
     demo_user_email: str = Field(default="admin@example.com", alias="DEMO_USER_EMAIL")
     demo_user_hashed_password: str = Field(
@@ -52,6 +123,22 @@ class Settings(BaseSettings):
             return [origin.strip() for origin in value.split(",") if origin.strip()]
         return list(value)
 
+    @field_validator("internal_metrics_allow", mode="before")
+    @classmethod
+    def assemble_internal_metrics_allow(cls, value: str | List[str] | None) -> List[str]:
+        if value is None:
+            return []
+        if isinstance(value, str):
+            return [network.strip() for network in value.split(",") if network.strip()]
+        return list(value)
+
+    @field_validator("rolling_windows", mode="before")
+    @classmethod
+    def assemble_rolling_windows(cls, value: str | List[int]) -> List[int]:
+        if isinstance(value, str):
+            return [int(window) for window in value.split(",") if window.strip()]
+        return list(value)
+
 
 @lru_cache
 def get_settings() -> Settings:
@@ -18,8 +18,18 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
         return False
 
 
-def get_password_hash(password: str) -> str:
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+def get_password_hash(password: str, rounds: int | None = None) -> str:
+    salt = bcrypt.gensalt(rounds=rounds or settings.bcrypt_rounds)
+    return bcrypt.hashpw(password.encode("utf-8"), salt).decode("utf-8")
+
+
+def password_needs_rehash(hashed_password: str, rounds: int | None = None) -> bool:
+    """True when `hashed_password` was not produced at the configured work factor."""
+    try:
+        cost = int(hashed_password.split("$")[2])
+    except (IndexError, ValueError):
+        return True
+    return cost != (rounds or settings.bcrypt_rounds)
 
 
 def create_access_token(subject: str, expires_delta: timedelta | None = None) -> str:
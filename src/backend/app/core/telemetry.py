@@ -0,0 +1,317 @@
+from __future__ import annotations
+
+import math
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Iterable, Sequence
+from typing import Any
+
+# Everything here runs on the event loop (or under the GIL from a worker thread),
+# so children are plain attribute updates: no locks on the hot path.
+
+LabelValues = tuple[str, ...]
+Sample = tuple[LabelValues, float]
+# (name, help, type, rendered sample lines) of one metric.
+Family = tuple[str, str, str, list[str]]
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: dict[LabelValues, Any] = {}
+
+    def labels(self, *values: str) -> Any:
+        """The child for `values`; bind it once at import time on hot paths."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self._render_samples()
+
+    def _render_samples(self) -> Iterable[str]:
+        for values, child in list(self._children.items()):
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}{labels} {_format_value(child.value)}"
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+
+class CallbackGauge(_Metric):
+    """A gauge (or counter) whose samples are read from live state at scrape time."""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str],
+        collect: Callable[[], Iterable[Sample]],
+        kind: str = "gauge",
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.kind = kind
+        self._collect = collect
+
+    def _render_samples(self) -> Iterable[str]:
+        for values, value in self._collect():
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ("child", "started")
+
+    def __init__(self, child: _HistogramChild) -> None:
+        self.child = child
+
+    def __enter__(self) -> _Timer:
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.child.observe(time.perf_counter() - self.started)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def _render_samples(self) -> Iterable[str]:
+        names = (*self.labelnames, "le")
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip((*child.bounds, math.inf), child.counts):
+                cumulative += count
+                labels = _format_labels(names, (*values, _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(child.sum)}"
+            yield f"{self.name}_count{labels} {child.count}"
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> Any:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def callback(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str],
+        collect: Callable[[], Iterable[Sample]],
+        kind: str = "gauge",
+    ) -> CallbackGauge:
+        return self._register(CallbackGauge(name, help, labelnames, collect, kind))
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def families(self) -> list[Family]:
+        return [
+            (metric.name, metric.help, metric.kind, list(metric._render_samples()))
+            for metric in self._metrics.values()
+        ]
+
+
+def _add_label(line: str, name: str, value: str) -> str:
+    # A metric name holds neither `{` nor a space, so the first of them ends it.
+    end = min(i for i in (line.find("{"), line.find(" ")) if i >= 0)
+    label = f'{name}="{_escape(value)}"'
+    if line[end] == "{":
+        return f"{line[: end + 1]}{label},{line[end + 1 :]}"
+    return f"{line[:end]}{{{label}}}{line[end:]}"
+
+
+def render_workers(workers: dict[str, list[Family]], label: str = "worker") -> str:
+    """One exposition of several processes' families, each sample tagged `label`."""
+    merged: dict[str, tuple[str, str, list[str]]] = {}
+    for worker, families in workers.items():
+        for name, help, kind, samples in families:
+            lines = merged.setdefault(name, (help, kind, []))[2]
+            lines.extend(_add_label(line, label, worker) for line in samples)
+    out: list[str] = []
+    for name, (help, kind, lines) in merged.items():
+        out += [f"# HELP {name} {help}", f"# TYPE {name} {kind}", *lines]
+    return "\n".join(out) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "rad_http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ("method", "route", "status"),
+)
+WS_CONNECTIONS = registry.gauge(
+    "rad_ws_connections", "Open WebSocket connections.", ("endpoint",)
+)
+WS_FRAMES_SENT = registry.counter(
+    "rad_ws_frames_sent_total", "Data frames sent to WebSocket clients.", ("endpoint",)
+)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request by its route template.
+
+    The route is read after the app ran (FastAPI stores the matched route in the
+    scope), so unmatched paths share one `<unmatched>` series instead of adding
+    a series per URL.
+    """
+
+    def __init__(self, app: Callable[..., Any]) -> None:
+        self.app = app
+        self._children: dict[tuple[str, str, int], _HistogramChild] = {}
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message: dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", "<unmatched>")
+            key = (scope["method"], path, status)
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = HTTP_REQUEST_SECONDS.labels(
+                    scope["method"], path, str(status)
+                )
+            child.observe(time.perf_counter() - started)
@@ -1,2 +1,2 @@
 from app.models.base import Base  # noqa: F401
-from app.models import metric, user  # noqa: F401
+from app.models import alert, ingest, metric, series, tenant, user  # noqa: F401
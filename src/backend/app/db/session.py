@@ -1,15 +1,72 @@
 from __future__ import annotations
 
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator, Iterator
+from typing import Any
 
 from sqlalchemy import create_engine
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, sessionmaker
 
 from app.core.config import settings
+from app.core.telemetry import Sample, registry
 
-engine = create_engine(settings.database_url, future=True, pool_pre_ping=True)
+
+def engine_options(url: str) -> dict[str, Any]:
+    """Pool and driver options shared by the sync and async engines."""
+    options: dict[str, Any] = {"pool_pre_ping": True}
+    backend = make_url(url).get_backend_name()
+    if backend == "sqlite":
+        return options
+    options.update(
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_recycle=settings.db_pool_recycle_seconds,
+        pool_timeout=settings.db_pool_timeout_seconds,
+    )
+    if backend == "postgresql":
+        options["connect_args"] = {"prepare_threshold": settings.db_prepare_threshold}
+    return options
+
+
+def async_database_url(url: str) -> URL:
+    """The async driver for `url`; psycopg serves both modes, SQLite needs aiosqlite."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite")
+    return parsed
+
+
+engine = create_engine(settings.database_url, future=True, **engine_options(settings.database_url))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=Session)
 
+async_engine = create_async_engine(
+    async_database_url(settings.database_url), **engine_options(settings.database_url)
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+def _pool_samples(method: str) -> Iterator[Sample]:
+    # Only queue pools count connections; SQLite's default pools don't.
+    for name, pool in (("sync", engine.pool), ("async", async_engine.pool)):
+        read = getattr(pool, method, None)
+        if read is not None:
+            yield (name,), read()
+
+
+registry.callback(
+    "rad_db_pool_checked_out",
+    "Pooled connections currently in use.",
+    ("engine",),
+    lambda: _pool_samples("checkedout"),
+)
+registry.callback(
+    "rad_db_pool_overflow",
+    "Connections opened beyond pool_size (negative while the pool is filling).",
+    ("engine",),
+    lambda: _pool_samples("overflow"),
+)
+
 
 def get_db() -> Generator[Session, None, None]:
     db = SessionLocal()
@@ -17,3 +74,13 @@ def get_db() -> Generator[Session, None, None]:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_async_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    """For streaming responses, which outlive the request-scoped session."""
+    return AsyncSessionLocal
@@ -1,16 +1,20 @@
 from __future__ import annotations
 
+from collections.abc import AsyncIterator
 from typing import Annotated
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, WebSocket, WebSocketException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
-from app.db.session import get_db
-from app.models.user import User
+from app.core.telemetry import registry
+from app.db.session import get_async_db
+from app.models.user import User, UserRole
+from app.services.auth_cache import Principal, principal_cache, token_cache
+from app.services.tenants import QuotaExceededError, tenant_limiter
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
@@ -20,23 +24,106 @@ CredentialsError = HTTPException(
     headers={"WWW-Authenticate": "Bearer"},
 )
 
+_jwt_decodes = registry.counter(
+    "rad_jwt_decodes_total", "Bearer tokens resolved, by outcome.", ("result",)
+)
+_jwt_cached = _jwt_decodes.labels("cached")
+_jwt_ok = _jwt_decodes.labels("ok")
+_jwt_invalid = _jwt_decodes.labels("invalid")
+_jwt_decode_seconds = registry.histogram(
+    "rad_jwt_decode_seconds",
+    "Time to verify and decode a JWT that missed the token cache.",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01),
+).labels()
 
-def get_current_user(
-    token: Annotated[str, Depends(oauth2_scheme)],
-    db: Annotated[Session, Depends(get_db)],
-) -> User:
+
+def websocket_token(websocket: WebSocket) -> str:
+    """Read a bearer token from the handshake header or the `token` query param."""
+    scheme, _, param = websocket.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and param:
+        return param
+    token = websocket.query_params.get("token")
+    if token:
+        return token
+    raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION)
+
+
+def _decode_subject(token: str) -> str:
+    subject = token_cache.get(token)
+    if subject is not None:
+        _jwt_cached.inc()
+        return subject
     try:
-        payload = jwt.decode(
-            token, settings.secret_key, algorithms=[settings.algorithm]
-        )
+        with _jwt_decode_seconds.time():
+            payload = jwt.decode(
+                token, settings.secret_key, algorithms=[settings.algorithm]
+            )
     except JWTError as exc:
+        _jwt_invalid.inc()
         raise CredentialsError from exc
 
     subject = payload.get("sub")
     if not isinstance(subject, str) or not subject:
+        _jwt_invalid.inc()
         raise CredentialsError
+    _jwt_ok.inc()
+    token_cache.set(token, subject, payload.get("exp"))
+    return subject
 
-    user = db.execute(select(User).where(User.email == subject)).scalar_one_or_none()
+
+async def _resolve_user(token: str, db: AsyncSession) -> Principal:
+    subject = _decode_subject(token)
+    principal = await principal_cache.get(subject)
+    if principal is not None:
+        return principal
+
+    result = await db.execute(select(User).where(User.email == subject))
+    user = result.scalar_one_or_none()
     if user is None:
         raise CredentialsError
+    principal = Principal.from_user(user)
+    await principal_cache.set(principal)
+    return principal
+
+
+async def get_current_user(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+) -> Principal:
+    return await _resolve_user(token, db)
+
+
+async def get_current_admin(
+    user: Annotated[Principal, Depends(get_current_user)],
+) -> Principal:
+    if user.role is not UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Admin role required"
+        )
     return user
+
+
+async def get_current_ws_user(
+    token: Annotated[str, Depends(websocket_token)],
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+) -> Principal:
+    try:
+        return await _resolve_user(token, db)
+    except HTTPException as exc:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION) from exc
+
+
+async def get_ws_connection(
+    user: Annotated[Principal, Depends(get_current_ws_user)],
+) -> AsyncIterator[Principal]:
+    """The WebSocket's user, holding one of its tenant's connections until close."""
+    try:
+        tenant_limiter.open_connection(user)
+    except QuotaExceededError as exc:
+        raise WebSocketException(
+            code=status.WS_1013_TRY_AGAIN_LATER, reason=str(exc)
+        ) from exc
+    try:
+        yield user
+    finally:
+        tenant_limiter.close_connection(user)
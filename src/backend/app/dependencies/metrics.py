@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from fastapi import HTTPException, status
+
+from app.services.auth_cache import Principal
+from app.services.series import Matcher
+from app.services.tenants import InvalidMetricTypeError, qualify
+
+
+def series_key(user: Principal, metric_type: str) -> str:
+    """`metric_type` in the caller's tenant namespace, or 422 for a bad name."""
+    try:
+        return qualify(user.tenant, metric_type)
+    except InvalidMetricTypeError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc)
+        ) from exc
+
+
+def parse_matchers(match: list[str] | None) -> list[Matcher]:
+    """Label matchers from `match` query parameters, or 422 for a bad one."""
+    try:
+        return [Matcher.parse(text) for text in match or ()]
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc)
+        ) from exc
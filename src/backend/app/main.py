@@ -5,14 +5,29 @@ import logging
 
 from fastapi import Depends, FastAPI, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api import api_router
 from app.core.config import settings
+from app.core.telemetry import MetricsMiddleware
+from app.services.alerts import alert_engine
+from app.services.auth_cache import principal_cache
+from app.services.fanout import hub
+from app.services.hot_tier import hot_tier
+from app.services.ingest import ingest_buffer
+from app.services.leader import SingletonTask
+from app.services.partitions import storage_maintainer
+from app.services.password_hasher import password_hasher
+from app.services.query_cache import query_cache
+from app.services.replay import replay_broker
+from app.services.rolling import rolling_aggregates
+from app.services.series import series_index
+from app.services.worker_metrics import worker_metrics
 from app.services.generator import start_generator
 from app.db.seed import seed_initial_data
-from app.db.session import SessionLocal, get_db
+from app.db.session import SessionLocal, async_engine, get_async_db
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +37,7 @@ app = FastAPI(
     docs_url="/docs",
     redoc_url="/redoc",
     openapi_url="/openapi.json",
+    default_response_class=ORJSONResponse,
 )
 
 app.add_middleware(
@@ -31,6 +47,14 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+
+# Jobs that must run once per deployment, not once per worker.
+singleton_tasks = [
+    SingletonTask("generator", start_generator),
+    SingletonTask("storage-maintenance", storage_maintainer.run),
+    SingletonTask("alert-engine", alert_engine.run),
+]
 
 
 @app.on_event("startup")
@@ -40,13 +64,39 @@ def startup() -> None:
             seed_initial_data(session)
     except Exception as exc:  # pragma: no cover - best effort seeding
         logger.warning("Skipping database seed during startup: %s", exc)
-    asyncio.create_task(start_generator())
+    for task in singleton_tasks:
+        task.start()
+    asyncio.create_task(ingest_buffer.start())
+    asyncio.create_task(principal_cache.start())
+    asyncio.create_task(hot_tier.start())
+    asyncio.create_task(rolling_aggregates.start())
+    asyncio.create_task(series_index.start())
+    asyncio.create_task(query_cache.start())
+    asyncio.create_task(worker_metrics.start())
+
+
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    for task in singleton_tasks:
+        await task.close()
+    await ingest_buffer.close()
+    await principal_cache.close()
+    await hot_tier.close()
+    await rolling_aggregates.close()
+    await series_index.close()
+    await query_cache.close()
+    await worker_metrics.close()
+    await alert_engine.close()
+    await replay_broker.close()
+    await hub.close()
+    password_hasher.close()
+    await async_engine.dispose()
 
 
 @app.get("/health")
-def health(db: Session = Depends(get_db)) -> dict[str, str]:
+async def health(db: AsyncSession = Depends(get_async_db)) -> dict[str, str]:
     try:
-        db.execute(text("SELECT 1"))
+        await db.execute(text("SELECT 1"))
     except Exception as exc:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -1,4 +1,19 @@
-from .metric import Metric
+from .alert import AlertKind, AlertRule
+from .ingest import IngestCheckpoint
+from .metric import Metric, MetricRollup1h, MetricRollup1m
+from .series import Series
+from .tenant import Tenant
 from .user import User, UserRole
 
-__all__ = ["Metric", "User", "UserRole"]
+__all__ = [
+    "AlertKind",
+    "AlertRule",
+    "IngestCheckpoint",
+    "Metric",
+    "MetricRollup1h",
+    "MetricRollup1m",
+    "Series",
+    "Tenant",
+    "User",
+    "UserRole",
+]
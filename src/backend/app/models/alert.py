@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import enum
+import uuid
+from datetime import datetime
+
+from sqlalchemy import DateTime, Enum, Float, Integer, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+
+
+class AlertKind(str, enum.Enum):
+    THRESHOLD = "threshold"
+    ZSCORE = "zscore"
+    EWMA = "ewma"
+
+
+class AlertRule(Base):
+    """A rule evaluated against every live point of `metric_type`.
+
+    `threshold` rules fire outside `[lower, upper]`; `zscore` rules when a point is
+    more than `threshold` standard deviations from the mean of the previous
+    `window` points; `ewma` rules likewise against an exponentially weighted mean
+    and deviation with smoothing factor `alpha`.
+    """
+
+    __tablename__ = "alert_rules"
+
+    id: Mapped[uuid.UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
+    name: Mapped[str] = mapped_column(String(255), nullable=False)
+    metric_type: Mapped[str] = mapped_column(String(128), index=True, nullable=False)
+    kind: Mapped[AlertKind] = mapped_column(
+        Enum(
+            AlertKind,
+            values_callable=lambda enum_cls: [member.value for member in enum_cls],
+            name="alertkind",
+        ),
+        nullable=False,
+    )
+    lower: Mapped[float | None] = mapped_column(Float)
+    upper: Mapped[float | None] = mapped_column(Float)
+    threshold: Mapped[float | None] = mapped_column(Float)
+    window: Mapped[int | None] = mapped_column(Integer)
+    alpha: Mapped[float | None] = mapped_column(Float)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+
+
+class IngestCheckpoint(Base):
+    """How far the database has taken one ingest log, written with each batch.
+
+    A batch replayed after a crash between the database commit and the log's own
+    checkpoint is recognised here and not applied twice (see `IngestBuffer`).
+    """
+
+    __tablename__ = "ingest_checkpoints"
+
+    log_id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    segment: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    byte_offset: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
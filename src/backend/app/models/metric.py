@@ -2,18 +2,58 @@ from __future__ import annotations
 
 from datetime import datetime
 import uuid
+from typing import ClassVar
 
-from sqlalchemy import DateTime, Float, String, func
+from sqlalchemy import BigInteger, DateTime, Float, Index, Integer, String, func
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.models.base import Base
 
 
 class Metric(Base):
+    """Raw points. On PostgreSQL the table is range-partitioned by day on `ts`."""
+
     __tablename__ = "metrics"
+    __table_args__ = (
+        Index("ix_metrics_type_ts", "type", "ts"),
+        Index("ix_metrics_series_id_ts", "series_id", "ts"),
+        Index("ix_metrics_ts_brin", "ts", postgresql_using="brin"),
+        # Keys are generated client-side, so inserts have nothing to read back.
+        {"postgresql_partition_by": "RANGE (ts)", "implicit_returning": False},
+    )
 
+    # The partition key has to be part of the primary key.
     id: Mapped[uuid.UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
-    type: Mapped[str] = mapped_column(String(64), index=True, nullable=False)
+    ts: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    type: Mapped[str] = mapped_column(String(128), nullable=False)
     value: Mapped[float] = mapped_column(Float, nullable=False)
-    ts: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+    # `Series.id`; null for points stored before labels existed.
+    series_id: Mapped[int | None] = mapped_column(BigInteger)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class RollupMixin:
+    """Per-bucket partial aggregates from which avg/min/max/sum/count are derived."""
+
+    resolution: ClassVar[int]
+
+    type: Mapped[str] = mapped_column(String(128), primary_key=True)
+    bucket: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, nullable=False)
+    sum: Mapped[float] = mapped_column(Float, nullable=False)
+    min: Mapped[float] = mapped_column(Float, nullable=False)
+    max: Mapped[float] = mapped_column(Float, nullable=False)
+
+
+class MetricRollup1m(RollupMixin, Base):
+    __tablename__ = "metrics_1m"
+    resolution = 60
+
+
+class MetricRollup1h(RollupMixin, Base):
+    __tablename__ = "metrics_1h"
+    resolution = 3600
+
+
+# Coarsest first, so range queries try the cheapest table that still fits the step.
+ROLLUPS: tuple[type[RollupMixin], ...] = (MetricRollup1h, MetricRollup1m)
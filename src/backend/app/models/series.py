@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import JSON, BigInteger, DateTime, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+
+
+class Series(Base):
+    """One label set of a metric type, e.g. `cpu{host="web-3", region="eu"}`.
+
+    The id is a hash of the type and labels (see `app.services.series`), so every
+    worker derives it independently and `metrics.series_id` needs no lookup.
+    """
+
+    __tablename__ = "series"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    type: Mapped[str] = mapped_column(String(128), index=True, nullable=False)
+    labels: Mapped[dict[str, Any]] = mapped_column(JSON, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
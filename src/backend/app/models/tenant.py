@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import uuid
+from datetime import datetime
+
+from sqlalchemy import DateTime, Float, Integer, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+
+
+class Tenant(Base):
+    """A team sharing the deployment, with its own metric namespace and quotas.
+
+    A tenant's metric `cpu` is stored, cached and published as `{slug}/cpu`, so
+    its users never see another tenant's series. Unset quotas fall back to the
+    `TENANT_*` settings.
+    """
+
+    __tablename__ = "tenants"
+
+    id: Mapped[uuid.UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
+    slug: Mapped[str] = mapped_column(
+        String(32), unique=True, index=True, nullable=False
+    )
+    name: Mapped[str] = mapped_column(String(255), nullable=False)
+    ingest_rate: Mapped[float | None] = mapped_column(Float)
+    ingest_burst: Mapped[int | None] = mapped_column(Integer)
+    connection_rate: Mapped[float | None] = mapped_column(Float)
+    max_connections: Mapped[int | None] = mapped_column(Integer)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
@@ -4,10 +4,11 @@ import enum
 from datetime import datetime
 import uuid
 
-from sqlalchemy import DateTime, Enum, String, func
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import DateTime, Enum, ForeignKey, String, func
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.models.base import Base
+from app.models.tenant import Tenant
 
 
 class UserRole(str, enum.Enum):
@@ -32,6 +33,11 @@ class User(Base):
         default=UserRole.USER,
         nullable=False,
     )
+    # None is the shared namespace every user was in before tenants existed.
+    tenant_id: Mapped[uuid.UUID | None] = mapped_column(
+        ForeignKey("tenants.id"), index=True
+    )
+    tenant: Mapped[Tenant | None] = relationship(lazy="joined")
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now()
     )
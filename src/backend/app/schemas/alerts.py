@@ -0,0 +1,64 @@
+import uuid
+from datetime import datetime
+from typing import Literal
+
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
+
+from app.models.alert import AlertKind
+from app.services.tenants import display_name
+
+
+class AlertRuleCreate(BaseModel):
+    name: str = Field(min_length=1, max_length=255)
+    metric_type: str = Field(min_length=1, max_length=64)
+    kind: AlertKind
+    lower: float | None = None
+    upper: float | None = None
+    threshold: float | None = Field(default=None, gt=0)
+    window: int | None = Field(default=None, ge=2, le=100_000)
+    alpha: float | None = Field(default=None, gt=0, le=1)
+
+    @model_validator(mode="after")
+    def check_parameters(self) -> "AlertRuleCreate":
+        if self.kind is AlertKind.THRESHOLD:
+            if self.lower is None and self.upper is None:
+                raise ValueError("a threshold rule needs lower and/or upper")
+            if (
+                self.lower is not None
+                and self.upper is not None
+                and self.lower > self.upper
+            ):
+                raise ValueError("lower must not exceed upper")
+            return self
+        if self.threshold is None:
+            raise ValueError(f"a {self.kind.value} rule needs threshold")
+        if self.kind is AlertKind.ZSCORE and self.window is None:
+            raise ValueError("a zscore rule needs window")
+        if self.kind is AlertKind.EWMA and self.alpha is None:
+            raise ValueError("an ewma rule needs alpha")
+        return self
+
+
+class AlertRuleRead(AlertRuleCreate):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: uuid.UUID
+    created_at: datetime | None = None
+
+    @field_validator("metric_type", mode="before")
+    @classmethod
+    def unqualified(cls, value: object) -> object:
+        return display_name(value) if isinstance(value, str) else value
+
+
+class AlertEventRead(BaseModel):
+    kind: Literal["alert"] = "alert"
+    rule_id: uuid.UUID
+    name: str
+    type: str
+    rule_kind: AlertKind
+    state: Literal["firing", "resolved"]
+    value: float
+    score: float
+    timestamp: str
+    labels: dict[str, str] = {}
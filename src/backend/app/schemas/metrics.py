@@ -1,6 +1,11 @@
-from typing import List, TypedDict
+from typing import Annotated, Dict, List, Literal, TypedDict
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
+
+from app.services.series import Matcher
+
+
+Quantile = Annotated[float, Field(ge=0, le=1)]
 
 
 class MetricPoint(TypedDict):
@@ -11,3 +16,52 @@ class MetricPoint(TypedDict):
 
 class MetricSeriesResponse(BaseModel):
     series: List[MetricPoint] = Field(default_factory=list)
+    step: int | None = None
+    agg: str | None = None
+
+
+class IngestResponse(BaseModel):
+    accepted: int
+
+
+class SeriesRead(BaseModel):
+    type: str
+    labels: Dict[str, str]
+
+
+class HotTierStats(BaseModel):
+    points: int
+    capacity: int
+    bytes: int
+
+
+class MetricAggregate(BaseModel):
+    type: str
+    window: int
+    count: int
+    sum: float
+    mean: float | None = None
+    min: float | None = None
+    max: float | None = None
+    rate: float | None = None
+    points_per_second: float
+    quantiles: Dict[str, float | None] = Field(default_factory=dict)
+
+
+class StreamCommand(BaseModel):
+    action: Literal["subscribe", "unsubscribe"]
+    types: List[str] = Field(min_length=1)
+    interval: float = Field(default=0.0, ge=0)
+    threshold: float = Field(default=0.0, ge=0)
+    downsample: Literal["latest", "minmax"] = "latest"
+    match: List[str] = Field(default_factory=list)
+
+    @field_validator("match")
+    @classmethod
+    def check_matchers(cls, value: List[str]) -> List[str]:
+        for text in value:
+            Matcher.parse(text)
+        return value
+
+    def matchers(self) -> tuple[Matcher, ...]:
+        return tuple(Matcher.parse(text) for text in self.match)
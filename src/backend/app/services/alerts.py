@@ -0,0 +1,446 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import uuid
+from collections import deque
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Any
+
+import orjson
+import redis.asyncio as redis
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.core.telemetry import registry
+from app.db.session import AsyncSessionLocal
+from app.models.alert import AlertKind, AlertRule
+from app.services.fanout import (
+    MetricMessage,
+    MetricsHub,
+    RedisFactory,
+    default_redis,
+    hub,
+    series_key,
+)
+from app.services.send_queue import OverflowPolicy, SendQueue
+from app.services.series import Labels
+from app.services.tenants import display_name, namespace
+
+logger = logging.getLogger(__name__)
+
+METRICS_PATTERN = "metrics:*"
+ALERTS_CHANNEL = "alerts"
+RULES_CHANNEL = "alerts:rules"
+RECENT_KEY = "alerts:recent"
+
+_events = registry.counter(
+    "rad_alert_events_total", "Alert state changes published, by state.", ("state",)
+)
+_firing = _events.labels("firing")
+_resolved = _events.labels("resolved")
+
+
+def recent_key(tenant: str | None) -> str:
+    """Each tenant keeps its own capped list, so one cannot evict another's."""
+    return f"{RECENT_KEY}:{tenant}" if tenant else RECENT_KEY
+
+
+class RollingStats:
+    """Mean and sample variance of the last `window` values, O(1) per value.
+
+    Welford's update; once the window is full the oldest value is swapped for the
+    new one in a single step instead of being removed and re-added.
+    """
+
+    __slots__ = ("window", "_values", "mean", "_m2")
+
+    def __init__(self, window: int) -> None:
+        self.window = window
+        self._values: deque[float] = deque()
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    @property
+    def std(self) -> float:
+        n = len(self._values)
+        return math.sqrt(self._m2 / (n - 1)) if n > 1 else 0.0
+
+    def add(self, value: float) -> None:
+        values = self._values
+        mean = self.mean
+        if len(values) == self.window:
+            oldest = values.popleft()
+            delta = value - oldest
+            self.mean = mean + delta / self.window
+            self._m2 += delta * (value - self.mean + oldest - mean)
+        else:
+            delta = value - mean
+            self.mean = mean + delta / (len(values) + 1)
+            self._m2 += delta * (value - self.mean)
+        # Rounding can leave a tiny negative sum for a constant series.
+        self._m2 = max(self._m2, 0.0)
+        values.append(value)
+
+
+class Ewma:
+    """Exponentially weighted mean and variance with smoothing factor `alpha`."""
+
+    __slots__ = ("alpha", "count", "mean", "variance")
+
+    def __init__(self, alpha: float) -> None:
+        self.alpha = alpha
+        self.count = 0
+        self.mean = 0.0
+        self.variance = 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        if self.count == 1:
+            self.mean = value
+            return
+        diff = value - self.mean
+        increment = self.alpha * diff
+        self.mean += increment
+        self.variance = (1 - self.alpha) * (self.variance + diff * increment)
+
+
+def _deviation(value: float, mean: float, std: float) -> float:
+    # Without any spread yet a point cannot be scored.
+    return (value - mean) / std if std > 0 else 0.0
+
+
+@dataclass(frozen=True, slots=True)
+class RuleSpec:
+    """The evaluated fields of an `AlertRule`, detached from any session."""
+
+    id: uuid.UUID
+    name: str
+    metric_type: str
+    kind: AlertKind
+    lower: float | None = None
+    upper: float | None = None
+    threshold: float | None = None
+    window: int | None = None
+    alpha: float | None = None
+
+    @classmethod
+    def from_model(cls, rule: AlertRule) -> RuleSpec:
+        return cls(
+            id=rule.id,
+            name=rule.name,
+            metric_type=rule.metric_type,
+            kind=AlertKind(rule.kind),
+            lower=rule.lower,
+            upper=rule.upper,
+            threshold=rule.threshold,
+            window=rule.window,
+            alpha=rule.alpha,
+        )
+
+
+class RuleState:
+    """One rule's incremental statistics and whether it is currently firing.
+
+    A point is scored against the statistics of the points before it, then folded
+    in. Only transitions produce events: a breach that lasts a thousand points is
+    one `firing` and one `resolved`.
+    """
+
+    __slots__ = ("spec", "firing", "_stats", "_warmup")
+
+    def __init__(self, spec: RuleSpec) -> None:
+        self.spec = spec
+        self.firing = False
+        self._stats: RollingStats | Ewma | None = None
+        self._warmup = 0
+        if spec.kind is AlertKind.ZSCORE:
+            self._stats = RollingStats(spec.window or 1)
+            self._warmup = spec.window or 1
+        elif spec.kind is AlertKind.EWMA:
+            alpha = spec.alpha or 1.0
+            self._stats = Ewma(alpha)
+            self._warmup = math.ceil(1 / alpha)
+
+    def score(self, value: float) -> float | None:
+        """How far `value` is off, or None while the statistics warm up."""
+        stats = self._stats
+        if stats is None:
+            return value
+        if isinstance(stats, Ewma):
+            ready = stats.count >= self._warmup
+        else:
+            ready = len(stats) >= self._warmup
+        return _deviation(value, stats.mean, stats.std) if ready else None
+
+    def breached(self, value: float, score: float) -> bool:
+        spec = self.spec
+        if spec.kind is AlertKind.THRESHOLD:
+            return (spec.lower is not None and value < spec.lower) or (
+                spec.upper is not None and value > spec.upper
+            )
+        return abs(score) > (spec.threshold or 0.0)
+
+    def observe(
+        self, value: float, timestamp: str, labels: Labels = ()
+    ) -> AlertEvent | None:
+        score = self.score(value)
+        if self._stats is not None:
+            self._stats.add(value)
+        if score is None or self.breached(value, score) == self.firing:
+            return None
+        self.firing = not self.firing
+        return AlertEvent(
+            rule=self.spec,
+            state="firing" if self.firing else "resolved",
+            value=value,
+            score=score,
+            timestamp=timestamp,
+            labels=labels,
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class AlertEvent:
+    rule: RuleSpec
+    state: str
+    value: float
+    score: float
+    timestamp: str
+    labels: Labels = ()
+
+    def to_dict(self) -> dict[str, Any]:
+        event = {
+            "kind": "alert",
+            "rule_id": str(self.rule.id),
+            "name": self.rule.name,
+            "type": display_name(self.rule.metric_type),
+            "tenant": namespace(self.rule.metric_type),
+            "rule_kind": self.rule.kind.value,
+            "state": self.state,
+            "value": self.value,
+            "score": self.score,
+            "timestamp": self.timestamp,
+        }
+        if self.labels:
+            event["labels"] = dict(self.labels)
+        return event
+
+    def to_json(self) -> str:
+        return orjson.dumps(self.to_dict()).decode()
+
+
+class AlertEngine:
+    """Evaluates every rule against the live stream, keeping O(1) state per point.
+
+    Rules are indexed by metric type, so a point costs only the rules of its own
+    type however many exist. Each rule keeps separate statistics and firing state
+    for every series (label set) of its type, so one host's baseline never
+    scores another's points. The engine consumes `metrics:*` once per deployment
+    (main.py runs it on the elected leader), publishes state changes to the
+    `alerts` channel and keeps the latest ones in a capped Redis list for REST.
+    Rule edits are announced on `alerts:rules`; statistics of rules that did not
+    change survive the reload.
+    """
+
+    def __init__(
+        self,
+        hub: MetricsHub = hub,
+        redis_factory: RedisFactory = default_redis,
+        session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+        recent_max: int | None = None,
+        queue_size: int | None = None,
+    ) -> None:
+        self._hub = hub
+        self._redis_factory = redis_factory
+        self._session_factory = session_factory
+        self.recent_max = recent_max or settings.alerts_recent_max
+        self.queue_size = queue_size or settings.alerts_queue_size
+        self._client: redis.Redis | None = None
+        self._specs: dict[str, list[RuleSpec]] = {}
+        # Per type, the states of its rules for each label set seen so far.
+        self._index: dict[str, dict[Labels, list[RuleState]]] = {}
+        self.evaluated = 0
+        self.dropped = 0
+
+    @property
+    def rule_count(self) -> int:
+        return sum(len(specs) for specs in self._specs.values())
+
+    def rules_for(self, metric_type: str, labels: Labels = ()) -> list[RuleState]:
+        return self._index.get(metric_type, {}).get(labels, [])
+
+    def load(self, specs: Iterable[RuleSpec]) -> None:
+        by_type: dict[str, list[RuleSpec]] = {}
+        for spec in specs:
+            by_type.setdefault(spec.metric_type, []).append(spec)
+        index: dict[str, dict[Labels, list[RuleState]]] = {}
+        for metric_type, series in self._index.items():
+            specs_of_type = by_type.get(metric_type)
+            if not specs_of_type:
+                continue
+            for labels, states in series.items():
+                previous = {state.spec: state for state in states}
+                index.setdefault(metric_type, {})[labels] = [
+                    previous.get(spec) or RuleState(spec) for spec in specs_of_type
+                ]
+        self._specs = by_type
+        self._index = index
+
+    def evaluate(
+        self, metric_type: str, value: float, timestamp: str, labels: Labels = ()
+    ) -> list[AlertEvent]:
+        specs = self._specs.get(metric_type)
+        if not specs:
+            return []
+        series = self._index.setdefault(metric_type, {})
+        states = series.get(labels)
+        if states is None:
+            states = series[labels] = [RuleState(spec) for spec in specs]
+        self.evaluated += len(states)
+        events = []
+        for state in states:
+            event = state.observe(value, timestamp, labels)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def evaluate_message(self, message: MetricMessage) -> list[AlertEvent]:
+        data = message.data
+        try:
+            metric_type = series_key(message)
+            if metric_type not in self._specs:
+                return []
+            # Published labels are already validated and sorted.
+            labels = tuple((data.get("labels") or {}).items())
+            return self.evaluate(
+                metric_type, float(data["value"]), data["timestamp"], labels
+            )
+        except (AttributeError, KeyError, TypeError, ValueError):
+            self.dropped += 1
+            return []
+
+    async def reload(self) -> None:
+        async with self._session_factory() as session:
+            rules = (await session.scalars(select(AlertRule))).all()
+        self.load(RuleSpec.from_model(rule) for rule in rules)
+        logger.info("Loaded %d alert rules", self.rule_count)
+
+    async def run(self) -> None:
+        """Consume the stream until cancelled; run as a leader-only task."""
+        queue: SendQueue[MetricMessage] = SendQueue(
+            self.queue_size, policy=OverflowPolicy.DROP_OLDEST
+        )
+        # Edits get their own queue so the metrics firehose cannot push one out;
+        # notices pending together conflate into a single reload.
+        notices: SendQueue[MetricMessage] = SendQueue(
+            1, key=lambda message: message.channel
+        )
+        # Listen for edits before loading, so none can slip in between.
+        changes = await self._hub.subscribe(RULES_CHANNEL, queue=notices)
+        metrics = None
+        watcher = None
+        try:
+            await self.reload()
+            watcher = asyncio.create_task(self._watch_rules(notices))
+            metrics = await self._hub.subscribe(
+                METRICS_PATTERN, queue=queue, pattern=True
+            )
+            while True:
+                batch = [await queue.get()]
+                while len(queue):
+                    batch.append(queue.get_nowait())
+                events: list[AlertEvent] = []
+                for message in batch:
+                    events += self.evaluate_message(message)
+                if queue.dropped:
+                    logger.warning(
+                        "Alert engine fell behind, %d points skipped", queue.dropped
+                    )
+                    self.dropped += queue.dropped
+                    queue.dropped = 0
+                if events:
+                    await self.publish(events)
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+                await asyncio.gather(watcher, return_exceptions=True)
+            await changes.close()
+            if metrics is not None:
+                await metrics.close()
+
+    async def _watch_rules(self, notices: SendQueue[MetricMessage]) -> None:
+        while True:
+            await notices.get()
+            try:
+                await self.reload()
+            except Exception:
+                logger.exception("Could not reload alert rules")
+
+    async def publish(self, events: list[AlertEvent]) -> None:
+        frames = [event.to_json() for event in events]
+        by_tenant: dict[str | None, list[str]] = {}
+        for event, frame in zip(events, frames):
+            by_tenant.setdefault(namespace(event.rule.metric_type), []).append(frame)
+        try:
+            async with self._redis().pipeline(transaction=False) as pipe:
+                for frame in frames:
+                    pipe.publish(ALERTS_CHANNEL, frame)
+                for tenant, tenant_frames in by_tenant.items():
+                    key = recent_key(tenant)
+                    pipe.lpush(key, *tenant_frames)
+                    pipe.ltrim(key, 0, self.recent_max - 1)
+                await pipe.execute()
+        except Exception as exc:
+            logger.warning("Could not publish %d alert events: %s", len(frames), exc)
+            return
+        for event in events:
+            (_firing if event.state == "firing" else _resolved).inc()
+
+    async def recent(
+        self, limit: int, tenant: str | None = None
+    ) -> list[dict[str, Any]]:
+        """The latest published events of `tenant`, newest first."""
+        raw = await self._redis().lrange(recent_key(tenant), 0, limit - 1)
+        return [orjson.loads(frame) for frame in raw]
+
+    async def rules_changed(self) -> None:
+        """Tell the engine, wherever it runs, to reload its rules."""
+        await self._redis().publish(RULES_CHANNEL, '{"action":"reload"}')
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _redis(self) -> redis.Redis:
+        if self._client is None:
+            self._client = self._redis_factory()
+        return self._client
+
+
+alert_engine = AlertEngine()
+
+registry.callback(
+    "rad_alert_rules",
+    "Alert rules loaded by the engine in this worker.",
+    (),
+    lambda: [((), alert_engine.rule_count)],
+)
+registry.callback(
+    "rad_alert_evaluations_total",
+    "Rule evaluations, one per rule of the point's type.",
+    (),
+    lambda: [((), alert_engine.evaluated)],
+    kind="counter",
+)
@@ -0,0 +1,341 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Iterable
+from dataclasses import dataclass, field
+from typing import Any, Generic, TypeVar
+
+import redis
+import redis.asyncio
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, object_session
+
+from app.core.config import settings
+from app.models.tenant import Tenant
+from app.models.user import User, UserRole
+from app.services.fanout import RedisFactory, Subscription, default_redis, hub
+from app.services.send_queue import OverflowPolicy, SendQueue
+from app.services.tenants import TenantQuota
+
+logger = logging.getLogger(__name__)
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+INVALIDATION_CHANNEL = "auth:invalidate"
+
+
+def _principal_key(subject: str) -> str:
+    return f"auth:principal:{subject}"
+
+
+class TTLCache(Generic[K, V]):
+    """A bounded LRU mapping whose entries also expire on a monotonic deadline."""
+
+    def __init__(
+        self, maxsize: int, ttl: float, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K) -> V | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        self._entries[key] = (self._clock() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: K) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """The authenticated identity handed to endpoints, detached from any session."""
+
+    id: uuid.UUID
+    email: str
+    role: UserRole
+    # The tenant's slug, or None for the shared namespace.
+    tenant: str | None = None
+    quota: TenantQuota = field(default_factory=lambda: TenantQuota.from_tenant(None))
+
+    @classmethod
+    def from_user(cls, user: User) -> Principal:
+        return cls(
+            id=user.id,
+            email=user.email,
+            role=UserRole(user.role),
+            tenant=user.tenant.slug if user.tenant else None,
+            quota=TenantQuota.from_tenant(user.tenant),
+        )
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "id": str(self.id),
+                "email": self.email,
+                "role": self.role.value,
+                "tenant": self.tenant,
+                "quota": self.quota.to_dict(),
+            }
+        )
+
+    @classmethod
+    def from_json(cls, raw: str) -> Principal:
+        data = json.loads(raw)
+        quota = data.get("quota")
+        return cls(
+            id=uuid.UUID(data["id"]),
+            email=data["email"],
+            role=UserRole(data["role"]),
+            tenant=data.get("tenant"),
+            quota=TenantQuota(**quota) if quota else TenantQuota.from_tenant(None),
+        )
+
+
+class PrincipalCache:
+    """Resolved users keyed by token subject.
+
+    The first tier is per process. With `redis_enabled` a Redis tier is shared across
+    workers, and invalidations are broadcast so every worker drops its local copy.
+    """
+
+    def __init__(
+        self,
+        maxsize: int | None = None,
+        ttl: float | None = None,
+        redis_enabled: bool | None = None,
+        redis_factory: RedisFactory = default_redis,
+        sync_redis_factory: Callable[[], redis.Redis] | None = None,
+    ) -> None:
+        self.local: TTLCache[str, Principal] = TTLCache(
+            maxsize or settings.auth_cache_max_entries,
+            settings.auth_cache_ttl_seconds if ttl is None else ttl,
+        )
+        self.redis_enabled = (
+            settings.auth_cache_redis_enabled
+            if redis_enabled is None
+            else redis_enabled
+        )
+        self._redis_factory = redis_factory
+        self._sync_redis_factory = sync_redis_factory or self._default_sync_redis
+        self._client: redis.asyncio.Redis | None = None
+        self._sync_client: redis.Redis | None = None
+        self._listener: asyncio.Task[None] | None = None
+        self._invalidations: set[asyncio.Task[None]] = set()
+
+    async def get(self, subject: str) -> Principal | None:
+        principal = self.local.get(subject)
+        if principal is not None or not self.redis_enabled:
+            return principal
+        try:
+            raw = await self._redis().get(_principal_key(subject))
+        except Exception as exc:
+            logger.warning("Auth cache Redis lookup failed: %s", exc)
+            return None
+        if raw is None:
+            return None
+        principal = Principal.from_json(raw)
+        self.local.set(subject, principal)
+        return principal
+
+    async def set(self, principal: Principal) -> None:
+        self.local.set(principal.email, principal)
+        if not self.redis_enabled:
+            return
+        try:
+            await self._redis().set(
+                _principal_key(principal.email),
+                principal.to_json(),
+                ex=max(int(self.local.ttl), 1),
+            )
+        except Exception as exc:
+            logger.warning("Auth cache Redis write failed: %s", exc)
+
+    def invalidate(self, subjects: Iterable[str]) -> None:
+        """Drop `subjects` everywhere; safe to call from sync ORM event hooks.
+
+        The local copies go at once. On the event loop the Redis round trips run
+        as a task on the async client, elsewhere on the blocking one.
+        """
+        subjects = list(subjects)
+        for subject in subjects:
+            self.local.pop(subject)
+        if not self.redis_enabled or not subjects:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None:
+            try:
+                with self._sync_redis().pipeline(transaction=False) as pipe:
+                    self._queue_invalidations(pipe, subjects)
+                    pipe.execute()
+            except Exception as exc:
+                logger.warning(
+                    "Auth cache invalidation of %s failed: %s", subjects, exc
+                )
+            return
+        task = loop.create_task(self._invalidate_async(subjects))
+        self._invalidations.add(task)
+        task.add_done_callback(self._invalidations.discard)
+
+    async def _invalidate_async(self, subjects: list[str]) -> None:
+        try:
+            async with self._redis().pipeline(transaction=False) as pipe:
+                self._queue_invalidations(pipe, subjects)
+                await pipe.execute()
+        except Exception as exc:
+            logger.warning("Auth cache invalidation of %s failed: %s", subjects, exc)
+
+    @staticmethod
+    def _queue_invalidations(pipe: Any, subjects: list[str]) -> None:
+        pipe.delete(*(_principal_key(subject) for subject in subjects))
+        for subject in subjects:
+            pipe.publish(INVALIDATION_CHANNEL, json.dumps({"sub": subject}))
+
+    def clear(self) -> None:
+        self.local.clear()
+
+    async def start(self) -> None:
+        if not self.redis_enabled or self._listener is not None:
+            return
+        queue = SendQueue(1024, policy=OverflowPolicy.DROP_OLDEST)
+        subscription = await hub.subscribe(INVALIDATION_CHANNEL, queue=queue)
+        self._listener = asyncio.create_task(self._listen(subscription))
+
+    async def close(self) -> None:
+        await asyncio.gather(*self._invalidations, return_exceptions=True)
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.cancel()
+            await asyncio.gather(listener, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._sync_client is not None:
+            self._sync_client.close()
+            self._sync_client = None
+
+    async def _listen(self, subscription: Subscription) -> None:
+        try:
+            async for message in subscription:
+                subject = message.data.get("sub")
+                if isinstance(subject, str):
+                    self.local.pop(subject)
+        finally:
+            await subscription.close()
+
+    def _redis(self) -> redis.asyncio.Redis:
+        if self._client is None:
+            self._client = self._redis_factory()
+        return self._client
+
+    def _sync_redis(self) -> redis.Redis:
+        if self._sync_client is None:
+            self._sync_client = self._sync_redis_factory()
+        return self._sync_client
+
+    @staticmethod
+    def _default_sync_redis() -> redis.Redis:
+        return redis.Redis(
+            host=settings.redis_host, port=settings.redis_port, decode_responses=True
+        )
+
+
+class TokenCache:
+    """Subjects of already-verified JWTs, each kept no longer than the token's `exp`."""
+
+    def __init__(self, maxsize: int | None = None) -> None:
+        self._entries: TTLCache[str, str] = TTLCache(
+            maxsize or settings.auth_token_cache_max_entries, ttl=float("inf")
+        )
+
+    def get(self, token: str) -> str | None:
+        return self._entries.get(token)
+
+    def set(self, token: str, subject: str, exp: Any) -> None:
+        if isinstance(exp, int | float):
+            self._entries.set(token, subject, ttl=exp - time.time())
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+principal_cache = PrincipalCache()
+token_cache = TokenCache()
+
+
+def _user_emails(target: User) -> set[str]:
+    history = inspect(target).attrs.email.history
+    return {email for email in (*history.deleted, target.email) if email}
+
+
+# Flush hooks only note what changed; the cache is touched once the transaction
+# commits, so a rolled-back edit keeps it and a reader cannot re-cache the old row
+# between the flush and the commit.
+_STALE_SUBJECTS = "auth_cache_stale_subjects"
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user(mapper, connection, target: User) -> None:
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_STALE_SUBJECTS, set()).update(_user_emails(target))
+
+
+@event.listens_for(Tenant, "after_update")
+def _invalidate_tenant(mapper, connection, target: Tenant) -> None:
+    # A principal carries its tenant's quota, so every member has to be refreshed.
+    session = object_session(target)
+    if session is not None:
+        members = connection.execute(
+            select(User.email).where(User.tenant_id == target.id)
+        ).scalars()
+        session.info.setdefault(_STALE_SUBJECTS, set()).update(members)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_invalidations(session: Session) -> None:
+    subjects = session.info.pop(_STALE_SUBJECTS, None)
+    if subjects:
+        principal_cache.invalidate(subjects)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session: Session) -> None:
+    session.info.pop(_STALE_SUBJECTS, None)
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import asyncio
+import csv
+import enum
+import io
+import logging
+import re
+from collections.abc import AsyncIterator, Callable, Sequence
+from datetime import datetime
+from typing import Any
+
+import orjson
+from sqlalchemy import Row, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.telemetry import registry
+from app.models.metric import Metric
+from app.services.tenants import display_name
+from app.services.timeseries import as_utc, format_timestamp
+from app.services.wire import epoch_ms
+
+try:  # Parquet is optional: install the `arrow` extra to serve it.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depends on the environment
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+SessionFactory = Callable[[], AsyncSession]
+ExportRows = Sequence[Row[tuple[datetime, float]]]
+
+_exports = registry.counter(
+    "rad_exports_total", "Metric exports by format and outcome.", ("format", "result")
+)
+
+
+class ExportFormat(str, enum.Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+    PARQUET = "parquet"
+
+    @property
+    def media_type(self) -> str:
+        return EXPORT_MEDIA_TYPES[self]
+
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.CSV: "text/csv; charset=utf-8",
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.PARQUET: "application/vnd.apache.parquet",
+}
+
+
+def available_export_formats() -> list[ExportFormat]:
+    return [fmt for fmt in ExportFormat if fmt is not ExportFormat.PARQUET or pq]
+
+
+def export_filename(metric_type: str, fmt: ExportFormat) -> str:
+    return f"{re.sub(r'[^A-Za-z0-9._-]', '_', metric_type)}.{fmt.value}"
+
+
+class _CsvEncoder:
+    def __init__(self, metric_type: str) -> None:
+        self.metric_type = metric_type
+
+    def header(self) -> bytes:
+        return b"timestamp,value,type\r\n"
+
+    def encode(self, rows: ExportRows) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        metric_type = self.metric_type
+        writer.writerows(
+            (format_timestamp(as_utc(ts)), value, metric_type) for ts, value in rows
+        )
+        return buffer.getvalue().encode()
+
+    def footer(self) -> bytes:
+        return b""
+
+
+class _NdjsonEncoder:
+    def __init__(self, metric_type: str) -> None:
+        # The type is the same on every line, so it is encoded once.
+        self._suffix = b',"type":' + orjson.dumps(metric_type) + b"}\n"
+
+    def header(self) -> bytes:
+        return b""
+
+    def encode(self, rows: ExportRows) -> bytes:
+        suffix = self._suffix
+        return b"".join(
+            b'{"timestamp":"'
+            + format_timestamp(as_utc(ts)).encode()
+            + b'","value":'
+            + orjson.dumps(value)
+            + suffix
+            for ts, value in rows
+        )
+
+    def footer(self) -> bytes:
+        return b""
+
+
+class _DrainedSink(io.RawIOBase):
+    """A write-only file that hands out what was written since the last drain.
+
+    `tell()` keeps counting across drains, which the Parquet footer offsets need.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class _ParquetEncoder:
+    """One row group per fetched partition, written as soon as it is encoded."""
+
+    def __init__(self, metric_type: str) -> None:
+        if pq is None:  # pragma: no cover - the endpoint never offers it
+            raise RuntimeError("pyarrow is not installed")
+        self._schema = pa.schema(
+            [("timestamp", pa.timestamp("ms", tz="UTC")), ("value", pa.float64())],
+            metadata={"type": metric_type},
+        )
+        self._sink = _DrainedSink()
+        self._writer = pq.ParquetWriter(self._sink, self._schema)
+
+    def header(self) -> bytes:
+        return b""
+
+    def encode(self, rows: ExportRows) -> bytes:
+        stamps = epoch_ms([as_utc(ts) for ts, _ in rows])
+        table = pa.table(
+            [
+                pa.array(stamps, pa.int64()).cast(self._schema.field(0).type),
+                pa.array([value for _, value in rows], pa.float64()),
+            ],
+            schema=self._schema,
+        )
+        self._writer.write_table(table)
+        return self._sink.drain()
+
+    def footer(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+
+ENCODERS = {
+    ExportFormat.CSV: _CsvEncoder,
+    ExportFormat.NDJSON: _NdjsonEncoder,
+    ExportFormat.PARQUET: _ParquetEncoder,
+}
+
+
+async def export_points(
+    session_factory: SessionFactory,
+    metric_type: str,
+    start_at: datetime,
+    end_at: datetime,
+    fmt: ExportFormat,
+    chunk_rows: int | None = None,
+) -> AsyncIterator[bytes]:
+    """Raw points of `metric_type` in `[start_at, end_at]`, encoded chunk by chunk.
+
+    Rows come through a server-side cursor `chunk_rows` at a time, so memory stays
+    flat whatever the range. The generator owns its session: when the client goes
+    away the response is cancelled, which closes the cursor and stops the query.
+    """
+    chunk_rows = chunk_rows or settings.export_chunk_rows
+    encoder = ENCODERS[fmt](display_name(metric_type))
+    stmt = (
+        select(Metric.ts, Metric.value)
+        .where(Metric.type == metric_type, Metric.ts >= start_at, Metric.ts <= end_at)
+        .order_by(Metric.ts)
+        .execution_options(yield_per=chunk_rows)
+    )
+    exported = 0
+    try:
+        if header := encoder.header():
+            yield header
+        async with session_factory() as session:
+            result = await session.stream(stmt)
+            try:
+                async for rows in result.partitions():
+                    exported += len(rows)
+                    if chunk := encoder.encode(rows):
+                        yield chunk
+            finally:
+                await result.close()
+        if footer := encoder.footer():
+            yield footer
+    except (asyncio.CancelledError, GeneratorExit):
+        _exports.labels(fmt.value, "aborted").inc()
+        logger.info(
+            "Export of %s aborted by the client after %d rows", metric_type, exported
+        )
+        raise
+    _exports.labels(fmt.value, "completed").inc()
@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from collections.abc import AsyncIterator, Callable, Hashable
+from dataclasses import dataclass
+from typing import Any
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.core.telemetry import registry
+from app.services.send_queue import OverflowPolicy, SendQueue
+
+logger = logging.getLogger(__name__)
+
+RedisFactory = Callable[[], redis.Redis]
+
+_pubsub_messages = registry.counter(
+    "rad_pubsub_messages_total", "Pub/sub messages dispatched to local subscribers."
+).labels()
+
+
+def metric_channel(metric_type: str) -> str:
+    return f"metrics:{metric_type}"
+
+
+def default_redis() -> redis.Redis:
+    return redis.Redis(
+        host=settings.redis_host, port=settings.redis_port, decode_responses=True
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class MetricMessage:
+    """A pub/sub payload decoded once and shared by every local subscriber."""
+
+    channel: str
+    raw: str
+    data: dict[str, Any]
+
+
+def series_key(message: MetricMessage) -> str:
+    """The series a message belongs to, tenant prefix included (see `tenants`)."""
+    return message.channel.partition(":")[2]
+
+
+def conflation_key(message: MetricMessage) -> Hashable:
+    """One key per series: the channel, plus the labels of a labelled point."""
+    labels = message.data.get("labels")
+    return (message.channel, repr(labels)) if labels else message.channel
+
+
+class Subscription:
+    """A single consumer's view of one channel, buffered by a `SendQueue`."""
+
+    def __init__(
+        self,
+        hub: MetricsHub,
+        channel: str,
+        queue: SendQueue[MetricMessage],
+        pattern: bool = False,
+    ) -> None:
+        self.hub = hub
+        self.channel = channel
+        self.queue = queue
+        self.pattern = pattern
+
+    @property
+    def dropped(self) -> int:
+        return self.queue.dropped
+
+    def put_nowait(self, message: MetricMessage) -> None:
+        self.queue.put(message)
+
+    async def get(self) -> MetricMessage:
+        return await self.queue.get()
+
+    async def __aiter__(self) -> AsyncIterator[MetricMessage]:
+        while True:
+            yield await self.queue.get()
+
+    async def close(self) -> None:
+        await self.hub.unsubscribe(self)
+
+
+class MetricsHub:
+    """Process-wide Redis pub/sub fan-out.
+
+    One Redis connection is shared by every WebSocket in the worker. A channel is
+    subscribed when its first local consumer arrives and dropped with its last.
+    """
+
+    def __init__(
+        self,
+        redis_factory: RedisFactory = default_redis,
+        queue_size: int | None = None,
+        overflow_policy: OverflowPolicy | None = None,
+        max_lag: float | None = None,
+    ) -> None:
+        self._redis_factory = redis_factory
+        self._queue_size = queue_size or settings.ws_queue_size
+        self._overflow_policy = OverflowPolicy(
+            overflow_policy or settings.ws_overflow_policy
+        )
+        self._max_lag = settings.ws_max_lag_seconds if max_lag is None else max_lag
+        self._client: redis.Redis | None = None
+        self._pubsub: redis.client.PubSub | None = None
+        self._reader: asyncio.Task[None] | None = None
+        self._lock = asyncio.Lock()
+        self._subscribers: dict[str, set[Subscription]] = {}
+        # Messages published while a read was failing are lost; consumers that need
+        # a gap-free stream compare this counter to detect it.
+        self.read_failures = 0
+
+    @property
+    def channels(self) -> set[str]:
+        return set(self._subscribers)
+
+    def subscriber_count(self, channel: str | None = None) -> int:
+        if channel is not None:
+            return len(self._subscribers.get(channel, ()))
+        return sum(len(subs) for subs in self._subscribers.values())
+
+    def subscriber_counts(self) -> dict[str, int]:
+        return {channel: len(subs) for channel, subs in self._subscribers.items()}
+
+    def queues(self) -> list[SendQueue[MetricMessage]]:
+        return [sub.queue for subs in self._subscribers.values() for sub in subs]
+
+    def new_queue(self) -> SendQueue[MetricMessage]:
+        return SendQueue(
+            self._queue_size,
+            policy=self._overflow_policy,
+            max_lag=self._max_lag,
+            key=conflation_key,
+        )
+
+    async def subscribe(
+        self,
+        channel: str,
+        queue: SendQueue[MetricMessage] | None = None,
+        pattern: bool = False,
+    ) -> Subscription:
+        """Subscribe to `channel`; pass `queue` to share one buffer across channels.
+
+        With `pattern` the channel is a glob such as `metrics:*` and every message
+        on a matching channel is delivered.
+        """
+        subscription = Subscription(
+            self, channel, self.new_queue() if queue is None else queue, pattern
+        )
+        async with self._lock:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is None:
+                pubsub = self._ensure_pubsub()
+                if pattern:
+                    await pubsub.psubscribe(channel)
+                else:
+                    await pubsub.subscribe(channel)
+                subscribers = self._subscribers[channel] = set()
+                self._ensure_reader()
+            subscribers.add(subscription)
+        return subscription
+
+    async def unsubscribe(self, subscription: Subscription) -> None:
+        async with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if not subscribers or subscription not in subscribers:
+                return
+            subscribers.discard(subscription)
+            if subscribers:
+                return
+            del self._subscribers[subscription.channel]
+            if self._pubsub is None:
+                return
+            if subscription.pattern:
+                await self._pubsub.punsubscribe(subscription.channel)
+            else:
+                await self._pubsub.unsubscribe(subscription.channel)
+
+    async def close(self) -> None:
+        reader, self._reader = self._reader, None
+        if reader is not None:
+            reader.cancel()
+            try:
+                await reader
+            except asyncio.CancelledError:
+                pass
+        self._subscribers.clear()
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._lock = asyncio.Lock()
+
+    def dispatch(self, channel: str, raw: str, pattern: str | None = None) -> None:
+        subscribers = self._subscribers.get(pattern or channel)
+        if not subscribers:
+            return
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            logger.warning("Dropping undecodable payload on %s", channel)
+            return
+        message = MetricMessage(channel=channel, raw=raw, data=data)
+        _pubsub_messages.inc()
+        for subscription in tuple(subscribers):
+            subscription.put_nowait(message)
+
+    def _ensure_pubsub(self) -> redis.client.PubSub:
+        if self._pubsub is None:
+            self._client = self._redis_factory()
+            self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        return self._pubsub
+
+    def _ensure_reader(self) -> None:
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read_loop())
+
+    async def _read_loop(self) -> None:
+        assert self._pubsub is not None
+        pubsub = self._pubsub
+        while True:
+            try:
+                message = await pubsub.get_message(timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self.read_failures += 1
+                logger.warning("Metrics hub read failed, retrying: %s", exc)
+                await asyncio.sleep(1)
+                continue
+            if message is None:
+                continue
+            if message["type"] == "message":
+                self.dispatch(message["channel"], message["data"])
+            elif message["type"] == "pmessage":
+                self.dispatch(message["channel"], message["data"], message["pattern"])
+
+
+hub = MetricsHub()
+
+registry.callback(
+    "rad_hub_subscribers",
+    "Local subscriptions per Redis channel or pattern.",
+    ("channel",),
+    lambda: [((channel,), n) for channel, n in hub.subscriber_counts().items()],
+)
+registry.callback(
+    "rad_pubsub_read_failures_total",
+    "Failed pub/sub reads; messages published meanwhile were lost.",
+    (),
+    lambda: [((), hub.read_failures)],
+    kind="counter",
+)
@@ -1,37 +1,249 @@
+"""Synthetic metric publisher for local development and capacity testing.
+
+Simulates `types` x `hosts` series and publishes their points to
+`metrics:{type}` at a target rate, pipelining the `PUBLISH` calls in batches.
+Inside the app it runs in local mode with the `GENERATOR_*` settings; to drive a
+backend harder, run it standalone::
+
+    uv run python -m app.services.generator --types 20 --hosts 50 \\
+        --rate 100000 --processes 4 --duration 60
+"""
+
 from __future__ import annotations
 
+import argparse
 import asyncio
-import json
 import logging
-from datetime import datetime, timezone
-from typing import Final
+import math
+import multiprocessing
+import time
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from datetime import UTC, datetime
 
+import numpy as np
 import redis.asyncio as redis
 
 from app.core.config import settings
+from app.core.telemetry import registry
+from app.services.fanout import RedisFactory, default_redis, metric_channel
 
 logger = logging.getLogger(__name__)
-CHANNEL: Final[str] = "metrics:cpu"
 
+BASE_TYPES = ("cpu", "mem", "disk", "net", "load", "latency", "errors", "requests")
+DAY_SECONDS = 86_400
 
-async def publish_dummy_metrics() -> None:
-    client = redis.Redis(
-        host=settings.redis_host, port=settings.redis_port, decode_responses=True
-    )
-    while True:
-        payload = json.dumps(
-            {
-                "timestamp": datetime.now(tz=timezone.utc).isoformat(),
-                "value": 50,
-                "type": "cpu",
-            }
+_points = registry.counter(
+    "rad_generator_points_total", "Points published by the generator.", ("result",)
+)
+_points_sent = _points.labels("sent")
+_points_failed = _points.labels("failed")
+
+
+def series_names(types: int, hosts: int) -> list[str]:
+    """`cpu`, `mem`, ... for one host, `cpu.host-000`, ... for several."""
+    base = [
+        BASE_TYPES[i] if i < len(BASE_TYPES) else f"metric_{i}" for i in range(types)
+    ]
+    if hosts <= 1:
+        return base
+    return [f"{name}.host-{host:03d}" for name in base for host in range(hosts)]
+
+
+class SeriesModel:
+    """Mean-reverting random walk around a daily seasonal baseline, per series."""
+
+    def __init__(
+        self, count: int, seed: int | None = None, period: float = DAY_SECONDS
+    ) -> None:
+        self._rng = np.random.default_rng(seed)
+        self.period = period
+        self.baseline = self._rng.uniform(20, 80, count)
+        self.amplitude = self._rng.uniform(5, 20, count)
+        self.phase = self._rng.uniform(0, 2 * math.pi, count)
+        self.drift = np.zeros(count)
+
+    def sample(self, indices: np.ndarray, now: float) -> np.ndarray:
+        angle = 2 * math.pi * now / self.period + self.phase[indices]
+        seasonal = self.baseline[indices] + self.amplitude[indices] * np.sin(angle)
+        drift = 0.95 * self.drift[indices] + self._rng.normal(0, 2, len(indices))
+        self.drift[indices] = drift
+        return np.round(np.clip(seasonal + drift, 0, None), 3)
+
+
+@dataclass(slots=True)
+class GeneratorStats:
+    sent: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.sent / self.elapsed if self.elapsed else 0.0
+
+
+class LoadGenerator:
+    """Publishes simulated points round-robin over its series at `rate` per second.
+
+    A token bucket paces the batches; when Redis cannot keep up the backlog is
+    capped at one second, so the reported rate is what was actually achieved.
+    """
+
+    def __init__(
+        self,
+        names: Sequence[str],
+        rate: float,
+        batch_size: int = 1000,
+        redis_factory: RedisFactory = default_redis,
+        seed: int | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if not names:
+            raise ValueError("the generator needs at least one series")
+        self.names = list(names)
+        self.rate = rate
+        self.batch_size = max(batch_size, 1)
+        self._channels = [metric_channel(name) for name in self.names]
+        self._model = SeriesModel(len(self.names), seed)
+        self._redis_factory = redis_factory
+        self._clock = clock
+        self._cursor = 0
+        self.stats = GeneratorStats()
+
+    @classmethod
+    def from_settings(cls) -> LoadGenerator:
+        return cls(
+            series_names(settings.generator_types, settings.generator_hosts),
+            rate=settings.generator_rate,
+            batch_size=settings.generator_batch_size,
         )
-        await client.publish(CHANNEL, payload)
-        await asyncio.sleep(1)
+
+    def build_batch(self, count: int, now: datetime) -> list[tuple[str, str]]:
+        """`(channel, payload)` pairs for the next `count` points."""
+        indices = np.arange(self._cursor, self._cursor + count) % len(self.names)
+        self._cursor = int(indices[-1]) + 1
+        values = self._model.sample(indices, now.timestamp())
+        ts = now.isoformat()
+        names, channels = self.names, self._channels
+        # Spliced by hand: json.dumps per point would dominate the publish cost.
+        return [
+            (
+                channels[i],
+                f'{{"timestamp":"{ts}","value":{value},"type":"{names[i]}"}}',
+            )
+            for i, value in zip(indices.tolist(), values.tolist())
+        ]
+
+    async def run(
+        self, duration: float | None = None, report_interval: float | None = None
+    ) -> GeneratorStats:
+        report_interval = report_interval or settings.generator_report_interval_seconds
+        client = self._redis_factory()
+        started = last = last_report = self._clock()
+        allowance = 0.0
+        # Wait for 10 ms worth of points so high rates publish in real batches.
+        ready = min(self.batch_size, max(1, int(self.rate / 100)))
+        self.stats = GeneratorStats()
+        try:
+            while duration is None or last - started < duration:
+                now = self._clock()
+                allowance = min(
+                    allowance + (now - last) * self.rate,
+                    max(self.rate, self.batch_size),
+                )
+                last = now
+                if allowance < ready:
+                    await asyncio.sleep((ready - allowance) / self.rate)
+                    continue
+                count = min(int(allowance), self.batch_size)
+                allowance -= count
+                await self._publish(client, count)
+                self.stats.elapsed = self._clock() - started
+                if now - last_report >= report_interval:
+                    last_report = now
+                    logger.info(
+                        "Generator sent %d points (%.0f/s, target %.0f/s)",
+                        self.stats.sent,
+                        self.stats.rate,
+                        self.rate,
+                    )
+        finally:
+            self.stats.elapsed = self._clock() - started
+            await client.aclose()
+        return self.stats
+
+    async def _publish(self, client: redis.Redis, count: int) -> None:
+        batch = self.build_batch(count, datetime.now(tz=UTC))
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for channel, payload in batch:
+                    pipe.publish(channel, payload)
+                await pipe.execute()
+        except Exception as exc:
+            self.stats.failed += count
+            _points_failed.inc(count)
+            logger.warning("Generator failed to publish %d points: %s", count, exc)
+            await asyncio.sleep(1)
+            return
+        self.stats.sent += count
+        _points_sent.inc(count)
 
 
 async def start_generator() -> None:
     if settings.app_env != "local":
         return
-    logger.info("Starting dummy metric publisher (dev mode)")
-    await publish_dummy_metrics()
+    generator = LoadGenerator.from_settings()
+    logger.info(
+        "Starting metric generator (dev mode): %d series at %.0f points/s",
+        len(generator.names),
+        generator.rate,
+    )
+    await generator.run()
+
+
+def _run_shard(
+    names: list[str], rate: float, batch_size: int, duration: float | None
+) -> GeneratorStats:
+    generator = LoadGenerator(names, rate=rate, batch_size=batch_size)
+    return asyncio.run(generator.run(duration))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--types", type=int, default=settings.generator_types)
+    parser.add_argument("--hosts", type=int, default=settings.generator_hosts)
+    parser.add_argument("--rate", type=float, default=settings.generator_rate)
+    parser.add_argument("--batch-size", type=int, default=settings.generator_batch_size)
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="Split the series and the rate across this many processes",
+    )
+    parser.add_argument("--duration", type=float, default=None)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    names = series_names(args.types, args.hosts)
+    shards = [names[i :: args.processes] for i in range(args.processes)]
+    shards = [shard for shard in shards if shard]
+    jobs = [
+        (shard, args.rate * len(shard) / len(names), args.batch_size, args.duration)
+        for shard in shards
+    ]
+    if len(jobs) == 1:
+        results = [_run_shard(*jobs[0])]
+    else:
+        with multiprocessing.get_context("spawn").Pool(len(jobs)) as pool:
+            results = pool.starmap(_run_shard, jobs)
+    sent = sum(stats.sent for stats in results)
+    failed = sum(stats.failed for stats in results)
+    elapsed = max(stats.elapsed for stats in results)
+    print(
+        f"{len(names)} series, {sent:,} points in {elapsed:.1f}s: "
+        f"{sent / elapsed:,.0f}/s (target {args.rate:,.0f}/s), {failed:,} failed"
+    )
+
+
+if __name__ == "__main__":
+    main()
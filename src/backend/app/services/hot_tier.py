@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from typing import Any
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.fanout import (
+    MetricMessage,
+    MetricsHub,
+    Subscription,
+    hub,
+    series_key,
+)
+from app.services.send_queue import OverflowPolicy, SendQueue
+from app.services.timeseries import (
+    P95,
+    Aggregation,
+    SeriesColumns,
+    as_utc,
+    series_origin,
+)
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PATTERN = "metrics:*"
+
+
+class RingBuffer:
+    """Fixed-capacity timestamp/value columns; the oldest point is overwritten."""
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._ts = np.zeros(capacity, dtype=np.float64)
+        self._values = np.zeros(capacity, dtype=np.float64)
+        self._next = 0
+        self._size = 0
+        # Newest timestamp ever overwritten: the buffer is complete only after it.
+        self.evicted_through = -math.inf
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        return self._ts.nbytes + self._values.nbytes
+
+    def append(self, ts: float, value: float) -> None:
+        index = self._next
+        if self._size == self.capacity:
+            self.evicted_through = max(self.evicted_through, self._ts[index])
+        else:
+            self._size += 1
+        self._ts[index] = ts
+        self._values[index] = value
+        self._next = (index + 1) % self.capacity
+
+    def window(self, start: float, end: float) -> tuple[np.ndarray, np.ndarray]:
+        ts = self._ts[: self._size]
+        mask = (ts >= start) & (ts <= end)
+        return ts[mask], self._values[: self._size][mask]
+
+
+def downsample(
+    ts: np.ndarray, values: np.ndarray, origin: float, step: int, agg: Aggregation
+) -> tuple[np.ndarray, np.ndarray]:
+    """Bucket points by `step` seconds from `origin`; returns bucket indexes and values.
+
+    Matches `query_series`, including the interpolated p95.
+    """
+    if not len(ts):
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    buckets = ((ts - origin) // step).astype(np.int64)
+    order = np.lexsort((values, buckets))
+    buckets, values = buckets[order], values[order]
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    counts = np.diff(np.r_[starts, len(buckets)])
+    if agg is Aggregation.COUNT:
+        result = counts.astype(np.float64)
+    elif agg is Aggregation.SUM:
+        result = np.add.reduceat(values, starts)
+    elif agg is Aggregation.AVG:
+        result = np.add.reduceat(values, starts) / counts
+    elif agg is Aggregation.MIN:
+        result = values[starts]
+    elif agg is Aggregation.MAX:
+        result = values[starts + counts - 1]
+    else:
+        position = (counts - 1) * P95
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, counts - 1)
+        low, high = values[starts + lower], values[starts + upper]
+        result = low + (high - low) * (position - lower)
+    return buckets[starts], result
+
+
+class HotTier:
+    """Per-process ring buffers of recent points, fed from the metrics pub/sub stream.
+
+    Every `metrics:*` message this worker receives is appended, so a window that
+    starts after the tier came up (and after anything the rings have overwritten)
+    can be answered without touching the database.
+    """
+
+    def __init__(
+        self,
+        capacity: int | None = None,
+        window: float | None = None,
+        hub: MetricsHub = hub,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.capacity = capacity or settings.hot_tier_capacity
+        self.window = window or settings.hot_tier_window_seconds
+        self._hub = hub
+        self._clock = clock
+        self._buffers: dict[str, RingBuffer] = {}
+        self._task: asyncio.Task[None] | None = None
+        self._failures_seen = 0
+        self.started_at: float | None = None
+        self.dropped = 0
+
+    def add(self, metric_type: str, ts: float, value: float) -> None:
+        buffer = self._buffers.get(metric_type)
+        if buffer is None:
+            buffer = self._buffers[metric_type] = RingBuffer(self.capacity)
+        buffer.append(ts, value)
+
+    def add_message(self, message: MetricMessage) -> None:
+        data = message.data
+        try:
+            metric_type = series_key(message)
+            ts = as_utc(datetime.fromisoformat(data["timestamp"])).timestamp()
+            value = float(data["value"])
+        except (KeyError, TypeError, ValueError):
+            self.dropped += 1
+            return
+        self.add(metric_type, ts, value)
+
+    def covers(self, metric_type: str, start_at: datetime) -> bool:
+        if self.started_at is None:
+            return False
+        if self._hub.read_failures != self._failures_seen:
+            # Messages may have been lost; only trust points received from now on.
+            self._failures_seen = self._hub.read_failures
+            self.started_at = self._clock()
+        start = start_at.timestamp()
+        if start < self.started_at or start < self._clock() - self.window:
+            return False
+        buffer = self._buffers.get(metric_type)
+        return buffer is None or start > buffer.evicted_through
+
+    def query(
+        self,
+        metric_type: str,
+        start_at: datetime,
+        end_at: datetime,
+        step: int,
+        agg: Aggregation = Aggregation.AVG,
+    ) -> SeriesColumns | None:
+        """Answer from memory, or return None when the window is not fully held."""
+        start_at, end_at = as_utc(start_at), as_utc(end_at)
+        origin = series_origin(start_at, step, agg)
+        if not self.covers(metric_type, origin):
+            return None
+        columns = SeriesColumns(metric_type=metric_type, step=step)
+        buffer = self._buffers.get(metric_type)
+        if buffer is None:
+            return columns
+        ts, values = buffer.window(origin.timestamp(), end_at.timestamp())
+        buckets, results = downsample(ts, values, origin.timestamp(), step, agg)
+        columns.timestamps = [
+            origin + timedelta(seconds=int(index) * step) for index in buckets
+        ]
+        columns.values = results.tolist()
+        return columns
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        return {
+            metric_type: {
+                "points": len(buffer),
+                "capacity": buffer.capacity,
+                "bytes": buffer.nbytes,
+            }
+            for metric_type, buffer in self._buffers.items()
+        }
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        queue: SendQueue[MetricMessage] = SendQueue(
+            settings.hot_tier_queue_size, policy=OverflowPolicy.DROP_OLDEST
+        )
+        try:
+            subscription = await self._hub.subscribe(
+                CHANNEL_PATTERN, queue=queue, pattern=True
+            )
+        except Exception as exc:
+            logger.warning("Hot tier disabled, could not subscribe: %s", exc)
+            return
+        self._failures_seen = self._hub.read_failures
+        self.started_at = self._clock()
+        self._task = asyncio.create_task(self._consume(subscription))
+
+    async def close(self) -> None:
+        task, self._task = self._task, None
+        self.started_at = None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        self._buffers.clear()
+
+    async def _consume(self, subscription: Subscription) -> None:
+        queue = subscription.queue
+        try:
+            while True:
+                self.add_message(await queue.get())
+                while len(queue):
+                    self.add_message(queue.get_nowait())
+                if queue.dropped:
+                    # The queue overflowed, so the rings have a gap.
+                    self.dropped += queue.dropped
+                    queue.dropped = 0
+                    self.started_at = self._clock()
+        finally:
+            await subscription.close()
+
+
+hot_tier = HotTier()
@@ -0,0 +1,507 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import math
+import uuid
+from collections.abc import Callable, Iterable
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any, NamedTuple
+
+import msgpack
+import redis.asyncio as redis
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.telemetry import registry
+from app.db.session import SessionLocal
+from app.models.ingest import IngestCheckpoint
+from app.models.metric import Metric
+from app.services.fanout import RedisFactory, default_redis, metric_channel
+from app.services.query_cache import query_cache
+from app.services.rollups import upsert_rollups
+from app.services.series import Labels, normalize_labels, series_id, upsert_series
+from app.services.tenants import display_name
+from app.services.timeseries import as_utc
+from app.services.wal import LogFullError, Position, SegmentLog
+
+logger = logging.getLogger(__name__)
+
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/jsonl")
+# Points per log record; keeps records well below any sensible segment size.
+RECORD_POINTS = 4096
+MAX_RETRY_SECONDS = 30.0
+
+
+class IngestPoint(NamedTuple):
+    type: str
+    ts: datetime
+    value: float
+    labels: Labels = ()
+
+
+# Points read from the log, with the position and point count after each record.
+LoggedBatch = tuple[list[IngestPoint], list[tuple[Position, int]]]
+
+
+class InvalidPayloadError(ValueError):
+    """Raised when an ingest body cannot be parsed into points."""
+
+
+class BufferFullError(Exception):
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("ingest buffer is full")
+        self.retry_after = retry_after
+
+
+def _parse_ts(value: Any) -> datetime:
+    if isinstance(value, bool):
+        raise TypeError(value)
+    if isinstance(value, int | float):
+        return datetime.fromtimestamp(value / 1000, tz=UTC)
+    return as_utc(datetime.fromisoformat(value))
+
+
+def _point(metric_type: Any, ts: Any, value: Any, labels: Any = None) -> IngestPoint:
+    if not isinstance(metric_type, str) or not metric_type:
+        raise TypeError(metric_type)
+    return IngestPoint(
+        metric_type, _parse_ts(ts), float(value), normalize_labels(labels)
+    )
+
+
+def parse_ndjson(body: bytes) -> list[IngestPoint]:
+    """Parse `{"type", "ts" | "timestamp", "value"}` objects, one per line.
+
+    An optional `"labels"` object of string values tags the point's series.
+    """
+    points = []
+    for lineno, line in enumerate(body.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+            points.append(
+                _point(
+                    item["type"],
+                    item.get("ts", item.get("timestamp")),
+                    item["value"],
+                    item.get("labels"),
+                )
+            )
+        except (ValueError, TypeError, KeyError, AttributeError) as exc:
+            raise InvalidPayloadError(f"invalid point on line {lineno}") from exc
+    return points
+
+
+def parse_compact(body: bytes) -> list[IngestPoint]:
+    """Parse `{"points": [[type, ts, value], ...]}` or a bare array of triples.
+
+    `ts` is epoch milliseconds or an ISO-8601 string; a fourth element may carry
+    the point's labels as an object.
+    """
+    try:
+        document = json.loads(body)
+    except ValueError as exc:
+        raise InvalidPayloadError("body is not valid JSON") from exc
+    rows = document.get("points") if isinstance(document, dict) else document
+    if not isinstance(rows, list):
+        raise InvalidPayloadError("expected an array of [type, ts, value] points")
+    points = []
+    for index, row in enumerate(rows):
+        try:
+            if not isinstance(row, list) or not 3 <= len(row) <= 4:
+                raise TypeError(row)
+            points.append(_point(*row))
+        except (ValueError, TypeError) as exc:
+            raise InvalidPayloadError(f"invalid point at index {index}") from exc
+    return points
+
+
+def parse_body(body: bytes, content_type: str) -> list[IngestPoint]:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    if media_type in NDJSON_MEDIA_TYPES:
+        return parse_ndjson(body)
+    return parse_compact(body)
+
+
+def encode_point(point: IngestPoint) -> str:
+    data = {
+        "timestamp": point.ts.isoformat(),
+        "value": point.value,
+        "type": display_name(point.type),
+    }
+    if point.labels:
+        data["labels"] = dict(point.labels)
+    return json.dumps(data)
+
+
+def encode_batch(points: list[IngestPoint]) -> bytes:
+    # Epoch seconds as a double round-trip to the exact microsecond.
+    return msgpack.packb(
+        [
+            (p.type, p.ts.timestamp(), p.value, p.labels)
+            if p.labels
+            else (p.type, p.ts.timestamp(), p.value)
+            for p in points
+        ]
+    )
+
+
+def decode_batch(payload: bytes) -> list[IngestPoint]:
+    return [
+        IngestPoint(
+            metric_type,
+            datetime.fromtimestamp(ts, tz=UTC),
+            value,
+            tuple(map(tuple, labels[0])) if labels else (),
+        )
+        for metric_type, ts, value, *labels in msgpack.unpackb(payload)
+    ]
+
+
+def batch_size(payload: bytes) -> int:
+    """The number of points in an encoded batch, without decoding them."""
+    unpacker = msgpack.Unpacker()
+    unpacker.feed(payload)
+    return unpacker.read_array_header()
+
+
+def applied_position(session: Session, log_id: str) -> Position | None:
+    """How far the database has taken the log `log_id`, if it ever took any."""
+    row = session.get(IngestCheckpoint, log_id)
+    return Position(row.segment, row.byte_offset) if row is not None else None
+
+
+def _record_position(session: Session, log_id: str, position: Position) -> None:
+    dialect = session.get_bind().dialect.name
+    insert_ = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = insert_(IngestCheckpoint).values(
+        log_id=log_id, segment=position.segment, byte_offset=position.offset
+    )
+    session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["log_id"],
+            set_={
+                "segment": stmt.excluded.segment,
+                "byte_offset": stmt.excluded.byte_offset,
+            },
+        )
+    )
+
+
+def write_points(
+    session: Session,
+    points: list[IngestPoint],
+    checkpoint: tuple[str, Position] | None = None,
+) -> None:
+    """Persist points with COPY on PostgreSQL and a multi-row INSERT elsewhere.
+
+    The series and rollup tables are updated in the same transaction, and so is
+    `checkpoint`, a log id and the position after these points in it.
+    """
+    ids = [series_id(point.type, point.labels) for point in points]
+    if session.get_bind().dialect.name == "postgresql":
+        cursor = session.connection().connection.driver_connection.cursor()
+        with (
+            cursor,
+            cursor.copy(
+                "COPY metrics (id, type, value, ts, series_id) FROM STDIN"
+            ) as copy,
+        ):
+            for point, sid in zip(points, ids):
+                copy.write_row((uuid.uuid4(), point.type, point.value, point.ts, sid))
+    else:
+        session.execute(
+            insert(Metric),
+            [
+                {
+                    "id": uuid.uuid4(),
+                    "type": p.type,
+                    "value": p.value,
+                    "ts": p.ts,
+                    "series_id": sid,
+                }
+                for p, sid in zip(points, ids)
+            ],
+        )
+    upsert_series(session, {sid: (p.type, p.labels) for p, sid in zip(points, ids)})
+    upsert_rollups(session, points)
+    if checkpoint is not None:
+        _record_position(session, *checkpoint)
+    session.commit()
+
+
+class IngestBuffer:
+    """Accumulates points and flushes them in batches.
+
+    A flush runs once `flush_points` are pending or `flush_interval` seconds have
+    passed. Each flush writes one batch to the database and publishes the same
+    points to `metrics:{type}` in a single Redis pipeline, which also retires the
+    cached query chunks of points that arrived late (see `QueryCache`).
+
+    With a `wal_dir` the pending points live in a `SegmentLog` instead of memory:
+    `add` appends them to the log, and a batch is committed only after both the
+    database and Redis took it. While either is down the flusher retries with
+    exponential backoff and points keep accumulating on disk (bounded by
+    `wal_max_bytes`, after which `add` raises `BufferFullError`); a restarted
+    worker replays what the previous one left. Every database write records the
+    log position it reached in the same transaction, so the batch a crash left
+    between that write and the log's checkpoint is replayed to Redis only and the
+    raw rows and rollups are not applied twice. Redis delivery stays at least
+    once.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        redis_factory: RedisFactory = default_redis,
+        max_points: int | None = None,
+        flush_points: int | None = None,
+        flush_interval: float | None = None,
+        wal_dir: str | Path | None = None,
+        wal_segment_bytes: int | None = None,
+        wal_max_bytes: int | None = None,
+    ) -> None:
+        self._session_factory = session_factory
+        self._redis_factory = redis_factory
+        self.max_points = max_points or settings.ingest_buffer_max_points
+        self.flush_points = flush_points or settings.ingest_flush_points
+        self.flush_interval = flush_interval or settings.ingest_flush_interval_seconds
+        self.wal_dir = wal_dir
+        self.wal_segment_bytes = wal_segment_bytes or settings.wal_segment_bytes
+        self.wal_max_bytes = wal_max_bytes or settings.wal_max_bytes
+        self._pending: list[IngestPoint] = []
+        self._wal: SegmentLog | None = None
+        self._opening = False
+        self._backlog = 0
+        # The batch being delivered, read from the log, and whether it is in the DB.
+        self._inflight: LoggedBatch | None = None
+        self._persisted = False
+        self.failures = 0
+        self._client: redis.Redis | None = None
+        self._flusher: asyncio.Task[None] | None = None
+        self._closing = False
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return self._backlog if self.wal_dir else len(self._pending)
+
+    @property
+    def retry_after(self) -> int:
+        return max(math.ceil(self.flush_interval), 1)
+
+    @property
+    def wal(self) -> SegmentLog | None:
+        """The log, opened (and its backlog counted) on first use.
+
+        `start` opens it in a worker thread instead: recovery reads every record
+        left on disk, up to `wal_max_bytes` of them.
+        """
+        if self._wal is None and self.wal_dir and not self._opening:
+            self._wal, self._backlog = self._open_wal()
+        return self._wal
+
+    def _open_wal(self) -> tuple[SegmentLog, int]:
+        wal = SegmentLog.claim(self.wal_dir, self.wal_segment_bytes, self.wal_max_bytes)
+        backlog = sum(batch_size(payload) for payload, _ in wal.records())
+        if backlog:
+            logger.info("Replaying %d ingested points from %s", backlog, wal.directory)
+        return wal, backlog
+
+    @property
+    def wal_bytes(self) -> int:
+        return self._wal.disk_bytes if self._wal is not None else 0
+
+    async def start(self) -> None:
+        """Open the log off the event loop and start replaying its backlog.
+
+        Until the log is open, `add` answers `BufferFullError`.
+        """
+        if self.wal_dir and self._wal is None and not self._opening:
+            self._opening = True
+            try:
+                self._wal, self._backlog = await asyncio.to_thread(self._open_wal)
+            finally:
+                self._opening = False
+        if self._wal is not None and self._backlog:
+            self._ensure_flusher()
+            self._wakeup.set()
+
+    def add(self, points: Iterable[IngestPoint]) -> int:
+        points = list(points)
+        if self._opening:
+            raise BufferFullError(self.retry_after)
+        wal = self.wal
+        if wal is not None:
+            records = [
+                encode_batch(points[offset : offset + RECORD_POINTS])
+                for offset in range(0, len(points), RECORD_POINTS)
+            ]
+            try:
+                wal.append(records)
+            except LogFullError as exc:
+                raise BufferFullError(self.retry_after) from exc
+            self._backlog += len(points)
+            pending = self._backlog
+        else:
+            if len(self._pending) + len(points) > self.max_points:
+                raise BufferFullError(self.retry_after)
+            self._pending.extend(points)
+            pending = len(self._pending)
+        self._ensure_flusher()
+        # While a dependency is down the flusher's backoff sets the pace.
+        if pending >= self.flush_points and not self.failures:
+            self._wakeup.set()
+        return len(points)
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            if self.wal is not None:
+                return await self._flush_wal(self.wal)
+            points, self._pending = self._pending, []
+            if not points:
+                return 0
+            try:
+                await asyncio.to_thread(self._write, points)
+            except Exception:
+                logger.exception("Failed to persist %d ingested points", len(points))
+            await self.publish(points)
+            return len(points)
+
+    async def _flush_wal(self, wal: SegmentLog) -> int:
+        """Deliver and commit the log's backlog batch by batch until it is empty."""
+        flushed = 0
+        await asyncio.to_thread(wal.sync)
+        while True:
+            if self._inflight is None:
+                self._inflight = self._read_batch(wal)
+                self._persisted = False
+            points, records = self._inflight
+            if not points:
+                self._inflight = None
+                return flushed
+            position = records[-1][0]
+            try:
+                if not self._persisted:
+                    await asyncio.to_thread(self._write_logged, wal.id, self._inflight)
+                    self._persisted = True
+                await self._publish(points)
+            except Exception as exc:
+                self.failures += 1
+                logger.warning(
+                    "Delivering %d ingested points failed (attempt %d), %d kept on "
+                    "disk: %s",
+                    len(points),
+                    self.failures,
+                    self._backlog,
+                    exc,
+                )
+                return flushed
+            wal.commit(position)
+            self._inflight = None
+            self._backlog -= len(points)
+            self.failures = 0
+            flushed += len(points)
+
+    def _read_batch(self, wal: SegmentLog) -> LoggedBatch:
+        points: list[IngestPoint] = []
+        records: list[tuple[Position, int]] = []
+        for payload, position in wal.records():
+            points += decode_batch(payload)
+            records.append((position, len(points)))
+            if len(points) >= self.flush_points:
+                break
+        return points, records
+
+    async def close(self) -> None:
+        flusher, self._flusher = self._flusher, None
+        if flusher is not None:
+            self._closing = True
+            self._wakeup.set()
+            await flusher
+        await self.flush()
+        if self._wal is not None:
+            # Whatever could not be delivered stays on disk for the next start.
+            self._wal.close()
+            self._wal = None
+            self._inflight = None
+            self._backlog = 0
+            self.failures = 0
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._closing = False
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+
+    def _write(self, points: list[IngestPoint]) -> None:
+        with self._session_factory() as session:
+            write_points(session, points)
+
+    def _write_logged(self, log_id: str, batch: LoggedBatch) -> None:
+        points, records = batch
+        with self._session_factory() as session:
+            applied = applied_position(session, log_id)
+            # A batch always starts at the log's checkpoint, so what the database
+            # already took is a prefix of it.
+            done = max(
+                (count for end, count in records if applied and end <= applied),
+                default=0,
+            )
+            if done:
+                logger.info("Skipping %d replayed points already stored", done)
+            if done < len(points):
+                write_points(session, points[done:], (log_id, records[-1][0]))
+
+    async def publish(self, points: list[IngestPoint]) -> None:
+        try:
+            await self._publish(points)
+        except Exception as exc:
+            logger.warning("Failed to publish %d ingested points: %s", len(points), exc)
+
+    async def _publish(self, points: list[IngestPoint]) -> None:
+        if self._client is None:
+            self._client = self._redis_factory()
+        async with self._client.pipeline(transaction=False) as pipe:
+            for point in points:
+                pipe.publish(metric_channel(point.type), encode_point(point))
+            query_cache.queue_invalidations(pipe, points)
+            await pipe.execute()
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while not self._closing:
+            delay = self.flush_interval
+            if self.failures:
+                delay = min(delay * 2**self.failures, MAX_RETRY_SECONDS)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+
+ingest_buffer = IngestBuffer(wal_dir=settings.wal_dir)
+
+registry.callback(
+    "rad_ingest_backlog_points",
+    "Ingested points not yet delivered to the database and Redis, per worker.",
+    (),
+    lambda: [((), len(ingest_buffer))],
+)
+registry.callback(
+    "rad_ingest_wal_bytes",
+    "Disk taken by this worker's ingest write-ahead log segments.",
+    (),
+    lambda: [((), ingest_buffer.wal_bytes)],
+)
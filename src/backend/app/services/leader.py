@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from collections.abc import Awaitable, Callable
+
+import redis.asyncio as redis
+from redis.exceptions import WatchError
+
+from app.core.config import settings
+from app.services.fanout import RedisFactory, default_redis
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderLock:
+    """A Redis lease held by one process: `SET NX PX` to take it, checked renewals.
+
+    Renewal and release only touch the key while it still holds this process's
+    token (a `WATCH`ed transaction), so a worker that stalled past the lease can
+    never extend or delete its successor's lock.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        redis_factory: RedisFactory = default_redis,
+        ttl: float | None = None,
+    ) -> None:
+        self.key = f"leader:{name}"
+        self.ttl = ttl or settings.leader_lease_seconds
+        self.token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._redis_factory = redis_factory
+        self._client: redis.Redis | None = None
+
+    async def acquire(self) -> bool:
+        return bool(
+            await self._redis().set(self.key, self.token, nx=True, px=self._ttl_ms)
+        )
+
+    async def renew(self) -> bool:
+        return await self._if_held(lambda pipe: pipe.pexpire(self.key, self._ttl_ms))
+
+    async def release(self) -> bool:
+        return await self._if_held(lambda pipe: pipe.delete(self.key))
+
+    async def holder(self) -> str | None:
+        return await self._redis().get(self.key)
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def _ttl_ms(self) -> int:
+        return max(int(self.ttl * 1000), 1)
+
+    async def _if_held(
+        self, command: Callable[[redis.client.Pipeline], object]
+    ) -> bool:
+        async with self._redis().pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(self.key)
+                if await pipe.get(self.key) != self.token:
+                    return False
+                pipe.multi()
+                command(pipe)
+                await pipe.execute()
+            except WatchError:
+                return False
+        return True
+
+    def _redis(self) -> redis.Redis:
+        if self._client is None:
+            self._client = self._redis_factory()
+        return self._client
+
+
+class SingletonTask:
+    """Runs `job` in exactly one process across every worker and node.
+
+    Each process competes for a `LeaderLock`; the holder runs the job and renews
+    the lease every third of its lifetime. A failed renewal cancels the job at
+    once, so two copies overlap for at most the time the old leader took to
+    notice. A job that returns is done: this process stops competing for it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        job: Callable[[], Awaitable[None]],
+        redis_factory: RedisFactory = default_redis,
+        ttl: float | None = None,
+        enabled: bool | None = None,
+    ) -> None:
+        self.name = name
+        self._job = job
+        self.lock = LeaderLock(name, redis_factory, ttl)
+        self.enabled = settings.leader_election_enabled if enabled is None else enabled
+        self.is_leader = False
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await self.lock.close()
+
+    async def _run(self) -> None:
+        if not self.enabled:
+            await self._job()
+            return
+        interval = self.lock.ttl / 3
+        while True:
+            try:
+                acquired = await self.lock.acquire()
+            except Exception as exc:
+                logger.warning("Leader election for %s failed: %s", self.name, exc)
+                acquired = False
+            if acquired and await self._lead(interval):
+                return
+            await asyncio.sleep(interval)
+
+    async def _lead(self, interval: float) -> bool:
+        """Run the job while the lease holds; True once it returned normally."""
+        logger.info("Leading %s as %s", self.name, self.lock.token)
+        self.is_leader = True
+        job = asyncio.create_task(self._job())
+        try:
+            while True:
+                done, _ = await asyncio.wait({job}, timeout=interval)
+                if done:
+                    job.result()
+                    return True
+                try:
+                    renewed = await self.lock.renew()
+                except Exception as exc:
+                    logger.warning("Could not renew %s lease: %s", self.name, exc)
+                    renewed = False
+                if not renewed:
+                    logger.warning("Lost leadership of %s; stopping it", self.name)
+                    return False
+        except Exception:
+            logger.exception("%s failed; handing leadership over", self.name)
+            return False
+        finally:
+            self.is_leader = False
+            job.cancel()
+            await asyncio.gather(job, return_exceptions=True)
+            try:
+                await asyncio.wait_for(self.lock.release(), interval)
+            except (Exception, asyncio.TimeoutError):
+                pass  # the lease simply expires
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+from collections.abc import Callable, Mapping
+from datetime import UTC, date, datetime, timedelta
+
+from sqlalchemy import delete, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.metric import Metric, MetricRollup1h, MetricRollup1m, RollupMixin
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PARTITION = "metrics_default"
+_PARTITION_NAME = re.compile(r"^metrics_p(\d{8})$")
+
+
+def partition_name(day: date) -> str:
+    return f"metrics_p{day:%Y%m%d}"
+
+
+def _is_partitioned(session: Session) -> bool:
+    return session.get_bind().dialect.name == "postgresql"
+
+
+def ensure_partitions(session: Session, start: date, days: int) -> list[str]:
+    """Create the daily partitions for `start` and the following `days` days.
+
+    A default partition catches rows outside every daily range so writes never fail.
+    Postgres refuses to create a partition whose range already has rows in the
+    default one (a point dated past the premake horizon), so a new day's table is
+    filled with those rows first and attached afterwards, in one transaction.
+    """
+    if not _is_partitioned(session):
+        return []
+    session.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF metrics DEFAULT"
+        )
+    )
+    existing = list_partitions(session)
+    created = []
+    for offset in range(days + 1):
+        day = start + timedelta(days=offset)
+        name = partition_name(day)
+        created.append(name)
+        if name in existing:
+            continue
+        lower = f"'{day.isoformat()}+00'"
+        upper = f"'{(day + timedelta(days=1)).isoformat()}+00'"
+        session.execute(
+            text(
+                f"CREATE TABLE {name} "
+                "(LIKE metrics INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+            )
+        )
+        session.execute(
+            text(
+                f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+                f"WHERE ts >= {lower} AND ts < {upper} RETURNING *) "
+                f"INSERT INTO {name} SELECT * FROM moved"
+            )
+        )
+        session.execute(
+            text(
+                f"ALTER TABLE metrics ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ({lower}) TO ({upper})"
+            )
+        )
+    session.commit()
+    return created
+
+
+def list_partitions(session: Session) -> dict[str, date]:
+    rows = session.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = 'metrics'"
+        )
+    ).scalars()
+    partitions = {}
+    for name in rows:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            partitions[name] = datetime.strptime(match.group(1), "%Y%m%d").date()
+    return partitions
+
+
+def drop_expired(session: Session, now: datetime, retention_days: int) -> list[str]:
+    """Drop whole daily partitions older than the retention window.
+
+    Without partitioning (SQLite in development) this falls back to a `DELETE`.
+    """
+    cutoff = now.astimezone(UTC) - timedelta(days=retention_days)
+    if not _is_partitioned(session):
+        session.execute(delete(Metric).where(Metric.ts < cutoff))
+        session.commit()
+        return []
+    dropped = []
+    for name, day in sorted(list_partitions(session).items()):
+        if day + timedelta(days=1) <= cutoff.date():
+            session.execute(text(f"ALTER TABLE metrics DETACH PARTITION {name}"))
+            session.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+    # Stragglers in the default partition are few, so deleting them is cheap.
+    session.execute(
+        text(f"DELETE FROM {DEFAULT_PARTITION} WHERE ts < :cutoff"), {"cutoff": cutoff}
+    )
+    session.commit()
+    return dropped
+
+
+def prune_rollups(
+    session: Session, now: datetime, retention_days: Mapping[type[RollupMixin], int]
+) -> None:
+    """Delete rollup buckets older than each table's own retention."""
+    for model, days in retention_days.items():
+        cutoff = now.astimezone(UTC) - timedelta(days=days)
+        session.execute(delete(model).where(model.bucket < cutoff))
+    session.commit()
+
+
+class StorageMaintainer:
+    """Periodically pre-creates upcoming partitions and applies retention."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        interval: float | None = None,
+        clock: Callable[[], datetime] = lambda: datetime.now(tz=UTC),
+    ) -> None:
+        self._session_factory = session_factory
+        self.interval = interval or settings.metrics_maintenance_interval_seconds
+        self._clock = clock
+
+    def run_once(self) -> list[str]:
+        now = self._clock()
+        dropped: list[str] = []
+        with self._session_factory() as session:
+            # Retention must not wait on partition creation, or a failure there
+            # would let expired data pile up.
+            try:
+                ensure_partitions(
+                    session, now.date(), settings.metrics_partition_premake_days
+                )
+            except Exception:
+                session.rollback()
+                logger.exception("Could not create upcoming metric partitions")
+            try:
+                dropped = drop_expired(session, now, settings.metrics_retention_days)
+                prune_rollups(
+                    session,
+                    now,
+                    {
+                        MetricRollup1m: settings.metrics_rollup_1m_retention_days,
+                        MetricRollup1h: settings.metrics_rollup_1h_retention_days,
+                    },
+                )
+            except Exception:
+                session.rollback()
+                logger.exception("Could not apply metric retention")
+        if dropped:
+            logger.info("Dropped expired metric partitions: %s", ", ".join(dropped))
+        return dropped
+
+    async def run(self) -> None:
+        """Maintain storage forever; the app runs this on the elected leader only."""
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception:
+                logger.exception("Metric storage maintenance failed")
+            await asyncio.sleep(self.interval)
+
+
+storage_maintainer = StorageMaintainer()
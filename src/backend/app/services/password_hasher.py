@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from collections import Counter
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, TypeVar
+
+from app.core.config import settings
+from app.core.security import get_password_hash, verify_password
+from app.core.telemetry import registry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Verified when the email is unknown so the response time does not reveal it.
+_DUMMY_HASH = "$2b$12$/qMunNIRjzSP9qSxbWJLSuGcLKY1sxYLXXBGWcolDEVGfl78e.OFW"
+
+_BCRYPT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_bcrypt_seconds = registry.histogram(
+    "rad_bcrypt_seconds",
+    "bcrypt time in the hashing pool, by operation.",
+    ("op",),
+    _BCRYPT_BUCKETS,
+)
+_bcrypt_queue_seconds = registry.histogram(
+    "rad_bcrypt_queue_wait_seconds",
+    "Time a bcrypt job waited for a pool worker.",
+    buckets=_BCRYPT_BUCKETS,
+).labels()
+_bcrypt_rejected = registry.counter(
+    "rad_bcrypt_rejected_total", "bcrypt jobs refused because the pool was full."
+).labels()
+
+
+class HasherBusyError(Exception):
+    def __init__(self, reason: str, retry_after: int = 1) -> None:
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+@dataclass(slots=True)
+class Timing:
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def as_dict(self) -> dict[str, float]:
+        mean = self.total / self.count if self.count else 0.0
+        return {"count": self.count, "mean": mean, "max": self.max}
+
+
+def _timed(func: Callable[..., T], *args: Any) -> tuple[float, float, T]:
+    started = time.monotonic()
+    result = func(*args)
+    return started, time.monotonic(), result
+
+
+class PasswordHasher:
+    """Runs bcrypt in a dedicated process pool, off the request threadpool.
+
+    At most `max_workers + max_queue` jobs are admitted at once and each key (client
+    IP, email) may hold `per_key_limit` of them; anything beyond that is rejected with
+    `HasherBusyError` instead of queueing behind other logins.
+    """
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        max_queue: int | None = None,
+        per_key_limit: int | None = None,
+        executor_factory: Callable[[int], Executor] | None = None,
+    ) -> None:
+        self.max_workers = max_workers or settings.password_hash_workers
+        self.max_queue = (
+            settings.password_hash_max_queue if max_queue is None else max_queue
+        )
+        self.per_key_limit = per_key_limit or settings.login_max_concurrency_per_key
+        self._executor_factory = executor_factory or self._default_executor
+        self._executor: Executor | None = None
+        self._inflight = 0
+        self._per_key: Counter[str] = Counter()
+        self.rejected = 0
+        self.latency = Timing()
+        self.queue_wait = Timing()
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    async def verify(
+        self, password: str, hashed_password: str | None, keys: Iterable[str] = ()
+    ) -> bool:
+        if hashed_password is None:
+            await self._run(verify_password, keys, password, _DUMMY_HASH)
+            return False
+        return await self._run(verify_password, keys, password, hashed_password)
+
+    async def hash(self, password: str, keys: Iterable[str] = ()) -> str:
+        return await self._run(
+            get_password_hash, keys, password, settings.bcrypt_rounds
+        )
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "inflight": self._inflight,
+            "rejected": self.rejected,
+            "latency": self.latency.as_dict(),
+            "queue_wait": self.queue_wait.as_dict(),
+        }
+
+    def close(self) -> None:
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, func: Callable[..., T], keys: Iterable[str], *args: Any) -> T:
+        with self._admit(keys):
+            submitted = time.monotonic()
+            loop = asyncio.get_running_loop()
+            started, finished, result = await loop.run_in_executor(
+                self._pool(), _timed, func, *args
+            )
+        waited = max(started - submitted, 0.0)
+        self.queue_wait.observe(waited)
+        self.latency.observe(finished - started)
+        _bcrypt_queue_seconds.observe(waited)
+        _bcrypt_seconds.labels(func.__name__).observe(finished - started)
+        return result
+
+    @contextmanager
+    def _admit(self, keys: Iterable[str]) -> Iterator[None]:
+        keys = [key for key in keys if key]
+        if self._inflight >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            _bcrypt_rejected.inc()
+            raise HasherBusyError("password hashing queue is full")
+        if any(self._per_key[key] >= self.per_key_limit for key in keys):
+            self.rejected += 1
+            _bcrypt_rejected.inc()
+            raise HasherBusyError("too many concurrent logins")
+        self._inflight += 1
+        self._per_key.update(keys)
+        try:
+            yield
+        finally:
+            self._inflight -= 1
+            self._per_key.subtract(keys)
+            for key in keys:
+                if self._per_key[key] <= 0:
+                    self._per_key.pop(key, None)
+
+    def _pool(self) -> Executor:
+        if self._executor is None:
+            self._executor = self._executor_factory(self.max_workers)
+        return self._executor
+
+    @staticmethod
+    def _default_executor(max_workers: int) -> Executor:
+        # Forking a process that already runs an event loop and threads is unsafe.
+        context = multiprocessing.get_context("spawn")
+        return ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+
+
+password_hasher = PasswordHasher()
+
+registry.callback(
+    "rad_bcrypt_inflight",
+    "bcrypt jobs admitted and not yet finished.",
+    (),
+    lambda: [((), password_hasher.inflight)],
+)
@@ -0,0 +1,422 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from typing import TYPE_CHECKING
+
+import orjson
+import redis.asyncio as redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.telemetry import registry
+from app.services.fanout import (
+    MetricMessage,
+    MetricsHub,
+    RedisFactory,
+    Subscription,
+    default_redis,
+    hub,
+)
+from app.services.send_queue import OverflowPolicy, SendQueue
+from app.services.timeseries import Aggregation, SeriesColumns, query_series
+
+if TYPE_CHECKING:
+    from redis.asyncio.client import Pipeline
+
+    from app.services.ingest import IngestPoint
+
+logger = logging.getLogger(__name__)
+
+ChunkKey = tuple[str, str, int, int]
+
+# Late points are announced here so every worker drops the chunks they land in.
+INVALIDATION_CHANNEL = "query-cache:invalidate"
+INVALIDATION_QUEUE_SIZE = 1024
+
+# Rough per-entry and per-point footprint of a cached chunk in this process.
+ENTRY_OVERHEAD_BYTES = 200
+POINT_BYTES = 64
+# Bucket ends are exclusive but range filters are inclusive.
+_EPSILON = timedelta(microseconds=1)
+
+_lookups = registry.counter(
+    "rad_query_cache_lookups_total",
+    "Series chunk lookups by cache tier and outcome.",
+    ("tier", "result"),
+)
+_local_hit = _lookups.labels("local", "hit")
+_local_partial = _lookups.labels("local", "partial")
+_local_miss = _lookups.labels("local", "miss")
+_redis_hit = _lookups.labels("redis", "hit")
+_redis_miss = _lookups.labels("redis", "miss")
+
+
+def grid_time(index: int, step: int) -> datetime:
+    """Start of bucket `index` on the epoch-aligned `step`-second grid."""
+    return datetime.fromtimestamp(index * step, tz=UTC)
+
+
+def align_down(value: datetime, step: int) -> datetime:
+    return grid_time(math.floor(value.timestamp() / step), step)
+
+
+@dataclass(frozen=True, slots=True)
+class CachedChunk:
+    """Buckets of one chunk that are final, i.e. those before bucket `through`.
+
+    `version` is the type's invalidation count when the chunk was read from the
+    database; a shared copy is only trusted while that count is unchanged.
+    """
+
+    through: int
+    timestamps: list[datetime]
+    values: list[float]
+    version: int = 0
+
+    @property
+    def nbytes(self) -> int:
+        return ENTRY_OVERHEAD_BYTES + POINT_BYTES * len(self.values)
+
+    def to_json(self) -> bytes:
+        ts = [stamp.timestamp() for stamp in self.timestamps]
+        return orjson.dumps(
+            {
+                "through": self.through,
+                "ts": ts,
+                "values": self.values,
+                "version": self.version,
+            }
+        )
+
+    @classmethod
+    def from_json(cls, raw: bytes | str) -> CachedChunk:
+        data = orjson.loads(raw)
+        return cls(
+            through=data["through"],
+            timestamps=[datetime.fromtimestamp(ts, tz=UTC) for ts in data["ts"]],
+            values=data["values"],
+            version=data.get("version", 0),
+        )
+
+
+class QueryCache:
+    """Bucketed series split into fixed chunks of the epoch-aligned bucket grid.
+
+    A bucket is final once it ended `settle_seconds` ago, so every chunk keeps the
+    final buckets it has seen and only later ones are ever queried again. Entries
+    live in a per-process LRU bounded by size; with `redis_enabled`, chunks that
+    are final throughout are shared across workers in Redis for
+    `redis_ttl_seconds`.
+
+    Points can still arrive for final buckets (backfills, or a write-ahead log
+    replayed after an outage). The ingest flusher then bumps the type's version in
+    Redis, which retires the shared chunks, and announces the late range on
+    `INVALIDATION_CHANNEL`, on which every started cache drops its local chunks.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int | None = None,
+        chunk_buckets: int | None = None,
+        settle_seconds: float | None = None,
+        redis_enabled: bool | None = None,
+        redis_ttl_seconds: int | None = None,
+        redis_factory: RedisFactory = default_redis,
+        hub: MetricsHub = hub,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.max_bytes = max_bytes or settings.metrics_cache_max_bytes
+        self.chunk_buckets = chunk_buckets or settings.metrics_cache_chunk_buckets
+        self.settle_seconds = (
+            settings.metrics_cache_settle_seconds
+            if settle_seconds is None
+            else settle_seconds
+        )
+        self.redis_enabled = (
+            settings.metrics_cache_redis_enabled
+            if redis_enabled is None
+            else redis_enabled
+        )
+        self.redis_ttl_seconds = (
+            redis_ttl_seconds or settings.metrics_cache_redis_ttl_seconds
+        )
+        self._redis_factory = redis_factory
+        self._client: redis.Redis | None = None
+        self._hub = hub
+        self._clock = clock
+        self._entries: OrderedDict[ChunkKey, CachedChunk] = OrderedDict()
+        # Bumped per type by every invalidation, so a read that raced one is not
+        # stored.
+        self._generations: dict[str, int] = {}
+        self._task: asyncio.Task[None] | None = None
+        self._failures_seen = 0
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.nbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.nbytes = 0
+        self._generations = {
+            metric_type: generation + 1
+            for metric_type, generation in self._generations.items()
+        }
+
+    def invalidate(self, metric_type: str, start: float, end: float) -> None:
+        """Drop the chunks of `metric_type` holding buckets in `[start, end]`."""
+        self._generations[metric_type] = self._generations.get(metric_type, 0) + 1
+        stale = [
+            key
+            for key, entry in self._entries.items()
+            if key[0] == metric_type
+            and key[3] * self.chunk_buckets * key[2] <= end
+            and start < entry.through * key[2]
+        ]
+        for key in stale:
+            self.nbytes -= self._entries.pop(key).nbytes
+
+    def late_ranges(
+        self, points: Iterable[IngestPoint]
+    ) -> dict[str, tuple[float, float]]:
+        """Per type, the span of `points` that falls in buckets that may be final."""
+        settle_line = self._clock() - self.settle_seconds
+        ranges: dict[str, tuple[float, float]] = {}
+        for point in points:
+            ts = point.ts.timestamp()
+            if ts >= settle_line:
+                continue
+            low, high = ranges.get(point.type, (ts, ts))
+            ranges[point.type] = (min(low, ts), max(high, ts))
+        return ranges
+
+    def queue_invalidations(
+        self, pipe: Pipeline, points: Iterable[IngestPoint]
+    ) -> None:
+        """Add the commands retiring chunks that `points` change to `pipe`.
+
+        Called by the ingest flusher after the points were written, in the same
+        pipeline that publishes them.
+        """
+        for metric_type, (start, end) in self.late_ranges(points).items():
+            pipe.incr(_version_key(metric_type))
+            pipe.publish(
+                INVALIDATION_CHANNEL,
+                orjson.dumps({"type": metric_type, "from": start, "to": end}),
+            )
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        queue: SendQueue[MetricMessage] = SendQueue(
+            INVALIDATION_QUEUE_SIZE, policy=OverflowPolicy.DROP_OLDEST
+        )
+        try:
+            subscription = await self._hub.subscribe(INVALIDATION_CHANNEL, queue=queue)
+        except Exception as exc:
+            logger.warning("Query cache not following invalidations: %s", exc)
+            return
+        self._failures_seen = self._hub.read_failures
+        self._task = asyncio.create_task(self._consume(subscription))
+
+    async def close(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def series(
+        self,
+        session: AsyncSession,
+        metric_type: str,
+        start_at: datetime,
+        end_at: datetime,
+        step: int,
+        agg: Aggregation = Aggregation.AVG,
+    ) -> SeriesColumns:
+        """The buckets touching `[start_at, end_at]`, whole, on the epoch grid.
+
+        Final buckets come from the cache; only buckets that may still change are
+        queried every time.
+        """
+        if self._task is not None and self._hub.read_failures != self._failures_seen:
+            # Invalidations published while the hub could not read are lost.
+            self._failures_seen = self._hub.read_failures
+            self.clear()
+        first = math.floor(start_at.timestamp() / step)
+        last = math.floor(end_at.timestamp() / step)
+        final_before = math.floor((self._clock() - self.settle_seconds) / step)
+        columns = SeriesColumns(metric_type=metric_type, step=step)
+        index = first
+        while index <= last and index < final_before:
+            chunk = index // self.chunk_buckets
+            through = min((chunk + 1) * self.chunk_buckets, final_before)
+            key = (metric_type, agg.value, step, chunk)
+            entry = await self._chunk(session, key, through)
+            lower, upper = (
+                grid_time(index, step),
+                grid_time(min(through, last + 1), step),
+            )
+            for stamp, value in zip(entry.timestamps, entry.values):
+                if lower <= stamp < upper:
+                    columns.timestamps.append(stamp)
+                    columns.values.append(value)
+            index = through
+        if index <= last:
+            tail = await query_series(
+                session,
+                metric_type,
+                grid_time(index, step),
+                grid_time(last + 1, step) - _EPSILON,
+                step=step,
+                agg=agg,
+            )
+            columns.timestamps += tail.timestamps
+            columns.values += tail.values
+        return columns
+
+    async def _chunk(
+        self, session: AsyncSession, key: ChunkKey, through: int
+    ) -> CachedChunk:
+        metric_type, agg, step, chunk = key
+        cached = self._entries.get(key)
+        if cached is not None and cached.through >= through:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            _local_hit.inc()
+            return cached
+        (_local_miss if cached is None else _local_partial).inc()
+        generation = self._generations.get(metric_type, 0)
+        full = through == (chunk + 1) * self.chunk_buckets
+        version = None
+        if cached is None and full and self.redis_enabled:
+            shared, version = await self._redis_get(key)
+            if shared is not None:
+                self.hits += 1
+                if self._generations.get(metric_type, 0) == generation:
+                    self._store(key, shared)
+                return shared
+        self.misses += 1
+        start = cached.through if cached is not None else chunk * self.chunk_buckets
+        fresh = await query_series(
+            session,
+            metric_type,
+            grid_time(start, step),
+            grid_time(through, step) - _EPSILON,
+            step=step,
+            agg=Aggregation(agg),
+        )
+        entry = CachedChunk(
+            through=through,
+            timestamps=(cached.timestamps if cached else []) + fresh.timestamps,
+            values=(cached.values if cached else []) + fresh.values,
+            version=version or 0,
+        )
+        if self._generations.get(metric_type, 0) == generation:
+            self._store(key, entry)
+        # The version was read before the query, so a chunk that raced a late
+        # write is stored under the version that write retired.
+        if version is not None:
+            await self._redis_set(key, entry)
+        return entry
+
+    def _store(self, key: ChunkKey, entry: CachedChunk) -> None:
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.nbytes -= previous.nbytes
+        if entry.nbytes > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self.nbytes += entry.nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    async def _redis_get(self, key: ChunkKey) -> tuple[CachedChunk | None, int | None]:
+        """The shared chunk, if still current, and the type's current version."""
+        try:
+            raw, version = await self._redis().mget(
+                _redis_key(key), _version_key(key[0])
+            )
+        except Exception as exc:
+            logger.warning("Query cache Redis lookup failed: %s", exc)
+            return None, None
+        version = int(version or 0)
+        entry = CachedChunk.from_json(raw) if raw is not None else None
+        if entry is None or entry.version != version:
+            _redis_miss.inc()
+            return None, version
+        _redis_hit.inc()
+        return entry, version
+
+    async def _redis_set(self, key: ChunkKey, entry: CachedChunk) -> None:
+        try:
+            await self._redis().set(
+                _redis_key(key), entry.to_json(), ex=self.redis_ttl_seconds
+            )
+        except Exception as exc:
+            logger.warning("Query cache Redis write failed: %s", exc)
+
+    def _redis(self) -> redis.Redis:
+        if self._client is None:
+            self._client = self._redis_factory()
+        return self._client
+
+    def _apply(self, message: MetricMessage) -> None:
+        try:
+            data = message.data
+            self.invalidate(data["type"], float(data["from"]), float(data["to"]))
+        except (KeyError, TypeError, ValueError):
+            logger.warning("Ignoring malformed query cache invalidation")
+
+    async def _consume(self, subscription: Subscription) -> None:
+        queue = subscription.queue
+        try:
+            while True:
+                self._apply(await queue.get())
+                while len(queue):
+                    self._apply(queue.get_nowait())
+                if queue.dropped:
+                    queue.dropped = 0
+                    self.clear()
+        finally:
+            await subscription.close()
+
+
+def _redis_key(key: ChunkKey) -> str:
+    metric_type, agg, step, chunk = key
+    return f"query-cache:{metric_type}:{agg}:{step}:{chunk}"
+
+
+def _version_key(metric_type: str) -> str:
+    return f"query-cache:version:{metric_type}"
+
+
+query_cache = QueryCache()
+
+registry.callback(
+    "rad_query_cache_bytes",
+    "Estimated size of the in-process query cache.",
+    (),
+    lambda: [((), query_cache.nbytes)],
+)
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import enum
+from collections.abc import Callable, Sequence
+from typing import TypeVar
+
+import numpy as np
+
+from app.services.timeseries import SeriesColumns
+
+T = TypeVar("T")
+
+
+class Downsample(str, enum.Enum):
+    """How a series longer than the client's `max_points` is thinned."""
+
+    LTTB = "lttb"
+    MINMAX = "minmax"
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indexes of the points that keep the shape.
+
+    The first and last points are always kept; each of the `max_points - 2`
+    buckets in between contributes the point forming the largest triangle with
+    the point kept before it and the average of the next bucket. Bucket sums are
+    vectorized; only the dependent pick walks the buckets.
+    """
+    n = len(x)
+    if max_points >= n:
+        return np.arange(n)
+    if max_points < 3:
+        return np.array([0, n - 1][:max_points], dtype=np.int64)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+    counts = ends - starts
+    mean_x = np.add.reduceat(x[: n - 1], starts) / counts
+    mean_y = np.add.reduceat(y[: n - 1], starts) / counts
+    # Bucket i looks ahead to bucket i + 1; the last bucket to the final point.
+    next_x = np.r_[mean_x[1:], x[n - 1]]
+    next_y = np.r_[mean_y[1:], y[n - 1]]
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+        ax, ay = x[a], y[a]
+        area = np.abs(
+            (ax - next_x[i]) * (y[start:end] - ay)
+            - (ax - x[start:end]) * (next_y[i] - ay)
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y: np.ndarray, max_points: int) -> np.ndarray:
+    """Indexes of the lowest and highest point of `max_points // 2` equal buckets.
+
+    The envelope keeps every spike, which averaging or LTTB may smooth away.
+    """
+    n = len(y)
+    if max_points >= n:
+        return np.arange(n)
+    buckets = max(max_points // 2, 1)
+    starts = np.arange(buckets) * n // buckets
+    counts = np.diff(np.r_[starts, n])
+    picks = []
+    for extreme in (np.minimum, np.maximum):
+        # First position in each bucket that equals the bucket's extreme.
+        hits = np.flatnonzero(y == np.repeat(extreme.reduceat(y, starts), counts))
+        picks.append(hits[np.searchsorted(hits, starts)])
+    return np.unique(np.concatenate(picks))
+
+
+def reduce_indices(
+    x: np.ndarray, y: np.ndarray, max_points: int, method: Downsample
+) -> np.ndarray:
+    if method is Downsample.MINMAX:
+        return minmax_indices(y, max_points)
+    return lttb_indices(x, y, max_points)
+
+
+def reduce_series(
+    columns: SeriesColumns, max_points: int, method: Downsample
+) -> SeriesColumns:
+    """`columns` thinned to at most `max_points`; shorter series are returned as is."""
+    if len(columns) <= max_points:
+        return columns
+    timestamps = columns.timestamps
+    x = np.fromiter((ts.timestamp() for ts in timestamps), np.float64, len(columns))
+    y = np.asarray(columns.values, dtype=np.float64)
+    keep = reduce_indices(x, y, max_points, method).tolist()
+    values = y[keep].tolist()
+    return SeriesColumns(
+        metric_type=columns.metric_type,
+        step=columns.step,
+        timestamps=[timestamps[i] for i in keep],
+        values=values,
+    )
+
+
+def reduce_points(
+    points: Sequence[tuple[float, float]], max_points: int, method: Downsample
+) -> list[tuple[float, float]]:
+    """The same reduction for `(epoch seconds, value)` pairs, e.g. a WS snapshot."""
+    if len(points) <= max_points:
+        return list(points)
+    xy = np.asarray(points, dtype=np.float64)
+    keep = reduce_indices(xy[:, 0], xy[:, 1], max_points, method)
+    return [tuple(point) for point in xy[keep].tolist()]
+
+
+def fold_minmax(kept: list[T], item: T, value: Callable[[T], float]) -> list[T]:
+    """Streaming min/max envelope: fold `item` into the (at most two) kept items.
+
+    Keeps arrival order, so a live feed reduced per interval reads like the
+    envelope `minmax_indices` produces for stored data.
+    """
+    candidates = [*kept, item]
+    low = min(candidates, key=value)
+    high = max(candidates, key=value)
+    return [c for c in candidates if c is low or c is high]
@@ -0,0 +1,422 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import math
+import time
+import uuid
+from collections import deque
+from collections.abc import AsyncIterator, Callable, Iterator
+from dataclasses import dataclass
+from datetime import UTC, datetime
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.telemetry import Sample, registry
+from app.services.fanout import (
+    MetricMessage,
+    MetricsHub,
+    Subscription,
+    hub,
+    metric_channel,
+    series_key,
+)
+from app.services.reducers import Downsample, reduce_points
+from app.services.send_queue import OverflowPolicy, SendQueue
+from app.services.series import Labels
+from app.services.tenants import display_name
+from app.services.timeseries import as_utc, recent_points
+
+logger = logging.getLogger(__name__)
+
+# `(epoch seconds, value, labels)`; labelled series are interleaved in one list.
+SnapshotPoint = tuple[float, float, Labels]
+
+
+@dataclass(frozen=True, slots=True)
+class LogEntry:
+    """One sequenced point; `frame` is the delta exactly as sent to clients."""
+
+    type: str
+    seq: int
+    ts: float
+    value: float
+    frame: str
+    labels: Labels = ()
+
+
+def delta_frame(seq: int, raw: str) -> str:
+    # `raw` is already JSON, so the frame is spliced rather than re-encoded.
+    return f'{{"kind":"delta","seq":{seq},"data":{raw}}}'
+
+
+def snapshot_frame(
+    metric_type: str, epoch: str, seq: int, points: list[SnapshotPoint]
+) -> str:
+    return json.dumps(
+        {
+            "kind": "snapshot",
+            "type": metric_type,
+            "epoch": epoch,
+            "seq": seq,
+            "points": [
+                [round(ts * 1000), value, dict(labels)]
+                if labels
+                else [round(ts * 1000), value]
+                for ts, value, labels in points
+            ],
+        },
+        separators=(",", ":"),
+    )
+
+
+def reduce_per_series(
+    points: list[SnapshotPoint], max_points: int, method: Downsample
+) -> list[SnapshotPoint]:
+    """Thin each series of a snapshot to `max_points` on its own."""
+    by_series: dict[Labels, list[tuple[float, float]]] = {}
+    for ts, value, labels in points:
+        by_series.setdefault(labels, []).append((ts, value))
+    return sorted(
+        (ts, value, labels)
+        for labels, series in by_series.items()
+        for ts, value in reduce_points(series, max_points, method)
+    )
+
+
+class ReplayLog:
+    """Recent entries of one metric type, bounded by count and age."""
+
+    def __init__(
+        self, max_entries: int, max_age: float, covered_since: float, last_seq: int = 0
+    ) -> None:
+        self.max_age = max_age
+        self.entries: deque[LogEntry] = deque(maxlen=max_entries)
+        self.last_seq = last_seq
+        # Every point published after this moment is in the log (or was evicted).
+        self.covered_since = covered_since
+
+    def append(self, entry: LogEntry, now: float) -> None:
+        if len(self.entries) == self.entries.maxlen:
+            self.covered_since = max(self.covered_since, self.entries[0].ts)
+        self.entries.append(entry)
+        self.last_seq = entry.seq
+        cutoff = now - self.max_age
+        while self.entries and self.entries[0].ts < cutoff:
+            self.covered_since = max(self.covered_since, self.entries.popleft().ts)
+
+    def since(self, seq: int) -> list[LogEntry] | None:
+        """Entries after `seq`, or None when some of them are no longer held."""
+        if seq > self.last_seq:
+            return None
+        first_seq = self.entries[0].seq if self.entries else self.last_seq + 1
+        if seq < first_seq - 1:
+            return None
+        return [entry for entry in self.entries if entry.seq > seq]
+
+
+class ReplaySubscription:
+    def __init__(
+        self, broker: ReplayBroker, metric_type: str, queue: SendQueue[LogEntry]
+    ) -> None:
+        self.broker = broker
+        self.metric_type = metric_type
+        self.queue = queue
+
+    async def __aiter__(self) -> AsyncIterator[LogEntry]:
+        while True:
+            yield await self.queue.get()
+
+    async def close(self) -> None:
+        await self.broker.detach(self)
+
+
+class ReplayBroker:
+    """Sequences the metrics stream per type and fans it out to WebSocket clients.
+
+    A type is subscribed (and its log started) when its first client attaches and
+    dropped `linger_seconds` after its last one left, so a client reconnecting
+    shortly after can still resume.
+
+    Sequence numbers are per process, so they are only meaningful together with
+    `epoch`; a client resuming against another worker gets a fresh snapshot
+    instead of deltas. Whenever points of a type may have been missed (a gap in
+    the stream, or the type was not followed for a while) its log restarts one
+    sequence number further on, so every client that saw the old numbers gets a
+    snapshot and live clients see the jump.
+    """
+
+    def __init__(
+        self,
+        hub: MetricsHub = hub,
+        snapshot_seconds: float | None = None,
+        max_entries: int | None = None,
+        linger_seconds: float | None = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._hub = hub
+        self.snapshot_seconds = snapshot_seconds or settings.ws_snapshot_seconds
+        self.max_entries = max_entries or settings.ws_replay_max_entries
+        self.linger_seconds = (
+            settings.ws_replay_linger_seconds
+            if linger_seconds is None
+            else linger_seconds
+        )
+        self._clock = clock
+        self._logs: dict[str, ReplayLog] = {}
+        self._last_seqs: dict[str, int] = {}
+        self._subscribers: dict[str, set[ReplaySubscription]] = {}
+        self._feeds: dict[str, tuple[Subscription, asyncio.Task[None]]] = {}
+        self._expiries: dict[str, asyncio.Task[None]] = {}
+        self._follow_lock = asyncio.Lock()
+        self._failures_seen = 0
+        self.epoch = uuid.uuid4().hex[:12]
+
+    def new_queue(self) -> SendQueue[LogEntry]:
+        # Deltas are sequenced, so they are never conflated; a client that falls
+        # behind far enough to lose one is disconnected and resumes instead.
+        return SendQueue(
+            settings.ws_queue_size,
+            policy=OverflowPolicy.DROP_OLDEST,
+            max_lag=settings.ws_max_lag_seconds,
+        )
+
+    def subscriber_count(self, metric_type: str | None = None) -> int:
+        if metric_type is not None:
+            return len(self._subscribers.get(metric_type, ()))
+        return sum(len(subs) for subs in self._subscribers.values())
+
+    def subscriber_counts(self) -> dict[str, int]:
+        return {type_: len(subs) for type_, subs in self._subscribers.items()}
+
+    def queues(self) -> list[SendQueue[LogEntry]]:
+        return [sub.queue for subs in self._subscribers.values() for sub in subs]
+
+    def followed(self) -> set[str]:
+        return set(self._feeds)
+
+    async def close(self) -> None:
+        tasks = [*self._expiries.values()]
+        feeds, self._feeds = self._feeds, {}
+        for subscription, task in feeds.values():
+            tasks.append(task)
+            await subscription.close()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._expiries.clear()
+        self._logs.clear()
+        self._subscribers.clear()
+        self._follow_lock = asyncio.Lock()
+
+    async def attach(
+        self,
+        metric_type: str,
+        session: AsyncSession,
+        queue: SendQueue[LogEntry],
+        last_seq: int | None = None,
+        epoch: str | None = None,
+        max_points: int | None = None,
+        downsample: Downsample = Downsample.LTTB,
+    ) -> tuple[list[str], ReplaySubscription]:
+        """Register a client and return the frames it must receive first.
+
+        A client resuming with this process's `epoch` and a `last_seq` still in the
+        log gets only the deltas it missed. Anyone else gets a snapshot of the last
+        `snapshot_seconds`, each series (label set) thinned to `max_points` if
+        given. Live deltas queued after that never overlap it.
+        """
+        await self._follow(metric_type)
+        self._check_gaps()
+        log = self._log(metric_type)
+        subscription = ReplaySubscription(self, metric_type, queue)
+        self._subscribers.setdefault(metric_type, set()).add(subscription)
+
+        if epoch == self.epoch and last_seq is not None:
+            missed = log.since(last_seq)
+            if missed is not None:
+                return [entry.frame for entry in missed], subscription
+
+        now = self._clock()
+        start = now - self.snapshot_seconds
+        seq = log.last_seq
+        points = sorted(
+            (entry.ts, entry.value, entry.labels)
+            for entry in log.entries
+            if entry.ts > log.covered_since
+            and entry.ts >= start
+            and math.isfinite(entry.value)
+        )
+        if start <= log.covered_since:
+            try:
+                older = await recent_points(
+                    session,
+                    metric_type,
+                    datetime.fromtimestamp(start, tz=UTC),
+                    datetime.fromtimestamp(log.covered_since, tz=UTC),
+                )
+            except Exception:
+                await subscription.close()
+                raise
+            points = [
+                (ts.timestamp(), value, labels) for ts, value, labels in older
+            ] + points
+        if max_points is not None:
+            points = reduce_per_series(points, max_points, downsample)
+        frame = snapshot_frame(display_name(metric_type), self.epoch, seq, points)
+        return [frame], subscription
+
+    async def detach(self, subscription: ReplaySubscription) -> None:
+        metric_type = subscription.metric_type
+        subscribers = self._subscribers.get(metric_type)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if subscribers:
+            return
+        del self._subscribers[metric_type]
+        if self.linger_seconds > 0:
+            self._expiries[metric_type] = asyncio.create_task(self._expire(metric_type))
+        else:
+            await self._unfollow(metric_type)
+
+    def publish(self, message: MetricMessage) -> None:
+        data = message.data
+        metric_type = series_key(message)
+        try:
+            ts = as_utc(datetime.fromisoformat(data["timestamp"])).timestamp()
+            value = float(data["value"])
+        except (KeyError, TypeError, ValueError):
+            ts, value = self._clock(), math.nan
+        labels = data.get("labels")
+        # Published labels are already validated and sorted.
+        labels = tuple(labels.items()) if isinstance(labels, dict) else ()
+        log = self._log(metric_type)
+        seq = log.last_seq + 1
+        frame = delta_frame(seq, message.raw)
+        entry = LogEntry(metric_type, seq, ts, value, frame, labels)
+        log.append(entry, self._clock())
+        for subscription in tuple(self._subscribers.get(metric_type, ())):
+            subscription.queue.put(entry)
+
+    def _log(self, metric_type: str) -> ReplayLog:
+        log = self._logs.get(metric_type)
+        if log is None:
+            log = self._logs[metric_type] = ReplayLog(
+                self.max_entries,
+                self.snapshot_seconds,
+                self._clock(),
+                self._last_seqs.get(metric_type, 0),
+            )
+        return log
+
+    def _restart_log(self, metric_type: str) -> None:
+        """Start the log of `metric_type` over from now, skipping a sequence number."""
+        previous = self._logs.pop(metric_type, None)
+        last_seq = (
+            previous.last_seq
+            if previous is not None
+            else self._last_seqs.get(metric_type)
+        )
+        # Sequence numbers keep counting up so live clients never see them go back.
+        self._last_seqs[metric_type] = 0 if last_seq is None else last_seq + 1
+        self._log(metric_type)
+
+    async def _follow(self, metric_type: str) -> None:
+        async with self._follow_lock:
+            expiry = self._expiries.pop(metric_type, None)
+            if expiry is not None:
+                expiry.cancel()
+            if metric_type in self._feeds:
+                return
+            queue: SendQueue[MetricMessage] = SendQueue(
+                settings.ws_replay_queue_size, policy=OverflowPolicy.DROP_OLDEST
+            )
+            subscription = await self._hub.subscribe(
+                metric_channel(metric_type), queue=queue
+            )
+            self._restart_log(metric_type)
+            task = asyncio.create_task(self._consume(metric_type, subscription))
+            self._feeds[metric_type] = (subscription, task)
+
+    async def _unfollow(self, metric_type: str) -> None:
+        feed = self._feeds.pop(metric_type, None)
+        log = self._logs.pop(metric_type, None)
+        if log is not None:
+            self._last_seqs[metric_type] = log.last_seq
+        if feed is not None:
+            subscription, task = feed
+            task.cancel()
+            await subscription.close()
+
+    async def _expire(self, metric_type: str) -> None:
+        await asyncio.sleep(self.linger_seconds)
+        async with self._follow_lock:
+            self._expiries.pop(metric_type, None)
+            if not self._subscribers.get(metric_type):
+                await self._unfollow(metric_type)
+
+    def _reset(self) -> None:
+        """Start a new epoch; every log restarts and resuming clients get a snapshot."""
+        self.epoch = uuid.uuid4().hex[:12]
+        self._failures_seen = self._hub.read_failures
+        for metric_type in list(self._logs):
+            self._restart_log(metric_type)
+
+    def _check_gaps(self) -> None:
+        if self._hub.read_failures != self._failures_seen:
+            logger.warning("Metrics stream had a gap; starting a new replay epoch")
+            self._reset()
+
+    async def _consume(self, metric_type: str, subscription: Subscription) -> None:
+        queue = subscription.queue
+        while True:
+            message = await queue.get()
+            self._check_gaps()
+            if queue.dropped:
+                logger.warning("Replay queue for %s overflowed", metric_type)
+                queue.dropped = 0
+                self._restart_log(metric_type)
+            self.publish(message)
+            while len(queue):
+                self.publish(queue.get_nowait())
+
+
+replay_broker = ReplayBroker()
+
+
+def _fanout_queues() -> Iterator[tuple[str, list[SendQueue]]]:
+    yield "hub", hub.queues()
+    yield "replay", replay_broker.queues()
+
+
+def _fanout_lag() -> Iterator[Sample]:
+    for stage, queues in _fanout_queues():
+        yield (stage,), max((queue.lag for queue in queues), default=0.0)
+
+
+def _fanout_pending() -> Iterator[Sample]:
+    for stage, queues in _fanout_queues():
+        yield (stage,), sum(len(queue) for queue in queues)
+
+
+registry.callback(
+    "rad_ws_subscribers",
+    "/ws/metrics clients per metric type.",
+    ("type",),
+    lambda: [((type_,), n) for type_, n in replay_broker.subscriber_counts().items()],
+)
+registry.callback(
+    "rad_fanout_lag_seconds",
+    "Age of the oldest undelivered message across send queues.",
+    ("stage",),
+    _fanout_lag,
+)
+registry.callback(
+    "rad_fanout_pending",
+    "Messages waiting in send queues.",
+    ("stage",),
+    _fanout_pending,
+)
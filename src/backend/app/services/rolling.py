@@ -0,0 +1,408 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Sequence
+from datetime import datetime
+from typing import Any
+
+from app.core.config import settings
+from app.services.fanout import (
+    MetricMessage,
+    MetricsHub,
+    Subscription,
+    hub,
+    series_key,
+)
+from app.services.send_queue import OverflowPolicy, SendQueue
+from app.services.series import Labels
+from app.services.tenants import display_name
+from app.services.timeseries import as_utc
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PATTERN = "metrics:*"
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+
+
+class DDSketch:
+    """Quantile sketch with relative accuracy `alpha` (DDSketch).
+
+    Values fall into logarithmic buckets `gamma**(i-1) < |v| <= gamma**i`, so any
+    quantile is off by at most `alpha` relative to the true value. Buckets are
+    plain counts: sketches merge by adding them and a value leaves a sliding
+    window by decrementing its bucket. Size depends on the range of the values,
+    not on how many there are.
+    """
+
+    __slots__ = (
+        "alpha",
+        "count",
+        "zeros",
+        "_gamma",
+        "_log_gamma",
+        "_positive",
+        "_negative",
+    )
+
+    def __init__(self, alpha: float = 0.01) -> None:
+        self.alpha = alpha
+        self._gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self._gamma)
+        self._positive: dict[int, int] = {}
+        self._negative: dict[int, int] = {}
+        self.count = 0
+        self.zeros = 0
+
+    @property
+    def bucket_count(self) -> int:
+        return len(self._positive) + len(self._negative)
+
+    def add(self, value: float, weight: int = 1) -> None:
+        self.count += weight
+        if value == 0:
+            self.zeros += weight
+            return
+        buckets = self._positive if value > 0 else self._negative
+        index = self._index(abs(value))
+        count = buckets.get(index, 0) + weight
+        if count:
+            buckets[index] = count
+        else:
+            del buckets[index]
+
+    def remove(self, value: float) -> None:
+        self.add(value, -1)
+
+    def merge(self, other: DDSketch) -> None:
+        if other.alpha != self.alpha:
+            raise ValueError("sketches with different accuracy cannot be merged")
+        self.count += other.count
+        self.zeros += other.zeros
+        for mine, theirs in (
+            (self._positive, other._positive),
+            (self._negative, other._negative),
+        ):
+            for index, count in theirs.items():
+                mine[index] = mine.get(index, 0) + count
+
+    def quantiles(self, qs: Sequence[float]) -> list[float | None]:
+        """Estimates for every `q` in `qs` from one ordered pass over the buckets."""
+        total = self.count
+        if not total:
+            return [None] * len(qs)
+        # (rank of the last value in the bucket, representative value), ascending.
+        ordered: list[tuple[int, float]] = []
+        seen = 0
+        for index in sorted(self._negative, reverse=True):
+            seen += self._negative[index]
+            ordered.append((seen, -self._value(index)))
+        if self.zeros:
+            seen += self.zeros
+            ordered.append((seen, 0.0))
+        for index in sorted(self._positive):
+            seen += self._positive[index]
+            ordered.append((seen, self._value(index)))
+
+        results = []
+        for q in qs:
+            rank = q * (total - 1)
+            for last_rank, value in ordered:
+                if rank < last_rank:
+                    results.append(value)
+                    break
+            else:
+                results.append(ordered[-1][1])
+        return results
+
+    def _index(self, magnitude: float) -> int:
+        return math.ceil(math.log(magnitude) / self._log_gamma)
+
+    def _value(self, index: int) -> float:
+        # The point of the bucket whose relative error to either bound is `alpha`.
+        return 2 * self._gamma**index / (self._gamma + 1)
+
+
+class RollingWindow:
+    """Sum, count, min, max, rate and quantiles of the last `window` seconds.
+
+    Each point costs O(1) amortized: it is appended once and evicted once, min
+    and max come from monotonic deques and quantiles from a sketch the point is
+    added to and later removed from. A snapshot never looks at the points.
+    Eviction relies on points arriving in timestamp order, so `add` refuses one
+    older than the newest already held; keep one window per series, since
+    different producers of a type interleave.
+    """
+
+    __slots__ = (
+        "window",
+        "_points",
+        "_mins",
+        "_maxs",
+        "_sketch",
+        "_sum",
+        "_version",
+        "_cached",
+    )
+
+    def __init__(self, window: float, accuracy: float = 0.01) -> None:
+        self.window = window
+        self._points: deque[tuple[float, float]] = deque()
+        self._mins: deque[tuple[float, float]] = deque()
+        self._maxs: deque[tuple[float, float]] = deque()
+        self._sketch = DDSketch(accuracy)
+        self._sum = 0.0
+        self._version = 0
+        self._cached: tuple[int, tuple[float, ...], dict[str, Any]] | None = None
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def add(self, ts: float, value: float, now: float) -> bool:
+        """Add a point; False if it is already outside the window or out of order."""
+        cutoff = now - self.window
+        if ts <= cutoff:
+            return False  # arrived after it already left the window
+        if self._points and ts < self._points[-1][0]:
+            return False
+        self._points.append((ts, value))
+        self._sum += value
+        self._sketch.add(value)
+        mins, maxs = self._mins, self._maxs
+        while mins and mins[-1][1] >= value:
+            mins.pop()
+        mins.append((ts, value))
+        while maxs and maxs[-1][1] <= value:
+            maxs.pop()
+        maxs.append((ts, value))
+        self._version += 1
+        self.expire(now)
+        return True
+
+    def expire(self, now: float) -> None:
+        cutoff = now - self.window
+        points = self._points
+        if not points or points[0][0] > cutoff:
+            return
+        while points and points[0][0] <= cutoff:
+            _, value = points.popleft()
+            self._sum -= value
+            self._sketch.remove(value)
+        for extremes in (self._mins, self._maxs):
+            while extremes and extremes[0][0] <= cutoff:
+                extremes.popleft()
+        if not points:
+            self._sum = 0.0  # drop accumulated rounding error
+        self._version += 1
+
+    @property
+    def low(self) -> float | None:
+        return self._mins[0][1] if self._points else None
+
+    @property
+    def high(self) -> float | None:
+        return self._maxs[0][1] if self._points else None
+
+    @property
+    def rate(self) -> float | None:
+        """Change per second from the oldest to the newest point held."""
+        points = self._points
+        if len(points) > 1:
+            (first_ts, first), (last_ts, last) = points[0], points[-1]
+            if last_ts > first_ts:
+                return (last - first) / (last_ts - first_ts)
+        return None
+
+    def snapshot(
+        self, now: float, quantiles: Sequence[float] = DEFAULT_QUANTILES
+    ) -> dict[str, Any]:
+        self.expire(now)
+        key = tuple(quantiles)
+        cached = self._cached
+        if cached is not None and cached[0] == self._version and cached[1] == key:
+            return cached[2]
+        result = summarize(self.window, [self], quantiles)
+        self._cached = (self._version, key, result)
+        return result
+
+
+def summarize(
+    window: float,
+    parts: Sequence[RollingWindow],
+    quantiles: Sequence[float] = DEFAULT_QUANTILES,
+) -> dict[str, Any]:
+    """One snapshot of several series' windows, each already expired.
+
+    Sums and counts add up, min and max are taken over the parts, quantiles come
+    from their merged sketches, and `rate` is the sum of each series' own rate.
+    """
+    live = [part for part in parts if len(part)]
+    count = sum(len(part) for part in live)
+    total = sum(part._sum for part in live)
+    low = min((part.low for part in live), default=None)
+    high = max((part.high for part in live), default=None)
+    rates = [rate for part in live if (rate := part.rate) is not None]
+    if len(live) == 1:
+        sketch = live[0]._sketch
+    else:
+        sketch = DDSketch(parts[0]._sketch.alpha) if parts else DDSketch()
+        for part in live:
+            sketch.merge(part._sketch)
+    # A bucket's representative may lie just outside the values it holds.
+    estimates = [
+        None if v is None else min(max(v, low), high)
+        for v in sketch.quantiles(quantiles)
+    ]
+    return {
+        "window": window,
+        "count": count,
+        "sum": total if count else 0.0,
+        "mean": total / count if count else None,
+        "min": low,
+        "max": high,
+        "rate": sum(rates) if rates else None,
+        "points_per_second": count / window,
+        "quantiles": {format(q, "g"): v for q, v in zip(quantiles, estimates)},
+    }
+
+
+class RollingAggregates:
+    """Sliding-window aggregates per metric type, fed from the pub/sub stream.
+
+    Every worker receives every point, so each one keeps its own copy and answers
+    `GET /metrics/aggregate` and `/ws/aggregates` without a database round trip.
+    Windows are kept per series (type and labels), so interleaved producers of
+    one type each stay in order, and a query merges the series of its type (see
+    `summarize`). Memory grows with points per window: rate times the longest
+    window; series that went quiet are swept once they hold nothing. Points that
+    no window takes (out of order within their series, or older than every
+    window) and messages that do not parse are counted in `dropped`.
+    """
+
+    def __init__(
+        self,
+        windows: Iterable[float] | None = None,
+        accuracy: float | None = None,
+        hub: MetricsHub = hub,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.windows = tuple(sorted(windows or settings.rolling_windows))
+        self.accuracy = accuracy or settings.rolling_sketch_accuracy
+        self._hub = hub
+        self._clock = clock
+        self._series: dict[str, dict[Labels, dict[float, RollingWindow]]] = {}
+        self._swept = clock()
+        self._task: asyncio.Task[None] | None = None
+        self.dropped = 0
+
+    @property
+    def types(self) -> list[str]:
+        return sorted(self._series)
+
+    def add(
+        self, metric_type: str, ts: float, value: float, labels: Labels = ()
+    ) -> None:
+        series = self._series.setdefault(metric_type, {})
+        windows = series.get(labels)
+        if windows is None:
+            windows = series[labels] = {
+                window: RollingWindow(window, self.accuracy) for window in self.windows
+            }
+        now = self._clock()
+        accepted = False
+        for rolling in windows.values():
+            accepted |= rolling.add(ts, value, now)
+        if not accepted:
+            self.dropped += 1
+        if now - self._swept > self.windows[-1]:
+            self._sweep(now)
+
+    def _sweep(self, now: float) -> None:
+        """Forget series with nothing left in any window."""
+        self._swept = now
+        for metric_type in list(self._series):
+            series = self._series[metric_type]
+            for labels in list(series):
+                windows = series[labels].values()
+                for rolling in windows:
+                    rolling.expire(now)
+                if not any(len(rolling) for rolling in windows):
+                    del series[labels]
+            if not series:
+                del self._series[metric_type]
+
+    def add_message(self, message: MetricMessage) -> None:
+        data = message.data
+        try:
+            metric_type = series_key(message)
+            ts = as_utc(datetime.fromisoformat(data["timestamp"])).timestamp()
+            value = float(data["value"])
+            # Published labels are already validated and sorted.
+            labels = tuple((data.get("labels") or {}).items())
+        except (AttributeError, KeyError, TypeError, ValueError):
+            self.dropped += 1
+            return
+        if math.isfinite(value):
+            self.add(metric_type, ts, value, labels)
+
+    def query(
+        self,
+        metric_type: str,
+        window: float,
+        quantiles: Sequence[float] = DEFAULT_QUANTILES,
+    ) -> dict[str, Any]:
+        """Aggregates of `metric_type` over one of the configured `windows`."""
+        if window not in self.windows:
+            raise ValueError(f"window must be one of {list(self.windows)}")
+        now = self._clock()
+        parts = [
+            windows[window] for windows in self._series.get(metric_type, {}).values()
+        ]
+        if len(parts) == 1:
+            snapshot = parts[0].snapshot(now, quantiles)
+        else:
+            for rolling in parts:
+                rolling.expire(now)
+            snapshot = summarize(window, parts, quantiles)
+        return {"type": display_name(metric_type), **snapshot}
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        queue: SendQueue[MetricMessage] = SendQueue(
+            settings.rolling_queue_size, policy=OverflowPolicy.DROP_OLDEST
+        )
+        try:
+            subscription = await self._hub.subscribe(
+                CHANNEL_PATTERN, queue=queue, pattern=True
+            )
+        except Exception as exc:
+            logger.warning("Rolling aggregates disabled, could not subscribe: %s", exc)
+            return
+        self._task = asyncio.create_task(self._consume(subscription))
+
+    async def close(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        self._series.clear()
+
+    async def _consume(self, subscription: Subscription) -> None:
+        queue = subscription.queue
+        try:
+            while True:
+                self.add_message(await queue.get())
+                while len(queue):
+                    self.add_message(queue.get_nowait())
+                if queue.dropped:
+                    self.dropped += queue.dropped
+                    queue.dropped = 0
+        finally:
+            await subscription.close()
+
+
+rolling_aggregates = RollingAggregates()
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+from datetime import UTC, datetime, timedelta
+from typing import Any, Protocol
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models.metric import ROLLUPS, Metric, RollupMixin
+from app.services.timeseries import as_utc, bucket_index
+
+EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
+
+class RollupPoint(Protocol):
+    type: str
+    ts: datetime
+    value: float
+
+
+def bucket_start(ts: datetime, resolution: int) -> datetime:
+    seconds = int(as_utc(ts).timestamp())
+    return EPOCH + timedelta(seconds=seconds - seconds % resolution)
+
+
+def accumulate(
+    points: Iterable[RollupPoint], resolution: int
+) -> dict[tuple[str, datetime], list[float]]:
+    """Fold points into `[count, sum, min, max]` per `(type, bucket)`."""
+    partials: dict[tuple[str, int], list[float]] = {}
+    for point in points:
+        seconds = int(point.ts.timestamp())
+        key = (point.type, seconds - seconds % resolution)
+        partial = partials.get(key)
+        if partial is None:
+            partials[key] = [1, point.value, point.value, point.value]
+        else:
+            partial[0] += 1
+            partial[1] += point.value
+            if point.value < partial[2]:
+                partial[2] = point.value
+            if point.value > partial[3]:
+                partial[3] = point.value
+    return {
+        (metric_type, EPOCH + timedelta(seconds=bucket)): partial
+        for (metric_type, bucket), partial in partials.items()
+    }
+
+
+def coarsen(
+    partials: dict[tuple[str, datetime], list[float]], resolution: int
+) -> dict[tuple[str, datetime], list[float]]:
+    """Merge finer partials into `resolution`-second buckets."""
+    merged: dict[tuple[str, datetime], list[float]] = {}
+    for (metric_type, bucket), (count, total, low, high) in partials.items():
+        key = (metric_type, bucket_start(bucket, resolution))
+        partial = merged.get(key)
+        if partial is None:
+            merged[key] = [count, total, low, high]
+        else:
+            partial[0] += count
+            partial[1] += total
+            partial[2] = min(partial[2], low)
+            partial[3] = max(partial[3], high)
+    return merged
+
+
+def _upsert(
+    session: Session,
+    model: type[RollupMixin],
+    partials: dict[tuple[str, datetime], list[float]],
+    replace: bool = False,
+) -> None:
+    if not partials:
+        return
+    dialect = session.get_bind().dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    least, greatest = (
+        (func.least, func.greatest) if dialect == "postgresql" else (func.min, func.max)
+    )
+    stmt = insert(model)
+    excluded = stmt.excluded
+    if replace:
+        updates: dict[str, Any] = {
+            "count": excluded.count,
+            "sum": excluded.sum,
+            "min": excluded.min,
+            "max": excluded.max,
+        }
+    else:
+        updates = {
+            "count": model.count + excluded.count,
+            "sum": model.sum + excluded.sum,
+            "min": least(model.min, excluded.min),
+            "max": greatest(model.max, excluded.max),
+        }
+    stmt = stmt.on_conflict_do_update(index_elements=["type", "bucket"], set_=updates)
+    # Sorted keys give concurrent writers the same row-lock order.
+    rows = [
+        {
+            "type": metric_type,
+            "bucket": bucket,
+            "count": int(count),
+            "sum": total,
+            "min": low,
+            "max": high,
+        }
+        for (metric_type, bucket), (count, total, low, high) in sorted(partials.items())
+    ]
+    session.execute(stmt, rows)
+
+
+def upsert_rollups(session: Session, points: list[RollupPoint]) -> None:
+    """Fold a freshly written batch into every rollup table in the same transaction."""
+    finest, *coarser = sorted(ROLLUPS, key=lambda model: model.resolution)
+    partials = accumulate(points, finest.resolution)
+    _upsert(session, finest, partials)
+    for model in coarser:
+        partials = coarsen(partials, model.resolution)
+        _upsert(session, model, partials)
+
+
+def refresh_rollups(session: Session, start_at: datetime, end_at: datetime) -> None:
+    """Rebuild rollup buckets overlapping `[start_at, end_at)` from the raw table.
+
+    Meant for backfills and repairs while nothing is writing to the range; live
+    ingest keeps rollups current through `upsert_rollups`.
+    """
+    for model in ROLLUPS:
+        resolution = model.resolution
+        start = bucket_start(start_at, resolution)
+        end = bucket_start(end_at, resolution)
+        if end < as_utc(end_at):
+            end += timedelta(seconds=resolution)
+        index = bucket_index(session, Metric.ts, EPOCH, resolution)
+        stmt = (
+            select(
+                Metric.type,
+                index,
+                func.count(),
+                func.sum(Metric.value),
+                func.min(Metric.value),
+                func.max(Metric.value),
+            )
+            .where(Metric.ts >= start, Metric.ts < end)
+            .group_by(Metric.type, index)
+        )
+        partials = {
+            (metric_type, EPOCH + timedelta(seconds=bucket * resolution)): [
+                count,
+                total,
+                low,
+                high,
+            ]
+            for metric_type, bucket, count, total, low, high in session.execute(stmt)
+        }
+        session.execute(delete(model).where(model.bucket >= start, model.bucket < end))
+        _upsert(session, model, partials, replace=True)
+    session.commit()
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import asyncio
+import enum
+import itertools
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class OverflowPolicy(str, enum.Enum):
+    CONFLATE = "conflate"
+    DROP_OLDEST = "drop_oldest"
+
+
+class SlowConsumerError(Exception):
+    """Raised when a consumer falls further behind than the configured lag."""
+
+
+class SendQueue(Generic[T]):
+    """Non-blocking per-connection send buffer.
+
+    Producers never wait: with ``CONFLATE`` a pending item is replaced by a newer one
+    sharing its key, and in either policy the oldest item is discarded once ``maxsize``
+    is reached. A consumer whose oldest pending item is older than ``max_lag`` seconds
+    is flagged as lagging so the connection can be shed.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        policy: OverflowPolicy = OverflowPolicy.CONFLATE,
+        max_lag: float = 0.0,
+        key: Callable[[T], Hashable] | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.maxsize = max(maxsize, 1)
+        self.policy = OverflowPolicy(policy)
+        self.max_lag = max_lag
+        self.enqueued = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.conflated = 0
+        self._key = key
+        self._clock = clock
+        self._sequence = itertools.count()
+        self._items: OrderedDict[Hashable, tuple[float, T]] = OrderedDict()
+        self._ready = asyncio.Event()
+        self.lagged = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def lag(self) -> float:
+        if not self._items:
+            return 0.0
+        enqueued_at, _ = next(iter(self._items.values()))
+        return self._clock() - enqueued_at
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enqueued": self.enqueued,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "conflated": self.conflated,
+            "pending": len(self._items),
+        }
+
+    def put(self, item: T) -> None:
+        self.enqueued += 1
+        now = self._clock()
+        if self.policy is OverflowPolicy.CONFLATE and self._key is not None:
+            key = self._key(item)
+            pending = self._items.get(key)
+            if pending is not None:
+                self._items[key] = (pending[0], item)
+                self.conflated += 1
+                self._check_lag(now)
+                return
+        else:
+            key = next(self._sequence)
+        if len(self._items) >= self.maxsize:
+            self._items.popitem(last=False)
+            self.dropped += 1
+        self._items[key] = (now, item)
+        self._ready.set()
+        self._check_lag(now)
+
+    def get_nowait(self) -> T:
+        if not self._items:
+            raise asyncio.QueueEmpty
+        _, (_, item) = self._items.popitem(last=False)
+        self.delivered += 1
+        return item
+
+    async def get(self) -> T:
+        while not self._items:
+            if self.lagged.is_set():
+                raise SlowConsumerError
+            self._ready.clear()
+            await self._ready.wait()
+        if self.lagged.is_set():
+            raise SlowConsumerError
+        return self.get_nowait()
+
+    async def wait_lagged(self) -> None:
+        await self.lagged.wait()
+        raise SlowConsumerError
+
+    def _check_lag(self, now: float) -> None:
+        if self.max_lag <= 0 or self.lagged.is_set():
+            return
+        enqueued_at, _ = next(iter(self._items.values()))
+        if now - enqueued_at > self.max_lag:
+            self.lagged.set()
+            self._ready.set()
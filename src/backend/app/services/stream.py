@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import math
+import time
+from collections.abc import Callable, Hashable, Iterable
+from dataclasses import dataclass, field
+from fnmatch import fnmatchcase
+from typing import Literal
+
+from app.core.config import settings
+from app.services.fanout import (
+    MetricMessage,
+    MetricsHub,
+    Subscription,
+    conflation_key,
+    hub,
+    metric_channel,
+    series_key,
+)
+from app.services.reducers import fold_minmax
+from app.services.series import Matcher, matches_labels
+from app.services.tenants import display_name, namespace, qualify
+
+GLOB_CHARS = frozenset("*?[")
+
+
+class StreamLimitError(Exception):
+    """Raised when a connection asks for more subscriptions than allowed."""
+
+
+def is_pattern(metric_type: str) -> bool:
+    return not GLOB_CHARS.isdisjoint(metric_type)
+
+
+def batch_frame(messages: Iterable[MetricMessage]) -> str:
+    # Payloads are already JSON, so the batch is spliced rather than re-encoded.
+    raws = ",".join(message.raw for message in messages)
+    return '{"kind":"batch","points":[' + raws + "]}"
+
+
+@dataclass(frozen=True, slots=True)
+class StreamFilter:
+    """Per-subscription thinning applied before points are batched.
+
+    `interval` keeps only the latest point of a series per that many seconds, or
+    with `downsample="minmax"` the lowest and highest, and `threshold` drops points
+    whose value moved less than that since the last one kept. Zero disables either.
+    `matchers` keep only the series whose labels satisfy all of them.
+    """
+
+    interval: float = 0.0
+    threshold: float = 0.0
+    downsample: Literal["latest", "minmax"] = "latest"
+    matchers: tuple[Matcher, ...] = ()
+
+
+def _value(message: MetricMessage) -> float:
+    value = message.data.get("value")
+    return value if isinstance(value, int | float) else math.nan
+
+
+@dataclass(slots=True)
+class _SeriesState:
+    metric_type: str
+    filter: StreamFilter
+    last_emit: float = -math.inf
+    last_value: float | None = None
+    last_raw: str | None = None
+    pending: list[MetricMessage] = field(default_factory=list)
+
+
+class StreamSession:
+    """Subscriptions of one multiplexed WebSocket and the batch it sends next.
+
+    Every subscription shares one `SendQueue`, so the socket holds a single buffer
+    no matter how many types it follows; the hub still keeps one Redis subscription
+    per channel or pattern for the whole worker. Types and patterns are resolved
+    in `tenant`'s namespace, and points of other tenants are never accepted.
+    """
+
+    def __init__(
+        self,
+        hub: MetricsHub = hub,
+        max_subscriptions: int | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        tenant: str | None = None,
+    ) -> None:
+        self._hub = hub
+        self.tenant = tenant
+        self.max_subscriptions = (
+            max_subscriptions or settings.ws_stream_max_subscriptions
+        )
+        self._clock = clock
+        self.queue = hub.new_queue()
+        self._subscriptions: dict[str, tuple[Subscription, StreamFilter]] = {}
+        self._states: dict[Hashable, _SeriesState] = {}
+
+    @property
+    def patterns(self) -> list[str]:
+        return [display_name(pattern) for pattern in self._subscriptions]
+
+    async def subscribe(
+        self, metric_types: Iterable[str], stream_filter: StreamFilter
+    ) -> None:
+        """Follow `metric_types` (names or globs such as `disk.*`) with a filter.
+
+        Re-subscribing to a type only replaces its filter. Raises
+        `InvalidMetricTypeError` for a name outside the tenant's namespace.
+        """
+        metric_types = list(
+            dict.fromkeys(qualify(self.tenant, name) for name in metric_types)
+        )
+        if len(self._subscriptions.keys() | metric_types) > self.max_subscriptions:
+            raise StreamLimitError(
+                f"at most {self.max_subscriptions} subscriptions per connection"
+            )
+        for metric_type in metric_types:
+            current = self._subscriptions.get(metric_type)
+            if current is None:
+                subscription = await self._hub.subscribe(
+                    metric_channel(metric_type),
+                    queue=self.queue,
+                    pattern=is_pattern(metric_type),
+                )
+            else:
+                subscription = current[0]
+            self._subscriptions[metric_type] = (subscription, stream_filter)
+        self._refresh_states()
+
+    async def unsubscribe(self, metric_types: Iterable[str]) -> None:
+        await self._drop([qualify(self.tenant, name) for name in metric_types])
+
+    async def close(self) -> None:
+        await self._drop(list(self._subscriptions))
+
+    def accept(self, message: MetricMessage) -> None:
+        """Fold one received point into the pending batch, or drop it."""
+        metric_type = series_key(message)
+        if namespace(metric_type) != self.tenant:
+            return  # another tenant's point, matched by a broad pattern
+        identity = conflation_key(message)
+        state = self._states.get(identity)
+        if state is None:
+            stream_filter = self._resolve(metric_type)
+            if stream_filter is None:
+                return  # queued before its subscription went away
+            state = self._states[identity] = _SeriesState(metric_type, stream_filter)
+        if state.filter.matchers:
+            labels = message.data.get("labels")
+            if not matches_labels(
+                state.filter.matchers, labels if isinstance(labels, dict) else {}
+            ):
+                return
+        if message.raw == state.last_raw:
+            return  # the same point, matched by an overlapping pattern
+        value = message.data.get("value")
+        if isinstance(value, int | float):
+            threshold = state.filter.threshold
+            if (
+                threshold > 0
+                and state.last_value is not None
+                and abs(value - state.last_value) < threshold
+            ):
+                return
+            state.last_value = value
+        state.last_raw = message.raw
+        if state.filter.interval <= 0:
+            state.pending.append(message)
+        elif state.filter.downsample == "minmax" and isinstance(value, int | float):
+            state.pending[:] = fold_minmax(state.pending, message, _value)
+        else:
+            state.pending[:] = [message]
+
+    def flush(self) -> list[MetricMessage]:
+        """The points due in this tick's batch, in subscription order."""
+        now = self._clock()
+        batch: list[MetricMessage] = []
+        for state in self._states.values():
+            if not state.pending or now - state.last_emit < state.filter.interval:
+                continue
+            batch.extend(state.pending)
+            state.pending.clear()
+            state.last_emit = now
+        return batch
+
+    async def _drop(self, keys: list[str]) -> None:
+        for key in keys:
+            current = self._subscriptions.pop(key, None)
+            if current is not None:
+                await current[0].close()
+        self._refresh_states()
+
+    def _resolve(self, metric_type: str) -> StreamFilter | None:
+        current = self._subscriptions.get(metric_type)
+        if current is not None:
+            return current[1]
+        for pattern, (_, stream_filter) in self._subscriptions.items():
+            if is_pattern(pattern) and fnmatchcase(metric_type, pattern):
+                return stream_filter
+        return None
+
+    def _refresh_states(self) -> None:
+        for identity, state in list(self._states.items()):
+            stream_filter = self._resolve(state.metric_type)
+            if stream_filter is None:
+                del self._states[identity]
+            else:
+                state.filter = stream_filter
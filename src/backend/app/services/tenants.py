@@ -0,0 +1,347 @@
+"""Tenant namespaces, per-tenant quotas and fair WebSocket scheduling.
+
+Every layer below the API (the metrics tables, rollups, caches, the hot tier and
+the `metrics:{key}` channels) is keyed by one series key. A tenant's metric `cpu`
+gets the key `{slug}/cpu`, so namespacing happens once, at the API boundary, and
+clients only ever see the unqualified name. Users without a tenant share the
+unprefixed namespace that existed before tenants did; `/` is reserved in names.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from app.core.config import settings
+from app.core.telemetry import registry
+from app.services.send_queue import SlowConsumerError
+
+if TYPE_CHECKING:
+    from app.models.tenant import Tenant
+    from app.services.auth_cache import Principal
+
+SEPARATOR = "/"
+
+_rejections = registry.counter(
+    "rad_tenant_quota_rejections_total",
+    "Requests and connections refused by a tenant quota.",
+    ("tenant", "quota"),
+)
+_send_timeouts = registry.counter(
+    "rad_fair_send_timeouts_total",
+    "WebSocket sends abandoned after WS_SEND_TIMEOUT_SECONDS, per tenant.",
+    ("tenant",),
+)
+
+
+class InvalidMetricTypeError(ValueError):
+    """Raised for a metric name that would escape its tenant's namespace."""
+
+
+class QuotaExceededError(Exception):
+    def __init__(self, detail: str, retry_after: int) -> None:
+        super().__init__(detail)
+        self.retry_after = retry_after
+
+
+def qualify(tenant: str | None, metric_type: str) -> str:
+    """The series key of `metric_type` in `tenant`'s namespace."""
+    if SEPARATOR in metric_type:
+        raise InvalidMetricTypeError(f"metric types must not contain {SEPARATOR!r}")
+    return f"{tenant}{SEPARATOR}{metric_type}" if tenant else metric_type
+
+
+def display_name(key: str) -> str:
+    """A series key without its tenant prefix, as clients name it."""
+    return key.rpartition(SEPARATOR)[2]
+
+
+def namespace(key: str) -> str | None:
+    head, separator, _ = key.rpartition(SEPARATOR)
+    return head if separator else None
+
+
+def tenant_label(tenant: str | None) -> str:
+    return tenant or ""
+
+
+@dataclass(frozen=True, slots=True)
+class TenantQuota:
+    """Limits of one tenant; a rate or count of zero means unlimited."""
+
+    ingest_rate: float
+    ingest_burst: int
+    connection_rate: float
+    max_connections: int
+
+    @classmethod
+    def from_tenant(cls, tenant: Tenant | None) -> TenantQuota:
+        defaults = {
+            "ingest_rate": settings.tenant_ingest_rate,
+            "ingest_burst": settings.tenant_ingest_burst,
+            "connection_rate": settings.tenant_connection_rate,
+            "max_connections": settings.tenant_max_connections,
+        }
+        return cls(
+            **{
+                name: default
+                if (value := getattr(tenant, name, None)) is None
+                else value
+                for name, default in defaults.items()
+            }
+        )
+
+    def to_dict(self) -> dict[str, float]:
+        return {
+            "ingest_rate": self.ingest_rate,
+            "ingest_burst": self.ingest_burst,
+            "connection_rate": self.connection_rate,
+            "max_connections": self.max_connections,
+        }
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`.
+
+    A request for more than `burst` is granted once the bucket is full and leaves
+    it in debt, so oversized batches are throttled rather than refused forever.
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "_updated", "_clock")
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self._clock = clock
+        self._updated = clock()
+
+    def take(self, amount: float = 1) -> float:
+        """Take `amount` tokens: 0.0 if granted, else seconds until it would be."""
+        now = self._clock()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        needed = min(amount, self.burst)
+        if self.tokens >= needed:
+            self.tokens -= amount
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    def refund(self, amount: float) -> None:
+        """Return tokens taken for work that was refused after all."""
+        self.tokens = min(self.burst, self.tokens + amount)
+
+
+class TenantLimiter:
+    """Per-tenant ingest and connection quotas.
+
+    Points and new connections draw from token buckets; open connections are
+    also capped outright. The state is per worker, so with several workers a
+    tenant's deployment-wide allowance is its quota times the worker count.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic) -> None:
+        self._clock = clock
+        self._ingest: dict[str | None, TokenBucket] = {}
+        self._connects: dict[str | None, TokenBucket] = {}
+        self.connections: dict[str | None, int] = {}
+
+    def admit_points(self, principal: Principal, count: int) -> None:
+        quota = principal.quota
+        if quota.ingest_rate <= 0:
+            return
+        bucket = self._bucket(
+            self._ingest, principal.tenant, quota.ingest_rate, quota.ingest_burst
+        )
+        wait = bucket.take(count)
+        if wait:
+            self._reject(principal.tenant, "ingest")
+            raise QuotaExceededError("Tenant ingest rate exceeded", _seconds(wait))
+
+    def refund_points(self, principal: Principal, count: int) -> None:
+        """Undo `admit_points` for a batch rejected by a later check."""
+        bucket = self._ingest.get(principal.tenant)
+        if bucket is not None and principal.quota.ingest_rate > 0:
+            bucket.refund(count)
+
+    def open_connection(self, principal: Principal) -> None:
+        tenant, quota = principal.tenant, principal.quota
+        current = self.connections.get(tenant, 0)
+        if quota.max_connections and current >= quota.max_connections:
+            self._reject(tenant, "connections")
+            raise QuotaExceededError("Tenant connection limit reached", 1)
+        if quota.connection_rate > 0:
+            bucket = self._bucket(
+                self._connects,
+                tenant,
+                quota.connection_rate,
+                # Reconnecting every socket at once, e.g. after a deploy, is fine.
+                max(quota.max_connections, quota.connection_rate, 1),
+            )
+            wait = bucket.take()
+            if wait:
+                self._reject(tenant, "connection_rate")
+                raise QuotaExceededError(
+                    "Tenant connection rate exceeded", _seconds(wait)
+                )
+        self.connections[tenant] = current + 1
+
+    def close_connection(self, principal: Principal) -> None:
+        remaining = self.connections.get(principal.tenant, 0) - 1
+        if remaining > 0:
+            self.connections[principal.tenant] = remaining
+        else:
+            self.connections.pop(principal.tenant, None)
+
+    def clear(self) -> None:
+        self._ingest.clear()
+        self._connects.clear()
+        self.connections.clear()
+
+    def _bucket(
+        self,
+        buckets: dict[str | None, TokenBucket],
+        tenant: str | None,
+        rate: float,
+        burst: float,
+    ) -> TokenBucket:
+        bucket = buckets.get(tenant)
+        if bucket is None:
+            bucket = buckets[tenant] = TokenBucket(rate, burst, self._clock)
+        else:
+            # The quota may have been edited since the bucket was made.
+            bucket.rate, bucket.burst = rate, burst
+        return bucket
+
+    @staticmethod
+    def _reject(tenant: str | None, quota: str) -> None:
+        _rejections.labels(tenant_label(tenant), quota).inc()
+
+
+def _seconds(wait: float) -> int:
+    return max(math.ceil(wait), 1)
+
+
+class _Turn:
+    __slots__ = ("scheduler", "tenant", "_deadline")
+
+    def __init__(self, scheduler: FairScheduler, tenant: str | None) -> None:
+        self.scheduler = scheduler
+        self.tenant = tenant
+
+    async def __aenter__(self) -> None:
+        await self.scheduler.acquire(self.tenant)
+        self._deadline = asyncio.timeout(self.scheduler.send_timeout)
+        await self._deadline.__aenter__()
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        try:
+            await self._deadline.__aexit__(*exc_info)
+        except TimeoutError as exc:
+            _send_timeouts.labels(tenant_label(self.tenant)).inc()
+            raise SlowConsumerError("send timed out") from exc
+        finally:
+            self.scheduler.release()
+
+
+class FairScheduler:
+    """Round-robin admission of WebSocket sends across tenants.
+
+    Up to `concurrency` sends proceed at once. Beyond that they wait in one FIFO
+    per tenant and freed slots go to the tenants in turn, so a tenant with a
+    thousand frames queued delays another tenant's next frame by one send per
+    waiting tenant, not by its whole backlog. Uncontended, a turn costs a counter.
+
+    A turn lasts at most `send_timeout` seconds: a send still blocked on a stalled
+    socket by then is cancelled and the turn raises `SlowConsumerError`, so a few
+    dead connections cannot sit on every slot until TCP gives up on them.
+    """
+
+    def __init__(
+        self, concurrency: int | None = None, send_timeout: float | None = None
+    ) -> None:
+        self.concurrency = concurrency or settings.ws_fair_concurrency
+        self.send_timeout = send_timeout or settings.ws_send_timeout_seconds or None
+        self.active = 0
+        self._waiting: OrderedDict[str | None, deque[asyncio.Future[None]]] = (
+            OrderedDict()
+        )
+
+    def turn(self, tenant: str | None) -> _Turn:
+        return _Turn(self, tenant)
+
+    def waiting(self) -> Iterator[tuple[str | None, int]]:
+        for tenant, queue in self._waiting.items():
+            yield tenant, len(queue)
+
+    async def acquire(self, tenant: str | None) -> None:
+        if self.active < self.concurrency and not self._waiting:
+            self.active += 1
+            return
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(tenant, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # granted just before the cancellation landed
+            else:
+                self._forget(tenant, future)
+            raise
+
+    def release(self) -> None:
+        waiting = self._waiting
+        while waiting:
+            tenant, queue = next(iter(waiting.items()))
+            future = queue.popleft()
+            if queue:
+                waiting.move_to_end(tenant)
+            else:
+                del waiting[tenant]
+            if not future.done():
+                future.set_result(None)  # the slot passes straight to it
+                return
+        self.active -= 1
+
+    def _forget(self, tenant: str | None, future: asyncio.Future[None]) -> None:
+        queue = self._waiting.get(tenant)
+        if queue is None:
+            return
+        try:
+            queue.remove(future)
+        except ValueError:
+            return
+        if not queue:
+            del self._waiting[tenant]
+
+
+tenant_limiter = TenantLimiter()
+fair_scheduler = FairScheduler()
+
+registry.callback(
+    "rad_tenant_connections",
+    "Open WebSocket connections per tenant in this worker.",
+    ("tenant",),
+    lambda: [
+        ((tenant_label(tenant),), count)
+        for tenant, count in tenant_limiter.connections.items()
+    ],
+)
+registry.callback(
+    "rad_fair_send_waiting",
+    "WebSocket sends queued for a fair-scheduling turn, per tenant.",
+    ("tenant",),
+    lambda: [
+        ((tenant_label(tenant),), count) for tenant, count in fair_scheduler.waiting()
+    ],
+)
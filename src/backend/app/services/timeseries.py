@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import enum
+import math
+from collections.abc import Collection
+from dataclasses import dataclass, field
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import (
+    BigInteger,
+    Float,
+    Integer,
+    any_,
+    bindparam,
+    cast,
+    extract,
+    func,
+    select,
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.models.metric import ROLLUPS, Metric, RollupMixin
+from app.models.series import Series
+from app.schemas.metrics import MetricPoint
+
+P95 = 0.95
+
+AnySession = Session | AsyncSession
+
+
+class Aggregation(str, enum.Enum):
+    AVG = "avg"
+    MIN = "min"
+    MAX = "max"
+    SUM = "sum"
+    COUNT = "count"
+    P95 = "p95"
+
+
+@dataclass(slots=True)
+class SeriesColumns:
+    """A bucketed series held as parallel columns instead of per-point objects."""
+
+    metric_type: str
+    step: int
+    timestamps: list[datetime] = field(default_factory=list)
+    values: list[float] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def to_points(self) -> list[MetricPoint]:
+        metric_type = self.metric_type
+        return [
+            {"timestamp": format_timestamp(ts), "value": value, "type": metric_type}
+            for ts, value in zip(self.timestamps, self.values)
+        ]
+
+
+def format_timestamp(value: datetime) -> str:
+    return value.isoformat().replace("+00:00", "Z")
+
+
+def as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=UTC)
+    return value.astimezone(UTC)
+
+
+def resolve_step(
+    start_at: datetime, end_at: datetime, step: int | None, max_points: int
+) -> int:
+    """Return a bucket width in seconds that keeps the series within `max_points`."""
+    duration = max((end_at - start_at).total_seconds(), 1.0)
+    floor_step = max(math.ceil(duration / max_points), 1)
+    if step and step >= floor_step:
+        return step
+    # A widened step is rounded onto the rollup grid so the query can use a rollup.
+    for model in ROLLUPS:
+        if floor_step > model.resolution:
+            return math.ceil(floor_step / model.resolution) * model.resolution
+    return floor_step
+
+
+def _dialect(session: AnySession) -> str:
+    return session.get_bind().dialect.name
+
+
+def epoch_seconds(
+    session: AnySession, column: ColumnElement[datetime]
+) -> ColumnElement[float]:
+    if _dialect(session) == "sqlite":
+        # julianday() is a float day count; round off its sub-millisecond noise.
+        return func.round((func.julianday(column) - 2440587.5) * 86400.0, 3)
+    return cast(extract("epoch", column), Float)
+
+
+def bucket_index(
+    session: AnySession, column: ColumnElement[datetime], origin: datetime, step: int
+) -> ColumnElement[int]:
+    """Index of the `step`-second bucket counted from `origin` that `column` falls in."""
+    offset = (epoch_seconds(session, column) - origin.timestamp()) / step
+    if _dialect(session) == "sqlite":
+        # Rows are already filtered to ts >= origin, so truncation is floor here.
+        return cast(offset, Integer)
+    return cast(func.floor(offset), Integer)
+
+
+def rollup_for(step: int, agg: Aggregation) -> type[RollupMixin] | None:
+    """The coarsest rollup whose buckets tile `step`, or None to read raw points."""
+    if agg is Aggregation.P95:
+        return None
+    for model in ROLLUPS:
+        if step % model.resolution == 0:
+            return model
+    return None
+
+
+def series_origin(start_at: datetime, step: int, agg: Aggregation) -> datetime:
+    """Where bucket 0 starts: `start_at`, snapped down onto the rollup grid if one is used."""
+    rollup = rollup_for(step, agg)
+    if rollup is None:
+        return start_at
+    resolution = rollup.resolution
+    return datetime.fromtimestamp(
+        start_at.timestamp() // resolution * resolution, tz=UTC
+    )
+
+
+def _aggregate(session: AnySession, agg: Aggregation) -> ColumnElement[float] | None:
+    if agg is Aggregation.P95:
+        if _dialect(session) != "postgresql":
+            return None
+        return func.percentile_cont(P95).within_group(Metric.value)
+    return {
+        Aggregation.AVG: func.avg,
+        Aggregation.MIN: func.min,
+        Aggregation.MAX: func.max,
+        Aggregation.SUM: func.sum,
+        Aggregation.COUNT: func.count,
+    }[agg](Metric.value)
+
+
+def _rollup_aggregate(
+    model: type[RollupMixin], agg: Aggregation
+) -> ColumnElement[float]:
+    return {
+        Aggregation.AVG: lambda: func.sum(model.sum) / func.sum(model.count),
+        Aggregation.MIN: lambda: func.min(model.min),
+        Aggregation.MAX: lambda: func.max(model.max),
+        Aggregation.SUM: lambda: func.sum(model.sum),
+        Aggregation.COUNT: lambda: func.sum(model.count),
+    }[agg]()
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Linear-interpolated percentile matching PostgreSQL's ``percentile_cont``."""
+    position = (len(sorted_values) - 1) * q
+    lower = math.floor(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    fraction = position - lower
+    return (
+        sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * fraction
+    )
+
+
+async def query_series(
+    session: AsyncSession,
+    metric_type: str,
+    start_at: datetime,
+    end_at: datetime,
+    step: int,
+    agg: Aggregation = Aggregation.AVG,
+    series: Collection[int] | None = None,
+) -> SeriesColumns:
+    """Buckets of `metric_type`, or with `series` of just those series' points.
+
+    Rollups are kept per type, so a query narrowed to series reads raw points.
+    """
+    start_at, end_at = as_utc(start_at), as_utc(end_at)
+    columns = SeriesColumns(metric_type=metric_type, step=step)
+    if series is not None and not series:
+        return columns
+    rollup = rollup_for(step, agg) if series is None else None
+    if rollup is not None:
+        return await _query_rollup(session, rollup, columns, start_at, end_at, agg)
+
+    bucket = bucket_index(session, Metric.ts, start_at, step).label("bucket")
+    window = (Metric.type == metric_type, Metric.ts >= start_at, Metric.ts <= end_at)
+    if series is not None:
+        window += (_in_series(session, series),)
+    aggregate = _aggregate(session, agg)
+
+    if aggregate is None:
+        stmt = (
+            select(bucket, Metric.value).where(*window).order_by(bucket, Metric.value)
+        )
+        rows = (await session.execute(stmt)).tuples()
+        current: int | None = None
+        values: list[float] = []
+        for index, value in rows:
+            if index != current and values:
+                _append(columns, start_at, current, percentile(values, P95))
+                values = []
+            current = index
+            values.append(value)
+        if values:
+            _append(columns, start_at, current, percentile(values, P95))
+        return columns
+
+    stmt = select(bucket, aggregate).where(*window).group_by(bucket).order_by(bucket)
+    for index, value in (await session.execute(stmt)).tuples():
+        _append(columns, start_at, index, float(value))
+    return columns
+
+
+def _in_series(session: AnySession, series: Collection[int]) -> ColumnElement[bool]:
+    if _dialect(session) == "postgresql":
+        # One array parameter instead of one bind per id (there may be 100k).
+        ids = bindparam("series_ids", list(series), type_=postgresql.ARRAY(BigInteger))
+        return Metric.series_id == any_(ids)
+    return Metric.series_id.in_(list(series))
+
+
+async def _query_rollup(
+    session: AsyncSession,
+    model: type[RollupMixin],
+    columns: SeriesColumns,
+    start_at: datetime,
+    end_at: datetime,
+    agg: Aggregation,
+) -> SeriesColumns:
+    origin = series_origin(start_at, columns.step, agg)
+    bucket = bucket_index(session, model.bucket, origin, columns.step).label("bucket")
+    stmt = (
+        select(bucket, _rollup_aggregate(model, agg))
+        .where(
+            model.type == columns.metric_type,
+            model.bucket >= origin,
+            model.bucket <= end_at,
+        )
+        .group_by(bucket)
+        .order_by(bucket)
+    )
+    for index, value in (await session.execute(stmt)).tuples():
+        _append(columns, origin, index, float(value))
+    return columns
+
+
+def _append(
+    columns: SeriesColumns, start_at: datetime, index: int | None, value: float
+) -> None:
+    columns.timestamps.append(start_at + timedelta(seconds=(index or 0) * columns.step))
+    columns.values.append(value)
+
+
+async def recent_points(
+    session: AsyncSession, metric_type: str, start_at: datetime, end_at: datetime
+) -> list[tuple[datetime, float, tuple[tuple[str, str], ...]]]:
+    """Raw `(ts, value, labels)` rows in `[start_at, end_at]`, oldest first."""
+    stmt = (
+        select(Metric.ts, Metric.value, Series.labels)
+        .outerjoin(Series, Series.id == Metric.series_id)
+        .where(Metric.type == metric_type, Metric.ts >= start_at, Metric.ts <= end_at)
+        .order_by(Metric.ts)
+    )
+    return [
+        (as_utc(ts), value, tuple(sorted(labels.items())) if labels else ())
+        for ts, value, labels in (await session.execute(stmt)).tuples()
+    ]
@@ -0,0 +1,263 @@
+"""Append-only segment log on memory-mapped files.
+
+The log is a directory of fixed-size segments named by sequence number. Each
+record is `<length:u32><crc32:u32>` followed by the payload; a zero length marks
+the end of the written part of a segment, so a torn or half-written record
+(failed CRC) simply ends the log on recovery. A `checkpoint` file records how far
+consumers have committed; segments entirely before it are deleted. An `id` file
+names the log, so consumers can record positions in it elsewhere.
+
+Appends are memory copies into the mapped segment, so they survive a crash of
+the process immediately and a crash of the machine once `sync` has run.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import mmap
+import os
+import struct
+import uuid
+import zlib
+from collections.abc import Iterator, Sequence
+from pathlib import Path
+from typing import NamedTuple
+
+HEADER = struct.Struct("<II")
+CHECKPOINT = struct.Struct("<QQ")
+SEGMENT_SUFFIX = ".seg"
+_ZEROS = bytes(HEADER.size)
+
+
+class Position(NamedTuple):
+    segment: int
+    offset: int
+
+
+class LogFullError(Exception):
+    """Raised when an append would take the log past `max_bytes`."""
+
+
+class _Segment:
+    __slots__ = ("seq", "path", "file", "map", "end", "dirty")
+
+    def __init__(self, seq: int, path: Path, size: int) -> None:
+        self.seq = seq
+        self.path = path
+        self.file = open(path, "r+b" if path.exists() else "w+b")
+        if os.fstat(self.file.fileno()).st_size < size:
+            self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.end = 0
+        self.dirty = False
+
+    @property
+    def size(self) -> int:
+        return len(self.map)
+
+    def records(self, offset: int) -> Iterator[tuple[bytes, int]]:
+        """`(payload, next offset)` from `offset` up to the first invalid header."""
+        data, size = self.map, len(self.map)
+        while offset + HEADER.size <= size:
+            length, crc = HEADER.unpack_from(data, offset)
+            start = offset + HEADER.size
+            if not length or start + length > size:
+                return
+            payload = data[start : start + length]
+            if zlib.crc32(payload) != crc:
+                return
+            offset = start + length
+            yield payload, offset
+
+    def close(self) -> None:
+        self.map.close()
+        self.file.close()
+
+
+class SegmentLog:
+    """Durable FIFO of byte records with bounded disk usage.
+
+    At most `max_bytes // segment_bytes` segments exist; when every one of them
+    still holds uncommitted records `append` raises `LogFullError` rather than
+    dropping the oldest data. A directory is owned by one process at a time
+    (an exclusive `flock` on `lock`), see `claim`.
+    """
+
+    def __init__(
+        self, directory: str | Path, segment_bytes: int, max_bytes: int
+    ) -> None:
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.max_segments = max(max_bytes // segment_bytes, 2)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = open(self.directory / "lock", "a+b")
+        try:
+            fcntl.flock(self._lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock.close()
+            raise
+        self._segments: dict[int, _Segment] = {}
+        try:
+            self.id = self._load_id()
+            self._recover()
+        except Exception:
+            self.close()
+            raise
+
+    @classmethod
+    def claim(
+        cls, root: str | Path, segment_bytes: int, max_bytes: int, slots: int = 64
+    ) -> SegmentLog:
+        """Open the first of `root/0`, `root/1`, ... no other process holds.
+
+        Every worker gets its own log, and a restarted worker picks up (and
+        replays) whatever an earlier one left behind.
+        """
+        for slot in range(slots):
+            try:
+                return cls(Path(root) / str(slot), segment_bytes, max_bytes)
+            except BlockingIOError:
+                continue
+        raise RuntimeError(f"all {slots} log directories under {root} are in use")
+
+    @property
+    def committed(self) -> Position:
+        return self._committed
+
+    @property
+    def disk_bytes(self) -> int:
+        return sum(segment.size for segment in self._segments.values())
+
+    @property
+    def pending_bytes(self) -> int:
+        """Bytes of records written after the checkpoint."""
+        seq, offset = self._committed
+        return sum(
+            segment.end - (offset if segment.seq == seq else 0)
+            for segment in self._segments.values()
+            if segment.seq >= seq
+        )
+
+    def append(self, payloads: Sequence[bytes]) -> Position:
+        """Write `payloads` in order, all or none, and return the end position."""
+        self._reserve([HEADER.size + len(payload) for payload in payloads])
+        active = self._active
+        for payload in payloads:
+            needed = HEADER.size + len(payload)
+            if active.end + needed > active.size:
+                active = self._rotate()
+            start = active.end + HEADER.size
+            end = start + len(payload)
+            # Payload and terminator first: a record only exists once its header
+            # is written, and nothing stale can follow it.
+            active.map[start:end] = payload
+            active.map[end : end + HEADER.size] = _ZEROS[: active.size - end]
+            HEADER.pack_into(active.map, active.end, len(payload), zlib.crc32(payload))
+            active.end = end
+            active.dirty = True
+        return Position(active.seq, active.end)
+
+    def records(
+        self, start: Position | None = None
+    ) -> Iterator[tuple[bytes, Position]]:
+        """`(payload, position after it)` from `start`, by default the checkpoint."""
+        seq, offset = start or self._committed
+        for segment_seq in sorted(self._segments):
+            if segment_seq < seq:
+                continue
+            segment = self._segments[segment_seq]
+            if segment_seq > seq:
+                offset = 0
+            for payload, end in segment.records(offset):
+                yield payload, Position(segment_seq, end)
+
+    def commit(self, position: Position) -> None:
+        """Mark everything before `position` consumed and delete spent segments."""
+        self._committed = position
+        tmp = self.directory / "checkpoint.tmp"
+        tmp.write_bytes(CHECKPOINT.pack(*position))
+        os.replace(tmp, self.directory / "checkpoint")
+        for seq in [seq for seq in self._segments if seq < position.segment]:
+            segment = self._segments.pop(seq)
+            segment.close()
+            segment.path.unlink(missing_ok=True)
+
+    def sync(self) -> None:
+        """Flush appended records to disk (msync)."""
+        for segment in list(self._segments.values()):
+            if segment.dirty:
+                segment.dirty = False
+                segment.map.flush()
+
+    def close(self) -> None:
+        for segment in self._segments.values():
+            if segment.dirty:
+                segment.map.flush()
+            segment.close()
+        self._segments.clear()
+        if not self._lock.closed:
+            fcntl.flock(self._lock, fcntl.LOCK_UN)
+            self._lock.close()
+
+    @property
+    def _active(self) -> _Segment:
+        return self._segments[max(self._segments)]
+
+    def _path(self, seq: int) -> Path:
+        return self.directory / f"{seq:020d}{SEGMENT_SUFFIX}"
+
+    def _load_id(self) -> str:
+        path = self.directory / "id"
+        if not path.exists():
+            tmp = self.directory / "id.tmp"
+            tmp.write_text(uuid.uuid4().hex)
+            os.replace(tmp, path)
+        return path.read_text().strip()
+
+    def _recover(self) -> None:
+        checkpoint = self.directory / "checkpoint"
+        if checkpoint.exists():
+            self._committed = Position(*CHECKPOINT.unpack(checkpoint.read_bytes()))
+        else:
+            self._committed = Position(0, 0)
+        for path in sorted(self.directory.glob(f"*{SEGMENT_SUFFIX}")):
+            seq = int(path.stem)
+            if seq < self._committed.segment:
+                path.unlink()
+                continue
+            segment = _Segment(seq, path, self.segment_bytes)
+            self._segments[seq] = segment
+            segment.end = 0
+            for _, end in segment.records(0):
+                segment.end = end
+        if not self._segments:
+            seq = self._committed.segment
+            self._segments[seq] = _Segment(seq, self._path(seq), self.segment_bytes)
+        self._truncate_tail()
+
+    def _truncate_tail(self) -> None:
+        # A torn record after the last valid one must not be read as its successor.
+        active = self._active
+        active.map[active.end : active.end + HEADER.size] = _ZEROS[
+            : active.size - active.end
+        ]
+
+    def _rotate(self) -> _Segment:
+        seq = max(self._segments) + 1
+        segment = self._segments[seq] = _Segment(
+            seq, self._path(seq), self.segment_bytes
+        )
+        return segment
+
+    def _reserve(self, sizes: list[int]) -> None:
+        segments, free = len(self._segments), self._active.size - self._active.end
+        for size in sizes:
+            if size > self.segment_bytes:
+                raise ValueError(f"a {size} byte record does not fit in a segment")
+            if size > free:
+                segments, free = segments + 1, self.segment_bytes
+            free -= size
+        if segments > self.max_segments:
+            raise LogFullError(
+                f"{self.directory} holds {self.max_segments} uncommitted segments"
+            )
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import enum
+import hashlib
+from collections.abc import Sequence
+from datetime import datetime
+from typing import Any
+
+import msgpack
+import orjson
+
+from app.services.fanout import MetricMessage
+from app.services.timeseries import SeriesColumns, as_utc
+
+try:  # Arrow IPC is optional: install the `arrow` extra to serve it.
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - depends on the environment
+    pa = None
+
+
+class WireFormat(str, enum.Enum):
+    """Encodings offered for metric series, keyed by their media type."""
+
+    JSON = "application/json"
+    COLUMNAR_JSON = "application/vnd.rad.columnar+json"
+    MSGPACK = "application/msgpack"
+    ARROW = "application/vnd.apache.arrow.stream"
+
+
+MEDIA_ALIASES = {"application/x-msgpack": WireFormat.MSGPACK}
+
+
+def available_formats() -> list[WireFormat]:
+    return [fmt for fmt in WireFormat if fmt is not WireFormat.ARROW or pa is not None]
+
+
+def negotiate(accept: str | None) -> WireFormat | None:
+    """Pick the format for an `Accept` header, or None when nothing acceptable.
+
+    Quality values only rank candidates; `q=0` rules a media type out. A missing
+    header or a wildcard gets plain JSON.
+    """
+    if not accept:
+        return WireFormat.JSON
+    offered = available_formats()
+    ranked: list[tuple[float, int, WireFormat]] = []
+    for position, item in enumerate(accept.split(",")):
+        media, *params = (part.strip() for part in item.split(";"))
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality <= 0:
+            continue
+        media = media.lower()
+        if media in ("*/*", "application/*"):
+            candidate: WireFormat | None = WireFormat.JSON
+        else:
+            candidate = MEDIA_ALIASES.get(media) or next(
+                (fmt for fmt in offered if fmt.value == media), None
+            )
+        if candidate is not None:
+            ranked.append((-quality, position, candidate))
+    return min(ranked)[2] if ranked else None
+
+
+def entity_tag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Whether an `If-None-Match` header names `etag` (weak comparison)."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def epoch_ms(timestamps: Sequence[datetime]) -> list[int]:
+    return [round(ts.timestamp() * 1000) for ts in timestamps]
+
+
+def columnar_series(columns: SeriesColumns, agg: str) -> dict[str, Any]:
+    return {
+        "type": columns.metric_type,
+        "step": columns.step,
+        "agg": agg,
+        "ts": epoch_ms(columns.timestamps),
+        "values": columns.values,
+    }
+
+
+def points_series(columns: SeriesColumns, agg: str) -> bytes:
+    """`MetricSeriesResponse` JSON, built without validating every point.
+
+    The series comes from our own queries, so the per-point `TypedDict` check is
+    skipped and orjson formats the datetimes exactly as `format_timestamp` does.
+    """
+    metric_type = columns.metric_type
+    body = {
+        "series": [
+            {"timestamp": ts, "value": value, "type": metric_type}
+            for ts, value in zip(columns.timestamps, columns.values)
+        ],
+        "step": columns.step,
+        "agg": agg,
+    }
+    return orjson.dumps(body, option=orjson.OPT_UTC_Z)
+
+
+def encode_series(columns: SeriesColumns, agg: str, fmt: WireFormat) -> bytes:
+    """Encode a series as point objects or, for the other formats, as columns."""
+    if fmt is WireFormat.JSON:
+        return points_series(columns, agg)
+    if fmt is WireFormat.ARROW:
+        return _arrow_series(columns, agg)
+    body = columnar_series(columns, agg)
+    if fmt is WireFormat.MSGPACK:
+        return msgpack.packb(body)
+    return orjson.dumps(body)
+
+
+def _arrow_series(columns: SeriesColumns, agg: str) -> bytes:
+    if pa is None:  # pragma: no cover - negotiate() never offers it
+        raise RuntimeError("pyarrow is not installed")
+    schema = pa.schema(
+        [("ts", pa.timestamp("ms", tz="UTC")), ("value", pa.float64())],
+        metadata={"type": columns.metric_type, "step": str(columns.step), "agg": agg},
+    )
+    batch = pa.record_batch(
+        [
+            pa.array(epoch_ms(columns.timestamps), pa.int64()).cast(
+                schema.field(0).type
+            ),
+            pa.array(columns.values, pa.float64()),
+        ],
+        schema=schema,
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+def msgpack_batch(messages: Sequence[MetricMessage]) -> bytes:
+    """A `/ws/stream` batch as columns: type, epoch-ms timestamp and value.
+
+    A `labels` column (an object or null per point) is added when any point of
+    the batch is labelled.
+    """
+    types, stamps, values, labels = [], [], [], []
+    for message in messages:
+        data = message.data
+        try:
+            ts = as_utc(datetime.fromisoformat(data["timestamp"]))
+        except (KeyError, TypeError, ValueError):
+            continue
+        types.append(data.get("type") or message.channel.partition(":")[2])
+        stamps.append(round(ts.timestamp() * 1000))
+        values.append(data.get("value"))
+        labels.append(data.get("labels"))
+    frame = {"kind": "batch", "type": types, "ts": stamps, "value": values}
+    if any(labels):
+        frame["labels"] = labels
+    return msgpack.packb(frame)
@@ -0,0 +1,101 @@
+"""One Prometheus exposition for every worker of the deployment.
+
+Each gunicorn worker keeps its own registry, and a scrape of the shared port
+reaches whichever worker accepts it, so scraping one process would make
+counters jump between workers. Every worker therefore writes its families to
+Redis every `INTERNAL_METRICS_PUBLISH_SECONDS` under its own key, which expires
+after three periods so a dead worker's series disappear, and `/internal/metrics`
+merges them with its own live registry. Each sample carries a `worker` label
+(`host:pid`); sum across workers in PromQL with `sum without (worker)`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+
+import orjson
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.core.telemetry import Family, Registry, registry, render_workers
+from app.services.fanout import RedisFactory, default_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "telemetry:worker:"
+
+
+class WorkerMetrics:
+    def __init__(
+        self,
+        registry: Registry = registry,
+        redis_factory: RedisFactory = default_redis,
+        interval: float | None = None,
+    ) -> None:
+        self.registry = registry
+        self.interval = interval or settings.internal_metrics_publish_seconds
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self._redis_factory = redis_factory
+        self._client: redis.Redis | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def key(self) -> str:
+        return KEY_PREFIX + self.worker
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            try:
+                await self._redis().delete(self.key)
+            except Exception as exc:
+                logger.debug("Could not withdraw worker metrics: %s", exc)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def publish(self) -> None:
+        ttl = max(int(self.interval * 3), 1)
+        await self._redis().set(
+            self.key, orjson.dumps(self.registry.families()), ex=ttl
+        )
+
+    async def render(self) -> str:
+        """Every live worker's families; just this worker's if Redis is down."""
+        workers: dict[str, list[Family]] = {}
+        try:
+            client = self._redis()
+            keys = [key async for key in client.scan_iter(match=KEY_PREFIX + "*")]
+            others = [key for key in keys if key != self.key]
+            for key, raw in zip(others, await client.mget(others) if others else ()):
+                if raw is not None:
+                    workers[key.removeprefix(KEY_PREFIX)] = orjson.loads(raw)
+        except Exception as exc:
+            logger.warning("Exposing only this worker's metrics: %s", exc)
+        workers[self.worker] = self.registry.families()
+        return render_workers(dict(sorted(workers.items())))
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.publish()
+            except Exception as exc:
+                logger.warning("Could not publish worker metrics: %s", exc)
+            await asyncio.sleep(self.interval)
+
+    def _redis(self) -> redis.Redis:
+        if self._client is None:
+            self._client = self._redis_factory()
+        return self._client
+
+
+worker_metrics = WorkerMetrics()
@@ -1,16 +1,28 @@
 from __future__ import annotations
 
+import tempfile
+from pathlib import Path
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool, StaticPool
 
 from app.db.base import Base
-from app.db.session import get_db
+from app.db.session import get_async_db, get_async_sessionmaker, get_db
 from app.main import app
+from app.services.auth_cache import principal_cache, token_cache
+from app.services.query_cache import query_cache
+from app.services.series import series_index
+from app.services.tenants import tenant_limiter
 
-TEST_DATABASE_URL = "sqlite+pysqlite:///:memory:"
+# The sync fixtures and the async request path must see the same data, so both
+# engines point at one SQLite file rather than a private in-memory database.
+TEST_DATABASE_PATH = Path(tempfile.mkdtemp()) / "test.db"
+TEST_DATABASE_URL = f"sqlite+pysqlite:///{TEST_DATABASE_PATH}"
+TEST_ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{TEST_DATABASE_PATH}"
 
 engine = create_engine(
     TEST_DATABASE_URL,
@@ -20,11 +32,21 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
+# Each TestClient runs its own event loop, so async connections must not be pooled.
+async_engine = create_async_engine(TEST_ASYNC_DATABASE_URL, poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
 
 @pytest.fixture(autouse=True)
 def prepare_database() -> None:
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
+    principal_cache.clear()
+    principal_cache.local.hits = principal_cache.local.misses = 0
+    token_cache.clear()
+    query_cache.clear()
+    tenant_limiter.clear()
+    series_index.clear()
 
 
 @pytest.fixture()
@@ -38,7 +60,27 @@ def client(db_session: Session) -> TestClient:
     def override_get_db():
         yield db_session
 
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as session:
+            yield session
+
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_async_sessionmaker] = lambda: TestingAsyncSessionLocal
     with TestClient(app) as test_client:
         yield test_client
     app.dependency_overrides.pop(get_db, None)
+    app.dependency_overrides.pop(get_async_db, None)
+    app.dependency_overrides.pop(get_async_sessionmaker, None)
+
+
+@pytest.fixture()
+def auth_headers(client: TestClient, db_session: Session) -> dict[str, str]:
+    from app.tests.test_auth import create_user
+
+    create_user(db_session)
+    response = client.post(
+        "/auth/login",
+        json={"email": "admin@example.com", "password": "adminpass"},
+    )
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
@@ -0,0 +1,361 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import uuid
+from datetime import UTC, datetime
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import alerts as alerts_api
+from app.core.security import get_password_hash
+from app.models.alert import AlertKind, AlertRule
+from app.models.user import User, UserRole
+from app.services.alerts import (
+    RECENT_KEY,
+    RULES_CHANNEL,
+    AlertEngine,
+    Ewma,
+    RollingStats,
+    RuleSpec,
+    RuleState,
+)
+from app.services.fanout import MetricsHub, metric_channel
+from app.tests.conftest import TestingAsyncSessionLocal
+from app.tests.test_fanout import CountingRedis, _wait_for
+from app.ws import alerts as ws_alerts
+
+NOW = datetime(2025, 1, 1, tzinfo=UTC).isoformat()
+
+
+def spec(kind: AlertKind, metric_type: str = "cpu", **params) -> RuleSpec:
+    return RuleSpec(
+        uuid.uuid4(), f"{kind.value} {metric_type}", metric_type, kind, **params
+    )
+
+
+def test_rolling_stats_match_numpy_over_sliding_window() -> None:
+    values = np.random.default_rng(3).normal(50, 10, 500)
+    stats = RollingStats(window=20)
+    for i, value in enumerate(values):
+        stats.add(float(value))
+        window = values[max(0, i - 19) : i + 1]
+        assert stats.mean == pytest.approx(window.mean())
+        if len(window) > 1:
+            assert stats.std == pytest.approx(window.std(ddof=1))
+
+
+def test_ewma_tracks_weighted_mean_and_variance() -> None:
+    ewma = Ewma(alpha=0.5)
+    for value in (10.0, 20.0, 20.0):
+        ewma.add(value)
+    # mean: 10 -> 15 -> 17.5; variance: 0 -> 25 -> 18.75
+    assert ewma.mean == pytest.approx(17.5)
+    assert ewma.variance == pytest.approx(18.75)
+
+
+def test_threshold_rule_emits_only_state_changes() -> None:
+    state = RuleState(spec(AlertKind.THRESHOLD, upper=90.0))
+    events = [state.observe(value, NOW) for value in (50, 95, 97, 99, 80, 70)]
+
+    fired = [event for event in events if event is not None]
+    assert [(event.state, event.value) for event in fired] == [
+        ("firing", 95),
+        ("resolved", 80),
+    ]
+
+
+def test_zscore_rule_waits_for_full_window_then_flags_spike() -> None:
+    state = RuleState(spec(AlertKind.ZSCORE, threshold=3.0, window=10))
+    baseline = [10.0, 11.0] * 5
+    assert all(state.observe(value, NOW) is None for value in baseline)
+
+    event = state.observe(30.0, NOW)
+
+    assert event is not None and event.state == "firing"
+    assert event.score > 3
+    assert event.to_dict()["rule_kind"] == "zscore"
+
+
+def test_ewma_rule_flags_deviation_from_smoothed_level() -> None:
+    state = RuleState(spec(AlertKind.EWMA, threshold=4.0, alpha=0.2))
+    for value in [100.0, 101.0, 99.0] * 10:
+        assert state.observe(value, NOW) is None
+
+    assert state.observe(140.0, NOW).state == "firing"
+
+
+def test_engine_evaluates_only_rules_of_the_point_type() -> None:
+    engine = AlertEngine(redis_factory=CountingRedis())
+    engine.load(
+        spec(AlertKind.THRESHOLD, f"type-{i % 1000}", upper=float(i))
+        for i in range(3000)
+    )
+    assert engine.rule_count == 3000
+
+    events = engine.evaluate("type-7", 5000.0, NOW)
+
+    assert engine.evaluated == 3
+    assert len(events) == 3
+    assert engine.evaluate("unknown", 1.0, NOW) == []
+
+
+def test_reload_keeps_state_of_unchanged_rules() -> None:
+    engine = AlertEngine(redis_factory=CountingRedis())
+    kept = spec(AlertKind.THRESHOLD, upper=1.0)
+    engine.load([kept])
+    assert engine.evaluate("cpu", 5.0, NOW)[0].state == "firing"
+
+    engine.load([kept, spec(AlertKind.THRESHOLD, "mem", upper=1.0)])
+
+    # Still firing, so no duplicate event for the same breach.
+    assert engine.evaluate("cpu", 6.0, NOW) == []
+    assert engine.rules_for("cpu")[0].firing
+
+
+def test_each_series_keeps_its_own_baseline() -> None:
+    engine = AlertEngine(redis_factory=CountingRedis())
+    engine.load([spec(AlertKind.ZSCORE, threshold=3.0, window=5)])
+    web, db = (("host", "web-1"),), (("host", "db-1"),)
+    for value in (10.0, 11.0, 10.0, 11.0, 10.0):
+        engine.evaluate("cpu", value, NOW, web)
+        engine.evaluate("cpu", value * 10, NOW, db)
+
+    # Normal for db-1, but far off web-1's baseline.
+    assert engine.evaluate("cpu", 105.0, NOW, db) == []
+    [event] = engine.evaluate("cpu", 105.0, NOW, web)
+    assert event.to_dict()["labels"] == {"host": "web-1"}
+    assert engine.rules_for("cpu", web)[0].firing
+    assert not engine.rules_for("cpu", db)[0].firing
+    assert engine.rule_count == 1
+
+
+async def _recent(engine: AlertEngine, count: int) -> list[dict]:
+    for _ in range(200):
+        if len(recent := await engine.recent(10)) >= count:
+            return recent
+        await asyncio.sleep(0.01)
+    raise AssertionError("alerts not published in time")
+
+
+@pytest.mark.asyncio
+async def test_engine_consumes_stream_and_publishes_events(db_session) -> None:
+    db_session.add(
+        AlertRule(name="hot", metric_type="cpu", kind=AlertKind.THRESHOLD, upper=90)
+    )
+    db_session.commit()
+    factory = CountingRedis()
+    hub = MetricsHub(redis_factory=factory)
+    engine = AlertEngine(
+        hub=hub, redis_factory=factory, session_factory=TestingAsyncSessionLocal
+    )
+    publisher = factory.publisher()
+    listener = factory.publisher().pubsub()
+    await listener.subscribe("alerts")
+
+    async def send(metric_type: str, value: float) -> None:
+        await publisher.publish(
+            metric_channel(metric_type),
+            json.dumps({"type": metric_type, "timestamp": NOW, "value": value}),
+        )
+
+    runner = asyncio.create_task(engine.run())
+    try:
+        await _wait_for(lambda: hub.subscriber_count("metrics:*") == 1)
+        for value in (50, 95, 96, 40):
+            await send("cpu", value)
+        await send("mem", 99)
+        await _wait_for(lambda: engine.evaluated == 4)
+        recent = await _recent(engine, 2)
+        assert [event["state"] for event in recent] == ["resolved", "firing"]
+        assert recent[1]["value"] == 95 and recent[1]["name"] == "hot"
+
+        db_session.add(
+            AlertRule(name="mem", metric_type="mem", kind=AlertKind.THRESHOLD, upper=1)
+        )
+        db_session.commit()
+        await engine.rules_changed()
+        await _wait_for(lambda: engine.rule_count == 2)
+        await send("mem", 5)
+        await _wait_for(lambda: engine.evaluated == 5)
+
+        frames = []
+        while (message := await listener.get_message(timeout=0.1)) is not None:
+            if message["type"] == "message":
+                frames.append(json.loads(message["data"]))
+        assert [(frame["type"], frame["state"]) for frame in frames] == [
+            ("cpu", "firing"),
+            ("cpu", "resolved"),
+            ("mem", "firing"),
+        ]
+    finally:
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+        await listener.aclose()
+        await publisher.aclose()
+        await engine.close()
+        await hub.close()
+
+
+def test_rule_crud_requires_admin_for_writes(
+    client: TestClient, auth_headers, db_session, monkeypatch
+) -> None:
+    factory = CountingRedis()
+    monkeypatch.setattr(alerts_api, "alert_engine", AlertEngine(redis_factory=factory))
+
+    response = client.post(
+        "/alerts/rules",
+        json={"name": "spiky", "metric_type": "cpu", "kind": "zscore", "threshold": 3},
+        headers=auth_headers,
+    )
+    assert response.status_code == 422  # zscore needs a window
+
+    response = client.post(
+        "/alerts/rules",
+        json={
+            "name": "spiky",
+            "metric_type": "cpu",
+            "kind": "zscore",
+            "threshold": 3,
+            "window": 60,
+        },
+        headers=auth_headers,
+    )
+    assert response.status_code == 201
+    rule_id = response.json()["id"]
+    listed = client.get("/alerts/rules", headers=auth_headers).json()
+    assert [rule["id"] for rule in listed] == [rule_id]
+
+    db_session.add(
+        User(
+            email="viewer@example.com",
+            password_hash=get_password_hash("viewerpass"),
+            role=UserRole.USER,
+        )
+    )
+    db_session.commit()
+    token = client.post(
+        "/auth/login", json={"email": "viewer@example.com", "password": "viewerpass"}
+    ).json()["access_token"]
+    viewer = {"Authorization": f"Bearer {token}"}
+    assert client.get("/alerts/rules", headers=viewer).status_code == 200
+    assert client.delete(f"/alerts/rules/{rule_id}", headers=viewer).status_code == 403
+
+    assert (
+        client.delete(f"/alerts/rules/{rule_id}", headers=auth_headers).status_code
+        == 204
+    )
+    assert (
+        client.delete(f"/alerts/rules/{rule_id}", headers=auth_headers).status_code
+        == 404
+    )
+
+
+@pytest.mark.asyncio
+async def test_rule_edits_survive_a_full_metrics_queue(db_session) -> None:
+    factory = CountingRedis()
+    hub = MetricsHub(redis_factory=factory)
+    engine = AlertEngine(
+        hub=hub,
+        redis_factory=factory,
+        session_factory=TestingAsyncSessionLocal,
+        queue_size=1,
+    )
+    publisher = factory.publisher()
+    runner = asyncio.create_task(engine.run())
+    try:
+        await _wait_for(lambda: hub.subscriber_count("metrics:*") == 1)
+        db_session.add(
+            AlertRule(name="hot", metric_type="cpu", kind=AlertKind.THRESHOLD, upper=90)
+        )
+        db_session.commit()
+        frame = json.dumps({"type": "cpu", "timestamp": NOW, "value": 1.0})
+        async with publisher.pipeline(transaction=False) as pipe:
+            pipe.publish(RULES_CHANNEL, '{"action":"reload"}')
+            for _ in range(50):
+                pipe.publish(metric_channel("cpu"), frame)
+            await pipe.execute()
+        await _wait_for(lambda: engine.rule_count == 1)
+    finally:
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+        await publisher.aclose()
+        await engine.close()
+        await hub.close()
+
+
+def test_alerts_are_served_over_rest_and_websocket(
+    client: TestClient, auth_headers, monkeypatch
+) -> None:
+    factory = CountingRedis()
+    engine = AlertEngine(redis_factory=factory)
+    hub = MetricsHub(redis_factory=factory)
+    monkeypatch.setattr(alerts_api, "alert_engine", engine)
+    monkeypatch.setattr(ws_alerts, "hub", hub)
+    token = auth_headers["Authorization"].split()[1]
+    rule = spec(AlertKind.THRESHOLD, upper=1.0)
+    engine.load([rule, spec(AlertKind.THRESHOLD, "mem", upper=1.0)])
+
+    try:
+        with client.websocket_connect(
+            f"/ws/alerts?metric_type=cpu&token={token}"
+        ) as socket:
+            client.portal.call(_wait_for, lambda: hub.subscriber_count("alerts") == 1)
+            events = engine.evaluate("mem", 2.0, NOW) + engine.evaluate(
+                "cpu", 2.0, NOW, (("host", "web"),)
+            )
+            client.portal.call(engine.publish, events)
+
+            frame = json.loads(socket.receive_text())
+            assert frame["kind"] == "alert"
+            assert frame["rule_id"] == str(rule.id)
+            assert frame["state"] == "firing"
+
+        response = client.get("/alerts", params={"limit": 1}, headers=auth_headers)
+        assert response.status_code == 200
+        assert [(event["type"], event["labels"]) for event in response.json()] == [
+            ("cpu", {"host": "web"})
+        ]
+        assert client.portal.call(engine.recent, 10)[1]["type"] == "mem"
+    finally:
+        client.portal.call(engine.close)
+        client.portal.call(hub.close)
+
+
+@pytest.mark.asyncio
+async def test_recent_list_is_capped() -> None:
+    factory = CountingRedis()
+    engine = AlertEngine(redis_factory=factory, recent_max=3)
+    engine.load([spec(AlertKind.THRESHOLD, upper=1.0)])
+    try:
+        for _ in range(5):
+            await engine.publish(engine.evaluate("cpu", 2.0, NOW))
+            await engine.publish(engine.evaluate("cpu", 0.0, NOW))
+        assert await factory.publisher().llen(RECENT_KEY) == 3
+    finally:
+        await engine.close()
+
+
+@pytest.mark.asyncio
+async def test_recent_lists_are_kept_per_tenant() -> None:
+    factory = CountingRedis()
+    engine = AlertEngine(redis_factory=factory, recent_max=3)
+    engine.load(
+        [
+            spec(AlertKind.THRESHOLD, upper=1.0),
+            spec(AlertKind.THRESHOLD, upper=1.0, metric_type="noisy/cpu"),
+        ]
+    )
+    try:
+        await engine.publish(engine.evaluate("cpu", 2.0, NOW))
+        for _ in range(5):  # enough to fill any shared list on its own
+            await engine.publish(engine.evaluate("noisy/cpu", 2.0, NOW))
+            await engine.publish(engine.evaluate("noisy/cpu", 0.0, NOW))
+        [shared] = await engine.recent(10)
+        assert (shared["tenant"], shared["state"]) == (None, "firing")
+        noisy = await engine.recent(10, "noisy")
+        assert len(noisy) == 3 and {event["tenant"] for event in noisy} == {"noisy"}
+    finally:
+        await engine.close()
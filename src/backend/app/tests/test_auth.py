@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+from datetime import UTC, datetime, timedelta
+
 from fastapi.testclient import TestClient
 
 from app.core.security import get_password_hash
+from app.models.metric import Metric
 from app.models.user import User, UserRole
 
 
@@ -50,6 +53,12 @@ def test_metrics_requires_authentication(client: TestClient) -> None:
 
 def test_metrics_returns_data_with_token(client: TestClient, db_session) -> None:
     create_user(db_session)
+    now = datetime.now(tz=UTC)
+    db_session.add_all(
+        Metric(type="cpu", value=50 + idx, ts=now - timedelta(seconds=idx))
+        for idx in range(10)
+    )
+    db_session.commit()
     login_response = client.post(
         "/auth/login",
         json={"email": "admin@example.com", "password": "adminpass"},
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import time
+import uuid
+
+import fakeredis
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.models.tenant import Tenant
+from app.models.user import User, UserRole
+from app.services.auth_cache import (
+    Principal,
+    PrincipalCache,
+    TokenCache,
+    TTLCache,
+    principal_cache,
+)
+from app.tests.conftest import async_engine
+from app.tests.test_fanout import CountingRedis
+from app.tests.test_tenants import tenant_headers
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_ttl_cache_expires_and_evicts_least_recently_used() -> None:
+    clock = FakeClock()
+    cache: TTLCache[str, int] = TTLCache(maxsize=2, ttl=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    clock.now = 10
+    assert cache.get("a") is None
+    assert cache.get("c") is None
+    assert len(cache) == 0
+
+
+def test_token_cache_is_bounded_by_exp() -> None:
+    cache = TokenCache(maxsize=10)
+    cache.set("live", "a@example.com", time.time() + 60)
+    cache.set("expired", "b@example.com", time.time() - 1)
+    cache.set("no-exp", "c@example.com", None)
+
+    assert cache.get("live") == "a@example.com"
+    assert cache.get("expired") is None
+    assert cache.get("no-exp") is None
+
+
+def test_repeated_requests_skip_user_lookup(
+    client: TestClient, auth_headers: dict[str, str]
+) -> None:
+    statements: list[str] = []
+
+    def record(conn, cursor, statement, *args) -> None:
+        if "FROM users" in statement:
+            statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        for _ in range(3):
+            assert client.get("/metrics", headers=auth_headers).status_code == 200
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+    assert len(statements) == 1
+    assert principal_cache.local.hits == 2
+
+
+def test_user_update_and_delete_invalidate_cache(
+    client: TestClient, db_session, auth_headers: dict[str, str]
+) -> None:
+    assert client.get("/metrics", headers=auth_headers).status_code == 200
+    assert principal_cache.local.get("admin@example.com").role is UserRole.ADMIN
+
+    user = db_session.query(User).filter_by(email="admin@example.com").one()
+    user.role = UserRole.USER
+    db_session.flush()
+    db_session.rollback()  # nothing changed, so nothing is invalidated
+    assert principal_cache.local.get("admin@example.com") is not None
+    user.role = UserRole.USER
+    db_session.flush()
+    assert principal_cache.local.get("admin@example.com") is not None
+    db_session.commit()
+    assert principal_cache.local.get("admin@example.com") is None
+
+    assert client.get("/metrics", headers=auth_headers).status_code == 200
+    assert principal_cache.local.get("admin@example.com").role is UserRole.USER
+
+    db_session.delete(user)
+    db_session.commit()
+    assert client.get("/metrics", headers=auth_headers).status_code == 401
+
+
+def test_tenant_update_invalidates_its_members(
+    client: TestClient, db_session, auth_headers: dict[str, str], monkeypatch
+) -> None:
+    headers = tenant_headers(client, db_session, ingest_rate=5.0)
+    for request_headers in (headers, auth_headers):
+        assert client.get("/metrics", headers=request_headers).status_code == 200
+    assert principal_cache.local.get("ops@acme.example").quota.ingest_rate == 5.0
+    invalidated: list[set[str]] = []
+    monkeypatch.setattr(principal_cache, "invalidate", invalidated.append)
+
+    tenant = db_session.query(Tenant).filter_by(slug="acme").one()
+    tenant.ingest_rate = 1.0
+    db_session.commit()
+
+    # Goes through `invalidate`, which also clears the Redis tier and tells
+    # the other workers; members of other tenants stay cached.
+    assert invalidated == [{"ops@acme.example"}]
+    assert principal_cache.local.get("admin@example.com") is not None
+
+
+@pytest.mark.asyncio
+async def test_redis_tier_is_shared_and_invalidated_across_workers() -> None:
+    factory = CountingRedis()
+
+    def sync_redis() -> fakeredis.FakeRedis:
+        return fakeredis.FakeRedis(server=factory.server, decode_responses=True)
+
+    workers = [
+        PrincipalCache(
+            maxsize=10,
+            ttl=60,
+            redis_enabled=True,
+            redis_factory=factory,
+            sync_redis_factory=sync_redis,
+        )
+        for _ in range(2)
+    ]
+    principal = Principal(id=uuid.uuid4(), email="a@example.com", role=UserRole.ADMIN)
+    try:
+        await workers[0].set(principal)
+        assert await workers[1].get("a@example.com") == principal
+        assert workers[1].local.get("a@example.com") == principal
+
+        workers[0].invalidate(["a@example.com"])
+        assert workers[0].local.get("a@example.com") is None
+        # On the loop the Redis side runs as a task instead of blocking it.
+        key = "auth:principal:a@example.com"
+        assert await factory.publisher().get(key) is not None
+        await workers[0].close()  # waits for pending invalidations
+        assert await factory.publisher().get(key) is None
+    finally:
+        for worker in workers:
+            await worker.close()
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from app.core.config import settings
+from app.db.session import async_database_url, engine_options
+
+
+def test_engine_options_apply_pool_settings_to_postgres(monkeypatch) -> None:
+    monkeypatch.setattr(settings, "db_pool_size", 30)
+    monkeypatch.setattr(settings, "db_prepare_threshold", None)
+
+    options = engine_options("postgresql+psycopg://u:p@db:5432/radb")
+
+    assert options["pool_size"] == 30
+    assert options["max_overflow"] == settings.db_max_overflow
+    assert options["pool_recycle"] == settings.db_pool_recycle_seconds
+    assert options["connect_args"] == {"prepare_threshold": None}
+
+
+def test_engine_options_skip_pool_sizing_for_sqlite() -> None:
+    assert engine_options("sqlite+aiosqlite:///test.db") == {"pool_pre_ping": True}
+
+
+def test_async_database_url_maps_sqlite_to_aiosqlite() -> None:
+    assert async_database_url("sqlite:///test.db").drivername == "sqlite+aiosqlite"
+    url = async_database_url("postgresql+psycopg://u:p@db:5432/radb")
+    assert url.drivername == "postgresql+psycopg"
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+from datetime import timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.services.export import ExportFormat, export_points
+from app.tests.conftest import TestingAsyncSessionLocal
+from app.tests.test_metrics import START, seed
+
+
+def export(client: TestClient, headers: dict[str, str], fmt: str, **params):
+    query = {
+        "type": "cpu",
+        "from": START.isoformat(),
+        "to": (START + timedelta(seconds=59)).isoformat(),
+        "format": fmt,
+        **params,
+    }
+    return client.get("/metrics/export", params=query, headers=headers)
+
+
+def test_export_streams_csv_and_ndjson(
+    client: TestClient, db_session, auth_headers
+) -> None:
+    seed(db_session, "cpu", [float(i) for i in range(90)])
+
+    response = export(client, auth_headers, "csv")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "text/csv; charset=utf-8"
+    assert 'filename="cpu.csv"' in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 60
+    assert rows[0] == {
+        "timestamp": "2025-01-01T00:00:00Z",
+        "value": "0.0",
+        "type": "cpu",
+    }
+
+    response = export(client, auth_headers, "ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["value"] for line in lines] == [float(i) for i in range(60)]
+    assert lines[-1] == {
+        "timestamp": "2025-01-01T00:00:59Z",
+        "value": 59.0,
+        "type": "cpu",
+    }
+
+
+def test_export_writes_parquet_row_groups(
+    client: TestClient, db_session, auth_headers, monkeypatch
+) -> None:
+    pq = pytest.importorskip("pyarrow.parquet")
+    monkeypatch.setattr(settings, "export_chunk_rows", 25)
+    seed(db_session, "cpu", [float(i) for i in range(60)])
+
+    response = export(client, auth_headers, "parquet")
+
+    assert response.status_code == 200
+    parquet = pq.ParquetFile(io.BytesIO(response.content))
+    assert parquet.metadata.num_row_groups == 3
+    table = parquet.read()
+    assert table.column("value").to_pylist() == [float(i) for i in range(60)]
+    assert table.column("timestamp")[0].as_py().isoformat() == START.isoformat()
+
+
+def test_export_requires_a_start(client: TestClient, auth_headers) -> None:
+    response = client.get("/metrics/export", headers=auth_headers)
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_abandoned_export_stops_reading(db_session) -> None:
+    seed(db_session, "cpu", [float(i) for i in range(100)])
+    chunks = export_points(
+        TestingAsyncSessionLocal,
+        "cpu",
+        START,
+        START + timedelta(seconds=99),
+        ExportFormat.NDJSON,
+        chunk_rows=10,
+    )
+
+    first = await chunks.__anext__()
+    await chunks.aclose()  # what the response does when the client goes away
+
+    assert first.count(b"\n") == 10
+    with pytest.raises(StopAsyncIteration):
+        await chunks.__anext__()
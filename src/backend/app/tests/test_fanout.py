@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+
+import fakeredis
+import pytest
+from fastapi import WebSocketDisconnect, status
+from fastapi.testclient import TestClient
+
+from app.services.fanout import MetricsHub, metric_channel
+from app.services.replay import ReplayBroker
+from app.services.send_queue import OverflowPolicy
+from app.tests.test_auth import create_user
+from app.ws import metrics as ws_metrics
+
+
+class CountingRedis:
+    """Redis factory backed by one fake server that counts client connections."""
+
+    def __init__(self) -> None:
+        self.server = fakeredis.FakeServer()
+        self.created = 0
+
+    def __call__(self) -> fakeredis.FakeAsyncRedis:
+        self.created += 1
+        return self.publisher()
+
+    def publisher(self) -> fakeredis.FakeAsyncRedis:
+        return fakeredis.FakeAsyncRedis(server=self.server, decode_responses=True)
+
+
+async def _wait_for(predicate, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_hub_uses_single_connection_as_subscribers_grow() -> None:
+    factory = CountingRedis()
+    hub = MetricsHub(redis_factory=factory, queue_size=4)
+    publisher = factory.publisher()
+    subscriptions = []
+    try:
+        for count in (1, 10, 100, 1000):
+            while len(subscriptions) < count:
+                subscriptions.append(await hub.subscribe(metric_channel("cpu")))
+            assert factory.created == 1
+            assert await publisher.pubsub_numsub(metric_channel("cpu")) == [
+                (metric_channel("cpu"), 1)
+            ]
+
+        await publisher.publish(metric_channel("cpu"), json.dumps({"value": 1}))
+        messages = await asyncio.wait_for(
+            asyncio.gather(*(sub.get() for sub in subscriptions)), timeout=2
+        )
+        assert {message.raw for message in messages} == {'{"value": 1}'}
+        assert len({id(message) for message in messages}) == 1
+    finally:
+        await hub.close()
+        await publisher.aclose()
+
+
+@pytest.mark.asyncio
+async def test_hub_drops_channel_after_last_subscriber() -> None:
+    factory = CountingRedis()
+    hub = MetricsHub(redis_factory=factory)
+    publisher = factory.publisher()
+    try:
+        first = await hub.subscribe(metric_channel("cpu"))
+        second = await hub.subscribe(metric_channel("cpu"))
+        await first.close()
+        assert hub.channels == {metric_channel("cpu")}
+        await second.close()
+        assert hub.channels == set()
+        assert await publisher.pubsub_numsub(metric_channel("cpu")) == [
+            (metric_channel("cpu"), 0)
+        ]
+    finally:
+        await hub.close()
+        await publisher.aclose()
+
+
+@pytest.mark.asyncio
+async def test_subscription_queue_is_bounded() -> None:
+    hub = MetricsHub(
+        redis_factory=CountingRedis(),
+        queue_size=2,
+        overflow_policy=OverflowPolicy.DROP_OLDEST,
+    )
+    try:
+        subscription = await hub.subscribe(metric_channel("cpu"))
+        for value in range(5):
+            hub.dispatch(metric_channel("cpu"), json.dumps({"value": value}))
+        assert subscription.dropped == 3
+        assert (await subscription.get()).data == {"value": 3}
+        assert (await subscription.get()).data == {"value": 4}
+    finally:
+        await hub.close()
+
+
+def test_websockets_share_hub_connection(
+    client: TestClient, db_session, monkeypatch
+) -> None:
+    create_user(db_session)
+    token = client.post(
+        "/auth/login",
+        json={"email": "admin@example.com", "password": "adminpass"},
+    ).json()["access_token"]
+    factory = CountingRedis()
+    hub = MetricsHub(redis_factory=factory)
+    broker = ReplayBroker(hub=hub)
+    monkeypatch.setattr(ws_metrics, "replay_broker", broker)
+    channel = metric_channel("cpu")
+
+    sockets = []
+    try:
+        for _ in range(25):
+            socket = client.websocket_connect(
+                f"/ws/metrics?metric_type=cpu&token={token}"
+            )
+            sockets.append(socket.__enter__())
+            assert json.loads(socket.receive_text())["kind"] == "snapshot"
+        client.portal.call(_wait_for, lambda: broker.subscriber_count("cpu") == 25)
+        assert factory.created == 1
+        assert hub.subscriber_count() == 1
+
+        publisher = client.portal.call(factory.publisher)
+        client.portal.call(publisher.publish, channel, '{"value": 42}')
+        for socket in sockets:
+            assert (
+                socket.receive_text() == '{"kind":"delta","seq":1,"data":{"value": 42}}'
+            )
+    finally:
+        for socket in sockets:
+            socket.__exit__(None, None, None)
+        client.portal.call(broker.close)
+        client.portal.call(hub.close)
+
+
+def test_websocket_rejects_missing_token(client: TestClient) -> None:
+    with pytest.raises(WebSocketDisconnect) as exc_info:
+        with client.websocket_connect("/ws/metrics?metric_type=cpu"):
+            pass
+    assert exc_info.value.code == status.WS_1008_POLICY_VIOLATION
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import json
+import math
+from datetime import UTC, datetime
+
+import numpy as np
+import pytest
+
+from app.services.generator import LoadGenerator, SeriesModel, series_names
+from app.tests.test_fanout import CountingRedis
+
+
+def test_series_names_cross_types_and_hosts() -> None:
+    assert series_names(2, 1) == ["cpu", "mem"]
+    assert series_names(9, 1)[-1] == "metric_8"
+    assert series_names(2, 2) == [
+        "cpu.host-000",
+        "cpu.host-001",
+        "mem.host-000",
+        "mem.host-001",
+    ]
+
+
+def test_series_model_walks_around_a_seasonal_baseline() -> None:
+    model = SeriesModel(3, seed=1, period=60)
+    indices = np.arange(3)
+    walk = np.array([model.sample(indices, float(t)) for t in range(600)])
+
+    assert (walk >= 0).all()
+    # Successive points stay close; the series never jumps to unrelated values.
+    assert np.abs(np.diff(walk, axis=0)).mean() < 10
+    assert np.abs(walk.mean(axis=0) - model.baseline).max() < 10
+
+
+def test_build_batch_cycles_through_series() -> None:
+    generator = LoadGenerator(series_names(1, 3), rate=10, seed=1)
+    now = datetime(2025, 1, 1, tzinfo=UTC)
+
+    first = generator.build_batch(4, now)
+    second = generator.build_batch(2, now)
+
+    channels = [channel for channel, _ in first + second]
+    assert channels == [f"metrics:cpu.host-00{i % 3}" for i in range(6)]
+    payload = json.loads(first[0][1])
+    assert payload["type"] == "cpu.host-000"
+    assert payload["timestamp"] == now.isoformat()
+    assert math.isfinite(payload["value"])
+
+
+@pytest.mark.asyncio
+async def test_generator_publishes_at_target_rate() -> None:
+    factory = CountingRedis()
+    listener = factory.publisher()
+    pubsub = listener.pubsub(ignore_subscribe_messages=True)
+    await pubsub.psubscribe("metrics:*")
+    generator = LoadGenerator(
+        series_names(2, 3), rate=2000, batch_size=100, redis_factory=factory
+    )
+
+    stats = await generator.run(duration=0.5)
+
+    received = []
+    for _ in range(stats.sent + 10):  # subscribe confirmations also yield None
+        message = await pubsub.get_message(timeout=0.1)
+        if message is not None:
+            received.append(json.loads(message["data"])["type"])
+    await pubsub.aclose()
+    await listener.aclose()
+
+    assert stats.failed == 0
+    assert 700 <= stats.sent <= 1100
+    assert len(received) == stats.sent
+    assert set(received) == set(generator.names)
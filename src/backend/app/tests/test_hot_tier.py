@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from datetime import UTC, datetime, timedelta
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import metrics as metrics_api
+from app.services.fanout import MetricsHub, metric_channel
+from app.services.hot_tier import HotTier, RingBuffer, downsample
+from app.services.timeseries import Aggregation
+from app.tests.test_fanout import CountingRedis, _wait_for
+
+START = datetime(2025, 1, 1, tzinfo=UTC)
+
+
+class FakeClock:
+    def __init__(self, now: float) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def started_tier(**kwargs) -> HotTier:
+    clock = FakeClock(START.timestamp())
+    tier = HotTier(
+        capacity=kwargs.pop("capacity", 100), window=600, clock=clock, **kwargs
+    )
+    tier.started_at = clock.now
+    clock.now += 60
+    return tier
+
+
+@pytest.mark.parametrize(
+    ("agg", "expected"),
+    [
+        (Aggregation.AVG, [4.5, 14.5]),
+        (Aggregation.MIN, [0.0, 10.0]),
+        (Aggregation.MAX, [9.0, 19.0]),
+        (Aggregation.SUM, [45.0, 145.0]),
+        (Aggregation.COUNT, [10.0, 10.0]),
+        (Aggregation.P95, [8.55, 18.55]),
+    ],
+)
+def test_downsample_matches_database_aggregates(
+    agg: Aggregation, expected: list[float]
+) -> None:
+    # Reversed input: the ring may hold out-of-order points.
+    ts = np.arange(20, dtype=np.float64)[::-1]
+    buckets, values = downsample(ts, ts.copy(), 0.0, 10, agg)
+
+    assert buckets.tolist() == [0, 1]
+    assert values.tolist() == pytest.approx(expected)
+
+
+def test_ring_buffer_overwrites_oldest_points() -> None:
+    buffer = RingBuffer(capacity=3)
+    for second in range(5):
+        buffer.append(float(second), float(second))
+
+    ts, values = buffer.window(0, 10)
+    assert sorted(ts.tolist()) == [2.0, 3.0, 4.0]
+    assert buffer.evicted_through == 1.0
+    assert buffer.nbytes == 48
+
+
+def test_hot_tier_only_answers_windows_it_fully_holds() -> None:
+    tier = started_tier(capacity=5)
+    for second in range(10):
+        tier.add("cpu", START.timestamp() + second, float(second))
+
+    assert tier.query("cpu", START - timedelta(seconds=1), START, 1) is None
+    assert tier.query("cpu", START + timedelta(seconds=2), START, 1) is None
+    columns = tier.query(
+        "cpu", START + timedelta(seconds=5), START + timedelta(seconds=9), 5
+    )
+    assert columns.values == [7.0]
+    assert tier.query("mem", START, START + timedelta(seconds=9), 5).values == []
+    assert tier.stats() == {"cpu": {"points": 5, "capacity": 5, "bytes": 80}}
+
+
+def test_hot_tier_snaps_to_rollup_grid_like_the_database() -> None:
+    tier = started_tier()
+    tier.started_at -= 3600
+    tier.add("cpu", START.timestamp() + 30, 1.0)
+    tier.add("cpu", START.timestamp() + 90, 3.0)
+
+    columns = tier.query(
+        "cpu", START + timedelta(seconds=20), START + timedelta(seconds=119), 60
+    )
+
+    assert columns.timestamps == [START, START + timedelta(seconds=60)]
+    assert columns.values == [1.0, 3.0]
+
+
+@pytest.mark.asyncio
+async def test_hot_tier_is_fed_from_pattern_subscription() -> None:
+    factory = CountingRedis()
+    hub = MetricsHub(redis_factory=factory)
+    tier = HotTier(capacity=10, window=600, hub=hub)
+    publisher = factory.publisher()
+    try:
+        await tier.start()
+        now = datetime.now(tz=UTC)
+        for metric_type in ("cpu", "mem"):
+            await publisher.publish(
+                metric_channel(metric_type),
+                json.dumps(
+                    {"type": metric_type, "timestamp": now.isoformat(), "value": 2}
+                ),
+            )
+        await _wait_for(lambda: len(tier.stats()) == 2)
+
+        columns = tier.query("mem", now - timedelta(seconds=1), now, 1)
+        assert columns is None  # the window starts before the tier did
+
+        columns = tier.query("mem", now, now + timedelta(seconds=1), 1)
+        assert columns.values == [2.0]
+        hub.read_failures += 1
+        await asyncio.sleep(0.01)
+        assert tier.query("mem", now, now + timedelta(seconds=1), 1) is None
+    finally:
+        await tier.close()
+        await hub.close()
+        await publisher.aclose()
+
+
+def test_metrics_endpoint_serves_recent_window_from_hot_tier(
+    client: TestClient, auth_headers, monkeypatch
+) -> None:
+    tier = HotTier(capacity=100, window=600)
+    tier.started_at = datetime.now(tz=UTC).timestamp() - 600
+    now = datetime.now(tz=UTC)
+    for second in range(5):
+        tier.add("cpu", (now - timedelta(seconds=second)).timestamp(), 10.0)
+    monkeypatch.setattr(metrics_api, "hot_tier", tier)
+
+    response = client.get("/metrics", headers=auth_headers, params={"step": 1})
+    stats = client.get("/metrics/hot-tier", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert [point["value"] for point in response.json()["series"]] == [10.0] * 5
+    assert stats.json() == {"cpu": {"points": 5, "capacity": 100, "bytes": 1600}}
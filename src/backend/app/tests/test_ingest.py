@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import json
+from datetime import UTC, datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+
+from app.api import metrics as metrics_api
+from app.models.metric import Metric
+from app.services.ingest import (
+    IngestBuffer,
+    IngestPoint,
+    InvalidPayloadError,
+    parse_compact,
+    parse_ndjson,
+)
+from app.tests.conftest import TestingSessionLocal
+from app.tests.test_fanout import CountingRedis
+
+TS = datetime(2025, 1, 1, tzinfo=UTC)
+TS_MS = int(TS.timestamp() * 1000)
+
+
+def test_parse_ndjson_accepts_iso_and_epoch_ms() -> None:
+    body = b"\n".join(
+        [
+            json.dumps({"type": "cpu", "ts": TS_MS, "value": 1}).encode(),
+            b"",
+            json.dumps(
+                {"type": "mem", "timestamp": "2025-01-01T00:00:00Z", "value": 2.5}
+            ).encode(),
+        ]
+    )
+    assert parse_ndjson(body) == [
+        IngestPoint("cpu", TS, 1.0),
+        IngestPoint("mem", TS, 2.5),
+    ]
+
+
+def test_parse_compact_accepts_wrapped_and_bare_arrays() -> None:
+    rows = [["cpu", TS_MS, 1], ["mem", TS_MS, 2]]
+    expected = [IngestPoint("cpu", TS, 1.0), IngestPoint("mem", TS, 2.0)]
+    assert parse_compact(json.dumps({"points": rows}).encode()) == expected
+    assert parse_compact(json.dumps(rows).encode()) == expected
+
+
+@pytest.mark.parametrize(
+    "body", [b"not json", b'{"points": 1}', b'[["cpu", 1]]', b'[["", 1, 1]]']
+)
+def test_parse_compact_rejects_malformed_points(body: bytes) -> None:
+    with pytest.raises(InvalidPayloadError):
+        parse_compact(body)
+
+
+@pytest.fixture()
+def ingest_redis() -> CountingRedis:
+    return CountingRedis()
+
+
+@pytest.fixture()
+def buffer(client: TestClient, ingest_redis: CountingRedis, monkeypatch):
+    buffer = IngestBuffer(
+        session_factory=TestingSessionLocal,
+        redis_factory=ingest_redis,
+        max_points=4,
+        flush_points=100,
+        flush_interval=60,
+    )
+    monkeypatch.setattr(metrics_api, "ingest_buffer", buffer)
+    yield buffer
+    client.portal.call(buffer.close)
+
+
+def test_ingest_persists_and_publishes_batch(
+    client: TestClient, db_session, auth_headers, ingest_redis, buffer
+) -> None:
+    subscriber = client.portal.call(ingest_redis.publisher).pubsub()
+    client.portal.call(subscriber.subscribe, "metrics:cpu")
+
+    body = "\n".join(
+        json.dumps({"type": metric_type, "ts": TS_MS, "value": value})
+        for metric_type, value in (("cpu", 1), ("mem", 2), ("cpu", 3))
+    )
+    response = client.post(
+        "/metrics/ingest",
+        content=body,
+        headers={**auth_headers, "Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 202
+    assert response.json() == {"accepted": 3}
+
+    assert client.portal.call(buffer.flush) == 3
+    count = db_session.execute(select(func.count()).select_from(Metric)).scalar_one()
+    assert count == 3
+
+    published = []
+    for _ in range(10):
+        message = client.portal.call(subscriber.get_message, True, 0.1)
+        if message is not None:
+            published.append(json.loads(message["data"])["value"])
+    assert published == [1.0, 3.0]
+    client.portal.call(subscriber.aclose)
+
+
+def test_ingest_returns_429_when_buffer_is_full(
+    client: TestClient, auth_headers, buffer
+) -> None:
+    rows = [["cpu", TS_MS, value] for value in range(3)]
+    first = client.post("/metrics/ingest", json=rows, headers=auth_headers)
+    second = client.post("/metrics/ingest", json=rows, headers=auth_headers)
+
+    assert first.status_code == 202
+    assert second.status_code == 429
+    assert second.headers["Retry-After"] == "60"
+
+
+def test_ingest_rejects_invalid_payload(
+    client: TestClient, auth_headers, buffer
+) -> None:
+    response = client.post(
+        "/metrics/ingest", json={"points": [["cpu"]]}, headers=auth_headers
+    )
+    assert response.status_code == 422
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.services.leader import LeaderLock, SingletonTask
+from app.tests.test_fanout import CountingRedis, _wait_for
+
+
+@pytest.mark.asyncio
+async def test_only_one_lock_holder_until_release() -> None:
+    factory = CountingRedis()
+    first = LeaderLock("jobs", factory, ttl=5)
+    second = LeaderLock("jobs", factory, ttl=5)
+
+    assert await first.acquire()
+    assert not await second.acquire()
+    # Only the holder may extend or drop the lease.
+    assert not await second.renew()
+    assert not await second.release()
+    assert await first.renew()
+    assert await first.holder() == first.token
+
+    assert await first.release()
+    assert await second.acquire()
+    assert not await first.renew()
+    await first.close()
+    await second.close()
+
+
+@pytest.mark.asyncio
+async def test_expired_lease_can_be_taken_over() -> None:
+    factory = CountingRedis()
+    stalled = LeaderLock("jobs", factory, ttl=0.05)
+    successor = LeaderLock("jobs", factory, ttl=0.05)
+    assert await stalled.acquire()
+
+    await asyncio.sleep(0.1)
+
+    assert await successor.acquire()
+    assert not await stalled.release()
+    assert await successor.holder() == successor.token
+    await stalled.close()
+    await successor.close()
+
+
+@pytest.mark.asyncio
+async def test_singleton_task_runs_in_one_process_and_fails_over() -> None:
+    factory = CountingRedis()
+    running: list[str] = []
+
+    def job(name: str):
+        async def run() -> None:
+            running.append(name)
+            await asyncio.Event().wait()
+
+        return run
+
+    workers = [
+        SingletonTask("generator", job(f"worker-{i}"), factory, ttl=0.15, enabled=True)
+        for i in range(3)
+    ]
+    for worker in workers:
+        worker.start()
+    await _wait_for(lambda: len(running) == 1)
+    await asyncio.sleep(0.3)  # several renewal rounds
+    assert len(running) == 1
+    leader = next(worker for worker in workers if worker.is_leader)
+
+    await leader.close()
+    await _wait_for(lambda: len(running) == 2)
+    assert sum(worker.is_leader for worker in workers) == 1
+    for worker in workers:
+        await worker.close()
+
+
+@pytest.mark.asyncio
+async def test_job_is_cancelled_when_the_lease_is_lost() -> None:
+    factory = CountingRedis()
+    cancelled = asyncio.Event()
+
+    async def job() -> None:
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    task = SingletonTask("maintenance", job, factory, ttl=0.15, enabled=True)
+    task.start()
+    await _wait_for(lambda: task.is_leader)
+    # Another node took over, e.g. after this one stalled past its lease.
+    await factory.publisher().set(task.lock.key, "other-node")
+
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert not task.is_leader
+    assert await task.lock.holder() == "other-node"
+    await task.close()
+
+
+@pytest.mark.asyncio
+async def test_finished_job_is_not_run_again() -> None:
+    factory = CountingRedis()
+    runs = 0
+
+    async def job() -> None:
+        nonlocal runs
+        runs += 1
+
+    task = SingletonTask("seed", job, factory, ttl=0.06, enabled=True)
+    task.start()
+    await asyncio.sleep(0.2)
+
+    assert runs == 1
+    assert await task.lock.holder() is None
+    await task.close()
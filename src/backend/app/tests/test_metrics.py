@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import time
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.models.metric import Metric, MetricRollup1h, MetricRollup1m
+from app.services import partitions
+from app.services.ingest import IngestPoint, write_points
+from app.services.partitions import StorageMaintainer, drop_expired, ensure_partitions
+from app.services.rollups import refresh_rollups
+from app.services.timeseries import Aggregation, percentile, resolve_step, rollup_for
+from app.tests.conftest import TestingSessionLocal
+
+START = datetime(2025, 1, 1, tzinfo=UTC)
+
+
+def seed(db_session, metric_type: str, values: list[float], spacing: int = 1) -> None:
+    write_points(
+        db_session,
+        [
+            IngestPoint(metric_type, START + timedelta(seconds=idx * spacing), value)
+            for idx, value in enumerate(values)
+        ],
+    )
+
+
+def fetch(client: TestClient, headers: dict[str, str], **params) -> dict:
+    query = {
+        "type": "cpu",
+        "from": START.isoformat(),
+        "to": (START + timedelta(seconds=59)).isoformat(),
+        **params,
+    }
+    response = client.get("/metrics", params=query, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+@pytest.mark.parametrize(
+    ("agg", "expected"),
+    [
+        ("avg", [4.5, 14.5]),
+        ("min", [0.0, 10.0]),
+        ("max", [9.0, 19.0]),
+        ("sum", [45.0, 145.0]),
+        ("count", [10.0, 10.0]),
+        ("p95", [8.55, 18.55]),
+    ],
+)
+def test_metrics_buckets_with_aggregation(
+    client: TestClient, db_session, auth_headers, agg: str, expected: list[float]
+) -> None:
+    seed(db_session, "cpu", [float(v) for v in range(20)])
+    seed(db_session, "mem", [99.0] * 20)
+
+    payload = fetch(client, auth_headers, step=10, agg=agg)
+
+    assert payload["step"] == 10
+    assert [point["value"] for point in payload["series"]] == pytest.approx(expected)
+    assert [point["timestamp"] for point in payload["series"]] == [
+        "2025-01-01T00:00:00Z",
+        "2025-01-01T00:00:10Z",
+    ]
+    assert {point["type"] for point in payload["series"]} == {"cpu"}
+
+
+def test_metrics_caps_returned_points(
+    client: TestClient, db_session, auth_headers, monkeypatch
+) -> None:
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "metrics_max_points", 6)
+    seed(db_session, "cpu", [1.0] * 60)
+
+    payload = fetch(client, auth_headers, step=1)
+
+    assert payload["step"] == 10
+    assert len(payload["series"]) == 6
+
+
+def test_metrics_long_range_is_bounded(
+    client: TestClient, db_session, auth_headers
+) -> None:
+    seed(db_session, "cpu", [1.0] * 100, spacing=3600)
+
+    started = time.perf_counter()
+    payload = fetch(client, auth_headers, to=(START + timedelta(days=30)).isoformat())
+
+    assert time.perf_counter() - started < 2
+    assert payload["step"] == 1320
+    assert len(payload["series"]) == 100
+
+
+def test_resolve_step_honours_requested_step() -> None:
+    end = START + timedelta(hours=1)
+    assert resolve_step(START, end, None, 2000) == 2
+    assert resolve_step(START, end, 60, 2000) == 60
+
+
+def test_resolve_step_rounds_widened_step_onto_rollup_grid() -> None:
+    assert resolve_step(START, START + timedelta(days=30), None, 2000) == 1320
+    assert resolve_step(START, START + timedelta(days=365), 60, 2000) == 18000
+
+
+def test_rollup_for_picks_coarsest_fitting_table() -> None:
+    assert rollup_for(7200, Aggregation.AVG) is MetricRollup1h
+    assert rollup_for(300, Aggregation.MAX) is MetricRollup1m
+    assert rollup_for(90, Aggregation.AVG) is None
+    assert rollup_for(3600, Aggregation.P95) is None
+
+
+@pytest.mark.parametrize(
+    ("agg", "expected"),
+    [("avg", [29.5, 89.5]), ("min", [0.0, 60.0]), ("count", [60.0, 60.0])],
+)
+def test_metrics_reads_minute_rollup(
+    client: TestClient, db_session, auth_headers, agg: str, expected: list[float]
+) -> None:
+    seed(db_session, "cpu", [float(v) for v in range(120)])
+    # Only the rollup can answer once the raw rows are gone.
+    db_session.query(Metric).delete()
+    db_session.commit()
+
+    payload = fetch(
+        client,
+        auth_headers,
+        to=(START + timedelta(seconds=119)).isoformat(),
+        step=60,
+        agg=agg,
+    )
+
+    assert [point["value"] for point in payload["series"]] == pytest.approx(expected)
+    assert payload["series"][1]["timestamp"] == "2025-01-01T00:01:00Z"
+
+
+def test_write_points_accumulates_rollups(db_session) -> None:
+    seed(db_session, "cpu", [1.0, 5.0])
+    seed(db_session, "cpu", [3.0])
+
+    minute = db_session.get(MetricRollup1m, ("cpu", START))
+    hour = db_session.get(MetricRollup1h, ("cpu", START))
+    for rollup in (minute, hour):
+        assert (rollup.count, rollup.sum, rollup.min, rollup.max) == (3, 9.0, 1.0, 5.0)
+
+
+def test_refresh_rollups_rebuilds_from_raw(db_session) -> None:
+    db_session.add_all(
+        Metric(type="cpu", value=float(v), ts=START + timedelta(seconds=v))
+        for v in range(90)
+    )
+    db_session.commit()
+
+    refresh_rollups(db_session, START, START + timedelta(seconds=90))
+
+    minutes = db_session.query(MetricRollup1m).order_by(MetricRollup1m.bucket).all()
+    assert [(row.count, row.max) for row in minutes] == [(60, 59.0), (30, 89.0)]
+    assert db_session.get(MetricRollup1h, ("cpu", START)).count == 90
+
+
+def test_retention_without_partitions_deletes_old_rows(db_session) -> None:
+    seed(db_session, "cpu", [1.0, 2.0], spacing=86400 * 10)
+
+    assert ensure_partitions(db_session, START.date(), 3) == []
+    drop_expired(db_session, START + timedelta(days=15), retention_days=7)
+
+    assert [row.value for row in db_session.query(Metric)] == [2.0]
+
+
+def test_retention_runs_when_partition_creation_fails(db_session, monkeypatch) -> None:
+    seed(db_session, "cpu", [1.0, 2.0], spacing=86400 * 10)
+    refresh_rollups(db_session, START, START + timedelta(days=11))
+
+    def fail(*args) -> list[str]:
+        raise RuntimeError("default partition has rows for that day")
+
+    monkeypatch.setattr(partitions, "ensure_partitions", fail)
+    monkeypatch.setattr(settings, "metrics_retention_days", 7)
+    monkeypatch.setattr(settings, "metrics_rollup_1m_retention_days", 7)
+    monkeypatch.setattr(settings, "metrics_rollup_1h_retention_days", 7)
+    maintainer = StorageMaintainer(
+        session_factory=TestingSessionLocal,
+        clock=lambda: START + timedelta(days=15),
+    )
+    maintainer.run_once()
+
+    db_session.expire_all()
+    assert [row.value for row in db_session.query(Metric)] == [2.0]
+    for model in (MetricRollup1m, MetricRollup1h):
+        assert [row.max for row in db_session.query(model)] == [2.0]
+
+
+def test_percentile_matches_percentile_cont() -> None:
+    assert percentile([1.0], 0.95) == 1.0
+    assert percentile([1.0, 2.0, 3.0, 4.0], 0.5) == pytest.approx(2.5)
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.security import get_password_hash, password_needs_rehash
+from app.models.user import User
+from app.services import password_hasher as hasher_module
+from app.services.password_hasher import HasherBusyError, PasswordHasher
+from app.tests.test_auth import create_user
+
+
+@pytest.fixture()
+def blocked_hasher(monkeypatch: pytest.MonkeyPatch):
+    release = threading.Event()
+
+    def blocking_verify(password: str, hashed_password: str) -> bool:
+        release.wait(timeout=5)
+        return True
+
+    monkeypatch.setattr(hasher_module, "verify_password", blocking_verify)
+    hasher = PasswordHasher(
+        max_workers=1,
+        max_queue=1,
+        per_key_limit=1,
+        executor_factory=lambda workers: ThreadPoolExecutor(max_workers=workers),
+    )
+    yield hasher, release
+    release.set()
+    hasher.close()
+
+
+@pytest.mark.asyncio
+async def test_hasher_rejects_beyond_per_key_and_queue_limits(blocked_hasher) -> None:
+    hasher, release = blocked_hasher
+    first = asyncio.create_task(hasher.verify("pw", "hash", ["ip:1", "email:a"]))
+    await asyncio.sleep(0)
+
+    with pytest.raises(HasherBusyError):
+        await hasher.verify("pw", "hash", ["ip:1", "email:b"])
+    second = asyncio.create_task(hasher.verify("pw", "hash", ["ip:2", "email:b"]))
+    await asyncio.sleep(0)
+    with pytest.raises(HasherBusyError):
+        await hasher.verify("pw", "hash", ["ip:3", "email:c"])
+
+    release.set()
+    assert await asyncio.gather(first, second) == [True, True]
+    stats = hasher.stats()
+    assert stats["inflight"] == 0
+    assert stats["rejected"] == 2
+    assert stats["latency"]["count"] == 2
+    assert stats["queue_wait"]["count"] == 2
+
+
+def test_password_needs_rehash_tracks_work_factor() -> None:
+    hashed = get_password_hash("secret", rounds=4)
+    assert password_needs_rehash(hashed, rounds=4) is False
+    assert password_needs_rehash(hashed, rounds=5) is True
+    assert password_needs_rehash("not-a-bcrypt-hash") is True
+
+
+def test_login_rehashes_password_at_configured_work_factor(
+    client: TestClient, db_session
+) -> None:
+    user = create_user(db_session)
+    user.password_hash = get_password_hash("adminpass", rounds=4)
+    db_session.commit()
+
+    response = client.post(
+        "/auth/login", json={"email": "admin@example.com", "password": "adminpass"}
+    )
+
+    assert response.status_code == 200
+    db_session.expire_all()
+    stored = db_session.get(User, user.id).password_hash
+    assert not password_needs_rehash(stored)
+    assert stored.startswith(f"$2b${settings.bcrypt_rounds:02d}$")
+
+
+def test_login_returns_429_when_hasher_is_saturated(
+    client: TestClient, db_session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    create_user(db_session)
+
+    async def busy(*args, **kwargs) -> bool:
+        raise HasherBusyError("too many concurrent logins", retry_after=2)
+
+    monkeypatch.setattr(hasher_module.password_hasher, "verify", busy)
+    response = client.post(
+        "/auth/login", json={"email": "admin@example.com", "password": "adminpass"}
+    )
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "2"
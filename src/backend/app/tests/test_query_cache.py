@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.fanout import MetricsHub
+from app.services.ingest import IngestBuffer, IngestPoint, write_points
+from app.services.query_cache import ENTRY_OVERHEAD_BYTES, POINT_BYTES, QueryCache
+from app.services.timeseries import Aggregation
+from app.tests.conftest import TestingAsyncSessionLocal, TestingSessionLocal
+from app.tests.test_fanout import CountingRedis, _wait_for
+from app.tests.test_metrics import START, fetch, seed
+
+
+class FakeClock:
+    def __init__(self, now: float) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def series(cache: QueryCache, seconds: int, step: int = 10) -> list[float]:
+    async with TestingAsyncSessionLocal() as session:
+        columns = await cache.series(
+            session,
+            "cpu",
+            START,
+            START + timedelta(seconds=seconds),
+            step=step,
+            agg=Aggregation.SUM,
+        )
+    return columns.values
+
+
+@pytest.mark.asyncio
+async def test_final_buckets_are_cached_and_only_the_open_tail_requeried(
+    db_session,
+) -> None:
+    seed(db_session, "cpu", [1.0] * 60)
+    # Buckets before START + 40s are final; 40-49 and 50-59 are still open.
+    clock = FakeClock(START.timestamp() + 40)
+    cache = QueryCache(chunk_buckets=2, settle_seconds=0, clock=clock)
+
+    assert await series(cache, 59) == [10.0] * 6
+    assert (cache.hits, cache.misses) == (0, 2)
+
+    late = START + timedelta(seconds=5)
+    write_points(db_session, [IngestPoint("cpu", late, 100.0)])
+    write_points(db_session, [IngestPoint("cpu", START + timedelta(seconds=45), 5.0)])
+
+    # The final bucket keeps its cached sum; the open one sees the new point.
+    assert await series(cache, 59) == [10.0, 10.0, 10.0, 10.0, 15.0, 10.0]
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    clock.now += 20  # two more buckets close; the third chunk is extended
+    assert await series(cache, 59) == [10.0, 10.0, 10.0, 10.0, 15.0, 10.0]
+    assert (cache.hits, cache.misses) == (4, 3)
+
+
+@pytest.mark.asyncio
+async def test_cache_evicts_least_recently_used_chunks_by_size(db_session) -> None:
+    seed(db_session, "cpu", [1.0] * 60)
+    clock = FakeClock(START.timestamp() + 3600)
+    entry_size = ENTRY_OVERHEAD_BYTES + POINT_BYTES * 2  # one chunk of two buckets
+    cache = QueryCache(max_bytes=entry_size * 2, chunk_buckets=2, clock=clock)
+
+    await series(cache, 59)
+    await series(cache, 19)  # the first chunk again, evicted meanwhile
+
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (0, 4)
+    assert cache.nbytes <= cache.max_bytes
+
+
+@pytest.mark.asyncio
+async def test_redis_tier_shares_complete_chunks_across_workers(db_session) -> None:
+    seed(db_session, "cpu", [1.0] * 60)
+    factory = CountingRedis()
+    clock = FakeClock(START.timestamp() + 3600)
+    first = QueryCache(
+        chunk_buckets=3, redis_enabled=True, redis_factory=factory, clock=clock
+    )
+    second = QueryCache(
+        chunk_buckets=3, redis_enabled=True, redis_factory=factory, clock=clock
+    )
+    try:
+        assert await series(first, 59) == [10.0] * 6
+        write_points(db_session, [IngestPoint("cpu", START, 100.0)])
+        assert await series(second, 59) == [10.0] * 6
+        assert (second.hits, second.misses) == (2, 0)
+    finally:
+        await first.close()
+        await second.close()
+
+
+def test_metrics_endpoint_answers_unchanged_ranges_with_304(
+    client: TestClient, db_session, auth_headers
+) -> None:
+    seed(db_session, "cpu", [float(i) for i in range(60)])
+    params = {
+        "type": "cpu",
+        "from": (START + timedelta(seconds=3)).isoformat(),
+        "to": (START + timedelta(seconds=57)).isoformat(),
+        "step": 10,
+    }
+
+    first = client.get("/metrics", params=params, headers=auth_headers)
+    etag = first.headers["etag"]
+    # `from`/`to` are widened to whole buckets, so the series starts at START.
+    assert first.json()["series"][0]["timestamp"] == "2025-01-01T00:00:00Z"
+    assert len(first.json()["series"]) == 6
+
+    cached = client.get(
+        "/metrics", params=params, headers={**auth_headers, "If-None-Match": etag}
+    )
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+
+    other = fetch(client, auth_headers, step=10, agg="max")
+    assert other["series"]
+    stale = client.get(
+        "/metrics",
+        params={**params, "agg": "max"},
+        headers={**auth_headers, "If-None-Match": etag},
+    )
+    assert stale.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_late_points_retire_cached_chunks_on_every_worker(db_session) -> None:
+    seed(db_session, "cpu", [1.0] * 60)
+    factory = CountingRedis()
+    hub = MetricsHub(redis_factory=factory)
+    clock = FakeClock(START.timestamp() + 3600)
+    options = dict(chunk_buckets=3, redis_enabled=True, redis_factory=factory, hub=hub)
+    first = QueryCache(clock=clock, **options)
+    second = QueryCache(clock=clock, **options)
+    buffer = IngestBuffer(session_factory=TestingSessionLocal, redis_factory=factory)
+    try:
+        await first.start()
+        await second.start()
+        assert await series(first, 59) == [10.0] * 6
+        assert await series(second, 59) == [10.0] * 6
+        shared = factory.publisher()
+        async for key in shared.scan_iter("query-cache:cpu:*"):
+            assert 0 < await shared.ttl(key) <= first.redis_ttl_seconds
+
+        buffer.add([IngestPoint("cpu", START + timedelta(seconds=35), 100.0)])
+        await buffer.flush()
+        await _wait_for(lambda: len(first) == len(second) == 1)
+
+        expected = [10.0, 10.0, 10.0, 110.0, 10.0, 10.0]
+        assert await series(second, 59) == expected
+        # Shared chunks are versioned per type: the one the second cache read back
+        # after the late point is current, the untouched one was retired as well.
+        third = QueryCache(clock=clock, **options)
+        assert await series(third, 59) == expected
+        assert (third.hits, third.misses) == (1, 1)
+        await third.close()
+    finally:
+        await buffer.close()
+        await first.close()
+        await second.close()
+        await hub.close()
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app.services.reducers import (
+    Downsample,
+    fold_minmax,
+    lttb_indices,
+    minmax_indices,
+    reduce_points,
+    reduce_series,
+)
+from app.services.timeseries import SeriesColumns
+from app.tests.test_metrics import START, fetch, seed
+
+
+def test_lttb_keeps_endpoints_and_the_spike() -> None:
+    x = np.arange(1000, dtype=np.float64)
+    y = np.sin(x / 50)
+    y[437] = 25.0
+
+    keep = lttb_indices(x, y, 50)
+
+    assert len(keep) == 50
+    assert keep[0] == 0 and keep[-1] == 999
+    assert (np.diff(keep) > 0).all()
+    assert 437 in keep
+
+
+def test_lttb_returns_short_series_unchanged() -> None:
+    x = np.arange(5, dtype=np.float64)
+    assert lttb_indices(x, x, 10).tolist() == [0, 1, 2, 3, 4]
+    assert lttb_indices(x, x, 2).tolist() == [0, 4]
+
+
+def test_minmax_keeps_each_bucket_extremes_in_order() -> None:
+    y = np.array([3.0, 1.0, 4.0, 1.5, 9.0, 2.0, 6.0, 5.0])
+
+    keep = minmax_indices(y, 4)
+
+    # Two buckets of four: min 1.0 / max 4.0, then min 2.0 / max 9.0.
+    assert keep.tolist() == [1, 2, 4, 5]
+
+
+def test_reduce_series_and_points_share_the_reducer() -> None:
+    values = [float(i % 7) for i in range(100)]
+    columns = SeriesColumns(
+        metric_type="cpu",
+        step=1,
+        timestamps=[START + timedelta(seconds=i) for i in range(100)],
+        values=values,
+    )
+    points = [(ts.timestamp(), value) for ts, value in zip(columns.timestamps, values)]
+
+    for method in Downsample:
+        reduced = reduce_series(columns, 20, method)
+        assert 0 < len(reduced) <= 20
+        assert reduced.step == 1
+        assert [
+            (ts.timestamp(), v) for ts, v in zip(reduced.timestamps, reduced.values)
+        ] == (reduce_points(points, 20, method))
+    assert reduce_series(columns, 100, Downsample.LTTB) is columns
+
+
+def test_fold_minmax_keeps_arrival_order() -> None:
+    kept: list[float] = []
+    for value in [5.0, 9.0, 2.0, 6.0]:
+        kept = fold_minmax(kept, value, float)
+    assert kept == [9.0, 2.0]
+
+
+def test_metrics_endpoint_thins_to_max_points(
+    client: TestClient, db_session, auth_headers
+) -> None:
+    seed(db_session, "cpu", [float(i % 10) for i in range(60)])
+
+    full = fetch(client, auth_headers, step=1)
+    lttb = fetch(client, auth_headers, step=1, max_points=12)
+    envelope = fetch(client, auth_headers, step=1, max_points=12, downsample="minmax")
+
+    assert len(full["series"]) == 60
+    assert len(lttb["series"]) == 12
+    assert lttb["series"][0] == full["series"][0]
+    assert lttb["series"][-1] == full["series"][-1]
+    assert len(envelope["series"]) <= 12
+    assert {point["value"] for point in envelope["series"]} == {0.0, 9.0}
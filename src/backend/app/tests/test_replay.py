@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import json
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.fanout import MetricMessage, MetricsHub, metric_channel
+from app.services.ingest import IngestPoint, write_points
+from app.services.replay import LogEntry, ReplayBroker, ReplayLog, ReplaySubscription
+from app.tests.conftest import TestingAsyncSessionLocal
+from app.tests.test_fanout import CountingRedis, _wait_for
+from app.ws import metrics as ws_metrics
+
+
+def entry(seq: int, ts: float) -> LogEntry:
+    return LogEntry("cpu", seq, ts, float(seq), f"frame-{seq}")
+
+
+def message(metric_type: str, value: float, ts: datetime) -> MetricMessage:
+    data = {"timestamp": ts.isoformat(), "value": value, "type": metric_type}
+    return MetricMessage(metric_channel(metric_type), json.dumps(data), data)
+
+
+def test_replay_log_serves_only_what_it_still_holds() -> None:
+    log = ReplayLog(max_entries=3, max_age=100, covered_since=0)
+    for seq in range(1, 6):
+        log.append(entry(seq, float(seq)), now=10)
+
+    assert [e.seq for e in log.since(3)] == [4, 5]
+    assert log.since(5) == []
+    assert log.since(1) is None  # seq 2 was evicted
+    assert log.since(6) is None
+    assert log.covered_since == 2.0
+
+    log.append(entry(6, 50.0), now=150)
+    assert [e.seq for e in log.entries] == [6]
+    assert log.covered_since == 5.0
+
+
+def test_broker_sequences_each_type_independently() -> None:
+    broker = ReplayBroker(hub=MetricsHub(redis_factory=CountingRedis()))
+    now = datetime.now(tz=UTC)
+    for value in range(3):
+        broker.publish(message("cpu", value, now))
+    broker.publish(message("mem", 1, now))
+
+    assert broker._logs["cpu"].last_seq == 3
+    assert broker._logs["mem"].last_seq == 1
+    frame = json.loads(broker._logs["cpu"].entries[-1].frame)
+    assert frame["kind"] == "delta" and frame["seq"] == 3
+    assert frame["data"]["value"] == 2
+
+
+@pytest.fixture()
+def ws_setup(client: TestClient, auth_headers, monkeypatch):
+    factory = CountingRedis()
+    hub = MetricsHub(redis_factory=factory)
+    broker = ReplayBroker(hub=hub, snapshot_seconds=60)
+    monkeypatch.setattr(ws_metrics, "replay_broker", broker)
+    token = auth_headers["Authorization"].split()[1]
+    publisher = client.portal.call(factory.publisher)
+
+    def publish(value: float) -> None:
+        payload = message("cpu", value, datetime.now(tz=UTC)).raw
+        client.portal.call(publisher.publish, metric_channel("cpu"), payload)
+
+    yield broker, token, publish
+    client.portal.call(broker.close)
+    client.portal.call(hub.close)
+
+
+def test_websocket_snapshot_joins_database_and_live_log(
+    client: TestClient, db_session, ws_setup
+) -> None:
+    broker, token, publish = ws_setup
+    now = datetime.now(tz=UTC)
+    write_points(
+        db_session,
+        [
+            IngestPoint("cpu", now - timedelta(seconds=120), 1.0),
+            IngestPoint("cpu", now - timedelta(seconds=30), 2.0),
+        ],
+    )
+    url = f"/ws/metrics?metric_type=cpu&token={token}"
+
+    with client.websocket_connect(url) as ws:
+        snapshot = json.loads(ws.receive_text())
+        assert snapshot["kind"] == "snapshot"
+        assert snapshot["epoch"] == broker.epoch
+        assert snapshot["seq"] == 0
+        assert [value for _, value in snapshot["points"]] == [2.0]
+
+        publish(3.0)
+        delta = json.loads(ws.receive_text())
+        assert delta["seq"] == 1
+        assert delta["data"]["value"] == 3.0
+
+        with client.websocket_connect(url) as other:
+            snapshot = json.loads(other.receive_text())
+            assert snapshot["seq"] == 1
+            assert [value for _, value in snapshot["points"]] == [2.0, 3.0]
+
+
+def test_websocket_resume_replays_only_missed_deltas(
+    client: TestClient, ws_setup
+) -> None:
+    broker, token, publish = ws_setup
+    url = f"/ws/metrics?metric_type=cpu&token={token}"
+    with client.websocket_connect(url) as ws:
+        epoch = json.loads(ws.receive_text())["epoch"]
+        publish(1.0)
+        last_seq = json.loads(ws.receive_text())["seq"]
+
+    publish(2.0)
+    publish(3.0)
+    client.portal.call(_wait_for, lambda: broker._logs["cpu"].last_seq == 3)
+
+    with client.websocket_connect(f"{url}&epoch={epoch}&last_seq={last_seq}") as ws:
+        replayed = [json.loads(ws.receive_text()) for _ in range(2)]
+        assert [frame["seq"] for frame in replayed] == [2, 3]
+        assert [frame["data"]["value"] for frame in replayed] == [2.0, 3.0]
+
+    with client.websocket_connect(f"{url}&epoch=stale&last_seq={last_seq}") as ws:
+        snapshot = json.loads(ws.receive_text())
+        assert snapshot["kind"] == "snapshot"
+        assert snapshot["seq"] == 3
+
+
+@pytest.mark.asyncio
+async def test_stream_gap_starts_new_epoch_without_resetting_seq() -> None:
+    hub = MetricsHub(redis_factory=CountingRedis())
+    broker = ReplayBroker(hub=hub)
+    broker.publish(message("cpu", 1, datetime.now(tz=UTC)))
+    epoch = broker.epoch
+
+    hub.read_failures += 1
+    broker._check_gaps()
+    broker.publish(message("cpu", 2, datetime.now(tz=UTC)))
+
+    assert broker.epoch != epoch
+    # One number is skipped, so a live client sees that it missed something.
+    assert broker._logs["cpu"].last_seq == 3
+    assert broker._logs["cpu"].since(1) is None
+
+
+@pytest.mark.asyncio
+async def test_snapshot_keeps_series_apart(db_session) -> None:
+    now = datetime.now(tz=UTC)
+    web, db = (("host", "web-1"),), (("host", "db-1"),)
+    write_points(
+        db_session,
+        [
+            IngestPoint("cpu", now - timedelta(seconds=30 - i), float(i), labels)
+            for i in range(10)
+            for labels in (web, db)
+        ],
+    )
+    hub = MetricsHub(redis_factory=CountingRedis())
+    broker = ReplayBroker(hub=hub, snapshot_seconds=60)
+    try:
+        async with TestingAsyncSessionLocal() as session:
+            frames, subscription = await broker.attach(
+                "cpu", session, broker.new_queue(), max_points=2
+            )
+            live = message("cpu", 42.0, now)
+            live.data["labels"] = {"host": "web-1"}
+            broker.publish(live)
+            assert broker._logs["cpu"].entries[-1].labels == web
+            await subscription.close()
+    finally:
+        await broker.close()
+        await hub.close()
+
+    points = json.loads(frames[0])["points"]
+    # Each series is thinned on its own, to its first and last point.
+    assert sorted((p[2]["host"], p[1]) for p in points) == [
+        ("db-1", 0.0),
+        ("db-1", 9.0),
+        ("web-1", 0.0),
+        ("web-1", 9.0),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_types_are_followed_only_while_they_have_clients() -> None:
+    hub = MetricsHub(redis_factory=CountingRedis())
+    broker = ReplayBroker(hub=hub, linger_seconds=0.05)
+    try:
+        async with TestingAsyncSessionLocal() as session:
+            _, first = await broker.attach("cpu", session, broker.new_queue())
+            assert hub.channels == {metric_channel("cpu")}
+            broker.publish(message("cpu", 1, datetime.now(tz=UTC)))
+            epoch, last_seq = broker.epoch, broker._logs["cpu"].last_seq
+
+            await first.close()
+            assert broker.followed() == {"cpu"}  # lingering for a quick resume
+            await _wait_for(lambda: not hub.channels)
+            assert broker.followed() == set()
+
+            # Points published meanwhile were not seen, so resuming gets a snapshot.
+            frames, second = await broker.attach(
+                "cpu", session, broker.new_queue(), last_seq=last_seq, epoch=epoch
+            )
+            assert json.loads(frames[0])["kind"] == "snapshot"
+            assert json.loads(frames[0])["seq"] == last_seq + 1
+            await second.close()
+    finally:
+        await broker.close()
+        await hub.close()
+
+
+def test_client_queues_never_conflate_sequenced_deltas() -> None:
+    broker = ReplayBroker(hub=MetricsHub(redis_factory=CountingRedis()))
+    queue = broker.new_queue()
+    broker._subscribers["cpu"] = {ReplaySubscription(broker, "cpu", queue)}
+    for value in range(3):
+        broker.publish(message("cpu", value, datetime.now(tz=UTC)))
+    assert [queue.get_nowait().seq for _ in range(len(queue))] == [1, 2, 3]
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import json
+from datetime import UTC, datetime
+
+import numpy as np
+import pytest
+from fastapi import WebSocketDisconnect
+from fastapi.testclient import TestClient
+
+from app.api import metrics as metrics_api
+from app.services.fanout import MetricsHub, metric_channel
+from app.services.rolling import DDSketch, RollingAggregates, RollingWindow
+from app.tests.test_fanout import CountingRedis, _wait_for
+from app.tests.test_hot_tier import FakeClock
+from app.ws import aggregates as ws_aggregates
+
+START = datetime(2025, 1, 1, tzinfo=UTC).timestamp()
+
+
+@pytest.mark.parametrize("q", [0.0, 0.25, 0.5, 0.95, 0.99, 1.0])
+def test_sketch_quantiles_stay_within_relative_accuracy(q: float) -> None:
+    values = np.random.default_rng(7).lognormal(3, 1.5, 20_000)
+    sketch = DDSketch(alpha=0.01)
+    for value in values:
+        sketch.add(float(value))
+
+    (estimate,) = sketch.quantiles([q])
+
+    exact = np.quantile(values, q, method="lower")
+    assert estimate == pytest.approx(exact, rel=0.0101)
+    assert sketch.bucket_count < 1500
+
+
+def test_sketch_merges_and_removes_by_bucket_counts() -> None:
+    left, right, whole = DDSketch(), DDSketch(), DDSketch()
+    for value in range(-50, 51):
+        (left if value % 2 else right).add(value)
+        whole.add(value)
+    left.merge(right)
+    assert left.quantiles([0.1, 0.5, 0.9]) == whole.quantiles([0.1, 0.5, 0.9])
+
+    for value in range(-50, 1):
+        whole.remove(value)
+    assert whole.count == 50
+    assert whole.quantiles([0.0])[0] == pytest.approx(1, rel=0.01)
+    with pytest.raises(ValueError):
+        whole.merge(DDSketch(alpha=0.05))
+
+
+def test_rolling_window_matches_brute_force_as_points_expire() -> None:
+    rng = np.random.default_rng(11)
+    window = RollingWindow(10)
+    points: list[tuple[float, float]] = []
+    ts = START
+    for _ in range(500):
+        ts += float(rng.uniform(0, 0.5))
+        value = float(rng.normal(100, 20))
+        points.append((ts, value))
+        window.add(ts, value, now=ts)
+
+        live = [v for t, v in points if t > ts - 10]
+        snapshot = window.snapshot(ts, [0.5])
+        assert snapshot["count"] == len(live)
+        assert snapshot["sum"] == pytest.approx(sum(live))
+        assert snapshot["min"] == min(live)
+        assert snapshot["max"] == max(live)
+        assert snapshot["quantiles"]["0.5"] == pytest.approx(
+            np.quantile(live, 0.5, method="lower"), rel=0.011
+        )
+
+
+def test_snapshot_expires_idle_series_and_reports_rate() -> None:
+    window = RollingWindow(60)
+    for second in range(10):
+        window.add(START + second, 100 + 5 * second, now=START + second)
+
+    snapshot = window.snapshot(START + 9)
+    assert snapshot["rate"] == pytest.approx(5)
+    assert snapshot["points_per_second"] == pytest.approx(10 / 60)
+    assert window.snapshot(START + 9) is snapshot  # unchanged, so cached
+
+    idle = window.snapshot(START + 120)
+    assert idle["count"] == 0
+    assert idle["min"] is None and idle["quantiles"]["0.5"] is None
+    window.add(START, 1.0, now=START + 120)  # already outside the window
+    assert len(window) == 0
+
+
+def test_late_points_are_dropped_not_misplaced() -> None:
+    clock = FakeClock(START + 5)
+    aggregates = RollingAggregates(windows=[10], clock=clock)
+    for second, value in ((1, 5.0), (4, 7.0), (2, 1.0), (5, 6.0)):
+        aggregates.add("cpu", START + second, value)
+    assert aggregates.dropped == 1  # the point at second 2 came after second 4
+    snapshot = aggregates.query("cpu", 10)
+    assert (snapshot["count"], snapshot["min"], snapshot["max"]) == (3, 5.0, 7.0)
+
+    clock.now = START + 14.5  # second 4 leaves the window and takes its max along
+    snapshot = aggregates.query("cpu", 10)
+    assert (snapshot["count"], snapshot["min"], snapshot["max"]) == (1, 6.0, 6.0)
+
+
+def test_interleaved_series_of_one_type_are_merged_at_query_time() -> None:
+    clock = FakeClock(START + 60.5)
+    aggregates = RollingAggregates(windows=[60], clock=clock)
+    web, db = (("host", "web"),), (("host", "db"),)
+    for second in range(1, 61):
+        # Each host reports on its own clock, so their timestamps cross.
+        aggregates.add("cpu", START + second + 0.5, 10.0, web)
+        aggregates.add("cpu", START + second, 30.0 + second, db)
+    assert aggregates.dropped == 0
+    snapshot = aggregates.query("cpu", 60)
+    assert (snapshot["count"], snapshot["min"], snapshot["max"]) == (120, 10.0, 90.0)
+    values = [10.0] * 60 + [30.0 + second for second in range(1, 61)]
+    assert snapshot["quantiles"]["0.95"] == pytest.approx(
+        np.quantile(values, 0.95), rel=0.02
+    )
+    # web is flat and db climbs one per second; neither rate mixes the two.
+    assert snapshot["rate"] == pytest.approx(1.0)
+
+    clock.now = START + 200
+    assert aggregates.query("cpu", 60)["count"] == 0
+    aggregates.add("cpu", START + 199, 1.0)
+    assert aggregates.types == ["cpu"]
+    assert list(aggregates._series["cpu"]) == [()]
+
+
+@pytest.mark.asyncio
+async def test_aggregates_are_fed_from_the_stream() -> None:
+    factory = CountingRedis()
+    hub = MetricsHub(redis_factory=factory)
+    aggregates = RollingAggregates(windows=[60], hub=hub)
+    publisher = factory.publisher()
+    try:
+        await aggregates.start()
+        now = datetime.now(tz=UTC).isoformat()
+        for value in (1, 2, 3):
+            await publisher.publish(
+                metric_channel("cpu"),
+                json.dumps({"type": "cpu", "timestamp": now, "value": value}),
+            )
+        await _wait_for(lambda: aggregates.query("cpu", 60)["count"] == 3)
+        assert aggregates.query("cpu", 60)["mean"] == pytest.approx(2)
+        with pytest.raises(ValueError):
+            aggregates.query("cpu", 30)
+    finally:
+        await aggregates.close()
+        await hub.close()
+        await publisher.aclose()
+
+
+def test_aggregate_endpoint_and_websocket(
+    client: TestClient, auth_headers, monkeypatch
+) -> None:
+    clock = FakeClock(START)
+    aggregates = RollingAggregates(windows=[60, 300], clock=clock)
+    for second in reversed(range(100)):  # oldest first, as the stream delivers
+        aggregates.add("cpu", START - second, float(second))
+    monkeypatch.setattr(metrics_api, "rolling_aggregates", aggregates)
+    monkeypatch.setattr(ws_aggregates, "rolling_aggregates", aggregates)
+
+    response = client.get(
+        "/metrics/aggregate",
+        params={"type": "cpu", "window": 60, "q": [0.5, 0.95]},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["count"], body["min"], body["max"]) == (60, 0, 59)
+    assert set(body["quantiles"]) == {"0.5", "0.95"}
+    assert body["quantiles"]["0.95"] == pytest.approx(56, rel=0.02)
+
+    response = client.get(
+        "/metrics/aggregate", params={"window": 42}, headers=auth_headers
+    )
+    assert response.status_code == 422
+
+    token = auth_headers["Authorization"].split()[1]
+    with client.websocket_connect(
+        f"/ws/aggregates?type=cpu&type=mem&window=300&q=0.5&token={token}"
+    ) as socket:
+        frame = json.loads(socket.receive_text())
+    assert frame["kind"] == "aggregates"
+    assert [a["type"] for a in frame["aggregates"]] == ["cpu", "mem"]
+    assert frame["aggregates"][0]["count"] == 100
+    assert frame["aggregates"][1]["count"] == 0
+
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect(
+            f"/ws/aggregates?type=cpu&window=42&token={token}"
+        ) as socket:
+            socket.receive_text()
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.services.send_queue import OverflowPolicy, SendQueue, SlowConsumerError
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _by_type(item: dict) -> str:
+    return item["type"]
+
+
+def test_conflate_keeps_newest_point_per_type() -> None:
+    queue: SendQueue[dict] = SendQueue(8, OverflowPolicy.CONFLATE, key=_by_type)
+    queue.put({"type": "cpu", "value": 1})
+    queue.put({"type": "mem", "value": 2})
+    queue.put({"type": "cpu", "value": 3})
+
+    assert queue.get_nowait() == {"type": "cpu", "value": 3}
+    assert queue.get_nowait() == {"type": "mem", "value": 2}
+    assert queue.stats() == {
+        "enqueued": 3,
+        "delivered": 2,
+        "dropped": 0,
+        "conflated": 1,
+        "pending": 0,
+    }
+
+
+def test_drop_oldest_once_bound_is_hit() -> None:
+    queue: SendQueue[int] = SendQueue(3, OverflowPolicy.DROP_OLDEST)
+    for value in range(5):
+        queue.put(value)
+
+    assert [queue.get_nowait() for _ in range(len(queue))] == [2, 3, 4]
+    assert queue.dropped == 2
+
+
+def test_conflate_drops_oldest_type_when_bound_is_hit() -> None:
+    queue: SendQueue[dict] = SendQueue(2, OverflowPolicy.CONFLATE, key=_by_type)
+    for metric_type in ("cpu", "mem", "disk"):
+        queue.put({"type": metric_type, "value": 0})
+
+    assert [queue.get_nowait()["type"] for _ in range(len(queue))] == ["mem", "disk"]
+    assert queue.dropped == 1
+
+
+@pytest.mark.asyncio
+async def test_lagging_consumer_is_flagged() -> None:
+    clock = FakeClock()
+    queue: SendQueue[dict] = SendQueue(
+        8, OverflowPolicy.CONFLATE, max_lag=5.0, key=_by_type, clock=clock
+    )
+    queue.put({"type": "cpu", "value": 1})
+    clock.now = 3.0
+    queue.put({"type": "cpu", "value": 2})
+    assert not queue.lagged.is_set()
+
+    clock.now = 6.0
+    queue.put({"type": "cpu", "value": 3})
+    assert queue.lagged.is_set()
+    with pytest.raises(SlowConsumerError):
+        await asyncio.wait_for(queue.wait_lagged(), timeout=1)
+    with pytest.raises(SlowConsumerError):
+        await queue.get()
+
+
+@pytest.mark.asyncio
+async def test_get_waits_for_next_item() -> None:
+    queue: SendQueue[int] = SendQueue(4, OverflowPolicy.DROP_OLDEST)
+    waiter = asyncio.create_task(queue.get())
+    await asyncio.sleep(0)
+    queue.put(7)
+
+    assert await asyncio.wait_for(waiter, timeout=1) == 7
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import json
+import time
+from datetime import timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from app.api import metrics as metrics_api
+from app.models.metric import Metric
+from app.models.series import Series
+from app.services.fanout import MetricMessage, MetricsHub, metric_channel
+from app.services.ingest import (
+    IngestBuffer,
+    IngestPoint,
+    decode_batch,
+    encode_batch,
+    encode_point,
+    parse_compact,
+    write_points,
+)
+from app.services.series import (
+    CardinalityLimitError,
+    Matcher,
+    MatchOp,
+    SeriesIndex,
+    normalize_labels,
+    series_id,
+    series_index,
+)
+from app.services.stream import StreamFilter, StreamSession
+from app.tests.conftest import TestingAsyncSessionLocal, TestingSessionLocal
+from app.tests.test_fanout import CountingRedis
+from app.tests.test_metrics import START, fetch
+
+WEB = (("host", "web-1"), ("region", "eu"))
+
+
+def test_labels_are_canonical_and_validated() -> None:
+    labels = normalize_labels({"region": "eu", "host": "web-1", "rack": ""})
+    assert labels == WEB  # sorted, and an empty value is no label at all
+    assert series_id("cpu", labels) == series_id("cpu", WEB)
+    assert series_id("cpu", labels) != series_id("mem", labels)
+    assert series_id("cpu") != series_id("cpu", labels)
+    for bad in ({"1host": "a"}, {"host": 1}, ["host"]):
+        with pytest.raises((TypeError, ValueError)):
+            normalize_labels(bad)
+
+
+def test_matchers_parse_every_operator() -> None:
+    assert Matcher.parse("host=web-1") == Matcher("host", MatchOp.EQ, "web-1")
+    assert Matcher.parse('host!="web-1"').op is MatchOp.NE
+    regex = Matcher.parse("host=~web-[12]")
+    assert regex.matches("web-2") and not regex.matches("web-21")  # anchored
+    assert not Matcher.parse("host!~web-.*").matches("web-3")
+    for bad in ("host", "=web", "host=~(", "1host=a"):
+        with pytest.raises(ValueError):
+            Matcher.parse(bad)
+    assert Matcher.parse("host=~web-[12]") is regex  # parsed once, then cached
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    ["(a+)+$", "(a|aa)*", "(.*){2,}x", r"(a)\1", "(?=a)a", ".*.*.*.*", "a" * 257],
+)
+def test_matchers_refuse_regexes_that_can_backtrack(pattern: str) -> None:
+    with pytest.raises(ValueError):
+        Matcher.parse(f"host=~{pattern}")
+    assert Matcher.parse("host=~(web|db)-[0-9]+.*").matches("db-12x")
+
+
+def build_index() -> tuple[SeriesIndex, dict[str, int]]:
+    index = SeriesIndex(max_per_type=100)
+    ids = {}
+    for host, region in (("web-1", "eu"), ("web-2", "eu"), ("db-1", "us")):
+        ids[host] = index.add("cpu", (("host", host), ("region", region)))
+    ids["bare"] = index.add("cpu", ())
+    index.add("mem", (("host", "web-1"),))
+    return index, ids
+
+
+@pytest.mark.parametrize(
+    ("matchers", "expected"),
+    [
+        ([], {"web-1", "web-2", "db-1", "bare"}),
+        (["host=web-1"], {"web-1"}),
+        (["region=eu", "host!=web-1"], {"web-2"}),
+        (["host=~web-.*"], {"web-1", "web-2"}),
+        (["host!~web-.*"], {"db-1", "bare"}),
+        (["region!=eu"], {"db-1", "bare"}),  # a missing label reads as ""
+        (['region=""'], {"bare"}),
+        (["host=nope"], set()),
+    ],
+)
+def test_index_resolves_matchers(matchers: list[str], expected: set[str]) -> None:
+    index, ids = build_index()
+    selected = index.select("cpu", [Matcher.parse(text) for text in matchers])
+    assert selected == {ids[name] for name in expected}
+    assert index.count("mem") == 1
+
+
+def test_cardinality_guard_admits_all_or_nothing() -> None:
+    index = SeriesIndex(max_per_type=3)
+    index.admit([("cpu", (("host", "a"),)), ("cpu", (("host", "b"),))])
+    with pytest.raises(CardinalityLimitError):
+        index.admit([("cpu", (("host", "c"),)), ("cpu", (("host", "d"),))])
+    assert index.count("cpu") == 2
+    index.admit([("cpu", (("host", "a"),)), ("cpu", (("host", "c"),))])
+    index.admit([("mem", (("host", "z"),))])  # the limit is per type
+    assert (index.count("cpu"), len(index)) == (3, 4)
+
+
+def test_labelled_points_round_trip_through_log_and_payload() -> None:
+    points = [IngestPoint("cpu", START, 1.0, WEB), IngestPoint("cpu", START, 2.0)]
+    assert decode_batch(encode_batch(points)) == points
+    assert json.loads(encode_point(points[0]))["labels"] == dict(WEB)
+    assert "labels" not in json.loads(encode_point(points[1]))
+    rows = [["cpu", 0, 1, {"host": "web-1"}], ["cpu", 0, 2]]
+    assert [p.labels for p in parse_compact(json.dumps(rows).encode())] == [
+        (("host", "web-1"),),
+        (),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_index_loads_stored_series_and_learns_from_the_stream(
+    db_session,
+) -> None:
+    write_points(db_session, [IngestPoint("cpu", START, 1.0, WEB)])
+    stored = db_session.scalars(select(Series)).one()
+    assert (stored.id, stored.labels) == (series_id("cpu", WEB), dict(WEB))
+    metric = db_session.scalars(select(Metric)).one()
+    assert metric.series_id == stored.id
+
+    index = SeriesIndex(session_factory=TestingAsyncSessionLocal)
+    await index.load()
+    point = IngestPoint("cpu", START, 2.0, (("host", "web-2"),))
+    raw = encode_point(point)
+    index.add_message(MetricMessage(metric_channel("cpu"), raw, json.loads(raw)))
+    hosts = {dict(index.labels(sid))["host"] for sid in index.select("cpu", [])}
+    assert hosts == {"web-1", "web-2"}
+
+
+def labelled(host: str, value: float, second: int = 0) -> MetricMessage:
+    point = IngestPoint("cpu", START + timedelta(seconds=second), value)
+    raw = encode_point(point._replace(labels=(("host", host),)))
+    return MetricMessage(metric_channel("cpu"), raw, json.loads(raw))
+
+
+@pytest.mark.asyncio
+async def test_stream_filters_and_thins_per_series() -> None:
+    hub = MetricsHub(redis_factory=CountingRedis())
+    clock = iter(range(100)).__next__
+    session = StreamSession(hub=hub, clock=lambda: float(clock()))
+    try:
+        matchers = (Matcher.parse("host=~web-.*"),)
+        await session.subscribe(["cpu"], StreamFilter(interval=60, matchers=matchers))
+        for host, value in (("web-1", 1), ("web-2", 2), ("db-1", 3), ("web-1", 4)):
+            session.accept(labelled(host, value))
+        # The latest point of each matching series, not of the type as a whole.
+        assert sorted(m.data["value"] for m in session.flush()) == [2, 4]
+    finally:
+        await session.close()
+        await hub.close()
+
+
+def test_metrics_endpoint_narrows_to_matching_series(
+    client: TestClient, db_session, auth_headers
+) -> None:
+    for host, value in (("web-1", 10.0), ("web-2", 20.0), ("db-1", 40.0)):
+        labels = (("host", host),)
+        write_points(db_session, [IngestPoint("cpu", START, value, labels)])
+        series_index.add("cpu", labels)
+
+    def total(*match: str) -> list[float]:
+        payload = fetch(client, auth_headers, step=60, agg="sum", match=list(match))
+        return [point["value"] for point in payload["series"]]
+
+    assert total() == [70.0]
+    assert total("host=~web-.*") == [30.0]
+    assert total("host=~web-.*", "host!=web-1") == [20.0]
+    assert total("host=none") == []
+    invalid = client.get("/metrics", params={"match": "host=~("}, headers=auth_headers)
+    assert invalid.status_code == 422
+
+    listed = client.get(
+        "/metrics/series",
+        params={"type": "cpu", "match": "host!=db-1"},
+        headers=auth_headers,
+    )
+    assert [item["labels"] for item in listed.json()] == [
+        {"host": "web-1"},
+        {"host": "web-2"},
+    ]
+
+
+def test_ingest_refuses_batches_past_the_series_limit(
+    client: TestClient, auth_headers, monkeypatch
+) -> None:
+    buffer = IngestBuffer(
+        session_factory=TestingSessionLocal,
+        redis_factory=CountingRedis(),
+        flush_interval=60,
+    )
+    monkeypatch.setattr(metrics_api, "ingest_buffer", buffer)
+    monkeypatch.setattr(series_index, "max_per_type", 2)
+    ts = int(time.time() * 1000)
+
+    def ingest(*hosts: str) -> int:
+        rows = [["cpu", ts, 1, {"host": host}] for host in hosts]
+        return client.post(
+            "/metrics/ingest", json=rows, headers=auth_headers
+        ).status_code
+
+    assert ingest("a", "b", "a") == 202
+    assert ingest("c") == 422
+    assert ingest("b") == 202
+    assert len(buffer) == 4
+    client.portal.call(buffer.close)
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.fanout import MetricMessage, MetricsHub, metric_channel
+from app.services.stream import StreamFilter, StreamLimitError, StreamSession
+from app.tests.test_fanout import CountingRedis
+from app.ws import stream as ws_stream
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def message(metric_type: str, value: float, second: int = 0) -> MetricMessage:
+    data = {"type": metric_type, "timestamp": f"2025-01-01T00:00:{second:02d}Z"}
+    data["value"] = value
+    return MetricMessage(metric_channel(metric_type), json.dumps(data), data)
+
+
+def values(batch: list[MetricMessage]) -> list[tuple[str, float]]:
+    return [(message.data["type"], message.data["value"]) for message in batch]
+
+
+@pytest.mark.asyncio
+async def test_session_batches_matching_types_once_per_flush() -> None:
+    hub = MetricsHub(redis_factory=CountingRedis())
+    session = StreamSession(hub=hub)
+    try:
+        await session.subscribe(["cpu", "disk.*"], StreamFilter())
+        assert hub.channels == {metric_channel("cpu"), metric_channel("disk.*")}
+
+        session.accept(message("cpu", 1))
+        session.accept(message("cpu", 1))  # duplicate delivery
+        session.accept(message("disk.read", 2))
+        session.accept(message("cpu", 3, second=1))
+        session.accept(message("mem", 4))
+
+        assert values(session.flush()) == [("cpu", 1), ("cpu", 3), ("disk.read", 2)]
+        assert session.flush() == []
+
+        await session.unsubscribe(["disk.*"])
+        session.accept(message("disk.read", 5, second=1))
+        assert session.flush() == []
+        assert hub.channels == {metric_channel("cpu")}
+    finally:
+        await session.close()
+        await hub.close()
+    assert hub.subscriber_count() == 0
+
+
+@pytest.mark.asyncio
+async def test_session_applies_interval_and_threshold_filters() -> None:
+    hub = MetricsHub(redis_factory=CountingRedis())
+    clock = FakeClock()
+    session = StreamSession(hub=hub, max_subscriptions=2, clock=clock)
+    try:
+        await session.subscribe(["cpu"], StreamFilter(interval=1.0))
+        await session.subscribe(["mem"], StreamFilter(threshold=0.5))
+
+        for second in range(3):
+            session.accept(message("cpu", second, second))
+        for second, value in enumerate([1.0, 1.2, 1.6, 1.7]):
+            session.accept(message("mem", value, second))
+        assert values(session.flush()) == [("cpu", 2), ("mem", 1.0), ("mem", 1.6)]
+
+        clock.now = 0.5
+        session.accept(message("cpu", 7, 10))
+        assert session.flush() == []  # still inside the interval
+        clock.now = 1.0
+        assert values(session.flush()) == [("cpu", 7)]
+
+        with pytest.raises(StreamLimitError):
+            await session.subscribe(["disk"], StreamFilter())
+    finally:
+        await session.close()
+        await hub.close()
+
+
+@pytest.mark.asyncio
+async def test_session_keeps_min_max_envelope_per_interval() -> None:
+    hub = MetricsHub(redis_factory=CountingRedis())
+    clock = FakeClock()
+    session = StreamSession(hub=hub, clock=clock)
+    try:
+        await session.subscribe(["cpu"], StreamFilter(1.0, downsample="minmax"))
+
+        for second, value in enumerate([5, 9, 2, 6, 4]):
+            session.accept(message("cpu", value, second))
+        assert values(session.flush()) == [("cpu", 9), ("cpu", 2)]
+
+        clock.now = 1.0
+        session.accept(message("cpu", 3, 10))
+        assert values(session.flush()) == [("cpu", 3)]
+    finally:
+        await session.close()
+        await hub.close()
+
+
+def test_stream_websocket_multiplexes_types_over_one_socket(
+    client: TestClient, auth_headers, monkeypatch
+) -> None:
+    factory = CountingRedis()
+    hub = MetricsHub(redis_factory=factory)
+    monkeypatch.setattr(ws_stream, "hub", hub)
+    monkeypatch.setattr(ws_stream.settings, "ws_stream_tick_seconds", 0.01)
+    token = auth_headers["Authorization"].split()[1]
+    publisher = client.portal.call(factory.publisher)
+
+    try:
+        with client.websocket_connect(f"/ws/stream?token={token}") as ws:
+            ws.send_text(json.dumps({"action": "subscribe", "types": []}))
+            assert json.loads(ws.receive_text())["kind"] == "error"
+
+            ws.send_text(
+                json.dumps({"action": "subscribe", "types": ["cpu", "disk.*"]})
+            )
+            ack = json.loads(ws.receive_text())
+            assert ack == {"kind": "subscribed", "types": ["cpu", "disk.*"]}
+
+            for metric_type, value in (("cpu", 1), ("mem", 2), ("disk.read", 3)):
+                raw = message(metric_type, value).raw
+                channel = metric_channel(metric_type)
+                client.portal.call(publisher.publish, channel, raw)
+
+            received: list[tuple[str, float]] = []
+            while len(received) < 2:
+                frame = json.loads(ws.receive_text())
+                assert frame["kind"] == "batch"
+                received += [(p["type"], p["value"]) for p in frame["points"]]
+            assert sorted(received) == [("cpu", 1), ("disk.read", 3)]
+            assert factory.created == 1
+    finally:
+        client.portal.call(hub.close)
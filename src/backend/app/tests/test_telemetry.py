@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.internal import _allowed_source
+from app.core.config import settings
+from app.core.telemetry import Registry
+from app.services.worker_metrics import WorkerMetrics, worker_metrics
+from app.tests.test_fanout import CountingRedis
+
+
+def sample(text: str, line_prefix: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(line_prefix + " "):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{line_prefix} not exposed")
+
+
+def test_registry_renders_text_exposition() -> None:
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests.", ("path",))
+    requests.labels('/a"b').inc()
+    requests.labels('/a"b').inc(2)
+    latency = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    child = latency.labels()
+    for value in (0.05, 0.1, 0.5, 3.0):
+        child.observe(value)
+    registry.callback("depth", "Depth.", ("queue",), lambda: [(("q",), 4)])
+
+    text = registry.render()
+
+    assert "# TYPE requests_total counter" in text
+    assert sample(text, 'requests_total{path="/a\\"b"}') == 3
+    assert sample(text, 'latency_seconds_bucket{le="0.1"}') == 2
+    assert sample(text, 'latency_seconds_bucket{le="1.0"}') == 3
+    assert sample(text, 'latency_seconds_bucket{le="+Inf"}') == 4
+    assert sample(text, "latency_seconds_sum") == 3.65
+    assert sample(text, "latency_seconds_count") == 4
+    assert sample(text, 'depth{queue="q"}') == 4
+    # Registering a name again hands back the existing metric.
+    assert registry.counter("requests_total", "Requests.", ("path",)) is requests
+
+
+@pytest.fixture()
+def scrape(client: TestClient, monkeypatch) -> dict[str, str]:
+    shared = WorkerMetrics(redis_factory=CountingRedis())
+    monkeypatch.setattr("app.api.internal.worker_metrics", shared)
+    monkeypatch.setattr(settings, "internal_metrics_token", "scrape-secret")
+    yield {"Authorization": "Bearer scrape-secret"}
+    client.portal.call(shared.close)
+
+
+def test_internal_metrics_exposes_hot_paths(
+    client: TestClient, auth_headers: dict[str, str], scrape: dict[str, str]
+) -> None:
+    client.get("/metrics/hot-tier", headers=auth_headers)
+    client.get("/metrics/hot-tier", headers=auth_headers)
+    client.get("/no-such-page")
+
+    response = client.get("/internal/metrics", headers=scrape)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    worker = f'worker="{worker_metrics.worker}"'
+    route = f'{worker},method="GET",route="/metrics/hot-tier",status="200"'
+    assert sample(text, f"rad_http_request_duration_seconds_count{{{route}}}") >= 2
+    unmatched = f'{worker},method="GET",route="<unmatched>",status="404"'
+    assert sample(text, f"rad_http_request_duration_seconds_count{{{unmatched}}}") >= 1
+    assert sample(text, f'rad_jwt_decodes_total{{{worker},result="cached"}}') >= 1
+    bcrypt = f'rad_bcrypt_seconds_count{{{worker},op="verify_password"}}'
+    assert sample(text, bcrypt) >= 1
+    assert "# TYPE rad_db_pool_checked_out gauge" in text
+    assert "# TYPE rad_fanout_lag_seconds gauge" in text
+
+
+def test_internal_metrics_needs_the_token_or_an_allowed_source(
+    client: TestClient, scrape: dict[str, str]
+) -> None:
+    # The test client connects from "testclient", which is no address at all.
+    assert client.get("/internal/metrics").status_code == 403
+    wrong = {"Authorization": "Bearer nope"}
+    assert client.get("/internal/metrics", headers=wrong).status_code == 403
+    assert client.get("/internal/metrics", headers=scrape).status_code == 200
+    assert _allowed_source("127.0.0.1") and _allowed_source("::1")
+    assert not _allowed_source("10.0.0.7")
+
+
+@pytest.mark.asyncio
+async def test_every_worker_is_exposed_under_its_own_label() -> None:
+    factory = CountingRedis()
+    workers = []
+    for pid, count in (("1", 2), ("2", 3)):
+        registry = Registry()
+        registry.counter("jobs_total", "Jobs.", ("kind",)).labels("a").inc(count)
+        worker = WorkerMetrics(registry=registry, redis_factory=factory, interval=10)
+        worker.worker = f"host:{pid}"
+        workers.append(worker)
+    try:
+        await workers[1].publish()
+        text = await workers[0].render()
+        assert text.count("# TYPE jobs_total counter") == 1
+        assert sample(text, 'jobs_total{worker="host:1",kind="a"}') == 2
+        assert sample(text, 'jobs_total{worker="host:2",kind="a"}') == 3
+        await workers[1].start()
+        await workers[1].close()  # a worker that shuts down withdraws its samples
+        assert "host:2" not in await workers[0].render()
+    finally:
+        for worker in workers:
+            await worker.close()
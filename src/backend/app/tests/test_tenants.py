@@ -0,0 +1,300 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+import uuid
+
+import pytest
+from fastapi import WebSocketDisconnect, status
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from app.api import metrics as metrics_api
+from app.core.security import get_password_hash
+from app.models.metric import Metric
+from app.models.tenant import Tenant
+from app.models.user import User, UserRole
+from app.services.auth_cache import Principal
+from app.services.fanout import MetricMessage, MetricsHub, metric_channel
+from app.services.ingest import IngestBuffer
+from app.services.send_queue import SlowConsumerError
+from app.services.stream import StreamFilter, StreamSession
+from app.services.tenants import (
+    FairScheduler,
+    InvalidMetricTypeError,
+    QuotaExceededError,
+    TenantLimiter,
+    TenantQuota,
+    TokenBucket,
+    display_name,
+    namespace,
+    qualify,
+    tenant_limiter,
+)
+from app.tests.conftest import TestingSessionLocal
+from app.tests.test_fanout import CountingRedis
+from app.tests.test_hot_tier import FakeClock
+from app.tests.test_ingest import TS_MS
+
+
+def principal(tenant: str | None, **quota: float) -> Principal:
+    limits = {
+        "ingest_rate": 0,
+        "ingest_burst": 0,
+        "connection_rate": 0,
+        "max_connections": 0,
+    }
+    return Principal(
+        id=uuid.uuid4(),
+        email=f"{tenant}@example.com",
+        role=UserRole.USER,
+        tenant=tenant,
+        quota=TenantQuota(**{**limits, **quota}),
+    )
+
+
+def test_series_keys_are_namespaced_per_tenant() -> None:
+    assert qualify("acme", "cpu") == "acme/cpu"
+    assert qualify(None, "cpu") == "cpu"
+    assert (display_name("acme/cpu"), namespace("acme/cpu")) == ("cpu", "acme")
+    assert (display_name("cpu"), namespace("cpu")) == ("cpu", None)
+    with pytest.raises(InvalidMetricTypeError):
+        qualify(None, "acme/cpu")
+
+
+def test_token_bucket_refills_and_throttles_oversized_requests() -> None:
+    clock = FakeClock(0.0)
+    bucket = TokenBucket(rate=10, burst=20, clock=clock)
+    assert bucket.take(15) == 0.0
+    assert bucket.take(10) == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.take(10) == 0.0
+
+    clock.now += 2
+    assert bucket.take(50) == 0.0  # granted once full, leaving the bucket in debt
+    assert bucket.take(1) == pytest.approx(3.1)
+
+
+def test_limiter_caps_connections_and_connection_rate() -> None:
+    clock = FakeClock(0.0)
+    limiter = TenantLimiter(clock)
+    capped = principal("acme", max_connections=2)
+    limiter.open_connection(capped)
+    limiter.open_connection(capped)
+    with pytest.raises(QuotaExceededError):
+        limiter.open_connection(capped)
+    limiter.open_connection(principal("other", max_connections=2))
+    limiter.close_connection(capped)
+    limiter.open_connection(capped)
+    assert limiter.connections == {"acme": 2, "other": 1}
+
+    throttled = principal("slow", connection_rate=1)
+    limiter.open_connection(throttled)
+    with pytest.raises(QuotaExceededError) as exc_info:
+        limiter.open_connection(throttled)
+    assert exc_info.value.retry_after == 1
+    clock.now += 1
+    limiter.open_connection(throttled)
+
+
+@pytest.mark.asyncio
+async def test_fair_scheduler_alternates_between_waiting_tenants() -> None:
+    scheduler = FairScheduler(concurrency=1)
+    order: list[str] = []
+
+    async def send(tenant: str, frame: int) -> None:
+        async with scheduler.turn(tenant):
+            order.append(f"{tenant}{frame}")
+            await asyncio.sleep(0)
+
+    await scheduler.acquire("busy")
+    tasks = [asyncio.create_task(send("busy", i)) for i in range(3)]
+    tasks += [asyncio.create_task(send("quiet", i)) for i in range(2)]
+    await asyncio.sleep(0)
+    assert dict(scheduler.waiting()) == {"busy": 3, "quiet": 2}
+    scheduler.release()
+    await asyncio.gather(*tasks)
+    assert order == ["busy0", "quiet0", "busy1", "quiet1", "busy2"]
+    assert scheduler.active == 0 and not dict(scheduler.waiting())
+
+
+@pytest.mark.asyncio
+async def test_stalled_send_gives_up_its_slot() -> None:
+    scheduler = FairScheduler(concurrency=1, send_timeout=0.05)
+    stalled = asyncio.Event()
+
+    async def stall() -> None:
+        async with scheduler.turn("stuck"):
+            await stalled.wait()  # a socket whose peer stopped reading
+
+    async def send() -> str:
+        async with scheduler.turn("quiet"):
+            return "sent"
+
+    stuck = asyncio.create_task(stall())
+    await asyncio.sleep(0)
+    assert await asyncio.wait_for(send(), 1) == "sent"
+    with pytest.raises(SlowConsumerError):
+        await stuck
+    assert scheduler.active == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_gives_up_its_place() -> None:
+    scheduler = FairScheduler(concurrency=1)
+    await scheduler.acquire("a")
+    waiter = asyncio.create_task(scheduler.acquire("b"))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+    scheduler.release()
+    assert scheduler.active == 0 and not dict(scheduler.waiting())
+
+
+def message(key: str, value: float) -> MetricMessage:
+    data = {"type": display_name(key), "timestamp": "2025-01-01T00:00:00Z"}
+    data["value"] = value
+    return MetricMessage(metric_channel(key), json.dumps(data), data)
+
+
+@pytest.mark.asyncio
+async def test_stream_session_only_sees_its_tenant() -> None:
+    hub = MetricsHub(redis_factory=CountingRedis())
+    session = StreamSession(hub=hub, tenant="acme")
+    shared = StreamSession(hub=hub)
+    try:
+        await session.subscribe(["cpu", "disk.*"], StreamFilter())
+        await shared.subscribe(["*"], StreamFilter())
+        assert session.patterns == ["cpu", "disk.*"]
+        assert metric_channel("acme/disk.*") in hub.channels
+        with pytest.raises(InvalidMetricTypeError):
+            await session.subscribe(["other/cpu"], StreamFilter())
+
+        for key, value in (("acme/cpu", 1), ("cpu", 2), ("other/disk.io", 3)):
+            session.accept(message(key, value))
+            shared.accept(message(key, value))
+        session.accept(message("acme/disk.io", 4))
+
+        assert [m.data["value"] for m in session.flush()] == [1, 4]
+        assert [m.data["value"] for m in shared.flush()] == [2]
+        await session.unsubscribe(["disk.*"])
+        assert session.patterns == ["cpu"]
+    finally:
+        await session.close()
+        await shared.close()
+        await hub.close()
+
+
+def tenant_headers(client: TestClient, db_session, **quota: float) -> dict[str, str]:
+    tenant = Tenant(slug="acme", name="Acme", **quota)
+    db_session.add(tenant)
+    db_session.add(
+        User(
+            email="ops@acme.example",
+            password_hash=get_password_hash("acmepass"),
+            role=UserRole.ADMIN,
+            tenant=tenant,
+        )
+    )
+    db_session.commit()
+    response = client.post(
+        "/auth/login", json={"email": "ops@acme.example", "password": "acmepass"}
+    )
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_tenant_ingest_is_namespaced_and_rate_limited(
+    client: TestClient, db_session, monkeypatch
+) -> None:
+    factory = CountingRedis()
+    buffer = IngestBuffer(
+        session_factory=TestingSessionLocal, redis_factory=factory, flush_interval=60
+    )
+    monkeypatch.setattr(metrics_api, "ingest_buffer", buffer)
+    headers = tenant_headers(client, db_session, ingest_rate=1.0, ingest_burst=3)
+    subscriber = client.portal.call(factory.publisher).pubsub()
+    client.portal.call(subscriber.subscribe, metric_channel("acme/cpu"))
+
+    rows = [["cpu", TS_MS, 1], ["cpu", TS_MS, 2]]
+    accepted = client.post("/metrics/ingest", json=rows, headers=headers)
+    throttled = client.post("/metrics/ingest", json=rows, headers=headers)
+    escaping = [["other/cpu", TS_MS, 1]]
+    invalid = client.post("/metrics/ingest", json=escaping, headers=headers)
+    assert (accepted.status_code, throttled.status_code) == (202, 429)
+    assert throttled.headers["Retry-After"] == "1"
+    assert invalid.status_code == 422
+
+    assert client.portal.call(buffer.flush) == 2
+    assert set(db_session.scalars(select(Metric.type))) == {"acme/cpu"}
+    published = []
+    for _ in range(10):
+        received = client.portal.call(subscriber.get_message, True, 0.1)
+        if received is not None:
+            published.append(json.loads(received["data"]))
+    assert [point["type"] for point in published] == ["cpu", "cpu"]
+    client.portal.call(subscriber.aclose)
+    client.portal.call(buffer.close)
+
+
+def test_refused_batches_do_not_use_up_the_ingest_rate(
+    client: TestClient, db_session, monkeypatch
+) -> None:
+    buffer = IngestBuffer(
+        session_factory=TestingSessionLocal,
+        redis_factory=CountingRedis(),
+        flush_interval=60,
+        max_points=3,
+    )
+    monkeypatch.setattr(metrics_api, "ingest_buffer", buffer)
+    monkeypatch.setattr(metrics_api.series_index, "max_per_type", 1)
+    headers = tenant_headers(client, db_session, ingest_rate=0.01, ingest_burst=3)
+
+    def ingest(*hosts: str) -> int:
+        rows = [["cpu", TS_MS, 1, {"host": host}] for host in hosts]
+        return client.post("/metrics/ingest", json=rows, headers=headers).status_code
+
+    assert ingest("a", "b", "a") == 422  # too many series
+    assert ingest("a", "a", "a", "a") == 429  # more than the buffer holds
+    assert ingest("a", "a", "a") == 202
+    assert ingest("a") == 429  # only now is the rate used up
+    client.portal.call(buffer.close)
+
+
+def test_alert_rules_are_private_to_their_tenant(
+    client: TestClient, db_session, auth_headers
+) -> None:
+    headers = tenant_headers(client, db_session)
+    rule = {"name": "hot", "metric_type": "cpu", "kind": "threshold", "upper": 90}
+    created = client.post("/alerts/rules", json=rule, headers=headers)
+    assert created.status_code == 201
+    assert created.json()["metric_type"] == "cpu"
+
+    shared = {**rule, "metric_type": "mem"}
+    assert client.post("/alerts/rules", json=shared, headers=auth_headers).is_success
+
+    def listed(headers: dict[str, str]) -> list[str]:
+        rules = client.get("/alerts/rules", headers=headers).json()
+        return [item["metric_type"] for item in rules]
+
+    assert (listed(headers), listed(auth_headers)) == (["cpu"], ["mem"])
+    rule_id = created.json()["id"]
+    deleted = client.delete(f"/alerts/rules/{rule_id}", headers=auth_headers)
+    assert deleted.status_code == 404
+
+
+def test_websocket_connections_are_capped_per_tenant(
+    client: TestClient, db_session
+) -> None:
+    token = tenant_headers(client, db_session, max_connections=1)["Authorization"]
+    url = f"/ws/stream?token={token.split()[1]}"
+    with client.websocket_connect(url):
+        with pytest.raises(WebSocketDisconnect) as exc_info:
+            with client.websocket_connect(url):
+                pass
+        assert exc_info.value.code == status.WS_1013_TRY_AGAIN_LATER
+    for _ in range(100):
+        if not tenant_limiter.connections:
+            break
+        time.sleep(0.01)
+    assert tenant_limiter.connections == {}
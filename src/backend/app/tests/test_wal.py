@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from app.models.metric import Metric, MetricRollup1m
+from app.services.ingest import (
+    BufferFullError,
+    IngestBuffer,
+    IngestPoint,
+    applied_position,
+    batch_size,
+    decode_batch,
+    encode_batch,
+)
+from app.services.wal import HEADER, LogFullError, Position, SegmentLog
+from app.tests.conftest import TestingSessionLocal
+from app.tests.test_fanout import CountingRedis, _wait_for
+
+TS = datetime(2025, 1, 1, 12, 0, 0, 123457, tzinfo=UTC)
+
+
+def payloads(log: SegmentLog) -> list[bytes]:
+    return [payload for payload, _ in log.records()]
+
+
+def test_log_rotates_segments_and_survives_reopen(tmp_path) -> None:
+    log = SegmentLog(tmp_path, segment_bytes=64, max_bytes=1024)
+    records = [bytes([i]) * 20 for i in range(6)]
+    log.append(records[:4])
+    end = log.append(records[4:])
+    assert end.segment == 2  # two 28 byte records per 64 byte segment
+    log.close()
+
+    log = SegmentLog(tmp_path, segment_bytes=64, max_bytes=1024)
+    assert payloads(log) == records
+    positions = [position for _, position in log.records()]
+    log.commit(positions[2])  # past the first segment, which is deleted
+    assert len(list(tmp_path.glob("*.seg"))) == 2
+    log.append([b"next"])
+    log.close()
+
+    log = SegmentLog(tmp_path, segment_bytes=64, max_bytes=1024)
+    assert payloads(log) == records[3:] + [b"next"]
+    log.close()
+
+
+def test_torn_tail_record_ends_the_log(tmp_path) -> None:
+    log = SegmentLog(tmp_path, segment_bytes=256, max_bytes=1024)
+    end = log.append([b"complete", b"torn-record"])
+    log.close()
+    segment = next(tmp_path.glob("*.seg"))
+    data = bytearray(segment.read_bytes())
+    data[end.offset - 3] ^= 0xFF  # corrupt the last record's payload
+    segment.write_bytes(bytes(data))
+
+    log = SegmentLog(tmp_path, segment_bytes=256, max_bytes=1024)
+    assert payloads(log) == [b"complete"]
+    log.append([b"after"])
+    assert payloads(log) == [b"complete", b"after"]
+    assert log.pending_bytes == 2 * HEADER.size + len(b"completeafter")
+    log.close()
+
+
+def test_full_log_rejects_whole_append_until_committed(tmp_path) -> None:
+    log = SegmentLog(tmp_path, segment_bytes=64, max_bytes=128)
+    record = b"x" * (64 - HEADER.size)
+    log.append([record])
+    with pytest.raises(LogFullError):
+        log.append([record, record])
+    assert payloads(log) == [record]  # nothing of the rejected append was written
+
+    end = log.append([record])
+    with pytest.raises(LogFullError):
+        log.append([record])
+    log.commit(end)
+    log.append([record])
+    assert payloads(log) == [record]
+    assert log.disk_bytes == 128
+    with pytest.raises(ValueError):
+        log.append([b"y" * 64])
+    log.close()
+
+
+def test_each_process_claims_its_own_directory(tmp_path) -> None:
+    first = SegmentLog.claim(tmp_path, 64, 1024)
+    second = SegmentLog.claim(tmp_path, 64, 1024)
+    try:
+        assert (first.directory.name, second.directory.name) == ("0", "1")
+    finally:
+        first.close()
+        second.close()
+    again = SegmentLog.claim(tmp_path, 64, 1024)
+    assert again.directory.name == "0"
+    again.close()
+
+
+def test_batches_round_trip_exactly() -> None:
+    points = [
+        IngestPoint(f"type-{i}", TS + timedelta(microseconds=i), i / 3)
+        for i in range(1000)
+    ]
+    assert decode_batch(encode_batch(points)) == points
+    assert batch_size(encode_batch(points)) == 1000
+
+
+class FlakyDatabase:
+    def __init__(self) -> None:
+        self.down = False
+        self.sessions = 0
+
+    def __call__(self):
+        if self.down:
+            raise ConnectionError("database is down")
+        self.sessions += 1
+        return TestingSessionLocal()
+
+
+def stored_points() -> int:
+    with TestingSessionLocal() as session:
+        return session.execute(select(func.count()).select_from(Metric)).scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_outage_is_replayed_once_dependencies_recover(db_session, tmp_path):
+    database, factory = FlakyDatabase(), CountingRedis()
+    subscriber = factory.publisher().pubsub()
+    await subscriber.subscribe("metrics:cpu")
+    buffer = IngestBuffer(
+        session_factory=database,
+        redis_factory=factory,
+        flush_points=50,
+        flush_interval=0.01,
+        wal_dir=tmp_path,
+    )
+    points = [IngestPoint("cpu", TS, float(i)) for i in range(120)]
+    try:
+        database.down = True
+        buffer.add(points[:60])
+        await _wait_for(lambda: buffer.failures >= 2)
+        database.down = False
+        factory.server.connected = False  # now Redis fails after the DB write
+        failures = buffer.failures
+        buffer.add(points[60:])
+        await _wait_for(lambda: database.sessions and buffer.failures > failures)
+        assert len(buffer) == 120
+
+        factory.server.connected = True
+        await _wait_for(lambda: len(buffer) == 0, timeout=5)
+        # The batch the database already took was only published on retry.
+        assert database.sessions == 2
+        assert stored_points() == 120
+        values = []
+        while (message := await subscriber.get_message(timeout=0.1)) is not None:
+            if message["type"] == "message":
+                values.append(message["data"])
+        assert len(values) == 120
+    finally:
+        await subscriber.aclose()
+        await buffer.close()
+
+
+@pytest.mark.asyncio
+async def test_backlog_left_on_disk_is_replayed_on_start(db_session, tmp_path):
+    database = FlakyDatabase()
+    database.down = True
+    buffer = IngestBuffer(
+        session_factory=database,
+        redis_factory=CountingRedis(),
+        flush_interval=60,
+        wal_dir=tmp_path,
+        wal_segment_bytes=4096,
+        wal_max_bytes=8192,
+    )
+    points = [IngestPoint("cpu", TS, float(i)) for i in range(100)]
+    with pytest.raises(BufferFullError):
+        for _ in range(10):
+            buffer.add(points)
+    accepted = len(buffer)
+    assert 0 < accepted < 1000
+    await buffer.close()
+    assert stored_points() == 0
+
+    restarted = IngestBuffer(
+        session_factory=TestingSessionLocal,
+        redis_factory=CountingRedis(),
+        flush_interval=60,
+        wal_dir=tmp_path,
+    )
+    try:
+        # Recovery reads the whole backlog, so it runs in a thread; meanwhile new
+        # points are turned away rather than blocking the event loop.
+        starting = asyncio.create_task(restarted.start())
+        await asyncio.sleep(0)
+        with pytest.raises(BufferFullError):
+            restarted.add(points[:1])
+        await starting
+        assert len(restarted) == accepted
+        await _wait_for(lambda: len(restarted) == 0)
+        assert stored_points() == accepted
+        assert restarted.wal.committed != Position(0, 0)
+    finally:
+        await restarted.close()
+
+
+@pytest.mark.asyncio
+async def test_batch_stored_before_a_crash_is_not_stored_again(db_session, tmp_path):
+    factory = CountingRedis()
+    factory.server.connected = False  # the database takes the batch, Redis does not
+    buffer = IngestBuffer(
+        session_factory=TestingSessionLocal,
+        redis_factory=factory,
+        flush_interval=60,
+        wal_dir=tmp_path,
+    )
+    buffer.add([IngestPoint("cpu", TS, float(i)) for i in range(10)])
+    assert await buffer.flush() == 0
+    log_id = buffer.wal.id
+    await buffer.close()  # the log is never committed, as after a crash
+    # The reopened log replays the 10 stored points together with a new one.
+    buffer.add([IngestPoint("cpu", TS, 100.0)])
+    await buffer.close()
+    assert stored_points() == 11
+
+    factory.server.connected = True
+    restarted = IngestBuffer(
+        session_factory=TestingSessionLocal,
+        redis_factory=factory,
+        flush_interval=60,
+        wal_dir=tmp_path,
+    )
+    try:
+        await restarted.start()
+        assert len(restarted) == 11
+        assert await restarted.flush() == 11
+        assert stored_points() == 11
+        with TestingSessionLocal() as session:
+            rollup = session.scalars(select(MetricRollup1m)).one()
+            assert (rollup.count, rollup.sum) == (11, 145.0)
+            assert applied_position(session, log_id) == restarted.wal.committed
+    finally:
+        await restarted.close()
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import json
+from datetime import timedelta
+
+import msgpack
+import pytest
+from fastapi.testclient import TestClient
+
+from app.schemas.metrics import MetricSeriesResponse
+from app.services import wire
+from app.services.fanout import MetricsHub, metric_channel
+from app.services.timeseries import SeriesColumns
+from app.services.wire import WireFormat, negotiate, points_series
+from app.tests.test_fanout import CountingRedis
+from app.tests.test_metrics import START, seed
+from app.tests.test_stream import message
+from app.ws import stream as ws_stream
+
+QUERY = {
+    "type": "cpu",
+    "from": START.isoformat(),
+    "to": (START + timedelta(seconds=19)).isoformat(),
+    "step": 10,
+}
+
+
+@pytest.mark.parametrize(
+    ("accept", "expected"),
+    [
+        (None, WireFormat.JSON),
+        ("*/*", WireFormat.JSON),
+        ("application/x-msgpack", WireFormat.MSGPACK),
+        ("application/json;q=0.5, application/msgpack", WireFormat.MSGPACK),
+        ("application/msgpack;q=0, application/json", WireFormat.JSON),
+        ("text/csv", None),
+    ],
+)
+def test_negotiate_ranks_by_quality_then_order(
+    accept: str | None, expected: WireFormat | None
+) -> None:
+    assert negotiate(accept) is expected
+
+
+def test_negotiate_skips_arrow_without_pyarrow(monkeypatch) -> None:
+    monkeypatch.setattr(wire, "pa", None)
+    assert negotiate(WireFormat.ARROW.value) is None
+
+
+def test_points_series_matches_validated_response_model() -> None:
+    columns = SeriesColumns(
+        metric_type="cpu",
+        step=1,
+        timestamps=[START, START + timedelta(seconds=1, microseconds=500)],
+        values=[1.0, 2.5],
+    )
+    validated = MetricSeriesResponse(series=columns.to_points(), step=1, agg="max")
+
+    assert json.loads(points_series(columns, "max")) == validated.model_dump()
+
+
+@pytest.mark.parametrize(
+    "fmt", [WireFormat.COLUMNAR_JSON, WireFormat.MSGPACK, WireFormat.ARROW]
+)
+def test_metrics_endpoint_serves_columnar_formats(
+    client: TestClient, auth_headers, db_session, fmt: WireFormat
+) -> None:
+    if fmt is WireFormat.ARROW:
+        pa = pytest.importorskip("pyarrow")
+    seed(db_session, "cpu", [float(i) for i in range(20)])
+
+    response = client.get(
+        "/metrics", params=QUERY, headers={**auth_headers, "Accept": fmt.value}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == fmt.value
+    assert response.headers["vary"] == "Accept"
+    start_ms = round(START.timestamp() * 1000)
+    if fmt is WireFormat.ARROW:
+        table = pa.ipc.open_stream(response.content).read_all()
+        assert table.schema.metadata[b"type"] == b"cpu"
+        ts = [value.timestamp() * 1000 for value in table.column("ts").to_pylist()]
+        assert ts == [start_ms, start_ms + 10_000]
+        assert table.column("value").to_pylist() == [4.5, 14.5]
+        return
+    if fmt is WireFormat.MSGPACK:
+        body = msgpack.unpackb(response.content)
+    else:
+        body = json.loads(response.content)
+    assert body == {
+        "type": "cpu",
+        "step": 10,
+        "agg": "avg",
+        "ts": [start_ms, start_ms + 10_000],
+        "values": [4.5, 14.5],
+    }
+
+
+def test_metrics_endpoint_rejects_unsupported_media_type(
+    client: TestClient, auth_headers
+) -> None:
+    response = client.get(
+        "/metrics", params=QUERY, headers={**auth_headers, "Accept": "text/csv"}
+    )
+    assert response.status_code == 406
+
+
+def test_stream_websocket_sends_msgpack_batches(
+    client: TestClient, auth_headers, monkeypatch
+) -> None:
+    factory = CountingRedis()
+    hub = MetricsHub(redis_factory=factory)
+    monkeypatch.setattr(ws_stream, "hub", hub)
+    monkeypatch.setattr(ws_stream.settings, "ws_stream_tick_seconds", 0.01)
+    token = auth_headers["Authorization"].split()[1]
+    publisher = client.portal.call(factory.publisher)
+
+    try:
+        url = f"/ws/stream?token={token}&format=msgpack"
+        with client.websocket_connect(url) as ws:
+            ws.send_text(json.dumps({"action": "subscribe", "types": ["cpu"]}))
+            assert msgpack.unpackb(ws.receive_bytes())["kind"] == "subscribed"
+
+            point = message("cpu", 0.5, second=1)
+            client.portal.call(publisher.publish, metric_channel("cpu"), point.raw)
+            batch = msgpack.unpackb(ws.receive_bytes())
+            assert batch == {
+                "kind": "batch",
+                "type": ["cpu"],
+                "ts": [round(START.timestamp() * 1000) + 1000],
+                "value": [0.5],
+            }
+    finally:
+        client.portal.call(hub.close)
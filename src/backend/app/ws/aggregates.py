@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Annotated, Any
+
+import orjson
+from fastapi import (
+    APIRouter,
+    Depends,
+    Query,
+    WebSocket,
+    WebSocketDisconnect,
+    WebSocketException,
+    status,
+)
+from fastapi.websockets import WebSocketState
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.telemetry import WS_CONNECTIONS, WS_FRAMES_SENT
+from app.db.session import get_async_db
+from app.dependencies.auth import get_ws_connection
+from app.schemas.metrics import Quantile
+from app.services.auth_cache import Principal
+from app.services.rolling import DEFAULT_QUANTILES, rolling_aggregates
+from app.services.tenants import InvalidMetricTypeError, qualify
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+_connections = WS_CONNECTIONS.labels("aggregates")
+_frames_sent = WS_FRAMES_SENT.labels("aggregates")
+
+
+async def _send_aggregates(
+    websocket: WebSocket,
+    types: list[str],
+    window: int,
+    quantiles: list[float],
+    interval: float,
+) -> None:
+    last: list[dict[str, Any]] | None = None
+    while websocket.application_state == WebSocketState.CONNECTED:
+        aggregates = [
+            rolling_aggregates.query(metric_type, window, quantiles)
+            for metric_type in types
+        ]
+        if aggregates != last:
+            frame = {"kind": "aggregates", "window": window, "aggregates": aggregates}
+            await websocket.send_text(orjson.dumps(frame).decode())
+            _frames_sent.inc()
+            last = aggregates
+        await asyncio.sleep(interval)
+
+
+async def _wait_disconnect(websocket: WebSocket) -> None:
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+
+
+@router.websocket("/ws/aggregates")
+async def aggregates_ws(
+    websocket: WebSocket,
+    user: Annotated[Principal, Depends(get_ws_connection)],
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    types: Annotated[list[str], Query(alias="type", min_length=1)],
+    window: int = 60,
+    q: Annotated[list[Quantile] | None, Query()] = None,
+    interval: Annotated[float, Query(ge=0.1)] = 1.0,
+) -> None:
+    """Push the `GET /metrics/aggregate` view of each `type` every `interval` seconds.
+
+    Frames are `{"kind": "aggregates", "window", "aggregates": [...]}` and are
+    skipped while nothing changed.
+    """
+    if window not in rolling_aggregates.windows:
+        raise WebSocketException(
+            code=status.WS_1008_POLICY_VIOLATION,
+            reason=f"window must be one of {list(rolling_aggregates.windows)}",
+        )
+    try:
+        keys = [qualify(user.tenant, metric_type) for metric_type in types]
+    except InvalidMetricTypeError as exc:
+        raise WebSocketException(
+            code=status.WS_1008_POLICY_VIOLATION, reason=str(exc)
+        ) from exc
+    await websocket.accept()
+    await db.close()
+    _connections.inc()
+    tasks = {
+        asyncio.create_task(
+            _send_aggregates(
+                websocket, keys, window, q or list(DEFAULT_QUANTILES), interval
+            )
+        ),
+        asyncio.create_task(_wait_disconnect(websocket)),
+    }
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
+    except WebSocketDisconnect:
+        logger.info("Aggregate WebSocket disconnected for %s", user.email)
+    except Exception as exc:  # pragma: no cover - defensive logging
+        logger.exception("Aggregate WebSocket error: %s", exc)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        _connections.dec()
+        # After the client's close frame the server has already answered it.
+        if WebSocketState.DISCONNECTED not in (
+            websocket.client_state,
+            websocket.application_state,
+        ):
+            await websocket.close()
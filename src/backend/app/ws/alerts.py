@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, status
+from fastapi.websockets import WebSocketState
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.telemetry import WS_CONNECTIONS, WS_FRAMES_SENT
+from app.db.session import get_async_db
+from app.dependencies.auth import get_ws_connection
+from app.services.alerts import ALERTS_CHANNEL
+from app.services.auth_cache import Principal
+from app.services.fanout import MetricMessage, Subscription, hub
+from app.services.send_queue import OverflowPolicy, SendQueue, SlowConsumerError
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+_connections = WS_CONNECTIONS.labels("alerts")
+_frames_sent = WS_FRAMES_SENT.labels("alerts")
+
+
+async def _forward(
+    websocket: WebSocket,
+    subscription: Subscription,
+    tenant: str | None,
+    metric_type: str | None,
+) -> None:
+    async for message in subscription:
+        if websocket.application_state != WebSocketState.CONNECTED:
+            break
+        if message.data.get("tenant") != tenant:
+            continue
+        if metric_type is not None and message.data.get("type") != metric_type:
+            continue
+        await websocket.send_text(message.raw)
+        _frames_sent.inc()
+
+
+async def _wait_disconnect(websocket: WebSocket) -> None:
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+
+
+@router.websocket("/ws/alerts")
+async def alerts_ws(
+    websocket: WebSocket,
+    user: Annotated[Principal, Depends(get_ws_connection)],
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    metric_type: str | None = None,
+) -> None:
+    """Stream alert state changes as they happen, optionally for one `metric_type`.
+
+    Frames are the events of `GET /alerts`: `{"kind": "alert", "state": "firing" |
+    "resolved", ...}`. Earlier events are not replayed; read them over REST.
+    """
+    await websocket.accept()
+    await db.close()
+    # Every event is a state change, so none may be conflated into another.
+    queue: SendQueue[MetricMessage] = SendQueue(
+        settings.ws_queue_size,
+        policy=OverflowPolicy.DROP_OLDEST,
+        max_lag=settings.ws_max_lag_seconds,
+    )
+    subscription = await hub.subscribe(ALERTS_CHANNEL, queue=queue)
+    _connections.inc()
+    tasks = {
+        asyncio.create_task(
+            _forward(websocket, subscription, user.tenant, metric_type)
+        ),
+        asyncio.create_task(_wait_disconnect(websocket)),
+        asyncio.create_task(queue.wait_lagged()),
+    }
+    close_code = status.WS_1000_NORMAL_CLOSURE
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
+    except WebSocketDisconnect:
+        logger.info("Alert WebSocket disconnected for %s", user.email)
+    except SlowConsumerError:
+        logger.warning(
+            "Disconnecting slow alert consumer %s (lag %.1fs)", user.email, queue.lag
+        )
+        close_code = status.WS_1013_TRY_AGAIN_LATER
+    except Exception as exc:  # pragma: no cover - defensive logging
+        logger.exception("Alert WebSocket error: %s", exc)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await subscription.close()
+        _connections.dec()
+        # After the client's close frame the server has already answered it.
+        if WebSocketState.DISCONNECTED not in (
+            websocket.client_state,
+            websocket.application_state,
+        ):
+            await websocket.close(code=close_code)
@@ -1,55 +1,138 @@
 from __future__ import annotations
 
+import asyncio
 import logging
-from collections.abc import AsyncIterator
 from typing import Annotated
 
-import redis.asyncio as redis
-from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
+from fastapi import (
+    APIRouter,
+    Depends,
+    Query,
+    WebSocket,
+    WebSocketDisconnect,
+    WebSocketException,
+    status,
+)
 from fastapi.websockets import WebSocketState
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.config import settings
-from app.dependencies.auth import get_current_user
-from app.models.user import User
+from app.core.telemetry import WS_CONNECTIONS, WS_FRAMES_SENT
+from app.db.session import get_async_db
+from app.dependencies.auth import get_ws_connection
+from app.services.auth_cache import Principal
+from app.services.reducers import Downsample
+from app.services.replay import ReplaySubscription, replay_broker
+from app.services.send_queue import SlowConsumerError
+from app.services.tenants import InvalidMetricTypeError, fair_scheduler, qualify
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+_connections = WS_CONNECTIONS.labels("metrics")
+_frames_sent = WS_FRAMES_SENT.labels("metrics")
 
-async def subscribe_channel(channel: str) -> AsyncIterator[str]:
-    client = redis.Redis(
-        host=settings.redis_host, port=settings.redis_port, decode_responses=True
-    )
-    pubsub = client.pubsub()
-    await pubsub.subscribe(channel)
-    try:
-        async for message in pubsub.listen():
-            if message["type"] == "message":
-                yield message["data"]
-    finally:
-        await pubsub.unsubscribe(channel)
-        await pubsub.close()
-        await client.aclose()
+
+async def _forward(
+    websocket: WebSocket,
+    initial: list[str],
+    subscription: ReplaySubscription,
+    tenant: str | None,
+) -> None:
+    for frame in initial:
+        async with fair_scheduler.turn(tenant):
+            await websocket.send_text(frame)
+    _frames_sent.inc(len(initial))
+    async for entry in subscription:
+        if websocket.application_state != WebSocketState.CONNECTED:
+            break
+        if subscription.queue.dropped:
+            # A delta is gone; the client resumes from its last seq instead.
+            raise SlowConsumerError
+        async with fair_scheduler.turn(tenant):
+            await websocket.send_text(entry.frame)
+        _frames_sent.inc()
+
+
+async def _wait_disconnect(websocket: WebSocket) -> None:
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
 
 
 @router.websocket("/ws/metrics")
 async def metrics_ws(
     websocket: WebSocket,
     metric_type: str,
-    user: Annotated[User, Depends(get_current_user)],
+    user: Annotated[Principal, Depends(get_ws_connection)],
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    last_seq: int | None = None,
+    epoch: str | None = None,
+    max_points: Annotated[int | None, Query(ge=2)] = None,
+    downsample: Downsample = Downsample.LTTB,
 ) -> None:
+    """Stream `metric_type`: a snapshot (or the missed deltas when resuming), then deltas.
+
+    Frames are `{"kind": "snapshot", "epoch", "seq", "points": [[ts_ms, value], ...]}`
+    and `{"kind": "delta", "seq", "data"}`; a snapshot point of a labelled series
+    carries its labels as a third element, as a delta's `data` does. Reconnecting with `epoch` and `last_seq`
+    replays only what was missed if this worker still holds it. A client too slow
+    to take every delta is closed with 1013 and should reconnect that way.
+    `max_points` thins the snapshot for a coarser chart, as on `GET /metrics`.
+    """
+    try:
+        key = qualify(user.tenant, metric_type)
+    except InvalidMetricTypeError as exc:
+        raise WebSocketException(
+            code=status.WS_1008_POLICY_VIOLATION, reason=str(exc)
+        ) from exc
     await websocket.accept()
-    channel = f"metrics:{metric_type}"
+    initial, subscription = await replay_broker.attach(
+        key,
+        db,
+        replay_broker.new_queue(),
+        last_seq=last_seq,
+        epoch=epoch,
+        max_points=max_points,
+        downsample=downsample,
+    )
+    # The socket may stay open for hours; don't pin a pooled connection to it.
+    await db.close()
+    _connections.inc()
+    tasks = {
+        asyncio.create_task(_forward(websocket, initial, subscription, user.tenant)),
+        asyncio.create_task(_wait_disconnect(websocket)),
+        asyncio.create_task(subscription.queue.wait_lagged()),
+    }
+    close_code = status.WS_1000_NORMAL_CLOSURE
     try:
-        async for payload in subscribe_channel(channel):
-            if websocket.application_state != WebSocketState.CONNECTED:
-                break
-            await websocket.send_text(payload)
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected for %s", user.email)
+    except SlowConsumerError:
+        logger.warning(
+            "Disconnecting slow WebSocket consumer %s (lag %.1fs)",
+            user.email,
+            subscription.queue.lag,
+        )
+        close_code = status.WS_1013_TRY_AGAIN_LATER
     except Exception as exc:  # pragma: no cover - defensive logging
         logger.exception("WebSocket error: %s", exc)
     finally:
-        if websocket.application_state == WebSocketState.CONNECTED:
-            await websocket.close()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await subscription.close()
+        _connections.dec()
+        logger.info(
+            "WebSocket stream closed for %s: %s", user.email, subscription.queue.stats()
+        )
+        # After the client's close frame the server has already answered it.
+        if WebSocketState.DISCONNECTED not in (
+            websocket.client_state,
+            websocket.application_state,
+        ):
+            await websocket.close(code=close_code)
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from typing import Annotated, Literal
+
+import msgpack
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, status
+from fastapi.websockets import WebSocketState
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.telemetry import WS_CONNECTIONS, WS_FRAMES_SENT
+from app.db.session import get_async_db
+from app.dependencies.auth import get_ws_connection
+from app.schemas.metrics import StreamCommand
+from app.services.auth_cache import Principal
+from app.services.fanout import hub
+from app.services.send_queue import SlowConsumerError
+from app.services.stream import (
+    StreamFilter,
+    StreamLimitError,
+    StreamSession,
+    batch_frame,
+)
+from app.services.tenants import InvalidMetricTypeError, fair_scheduler
+from app.services.wire import msgpack_batch
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+_connections = WS_CONNECTIONS.labels("stream")
+_frames_sent = WS_FRAMES_SENT.labels("stream")
+
+
+StreamFormat = Literal["json", "msgpack"]
+
+
+async def _send_control(
+    websocket: WebSocket, fmt: StreamFormat, kind: str, **fields: object
+) -> None:
+    frame = {"kind": kind, **fields}
+    if fmt == "msgpack":
+        await websocket.send_bytes(msgpack.packb(frame))
+    else:
+        await websocket.send_text(json.dumps(frame, separators=(",", ":")))
+
+
+async def _collect(session: StreamSession) -> None:
+    queue = session.queue
+    while True:
+        session.accept(await queue.get())
+        while len(queue):
+            session.accept(queue.get_nowait())
+
+
+async def _send_batches(
+    websocket: WebSocket, session: StreamSession, fmt: StreamFormat
+) -> None:
+    while websocket.application_state == WebSocketState.CONNECTED:
+        await asyncio.sleep(settings.ws_stream_tick_seconds)
+        batch = session.flush()
+        if not batch:
+            continue
+        async with fair_scheduler.turn(session.tenant):
+            if fmt == "msgpack":
+                await websocket.send_bytes(msgpack_batch(batch))
+            else:
+                await websocket.send_text(batch_frame(batch))
+        _frames_sent.inc()
+
+
+async def _handle_commands(
+    websocket: WebSocket, session: StreamSession, fmt: StreamFormat
+) -> None:
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        try:
+            command = StreamCommand.model_validate_json(
+                message.get("text") or message.get("bytes") or b""
+            )
+            if command.action == "subscribe":
+                stream_filter = StreamFilter(
+                    command.interval,
+                    command.threshold,
+                    command.downsample,
+                    command.matchers(),
+                )
+                await session.subscribe(command.types, stream_filter)
+            else:
+                await session.unsubscribe(command.types)
+        except ValidationError as exc:
+            detail = exc.errors(
+                include_url=False, include_context=False, include_input=False
+            )
+            await _send_control(websocket, fmt, "error", detail=detail)
+            continue
+        except (StreamLimitError, InvalidMetricTypeError) as exc:
+            await _send_control(websocket, fmt, "error", detail=str(exc))
+            continue
+        await _send_control(websocket, fmt, "subscribed", types=session.patterns)
+
+
+@router.websocket("/ws/stream")
+async def stream_ws(
+    websocket: WebSocket,
+    user: Annotated[Principal, Depends(get_ws_connection)],
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    format: StreamFormat = "json",
+) -> None:
+    """Stream any number of metric types over one socket.
+
+    The client sends `{"action": "subscribe" | "unsubscribe", "types": [...]}`, where
+    a type may be a glob such as `disk.*`; subscribe also accepts `interval`
+    (seconds), `threshold` and `downsample` (`latest` or `minmax` per interval)
+    to thin the points server-side, and `match` (label matchers such as
+    `host=~"web-.*"`, as on `GET /metrics`) to pick series. Every command is
+    answered with `{"kind": "subscribed", "types": [...]}` or `{"kind": "error"}`,
+    and matching points arrive as one `{"kind": "batch", "points": [...]}` frame
+    per tick.
+
+    With `format=msgpack` every frame is binary MessagePack instead, and a batch
+    carries parallel `type`, `ts` (epoch ms) and `value` arrays, plus `labels`
+    when any of its points has labels.
+    """
+    await websocket.accept()
+    await db.close()
+    session = StreamSession(hub=hub, tenant=user.tenant)
+    _connections.inc()
+    tasks = {
+        asyncio.create_task(_collect(session)),
+        asyncio.create_task(_send_batches(websocket, session, format)),
+        asyncio.create_task(_handle_commands(websocket, session, format)),
+        asyncio.create_task(session.queue.wait_lagged()),
+    }
+    close_code = status.WS_1000_NORMAL_CLOSURE
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
+    except WebSocketDisconnect:
+        logger.info("Stream WebSocket disconnected for %s", user.email)
+    except SlowConsumerError:
+        logger.warning(
+            "Disconnecting slow stream consumer %s (lag %.1fs)",
+            user.email,
+            session.queue.lag,
+        )
+        close_code = status.WS_1013_TRY_AGAIN_LATER
+    except Exception as exc:  # pragma: no cover - defensive logging
+        logger.exception("Stream WebSocket error: %s", exc)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await session.close()
+        _connections.dec()
+        logger.info(
+            "Stream WebSocket closed for %s: %s", user.email, session.queue.stats()
+        )
+        # After the client's close frame the server has already answered it.
+        if WebSocketState.DISCONNECTED not in (
+            websocket.client_state,
+            websocket.application_state,
+        ):
+            await websocket.close(code=close_code)
@@ -0,0 +1 @@
+"""Benchmarks for the backend hot paths (run with `uv run python -m benchmarks.<name>`)."""
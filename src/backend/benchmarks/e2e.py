@@ -0,0 +1,326 @@
+"""Drive the app end to end with concurrent HTTP clients and WebSocket consumers.
+
+Serves the real ASGI app with uvicorn on a local port and, in the same process,
+runs `--concurrency` HTTP clients against the REST scenarios, then connects
+`--consumers` WebSocket clients while the load generator publishes `--rate`
+points/s. Latency percentiles, throughput and memory per connection are printed
+and written as JSON (compare runs with `python -m benchmarks.results`).
+
+SQLite and fakeredis stand in for Postgres and Redis unless `DATABASE_URL` and
+`--real-redis` point the run at real services::
+
+    uv run python -m benchmarks.e2e --requests 5000 --concurrency 100 \\
+        --consumers 2000 --rate 2000 --duration 10
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+# Must be set before the app reads its settings: no dev generator, scratch DB.
+os.environ.setdefault("APP_ENV", "bench")
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite+pysqlite:///{Path(tempfile.mkdtemp()) / 'e2e.db'}"
+)
+
+import fakeredis  # noqa: E402
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from websockets.asyncio.client import ClientConnection, connect  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.db.base import Base  # noqa: E402
+from app.db.session import SessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services.fanout import RedisFactory, default_redis, hub  # noqa: E402
+from app.services.generator import LoadGenerator, series_names  # noqa: E402
+from app.services.ingest import IngestPoint, ingest_buffer, write_points  # noqa: E402
+from app.services.timeseries import as_utc  # noqa: E402
+from benchmarks.results import latency_summary, rss_bytes, write_results  # noqa: E402
+
+METRIC_TYPE = "bench"
+# Only this many consumers time every frame; the rest just count them.
+LATENCY_SAMPLERS = 50
+REST_SCENARIOS: dict[str, tuple[str, dict[str, str], dict[str, str]]] = {
+    "auth_only": ("/metrics/hot-tier", {}, {}),
+    "metrics_json": ("/metrics", {"type": METRIC_TYPE}, {}),
+    "metrics_msgpack": (
+        "/metrics",
+        {"type": METRIC_TYPE},
+        {"Accept": "application/msgpack"},
+    ),
+}
+
+
+def fake_redis_factory() -> RedisFactory:
+    server = fakeredis.FakeServer()
+    return lambda: fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+
+
+def prepare_database() -> None:
+    if engine.dialect.name == "sqlite":
+        Base.metadata.create_all(engine)
+    now = datetime.now(tz=UTC)
+    with SessionLocal() as session:
+        write_points(
+            session,
+            [
+                IngestPoint(METRIC_TYPE, now - timedelta(seconds=i / 10), i % 100)
+                for i in range(3000)
+            ],
+        )
+
+
+async def login(base_url: str) -> str:
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        response = await client.post(
+            "/auth/login",
+            json={"email": settings.demo_user_email, "password": "adminpass"},
+        )
+        response.raise_for_status()
+        return response.json()["access_token"]
+
+
+async def bench_rest(
+    base_url: str, token: str, requests: int, concurrency: int
+) -> dict[str, Any]:
+    results = {}
+    limits = httpx.Limits(max_connections=concurrency)
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(
+        base_url=base_url, headers=headers, limits=limits, timeout=60
+    ) as client:
+        for name, (path, params, extra_headers) in REST_SCENARIOS.items():
+            latencies: list[float] = []
+            errors = 0
+            remaining = requests
+
+            async def worker() -> None:
+                nonlocal remaining, errors
+                while remaining > 0:
+                    remaining -= 1
+                    started = time.perf_counter()
+                    response = await client.get(
+                        path, params=params, headers=extra_headers
+                    )
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    errors += response.status_code != 200
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+            results[name] = {
+                **latency_summary(latencies),
+                "requests_per_second": len(latencies) / elapsed,
+                "errors": errors,
+            }
+    return results
+
+
+def _frame_points(frame: str | bytes) -> list[dict[str, Any]]:
+    message = json.loads(frame)
+    if message.get("kind") == "batch":
+        return message["points"]
+    if message.get("kind") == "delta":
+        return [message["data"]]
+    return []
+
+
+async def _consume(
+    socket: ClientConnection, counts: list[int], latencies: list[float] | None
+) -> None:
+    async for frame in socket:
+        points = _frame_points(frame)
+        counts[0] += len(points)
+        if latencies is None:
+            continue
+        now = time.time()
+        for point in points:
+            ts = as_utc(datetime.fromisoformat(point["timestamp"])).timestamp()
+            latencies.append((now - ts) * 1000)
+
+
+async def _open_consumer(
+    ws_url: str, endpoint: str, token: str, deflate: bool
+) -> ClientConnection:
+    compression = "deflate" if deflate else None
+    if endpoint == "metrics":
+        url = f"{ws_url}/ws/metrics?metric_type={METRIC_TYPE}&token={token}"
+        return await connect(url, compression=compression, open_timeout=60)
+    socket = await connect(
+        f"{ws_url}/ws/stream?token={token}", compression=compression, open_timeout=60
+    )
+    await socket.send(
+        json.dumps({"action": "subscribe", "types": [f"{METRIC_TYPE}.*"]})
+    )
+    await socket.recv()  # the "subscribed" acknowledgement
+    return socket
+
+
+async def bench_ws(
+    base_url: str,
+    token: str,
+    consumers: int,
+    rate: float,
+    duration: float,
+    endpoint: str,
+    deflate: bool,
+    redis_factory: RedisFactory,
+) -> dict[str, Any]:
+    ws_url = base_url.replace("http://", "ws://")
+    rss_before = rss_bytes()
+    sockets: list[ClientConnection] = []
+    connect_started = time.perf_counter()
+    for offset in range(0, consumers, 100):
+        sockets += await asyncio.gather(
+            *(
+                _open_consumer(ws_url, endpoint, token, deflate)
+                for _ in range(min(100, consumers - offset))
+            )
+        )
+    connect_seconds = time.perf_counter() - connect_started
+    await asyncio.sleep(1)  # let the hub finish subscribing
+    memory_per_connection = (rss_bytes() - rss_before) / max(consumers, 1)
+
+    counts = [[0] for _ in sockets]
+    latencies: list[float] = []
+    readers = [
+        asyncio.create_task(
+            _consume(socket, count, latencies if index < LATENCY_SAMPLERS else None)
+        )
+        for index, (socket, count) in enumerate(zip(sockets, counts))
+    ]
+    names = (
+        [METRIC_TYPE]
+        if endpoint == "metrics"
+        else [f"{METRIC_TYPE}.{name}" for name in series_names(4, 1)]
+    )
+    generator = LoadGenerator(names, rate=rate, redis_factory=redis_factory)
+    stats = await generator.run(duration)
+    # Drain in-flight frames until deliveries stop, or give up after 30 s.
+    delivered, deadline = -1, time.monotonic() + 30
+    while time.monotonic() < deadline:
+        await asyncio.sleep(1)
+        total = sum(count[0] for count in counts)
+        if total == delivered:
+            break
+        delivered = total
+
+    for reader in readers:
+        reader.cancel()
+    await asyncio.gather(*readers, return_exceptions=True)
+    await asyncio.gather(
+        *(socket.close() for socket in sockets), return_exceptions=True
+    )
+
+    delivered = sum(count[0] for count in counts)
+    expected = stats.sent * consumers
+    return {
+        "endpoint": endpoint,
+        "consumers": consumers,
+        "connect_seconds": connect_seconds,
+        "memory_per_connection_bytes": memory_per_connection,
+        "published": stats.sent,
+        "publish_rate": stats.rate,
+        "delivered": delivered,
+        "delivered_ratio": delivered / expected if expected else 0.0,
+        "deliveries_per_second": delivered / stats.elapsed if stats.elapsed else 0.0,
+        "latency": latency_summary(latencies),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    redis_factory = default_redis if args.real_redis else fake_redis_factory()
+    # The worker's pub/sub clients are the only Redis connections the run needs.
+    hub._redis_factory = redis_factory
+    ingest_buffer._redis_factory = redis_factory
+    await asyncio.to_thread(prepare_database)
+
+    config = uvicorn.Config(
+        app, host="127.0.0.1", port=args.port, log_level="warning", lifespan="on"
+    )
+    server = uvicorn.Server(config)
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        if serving.done():
+            serving.result()
+        await asyncio.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        token = await login(base_url)
+        return {
+            "rest": await bench_rest(base_url, token, args.requests, args.concurrency),
+            "ws": await bench_ws(
+                base_url,
+                token,
+                args.consumers,
+                args.rate,
+                args.duration,
+                args.ws_endpoint,
+                not args.no_deflate,
+                redis_factory,
+            ),
+        }
+    finally:
+        server.should_exit = True
+        await serving
+
+
+def report(results: dict[str, Any]) -> None:
+    for name, stats in results["rest"].items():
+        print(
+            f"{name:>16}: {stats['requests_per_second']:9,.0f} req/s"
+            f"  p50 {stats['p50_ms']:7.2f}  p95 {stats['p95_ms']:7.2f}"
+            f"  p99 {stats['p99_ms']:7.2f} ms  errors {stats['errors']}"
+        )
+    ws = results["ws"]
+    latency = ws["latency"]
+    print(
+        f"{'ws/' + ws['endpoint']:>16}: {ws['consumers']:,} consumers,"
+        f" {ws['deliveries_per_second']:,.0f} msgs/s delivered"
+        f" ({ws['delivered_ratio']:.1%}),"
+        f" {ws['memory_per_connection_bytes'] / 1024:,.1f} KiB/connection"
+    )
+    if latency["count"]:
+        print(
+            f"{'':>16}  latency p50 {latency['p50_ms']:7.2f}"
+            f"  p95 {latency['p95_ms']:7.2f}  p99 {latency['p99_ms']:7.2f} ms"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--consumers", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=1000)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument(
+        "--ws-endpoint", choices=("stream", "metrics"), default="stream"
+    )
+    parser.add_argument("--no-deflate", action="store_true")
+    parser.add_argument("--real-redis", action="store_true")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    report(results)
+    config = {
+        key: value for key, value in vars(args).items() if key not in ("output", "port")
+    }
+    config["database"] = engine.dialect.name
+    print(f"results written to {write_results('e2e', config, results, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Compare two machine-readable benchmark result files.
+
+Benchmarks that take `--output` write one JSON document per run (see
+`write_results`); this prints every numeric metric side by side with the change::
+
+    uv run python -m benchmarks.results results/e2e-old.json results/e2e-new.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+from collections.abc import Mapping, Sequence
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def latency_summary(latencies_ms: Sequence[float]) -> dict[str, float]:
+    if not latencies_ms:
+        return {"count": 0}
+    if len(latencies_ms) > 1:
+        cuts = statistics.quantiles(latencies_ms, n=100, method="inclusive")
+    else:
+        cuts = list(latencies_ms) * 99
+    return {
+        "count": len(latencies_ms),
+        "mean_ms": statistics.fmean(latencies_ms),
+        "p50_ms": cuts[49],
+        "p95_ms": cuts[94],
+        "p99_ms": cuts[98],
+        "max_ms": max(latencies_ms),
+    }
+
+
+def rss_bytes() -> int:
+    """Current resident set size; peak RSS where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(
+    name: str,
+    config: Mapping[str, Any],
+    results: Mapping[str, Any],
+    output: Path | None = None,
+) -> Path:
+    started_at = datetime.now(tz=UTC)
+    if output is None:
+        stamp = started_at.strftime("%Y%m%dT%H%M%SZ")
+        output = RESULTS_DIR / f"{name}-{stamp}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    document = {
+        "benchmark": name,
+        "recorded_at": started_at.isoformat(),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": dict(config),
+        "results": dict(results),
+    }
+    output.write_text(json.dumps(document, indent=2, sort_keys=True) + "\n")
+    return output
+
+
+def flatten(value: Any, prefix: str = "") -> dict[str, float]:
+    if isinstance(value, Mapping):
+        flat: dict[str, float] = {}
+        for key, item in value.items():
+            flat.update(flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+        return flat
+    if isinstance(value, int | float) and not isinstance(value, bool):
+        return {prefix: float(value)}
+    return {}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("candidate", type=Path)
+    args = parser.parse_args()
+
+    old = json.loads(args.baseline.read_text())
+    new = json.loads(args.candidate.read_text())
+    print(f"{old.get('git_commit')} -> {new.get('git_commit')}")
+    old_flat, new_flat = flatten(old["results"]), flatten(new["results"])
+    width = max(map(len, old_flat.keys() | new_flat.keys()), default=0)
+    for key in sorted(old_flat.keys() | new_flat.keys()):
+        before, after = old_flat.get(key), new_flat.get(key)
+        if before is None or after is None:
+            print(f"{key:<{width}}  {before!s:>14}  {after!s:>14}")
+            continue
+        change = f"{(after - before) / before:+8.1%}" if before else ""
+        print(f"{key:<{width}}  {before:14.3f}  {after:14.3f}  {change}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""Measure how ingest throughput and WebSocket capacity scale with worker count.
+
+For each entry of `--workers` the app is started under gunicorn with that many
+uvicorn workers (see `gunicorn.conf.py`), then loaded in two phases whose size
+grows with the worker count:
+
+* ingest: `--ingest-clients` HTTP clients per worker post `--batch`-point
+  batches to `/metrics/ingest` for `--duration` seconds;
+* WebSocket: `--consumers` clients per worker connect to `/ws/metrics` while
+  the load generator publishes `--rate` points/s through Redis.
+
+Efficiency is each throughput divided by the single-worker one times the worker
+count, so 1.0 means perfectly linear. Workers share Redis and the database, so
+the run needs real services: point `DATABASE_URL` at PostgreSQL and `REDIS_HOST`
+at Redis. Drive from another machine (or pin this process to its own cores) so
+the clients do not compete with the workers::
+
+    uv run python -m benchmarks.scaling --workers 1,2,4,8 --consumers 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+import httpx
+import orjson
+from websockets.asyncio.client import ClientConnection, connect
+
+from app.core.config import settings
+from app.services.generator import LoadGenerator
+from benchmarks.results import write_results
+
+METRIC_TYPE = "bench"
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def start_server(workers: int, port: int) -> subprocess.Popen[bytes]:
+    env = {
+        **os.environ,
+        # No dev generator: the benchmark publishes the load itself.
+        "APP_ENV": "bench",
+        "WEB_CONCURRENCY": str(workers),
+        "BIND": f"127.0.0.1:{port}",
+        "LOG_LEVEL": "warning",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app.main:app"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+
+
+def stop_server(server: subprocess.Popen[bytes]) -> None:
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+async def wait_until_ready(base_url: str, workers: int, timeout: float = 60) -> None:
+    """Wait until `/health` answers, plus a moment for the other workers to boot."""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    await asyncio.sleep(0.5 * workers)
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"server at {base_url} did not become ready")
+
+
+async def login(base_url: str) -> str:
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        response = await client.post(
+            "/auth/login",
+            json={"email": settings.demo_user_email, "password": "adminpass"},
+        )
+        response.raise_for_status()
+        return response.json()["access_token"]
+
+
+async def bench_ingest(
+    base_url: str, token: str, clients: int, batch: int, duration: float
+) -> dict[str, Any]:
+    # One pre-encoded body: the clients should cost as little CPU as possible.
+    now_ms = int(time.time() * 1000)
+    body = orjson.dumps(
+        {"points": [[METRIC_TYPE, now_ms - i, i % 100] for i in range(batch)]}
+    )
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    accepted = rejected = 0
+    deadline = time.monotonic() + duration
+
+    async def client_loop(client: httpx.AsyncClient) -> None:
+        nonlocal accepted, rejected
+        while time.monotonic() < deadline:
+            response = await client.post("/metrics/ingest", content=body)
+            if response.status_code == 202:
+                accepted += response.json()["accepted"]
+            else:
+                rejected += 1
+                await asyncio.sleep(0.1)
+
+    limits = httpx.Limits(max_connections=clients)
+    started = time.perf_counter()
+    async with httpx.AsyncClient(
+        base_url=base_url, headers=headers, limits=limits, timeout=60
+    ) as client:
+        await asyncio.gather(*(client_loop(client) for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    return {
+        "clients": clients,
+        "points_per_second": accepted / elapsed,
+        "rejected_batches": rejected,
+    }
+
+
+async def _consume(socket: ClientConnection, counts: list[int]) -> None:
+    async for frame in socket:
+        message = orjson.loads(frame)
+        if message.get("kind") == "delta":
+            counts[0] += 1
+        elif message.get("kind") == "batch":
+            counts[0] += len(message["points"])
+
+
+async def bench_ws(
+    base_url: str, token: str, consumers: int, rate: float, duration: float
+) -> dict[str, Any]:
+    url = (
+        base_url.replace("http://", "ws://")
+        + f"/ws/metrics?metric_type={METRIC_TYPE}&token={token}"
+    )
+    sockets: list[ClientConnection] = []
+    started = time.perf_counter()
+    for offset in range(0, consumers, 100):
+        sockets += await asyncio.gather(
+            *(
+                connect(url, compression=None, open_timeout=60)
+                for _ in range(min(100, consumers - offset))
+            )
+        )
+    connect_seconds = time.perf_counter() - started
+    await asyncio.sleep(1)  # let every worker's hub subscribe
+
+    counts = [[0] for _ in sockets]
+    readers = [
+        asyncio.create_task(_consume(socket, count))
+        for socket, count in zip(sockets, counts)
+    ]
+    generator = LoadGenerator([METRIC_TYPE], rate=rate)
+    stats = await generator.run(duration)
+    delivered, deadline = -1, time.monotonic() + 30
+    while time.monotonic() < deadline:
+        await asyncio.sleep(1)
+        total = sum(count[0] for count in counts)
+        if total == delivered:
+            break
+        delivered = total
+
+    for reader in readers:
+        reader.cancel()
+    await asyncio.gather(*readers, return_exceptions=True)
+    await asyncio.gather(
+        *(socket.close() for socket in sockets), return_exceptions=True
+    )
+    expected = stats.sent * consumers
+    return {
+        "consumers": consumers,
+        "connections_per_second": consumers / connect_seconds,
+        "delivered_ratio": delivered / expected if expected else 0.0,
+        "deliveries_per_second": delivered / stats.elapsed if stats.elapsed else 0.0,
+    }
+
+
+async def bench_workers(workers: int, args: argparse.Namespace) -> dict[str, Any]:
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = start_server(workers, args.port)
+    try:
+        await wait_until_ready(base_url, workers)
+        token = await login(base_url)
+        return {
+            "workers": workers,
+            "ingest": await bench_ingest(
+                base_url,
+                token,
+                args.ingest_clients * workers,
+                args.batch,
+                args.duration,
+            ),
+            "ws": await bench_ws(
+                base_url, token, args.consumers * workers, args.rate, args.duration
+            ),
+        }
+    finally:
+        await asyncio.to_thread(stop_server, server)
+
+
+def with_efficiency(runs: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Add each throughput relative to perfect scaling from the first run."""
+    base = runs[0]
+    metrics = {
+        "ingest_points_per_second": ("ingest", "points_per_second"),
+        "ws_deliveries_per_second": ("ws", "deliveries_per_second"),
+        "ws_connections_per_second": ("ws", "connections_per_second"),
+    }
+    for run in runs:
+        factor = run["workers"] / base["workers"]
+        run["efficiency"] = {
+            name: run[phase][key] / (base[phase][key] * factor)
+            if base[phase][key]
+            else 0.0
+            for name, (phase, key) in metrics.items()
+        }
+    return runs
+
+
+def report(runs: list[dict[str, Any]]) -> None:
+    print(
+        f"{'workers':>7}  {'ingest pts/s':>12}  {'eff':>5}"
+        f"  {'ws msgs/s':>12}  {'eff':>5}  {'conns/s':>8}  {'delivered':>9}"
+    )
+    for run in runs:
+        efficiency = run["efficiency"]
+        print(
+            f"{run['workers']:>7}  {run['ingest']['points_per_second']:>12,.0f}"
+            f"  {efficiency['ingest_points_per_second']:>5.2f}"
+            f"  {run['ws']['deliveries_per_second']:>12,.0f}"
+            f"  {efficiency['ws_deliveries_per_second']:>5.2f}"
+            f"  {run['ws']['connections_per_second']:>8,.0f}"
+            f"  {run['ws']['delivered_ratio']:>9.1%}"
+        )
+
+
+async def run(args: argparse.Namespace) -> list[dict[str, Any]]:
+    runs = [await bench_workers(workers, args) for workers in args.workers]
+    return with_efficiency(runs)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--workers",
+        type=lambda value: [int(part) for part in value.split(",")],
+        default=[1, 2, 4],
+        help="Comma-separated worker counts to measure, e.g. 1,2,4,8",
+    )
+    parser.add_argument("--ingest-clients", type=int, default=8, help="Per worker")
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--consumers", type=int, default=500, help="Per worker")
+    parser.add_argument("--rate", type=float, default=200)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+    if not settings.database_url.startswith("postgresql"):
+        parser.error("workers share the database: set DATABASE_URL to PostgreSQL")
+
+    runs = asyncio.run(run(args))
+    report(runs)
+    config = {
+        key: value for key, value in vars(args).items() if key not in ("output", "port")
+    }
+    results = {f"{run['workers']}_workers": run for run in runs}
+    print(
+        f"results written to {write_results('scaling', config, results, args.output)}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Time the GET /metrics JSON body before and after the fast serialization path.
+
+"before" is what FastAPI did for the `response_model`: build the point dicts,
+validate them into `MetricSeriesResponse`, run `jsonable_encoder` and render with
+the stdlib encoder. "after" is `points_series`, which hands the columns straight
+to orjson::
+
+    uv run python -m benchmarks.serialization --points 10000 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import time
+from collections.abc import Callable
+from datetime import UTC, datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.schemas.metrics import MetricSeriesResponse
+from app.services.timeseries import SeriesColumns
+from app.services.wire import points_series
+
+RESPONSE_ADAPTER = TypeAdapter(MetricSeriesResponse)
+
+
+def build_series(points: int) -> SeriesColumns:
+    start = datetime.now(tz=UTC).replace(microsecond=0) - timedelta(seconds=points)
+    return SeriesColumns(
+        metric_type="cpu",
+        step=1,
+        timestamps=[start + timedelta(seconds=i) for i in range(points)],
+        values=[round(50 + (i % 977) / 10, 3) for i in range(points)],
+    )
+
+
+def validated_json(columns: SeriesColumns) -> bytes:
+    body = MetricSeriesResponse(series=columns.to_points(), step=1, agg="avg")
+    validated = RESPONSE_ADAPTER.validate_python(body, from_attributes=True)
+    return JSONResponse(jsonable_encoder(validated)).body
+
+
+def measure(encode: Callable[[], bytes], repeat: int) -> float:
+    encode()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        encode()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for points in args.points:
+        columns = build_series(points)
+        assert json.loads(validated_json(columns)) == json.loads(
+            points_series(columns, "avg")
+        )
+        before = measure(lambda: validated_json(columns), args.repeat)
+        after = measure(lambda: points_series(columns, "avg"), args.repeat)
+        print(
+            f"{points:>8,} points: before {before:9.2f} ms   after {after:8.2f} ms"
+            f"   ({before / after:5.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
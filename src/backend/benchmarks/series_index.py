@@ -0,0 +1,122 @@
+"""Label matcher lookups against the series index versus a scan of every series.
+
+Registers `--series` label sets of one metric type in a `SeriesIndex` (hosts,
+regions, instances and a constant `env` label), then times each matcher set from
+`QUERIES` through the index and through a linear `matches_labels` scan over all
+series, and reports p50/p99 in milliseconds. Results are written as JSON (compare
+runs with `python -m benchmarks.results`)::
+
+    uv run python -m benchmarks.series_index --series 100000 --queries 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from app.services.series import Labels, Matcher, SeriesIndex, matches_labels
+from benchmarks.results import write_results
+
+METRIC_TYPE = "bench_series"
+
+QUERIES = {
+    "eq": ["host=host-42"],
+    "eq_and_eq": ["region=region-3", "instance=i-7"],
+    "regex": ["host=~host-4[0-9]"],
+    "not_eq": ["region!=region-0", "env=prod"],
+    "not_regex": ["instance!~i-[0-8]"],
+}
+
+
+def build(series: int, hosts: int) -> tuple[SeriesIndex, list[Labels]]:
+    index = SeriesIndex(max_per_type=series)
+    label_sets = []
+    for i in range(series):
+        labels = (
+            ("env", "prod"),
+            ("host", f"host-{i % hosts}"),
+            ("instance", f"i-{i // hosts % 10}"),
+            ("region", f"region-{i % 8}"),
+            ("shard", str(i)),
+        )
+        index.add(METRIC_TYPE, labels)
+        label_sets.append(labels)
+    return index, label_sets
+
+
+def measure(lookup: Callable[[], int], queries: int) -> tuple[list[float], int]:
+    matched = lookup()
+    latencies = []
+    for _ in range(queries):
+        started = time.perf_counter()
+        lookup()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies, matched
+
+
+def summarize(latencies: list[float]) -> dict[str, float]:
+    ordered = sorted(latencies)
+    return {
+        "p50_ms": statistics.median(ordered),
+        "p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+    }
+
+
+def run(args: argparse.Namespace) -> dict[str, Any]:
+    started = time.perf_counter()
+    index, label_sets = build(args.series, args.hosts)
+    results: dict[str, Any] = {
+        "build_series_per_second": args.series / (time.perf_counter() - started)
+    }
+    for name, texts in QUERIES.items():
+        matchers = [Matcher.parse(text) for text in texts]
+        indexed, matched = measure(
+            lambda: len(index.select(METRIC_TYPE, matchers)), args.queries
+        )
+        scanned, expected = measure(
+            lambda: sum(
+                matches_labels(matchers, dict(labels)) for labels in label_sets
+            ),
+            args.scan_queries,
+        )
+        assert matched == expected, (name, matched, expected)
+        results[name] = {
+            "matched": matched,
+            "index": summarize(indexed),
+            "scan": summarize(scanned),
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--series", type=int, default=100_000)
+    parser.add_argument("--hosts", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--scan-queries", type=int, default=5)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    results = run(args)
+    print(f"{'build':>10}: {results['build_series_per_second']:12,.0f} series/s")
+    for name in QUERIES:
+        result = results[name]
+        print(
+            f"{name:>10}: {result['matched']:7,d} series  "
+            f"index p50 {result['index']['p50_ms']:8.3f}ms "
+            f"p99 {result['index']['p99_ms']:8.3f}ms  "
+            f"scan p50 {result['scan']['p50_ms']:8.1f}ms"
+        )
+    config = {key: value for key, value in vars(args).items() if key != "output"}
+    print(
+        "results written to "
+        f"{write_results('series_index', config, results, args.output)}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Ingest write-ahead log throughput: appends during an outage, replay after it.
+
+Accepts `--points` into an `IngestBuffer` whose database is down, so everything
+lands in the segment log, then restarts the buffer against a working database and
+Redis and times how fast the backlog drains. Reports the append rate, the raw log
+read + decode rate and the end-to-end replay rate, and writes them as JSON
+(compare runs with `python -m benchmarks.results`).
+
+SQLite and fakeredis stand in for Postgres and Redis unless `DATABASE_URL` and
+`--real-redis` point the run at real services::
+
+    uv run python -m benchmarks.wal_replay --points 1000000 --batch 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+os.environ.setdefault("APP_ENV", "bench")
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite+pysqlite:///{Path(tempfile.mkdtemp()) / 'wal.db'}"
+)
+
+import fakeredis  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.db.base import Base  # noqa: E402
+from app.db.session import SessionLocal, engine  # noqa: E402
+from app.services.fanout import RedisFactory, default_redis  # noqa: E402
+from app.services.ingest import IngestBuffer, IngestPoint, decode_batch  # noqa: E402
+from benchmarks.results import write_results  # noqa: E402
+
+
+def unavailable() -> Session:
+    raise ConnectionError("database is down")
+
+
+def build_batches(points: int, batch: int, types: int) -> list[list[IngestPoint]]:
+    start = datetime.now(tz=UTC)
+    rows = [
+        IngestPoint(
+            f"bench_{i % types}", start + timedelta(milliseconds=i), float(i % 100)
+        )
+        for i in range(points)
+    ]
+    return [rows[offset : offset + batch] for offset in range(0, points, batch)]
+
+
+async def run(args: argparse.Namespace, redis_factory: RedisFactory) -> dict[str, Any]:
+    batches = build_batches(args.points, args.batch, args.types)
+    wal_dir = Path(tempfile.mkdtemp())
+    options = dict(
+        redis_factory=redis_factory,
+        flush_points=args.flush_points,
+        flush_interval=3600,
+        wal_dir=wal_dir,
+        wal_segment_bytes=args.segment_mb * 1024 * 1024,
+        wal_max_bytes=args.max_mb * 1024 * 1024,
+    )
+
+    outage = IngestBuffer(session_factory=unavailable, **options)
+    started = time.perf_counter()
+    for batch in batches:
+        outage.add(batch)
+    append = time.perf_counter() - started
+    log_bytes = outage.wal.pending_bytes
+    await outage.close()
+
+    recovered = IngestBuffer(session_factory=SessionLocal, **options)
+    started = time.perf_counter()
+    decoded = sum(len(decode_batch(payload)) for payload, _ in recovered.wal.records())
+    read = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await recovered.start()
+    while len(recovered):
+        await asyncio.sleep(0.01)
+    replay = time.perf_counter() - started
+    await recovered.close()
+
+    return {
+        "append_points_per_second": args.points / append,
+        "read_points_per_second": decoded / read,
+        "replay_points_per_second": args.points / replay,
+        "log_bytes": log_bytes,
+        "bytes_per_point": log_bytes / args.points,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, default=500_000)
+    parser.add_argument("--batch", type=int, default=1000, help="Points per add()")
+    parser.add_argument("--types", type=int, default=50)
+    parser.add_argument("--flush-points", type=int, default=10_000)
+    parser.add_argument("--segment-mb", type=int, default=64)
+    parser.add_argument("--max-mb", type=int, default=1024)
+    parser.add_argument("--real-redis", action="store_true")
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    if engine.dialect.name == "sqlite":
+        Base.metadata.create_all(engine)
+    if args.real_redis:
+        redis_factory = default_redis
+    else:
+        server = fakeredis.FakeServer()
+        redis_factory = lambda: fakeredis.FakeAsyncRedis(server=server)  # noqa: E731
+
+    results = asyncio.run(run(args, redis_factory))
+    for name, value in results.items():
+        print(f"{name:>26}: {value:14,.1f}")
+    config = {key: value for key, value in vars(args).items() if key != "output"}
+    config["database"] = engine.dialect.name
+    print(
+        f"results written to {write_results('wal_replay', config, results, args.output)}"
+    )
+
+
+if __name__ == "__main__":
+    main()
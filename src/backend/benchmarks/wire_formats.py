@@ -0,0 +1,89 @@
+"""Compare encode time and payload size of the metric wire formats.
+
+Encodes one synthetic series of `--points` buckets the way `GET /metrics` does
+for each negotiated media type, and one `/ws/stream` batch of `--batch` points
+as spliced JSON and as MessagePack; sizes are reported raw and after the
+deflate that gzip or permessage-deflate would apply::
+
+    uv run python -m benchmarks.wire_formats --points 86400 --batch 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+import zlib
+from collections.abc import Callable
+from datetime import UTC, datetime, timedelta
+from functools import partial
+
+from app.services.fanout import MetricMessage, metric_channel
+from app.services.stream import batch_frame
+from app.services.timeseries import SeriesColumns
+from app.services.wire import available_formats, encode_series, msgpack_batch
+
+
+def build_series(points: int) -> SeriesColumns:
+    start = datetime.now(tz=UTC).replace(microsecond=0) - timedelta(seconds=points)
+    return SeriesColumns(
+        metric_type="cpu",
+        step=1,
+        timestamps=[start + timedelta(seconds=i) for i in range(points)],
+        values=[round(50 + (i % 977) / 10, 3) for i in range(points)],
+    )
+
+
+def build_batch(points: int) -> list[MetricMessage]:
+    start = datetime.now(tz=UTC)
+    messages = []
+    for i in range(points):
+        data = {
+            "timestamp": (start + timedelta(milliseconds=i)).isoformat(),
+            "value": round(50 + (i % 97) / 10, 3),
+            "type": f"panel_{i % 12}",
+        }
+        messages.append(
+            MetricMessage(metric_channel(data["type"]), json.dumps(data), data)
+        )
+    return messages
+
+
+def measure(encode: Callable[[], bytes], repeat: int) -> tuple[float, bytes]:
+    payload = encode()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        encode()
+    return (time.perf_counter() - started) / repeat * 1000, payload
+
+
+def report(label: str, elapsed_ms: float, payload: bytes) -> None:
+    deflated = len(zlib.compress(payload, 6))
+    print(
+        f"{label:>36}: {elapsed_ms:9.3f} ms  {len(payload):>11,} B"
+        f"  {deflated:>10,} B deflated"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, default=86_400)
+    parser.add_argument("--batch", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    columns = build_series(args.points)
+    print(f"GET /metrics, {args.points:,} points")
+    for fmt in available_formats():
+        encode = partial(encode_series, columns, "avg", fmt)
+        report(fmt.value, *measure(encode, args.repeat))
+
+    batch = build_batch(args.batch)
+    repeat = args.repeat * 100
+    print(f"/ws/stream batch, {args.batch:,} points")
+    report("json", *measure(lambda: batch_frame(batch).encode(), repeat))
+    report("msgpack", *measure(lambda: msgpack_batch(batch), repeat))
+
+
+if __name__ == "__main__":
+    main()
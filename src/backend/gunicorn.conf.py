@@ -0,0 +1,39 @@
+"""Gunicorn settings for running the API on several uvicorn workers.
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+Every worker is a full copy of the app: its own event loop, DB pools, Redis
+pub/sub connection and WebSocket clients. Points published to Redis reach every
+worker's hub, so a client gets the same stream whichever worker accepted it.
+Jobs that must run once per deployment (the dev generator, storage maintenance)
+are elected through a Redis lease, see `app.services.leader`.
+`/internal/metrics` merges every worker's registry through Redis, so one scrape
+target covers the deployment, see `app.services.worker_metrics`.
+
+Each worker opens up to `DB_POOL_SIZE + DB_MAX_OVERFLOW` connections per engine,
+so keep `workers x (pool + overflow) x 2` below Postgres' `max_connections`.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+# One worker per core; the work is async, so more only adds memory.
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Recycling workers (`max_requests`) would drop every WebSocket they hold, and
+# `timeout` only bounds how long a blocked event loop goes unnoticed.
+max_requests = 0
+timeout = int(os.environ.get("WORKER_TIMEOUT", 60))
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+# Import the app in each worker, after the fork: engines, thread pools and
+# module-level clients must not be shared between processes.
+preload_app = False
+
+accesslog = os.environ.get("ACCESS_LOG")
+errorlog = "-"
+loglevel = os.environ.get("LOG_LEVEL", "info")